@@ -0,0 +1,214 @@
+"""
+Conversion throughput and memory benchmark of the Chronicle backends.
+
+A synthetic corpus of Sigma rules is generated from a seed with the shapes found in real rule sets: plain selections,
+long wildcard value lists, regular expressions and nested conditions with filters over the log sources of the
+Chronicle pipeline. Each backend converts the corpus rule by rule in a fresh interpreter, so the peak resident set
+size is measured per backend. Reported are rules per second, per-rule latency percentiles and the peak RSS.
+
+With --baseline the results are compared against a previous run and the benchmark fails with exit status 1 if
+throughput drops or latency or memory grow by more than --threshold percent.
+
+Usage: python benchmarks/conversion.py [--rules N] [--seed S] [--backends udm yaral] [--output results.json]
+                                       [--baseline baseline.json] [--threshold 10]
+"""
+import argparse
+import json
+import random
+import resource
+import statistics
+import string
+import subprocess
+import sys
+import time
+from typing import List
+
+backend_classes = {
+    "udm": "chronicleBackendUdm",
+    "yaral": "chronicleBackendYaral",
+}
+
+# Log sources of the Chronicle pipeline with string fields used in the generated detections.
+logsources = [
+    ({"product": "windows", "category": "process_creation"}, ["Image", "CommandLine", "ParentImage", "ParentCommandLine", "OriginalFileName", "User"]),
+    ({"product": "linux", "category": "process_creation"}, ["Image", "CommandLine", "ParentImage", "User"]),
+    ({"product": "windows", "category": "network_connection"}, ["Image", "DestinationHostname", "SourceHostname", "User"]),
+    ({"product": "windows", "category": "file_event"}, ["Image", "TargetFilename", "User"]),
+    ({"product": "windows", "category": "registry_set"}, ["Image", "TargetObject", "Details"]),
+    ({"product": "windows", "category": "dns_query"}, ["Image", "QueryName"]),
+    ({"product": "windows", "service": "security"}, ["TargetUserName", "SubjectUserName", "WorkstationName", "ProcessName"]),
+]
+
+# Relative frequency of the rule shapes in the corpus.
+shapes = {
+    "selection": 4,
+    "wildcard_list": 3,
+    "regex": 1,
+    "nested": 2,
+}
+
+# Thresholds are relative changes in percent, latencies and memory regress when growing, throughput when dropping.
+regression_metrics = {
+    "rules_per_second": -1,
+    "latency_p50_ms": 1,
+    "latency_p99_ms": 1,
+    "peak_rss_mb": 1,
+}
+
+def word(rng : random.Random, minimum : int = 3, maximum : int = 12) -> str:
+    return "".join(rng.choices(string.ascii_lowercase + string.digits, k=rng.randint(minimum, maximum)))
+
+def value(rng : random.Random) -> str:
+    return rng.choice([
+        lambda: word(rng),
+        lambda: f"\\{word(rng)}.exe",
+        lambda: f"C:\\Windows\\{word(rng)}\\{word(rng)}.dll",
+        lambda: f" -{word(rng, 1, 3)} {word(rng)}",
+        lambda: f"{word(rng)}.{rng.choice(['com', 'net', 'io'])}",
+    ])()
+
+def selection(rng : random.Random, fields : List[str], values : int = 1) -> dict:
+    return {
+        f"{field}{rng.choice(['', '|contains', '|startswith', '|endswith'])}":
+            value(rng) if values == 1 else [value(rng) for _ in range(values)]
+        for field in rng.sample(fields, rng.randint(1, min(3, len(fields))))
+    }
+
+def generate_rule(rng : random.Random, index : int) -> dict:
+    logsource, fields = rng.choice(logsources)
+    shape = rng.choices(list(shapes), weights=list(shapes.values()))[0]
+    if shape == "selection":
+        detection = {"selection": selection(rng, fields), "condition": "selection"}
+    elif shape == "wildcard_list":
+        field = rng.choice(fields)
+        detection = {
+            "selection": {f"{field}|{rng.choice(['contains', 'endswith'])}": [value(rng) for _ in range(rng.randint(20, 300))]},
+            "filter": selection(rng, fields),
+            "condition": "selection and not filter",
+        }
+    elif shape == "regex":
+        detection = {
+            "selection": {f"{field}|re": f"(?i).*{word(rng)}[0-9]{{2,4}}\\.({word(rng)}|{word(rng)})$" for field in rng.sample(fields, rng.randint(1, 2))},
+            "condition": "selection",
+        }
+    else:
+        detection = {
+            "selection_a": selection(rng, fields, rng.randint(1, 5)),
+            "selection_b1": selection(rng, fields, rng.randint(1, 5)),
+            "selection_b2": selection(rng, fields, rng.randint(1, 5)),
+            "filter_a": selection(rng, fields),
+            "filter_b": selection(rng, fields, rng.randint(1, 10)),
+            "condition": "(selection_a or all of selection_b*) and not 1 of filter_*",
+        }
+    return {
+        "title": f"Synthetic {shape} rule {index}",
+        "id": f"00000000-0000-4000-8000-{index:012d}",
+        "status": "test",
+        "level": rng.choice(["low", "medium", "high"]),
+        "logsource": logsource,
+        "detection": detection,
+    }
+
+def generate_corpus(count : int, seed : int = 0) -> List[dict]:
+    """Rule dicts of a synthetic corpus, equal for equal seeds."""
+    rng = random.Random(seed)
+    return [generate_rule(rng, index) for index in range(count)]
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024      # bytes on macOS, KiB on Linux
+
+def measure(backend_name : str, count : int, seed : int) -> dict:
+    """Conversion of the corpus by one backend in the current process."""
+    from sigma.collection import SigmaCollection
+    import sigma.backends.chronicle as backends
+
+    backend = getattr(backends, backend_classes[backend_name])(collect_errors=True)
+    for rule in SigmaCollection.from_dicts(generate_corpus(1, seed + 1)):       # build the pipeline outside of the measurement
+        backend.convert_rule(rule)
+    backend.errors.clear()
+
+    start = time.perf_counter()
+    rules = SigmaCollection.from_dicts(generate_corpus(count, seed)).rules
+    parsed = time.perf_counter()
+    latencies = []
+    for rule in rules:
+        rule_start = time.perf_counter()
+        backend.convert_rule(rule)
+        latencies.append(time.perf_counter() - rule_start)
+    converted = time.perf_counter()
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "rules": len(rules),
+        "errors": len(backend.errors),
+        "parse_seconds": parsed - start,
+        "conversion_seconds": converted - parsed,
+        "rules_per_second": len(rules) / (converted - parsed),
+        "latency_p50_ms": percentiles[49] * 1000,
+        "latency_p90_ms": percentiles[89] * 1000,
+        "latency_p99_ms": percentiles[98] * 1000,
+        "latency_max_ms": max(latencies) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def run(backend_names : List[str], count : int, seed : int) -> dict:
+    return {
+        "corpus": {"rules": count, "seed": seed},
+        "backends": {
+            name: json.loads(subprocess.run(
+                [sys.executable, __file__, "--worker", name, "--rules", str(count), "--seed", str(seed)],
+                check=True, capture_output=True, text=True,
+            ).stdout)
+            for name in backend_names
+        },
+    }
+
+def compare(results : dict, baseline : dict, threshold : float) -> List[str]:
+    """Descriptions of the metrics that regressed by more than threshold percent against the baseline."""
+    if results["corpus"] != baseline["corpus"]:
+        return [f"corpus {results['corpus']} differs from baseline corpus {baseline['corpus']}"]
+    regressions = []
+    for name, metrics in results["backends"].items():
+        for metric, direction in regression_metrics.items():
+            if name not in baseline["backends"] or not baseline["backends"][name].get(metric):
+                continue
+            before, after = baseline["backends"][name][metric], metrics[metric]
+            change = (after - before) / before * 100
+            if change * direction > threshold:
+                regressions.append(f"{name} {metric}: {before:.2f} -> {after:.2f} ({change:+.1f}%)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rules", type=int, default=1000, help="Number of generated rules")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus generator")
+    parser.add_argument("--backends", nargs="+", choices=list(backend_classes), default=list(backend_classes), help="Backends to measure")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against the JSON results of a previous run")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Maximum regression against the baseline in percent")
+    parser.add_argument("--worker", choices=list(backend_classes), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker, args.rules, args.seed)))
+        return
+
+    results = run(args.backends, args.rules, args.seed)
+    for name, result in results["backends"].items():
+        print(
+            f"{name:<6} {result['rules_per_second']:9.1f} rules/s   p50 {result['latency_p50_ms']:7.2f} ms"
+            f"   p99 {result['latency_p99_ms']:7.2f} ms   peak RSS {result['peak_rss_mb']:7.1f} MiB   errors {result['errors']}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
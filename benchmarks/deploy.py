@@ -0,0 +1,74 @@
+"""
+Deployment throughput benchmark of converted YARA-L rules against the local Rules API stand-in.
+
+The synthetic corpus of the conversion benchmark is converted to ndjson records once and deployed to a
+MockRulesServer with simulated response latency with each given number of workers. Reported are rules per second, the
+speed-up against the first concurrency (1 by default, a sequential upload), retries and the opened connections.
+
+Usage: python benchmarks/deploy.py [--rules N] [--seed S] [--latency 0.02] [--concurrency 1 8 32]
+                                   [--rate-limit R] [--fail-rate F] [--output results.json]
+"""
+import argparse
+import asyncio
+import io
+import json
+from typing import Any, Dict, List
+
+from conversion import generate_corpus
+
+def records(count : int, seed : int) -> List[Dict[str, Any]]:
+    from sigma.backends.chronicle import chronicleBackendYaral
+    from sigma.backends.chronicle.deploy import read_records
+    from sigma.collection import SigmaCollection
+
+    output = chronicleBackendYaral(collect_errors=True).convert(SigmaCollection.from_dicts(generate_corpus(count, seed)), "ndjson")
+    return list(read_records(io.StringIO(output)))
+
+async def measure(records : List[Dict[str, Any]], concurrency : int, latency : float, rate_limit : float, fail_rate : float, seed : int) -> dict:
+    from sigma.backends.chronicle.deploy import RulesDeployer
+    from sigma.backends.chronicle.mock_server import MockRulesServer
+
+    async with MockRulesServer(latency=latency, rate_limit=rate_limit, fail_rate=fail_rate, seed=seed) as server:
+        deployer = RulesDeployer(server.base_url, "projects/benchmark/locations/eu/instances/benchmark", concurrency=concurrency, backoff=0.05)
+        stats = await deployer.deploy(records)
+        return {
+            "concurrency": concurrency,
+            "rules_per_second": len(records) / stats.seconds,
+            "seconds": stats.seconds,
+            "created": stats.created,
+            "failed": stats.failed,
+            "retries": stats.retries,
+            "connections": server.connections,
+        }
+
+def run(count : int, seed : int, concurrencies : List[int], latency : float, rate_limit : float, fail_rate : float) -> dict:
+    corpus = records(count, seed)
+    return {
+        "corpus": {"rules": len(corpus), "seed": seed, "latency": latency, "rate_limit": rate_limit, "fail_rate": fail_rate},
+        "runs": [asyncio.run(measure(corpus, concurrency, latency, rate_limit, fail_rate, seed)) for concurrency in concurrencies],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rules", type=int, default=500, help="Number of generated rules")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus generator and the failure injection")
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated response latency in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Worker counts to measure")
+    parser.add_argument("--rate-limit", type=float, help="Requests per second accepted by the server")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests failing with 503")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run(args.rules, args.seed, args.concurrency, args.latency, args.rate_limit, args.fail_rate)
+    sequential = results["runs"][0]["rules_per_second"]
+    for result in results["runs"]:
+        print(
+            f"concurrency {result['concurrency']:>4} {result['rules_per_second']:9.1f} rules/s ({result['rules_per_second'] / sequential:5.1f}x)"
+            f"   retries {result['retries']:>5}   connections {result['connections']:>4}   failed {result['failed']}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
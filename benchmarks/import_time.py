@@ -0,0 +1,99 @@
+"""
+Import time benchmark of the Chronicle backends.
+
+Every measurement runs in a fresh interpreter, as imports are cached within a process. Measured are the import of the
+backend package, the first access to a backend class, the instantiation of a backend together with the construction
+of its processing pipeline and the conversion of a first rule, i.e. the startup cost of a short-lived `sigma convert`
+invocation or worker process.
+
+Both import paths are measured: the lazy path of the package, which only loads and builds what the conversion uses,
+and the eager path, which loads all backends and pipelines and builds the pipeline of every backend class during the
+import like the package did before backends and pipelines were resolved lazily. Every stage is reported for both
+paths side by side.
+
+Usage: python benchmarks/import_time.py [--runs N] [--output results.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Resolves everything the package registers right after its import, as an eager import of the package did.
+eager_import = """
+import sigma.pipelines.chronicle as pipelines
+for backend in backends.backends.values():
+    backend.backend_processing_pipeline
+for pipeline in pipelines.pipelines.values():
+    pipeline()
+"""
+
+measurement = """
+import json, time
+start = time.perf_counter()
+import sigma.backends.chronicle as backends
+{import_path}
+imported = time.perf_counter()
+backend_class = backends.chronicleBackendUdm
+resolved = time.perf_counter()
+backend = backend_class()
+backend.backend_processing_pipeline
+instantiated = time.perf_counter()
+from sigma.collection import SigmaCollection
+backend.convert(SigmaCollection.from_yaml('''
+title: Test
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        CommandLine|contains: test
+    condition: sel
+'''))
+converted = time.perf_counter()
+print(json.dumps({
+    "import_package": imported - start,
+    "resolve_backend": resolved - imported,
+    "instantiate_backend": instantiated - resolved,
+    "first_conversion": converted - instantiated,
+    "total": converted - start,
+}))
+"""
+
+import_paths = {
+    "lazy": "",
+    "eager": eager_import,
+}
+
+def measure(runs : int, import_path : str = "lazy") -> dict:
+    script = measurement.replace("{import_path}", import_paths[import_path])
+    samples = [
+        json.loads(subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True).stdout)
+        for _ in range(runs)
+    ]
+    return {
+        stage: {
+            "median_ms": statistics.median(sample[stage] for sample in samples) * 1000,
+            "min_ms": min(sample[stage] for sample in samples) * 1000,
+        }
+        for stage in samples[0]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="Number of interpreter starts")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {import_path: measure(args.runs, import_path) for import_path in import_paths}
+    print(f"{'':<20} {'lazy median':>12} {'eager median':>13} {'lazy min':>10} {'eager min':>10}")
+    for stage in results["lazy"]:
+        lazy, eager = results["lazy"][stage], results["eager"][stage]
+        print(f"{stage:<20} {lazy['median_ms']:9.2f} ms {eager['median_ms']:10.2f} ms {lazy['min_ms']:7.2f} ms {eager['min_ms']:7.2f} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
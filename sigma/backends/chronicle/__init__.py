@@ -1,8 +1,13 @@
-from .chronicle_udm import chronicleBackendUdm
-from .chronicle_yaral import chronicleBackendYaral
-# TODO: add all backend classes that should be exposed to the user of your backend in the import statement above.
+from sigma.pipelines.chronicle.lazy import LazyRegistry, lazy_module_getattr
 
-backends = {        # Mapping between backend identifiers and classes. This is used by the pySigma plugin system to recognize backends and expose them with the identifier.
-    "chronicle_udm": chronicleBackendUdm,
-    "chronicle_yaral": chronicleBackendYaral,
-}
\ No newline at end of file
+# Backend classes are imported from their modules on first access, so only the backends that are actually used
+# are loaded.
+__getattr__ = lazy_module_getattr(__name__, {
+    "chronicleBackendUdm": ".chronicle_udm",
+    "chronicleBackendYaral": ".chronicle_yaral",
+})
+
+backends = LazyRegistry(__name__, {        # Mapping between backend identifiers and classes. This is used by the pySigma plugin system to recognize backends and expose them with the identifier.
+    "chronicle_udm": "chronicleBackendUdm",
+    "chronicle_yaral": "chronicleBackendYaral",
+})
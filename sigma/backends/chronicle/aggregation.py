@@ -0,0 +1,67 @@
+"""Rendering helpers for YARA-L multi-event rules generated from Sigma aggregations and correlation rules."""
+import math
+import re
+from typing import Dict, Iterable, Optional
+
+from sigma.exceptions import SigmaFeatureNotSupportedByBackendError
+
+# Names of SigmaCorrelationConditionOperator members to YARA-L comparison operators.
+yaral_operators = {
+    "LT": "<",
+    "LTE": "<=",
+    "GT": ">",
+    "GTE": ">=",
+    "EQ": "=",
+}
+
+# Tokens of a YARA-L events expression: string literals, regular expressions and references to the $selection event
+# variable. Only the latter are replaced by rename_event_variable, so values containing the variable name are kept.
+event_variable_tokens = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`[^`]*`|/(?:\\.|[^/\\])*/|(?P<variable>\$selection\.)')
+
+def yaral_window(seconds : int) -> str:
+    """Match window of a YARA-L rule. Windows are specified in whole days, hours or minutes, seconds are rounded up."""
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size and seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{max(1, math.ceil(seconds / 60))}m"
+
+def match_variable(name : str) -> str:
+    """YARA-L match variable for a group-by field or alias name."""
+    return "$" + re.sub(r"\W", "_", name)
+
+def rename_event_variable(expression : str, variable : str) -> str:
+    """Replace the $selection event variable of the field references in an events expression by another variable."""
+    return event_variable_tokens.sub(
+        lambda match: variable + "." if match.group("variable") else match.group(0),
+        expression,
+    )
+
+def multi_event_sections(
+        events : Dict[str, str],
+        group_by : Dict[str, Dict[str, str]],
+        seconds : int,
+        condition : str,
+        outcome : Optional[str] = None,
+        constraints : Iterable[str] = (),
+    ) -> str:
+    """
+    Sections of a multi-event YARA-L rule. events maps event variables to their events expression, group_by maps
+    match variables to the field they are bound to per event variable. Constraints are additional lines of the events
+    section, e.g. the order of the events of temporal correlations.
+    """
+    if not group_by:
+        raise SigmaFeatureNotSupportedByBackendError("Aggregations and correlations without group-by fields are not supported by the YARA-L backend.")
+    lines = ["    events:"]
+    for variable, expression in events.items():
+        lines.append(f"        ({expression})")
+        for name, fields in group_by.items():
+            lines.append(f"        {variable}.{fields[variable]} = {name}")
+    lines.extend(f"        {constraint}" for constraint in constraints)
+    lines.append("    match:")
+    lines.append(f"        {', '.join(group_by)} over {yaral_window(seconds)}")
+    if outcome is not None:
+        lines.append("    outcome:")
+        lines.append(f"        {outcome}")
+    lines.append("    condition:")
+    lines.append(f"        {condition}")
+    return "\n".join(lines) + "\n"
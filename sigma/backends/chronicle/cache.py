@@ -0,0 +1,204 @@
+"""Content addressed on-disk cache of conversion results."""
+import hashlib
+import json
+import os
+import re
+import tempfile
+from dataclasses import asdict
+from pathlib import Path
+from importlib.metadata import PackageNotFoundError, version
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from sigma.backends.chronicle.cost import QueryCost
+from sigma.backends.chronicle.fingerprint import RuleFingerprint
+from sigma.backends.chronicle.optimizer import OptimizerStats
+from sigma.backends.chronicle.re2 import RegexFinding
+from sigma.backends.chronicle.reference_lists import ReferenceList, ReferenceLists
+from sigma.conversion.base import Backend
+
+def package_version(name : str) -> str:
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return "unknown"
+
+def _tuples(value : Any) -> Any:
+    """Canonical conditions are nested tuples, which are stored as JSON lists."""
+    return tuple(_tuples(item) for item in value) if isinstance(value, list) else value
+
+def record_marks(backend : Backend) -> Tuple[int, int]:
+    """Number of query costs and fingerprints the backend recorded so far, see conversion_records."""
+    costs = getattr(backend, "costs", None)
+    fingerprints = getattr(backend, "fingerprints", None)
+    return (
+        len(costs.costs) if costs is not None else 0,
+        len(fingerprints.fingerprints) if fingerprints is not None else 0,
+    )
+
+def conversion_records(backend : Backend, rule_ids : Iterable[str], marks : Tuple[int, int]) -> Dict[str, Any]:
+    """
+    Optimizer statistics, regex findings, query costs and fingerprints the backend recorded for the rules of a rule
+    source, as JSON-serializable dict. marks are the record_marks of the backend before the source was converted.
+    """
+    rule_ids = list(dict.fromkeys(rule_ids))
+    records : Dict[str, Any] = {}
+    optimizer_stats = getattr(backend, "optimizer_stats", None)
+    if optimizer_stats:
+        records["optimizer_stats"] = {rule_id: asdict(optimizer_stats[rule_id]) for rule_id in rule_ids if rule_id in optimizer_stats}
+    regex_findings = getattr(backend, "regex_findings", None)
+    if regex_findings:
+        records["regex_findings"] = {rule_id: [asdict(finding) for finding in regex_findings[rule_id]] for rule_id in rule_ids if rule_id in regex_findings}
+    if getattr(backend, "costs", None) is not None:
+        records["costs"] = [asdict(cost) for cost in backend.costs.costs[marks[0]:]]
+    if getattr(backend, "fingerprints", None) is not None:
+        records["fingerprints"] = [asdict(fingerprint) for fingerprint in backend.fingerprints.fingerprints[marks[1]:]]
+    return records
+
+def replay_records(backend : Backend, records : Dict[str, Any]) -> None:
+    """Record the conversion records of a cache entry in the backend like a conversion of its rules would."""
+    with backend.lock:
+        if getattr(backend, "optimizer_stats", None) is not None:
+            for rule_id, stats in records.get("optimizer_stats", {}).items():
+                backend.optimizer_stats[rule_id] = backend.optimizer_stats.get(rule_id, OptimizerStats()) + OptimizerStats(**stats)
+        if getattr(backend, "regex_findings", None) is not None:
+            for rule_id, findings in records.get("regex_findings", {}).items():
+                backend.regex_findings[rule_id] = [RegexFinding(**finding) for finding in findings]
+    if getattr(backend, "costs", None) is not None:
+        for cost in records.get("costs", ()):
+            backend.costs.add(QueryCost(**cost))
+    if getattr(backend, "fingerprints", None) is not None:
+        for fingerprint in records.get("fingerprints", ()):
+            backend.fingerprints.add(RuleFingerprint(**dict(fingerprint, canonical=_tuples(fingerprint["canonical"]))))
+
+class ConversionCache:
+    """
+    Cache of conversion results of Sigma rule sources, stored as JSON files below a cache directory.
+
+    Entries are addressed by a SHA-256 hash of the rule source content, the backend class, its options, the output
+    format, the definition of all processing pipelines used by the backend and the versions of this package and
+    pySigma. Changing any of these results in a cache miss, stale entries are removed by the size-bounded eviction
+    which removes the least recently used entries first. The entry format version is part of the key, entries that
+    can't be read are treated as misses.
+    """
+    entry_suffix = ".json"
+    entry_format = 2        # increased whenever the structure of the entries changes
+
+    def __init__(self, directory : Union[str, Path], max_size : int = 256 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._size : Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    def context_key(self, backend : Backend, output_format : str) -> str:
+        """Hash of everything that influences the conversion result besides the rule itself."""
+        pipeline = (
+            backend.backend_processing_pipeline
+            + backend.processing_pipeline
+            + backend.output_format_processing_pipeline[output_format]
+        )
+        context = [
+            f"entry format {ConversionCache.entry_format}",
+            type(backend).__module__ + "." + type(backend).__qualname__,
+            output_format,
+            re.sub(" at 0x[0-9a-fA-F]+", "", repr(pipeline)),        # object addresses differ between runs
+            repr(sorted(backend.backend_options.items())),
+            package_version("pySigma-backend-chronicle"),
+            package_version("pySigma"),
+        ]
+        return hashlib.sha256("\0".join(context).encode("utf-8")).hexdigest()
+
+    def key(self, context_key : str, content : Union[str, dict]) -> str:
+        """Cache key of a rule source converted within the given context."""
+        if isinstance(content, dict):
+            content = json.dumps(content, sort_keys=True, default=str)
+        return hashlib.sha256((context_key + "\0" + content).encode("utf-8")).hexdigest()
+
+    def path(self, key : str) -> Path:
+        return self.directory / key[:2] / (key + self.entry_suffix)
+
+    def get(self, key : str) -> Optional[Tuple[List[Tuple[str, Any]], Dict[str, ReferenceList], Dict[str, Any]]]:
+        """
+        Return cached (rule id, output) pairs, the reference lists used by the rules and their conversion records (see
+        conversion_records) or None if the key is not cached or the entry can't be read.
+        """
+        path = self.path(key)
+        try:
+            with path.open(encoding="utf-8") as f:
+                entry = json.load(f)
+            result = (
+                [(rule_id, output) for rule_id, output in entry["results"]],
+                ReferenceLists.deserialize(entry["reference_lists"]),
+                dict(entry.get("records", {})),
+            )
+            os.utime(path)      # mark entry as recently used for eviction
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(
+            self,
+            key : str,
+            results : List[Tuple[str, Any]],
+            reference_lists : Optional[Dict[str, ReferenceList]] = None,
+            records : Optional[Dict[str, Any]] = None,
+        ) -> None:
+        """
+        Store (rule id, output) pairs, reference lists and conversion records. The entry is written atomically, so
+        concurrent readers never see partial entries.
+        """
+        size = self.size()
+        path = self.path(key)
+        path.parent.mkdir(exist_ok=True)
+        entry = {
+            "results": [[rule_id, output] for rule_id, output in results],
+            "reference_lists": ReferenceLists.serialize(reference_lists or {}),
+        }
+        if records:
+            entry["records"] = records
+        data = json.dumps(entry).encode("utf-8")
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._size = size + len(data)
+        if self._size > self.max_size:
+            self.evict()
+
+    def _entries(self) -> List[Path]:
+        return list(self.directory.glob("*/*" + self.entry_suffix))
+
+    def size(self) -> int:
+        """Total size of all cache entries in bytes."""
+        if self._size is None:
+            self._size = sum(path.stat().st_size for path in self._entries())
+        return self._size
+
+    def evict(self, max_size : Optional[int] = None) -> int:
+        """Remove least recently used entries until the cache fits into max_size bytes. Returns the number of removed entries."""
+        max_size = self.max_size if max_size is None else max_size
+        entries = sorted(((path.stat(), path) for path in self._entries()), key=lambda entry: entry[0].st_mtime)
+        size = sum(stat.st_size for stat, _ in entries)
+        removed = 0
+        for stat, path in entries:
+            if size <= max_size:
+                break
+            path.unlink()
+            size -= stat.st_size
+            removed += 1
+        self._size = size
+        return removed
+
+    def invalidate(self, key : str) -> None:
+        """Remove a single entry from the cache."""
+        path = self.path(key)
+        if path.exists():
+            self._size = self.size() - path.stat().st_size
+            path.unlink()
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        self.evict(0)
@@ -1,10 +1,18 @@
 from sigma.conversion.state import ConversionState
 from sigma.rule import SigmaRule
+from sigma.exceptions import SigmaFeatureNotSupportedByBackendError
 from sigma.conversion.base import TextQueryBackend
 from sigma.types import SigmaCompareExpression, SigmaRegularExpressionFlag
 from sigma.conversion.deferred import DeferredQueryExpression
 from sigma.types import re
-from sigma.pipelines.chronicle.chronicle import chronicle_pipeline
+from sigma.pipelines.chronicle.lazy import LazyPipeline
+from sigma.backends.chronicle.concurrency import ThreadLocalPipeline
+from sigma.backends.chronicle.conversion import ChronicleBackendMixin
+from sigma.backends.chronicle.cost import QueryCost, score_query
+from sigma.backends.chronicle.fingerprint import RuleFingerprint, record_fingerprint
+from sigma.backends.chronicle.metrics import timed
+from sigma.backends.chronicle.sharding import finalization_estimates, query_size
+from sigma.processing.pipeline import ProcessingPipeline
 import re
 from typing import ClassVar, Dict, Tuple, Pattern, List, Any, Optional
 from sigma.conditions import ConditionFieldEqualsValueExpression, ConditionOR, ConditionAND
@@ -17,7 +25,7 @@ from sigma.conditions import (
     ConditionFieldEqualsValueExpression,
 )
 
-class chronicleBackendUdm(TextQueryBackend):
+class chronicleBackendUdm(ChronicleBackendMixin, TextQueryBackend):
     """chronicle UDM backend."""
     name : ClassVar[str] = "chronicle UDM backend"
     formats : Dict[str, str] = {
@@ -27,7 +35,8 @@ class chronicleBackendUdm(TextQueryBackend):
 
     requires_pipeline : bool = True
 
-    backend_processing_pipeline : ClassVar[chronicle_pipeline] = chronicle_pipeline()
+    backend_processing_pipeline : ClassVar[ProcessingPipeline] = LazyPipeline("sigma.pipelines.chronicle.chronicle", "chronicle_pipeline")   # built on first use
+    last_processing_pipeline = ThreadLocalPipeline()     # pipeline of the rule converted by each thread, see sigma.backends.chronicle.concurrency
 
     precedence : ClassVar[Tuple[ConditionItem, ConditionItem, ConditionItem]] = (ConditionNOT, ConditionAND, ConditionOR)
     group_expression : ClassVar[str] = "({expr})"   # Expression for precedence override grouping as format string with {expr} placeholder
@@ -51,16 +60,14 @@ class chronicleBackendUdm(TextQueryBackend):
     field_escape_quote : ClassVar[bool] = True        # Escape quote string defined in field_quote
     field_escape_pattern : ClassVar[Pattern] = re.compile("\\s")   # All matches of this pattern are prepended with the string contained in field_escape.
 
-    str_double_quote : ClassVar[str] = '"'
-    str_single_quote : ClassVar[str] = "'"
-    str_triple_quote : ClassVar[str] = '"""'
+    str_double_quote : ClassVar[str] = '"'   # Quote of string values, quotes and backslashes inside them are escaped
     ## Values
     str_quote       : ClassVar[str] = ''     # string quoting character (added as escaping character)
     str_quote_pattern: ClassVar[Pattern] = re.compile(r"^$")
     escape_char     : ClassVar[str] = "\\"    # Escaping character for special characrers inside string
     wildcard_multi  : ClassVar[str] = "*"     # Character used as multi-character wildcard
     wildcard_single : ClassVar[str] = "*"     # Character used as single-character wildcard
-    add_escaped     : ClassVar[str] = "\\"    # Characters quoted in addition to wildcards and string quote
+    add_escaped     : ClassVar[str] = '\\"'    # Characters quoted in addition to wildcards and string quote
     filter_chars    : ClassVar[str] = ""      # Characters filtered
     bool_values     : ClassVar[Dict[bool, str]] = {   # Values to which boolean values are mapped.
         True: "true",
@@ -70,6 +77,14 @@ class chronicleBackendUdm(TextQueryBackend):
     startswith_expression : ClassVar[str] = "{field} = /^{value}.*/ nocase"
     endswith_expression   : ClassVar[str] = "{field} = /.*{value}$/ nocase"
     contains_expression   : ClassVar[str] = "{field} = /.*{value}.*/ nocase"
+    pattern_expression    : ClassVar[str] = "{field} = /^{value}$/ nocase"   # Values with inner wildcards and merged exact values as anchored regular expression
+    regex_match_expression : ClassVar[str] = "{field} = /{regex}/ nocase"   # Regular expression match of the minimal and functions string match modes as format string with placeholders {field} and {regex}
+    string_function_expressions : ClassVar[Dict[str, str]] = {   # Literal matches of the functions string match mode as format strings with placeholders {field} and {value}, the lowercase value escaped for a string literal
+        "contains": 'strings.contains(strings.to_lower({field}), "{value}")',
+        "startswith": 'strings.starts_with(strings.to_lower({field}), "{value}")',
+        "endswith": 'strings.ends_with(strings.to_lower({field}), "{value}")',
+    }
+    reference_list_expression : ClassVar[str] = "{field} in %{list_name} nocase"   # Expression for values replaced by a reference list as format string with placeholders {field} and {list_name}
     wildcard_match_expression : ClassVar[str] = "{field} match {value}"
 
     # String matching operators. if none is appropriate eq_token is used.
@@ -98,9 +113,10 @@ class chronicleBackendUdm(TextQueryBackend):
     # Case sensitive string matching operators similar to standard string matching. If not provided,
     # case_sensitive_match_expression is used.
 
-    # CIDR expressions: define CIDR matching if backend has native support. Else pySigma expands
-    # CIDR values into string wildcard matches.
-    cidr_expression : ClassVar[Optional[str]] = None  # CIDR expression query as format string with placeholders {field}, {value} (the whole CIDR value), {network} (network part only), {prefixlen} (length of network mask prefix) and {netmask} (CIDR network mask only).
+    # CIDR expressions: native CIDR matching with the net.ip_in_range_cidr function. The networks of CIDR value lists
+    # of a field are collapsed before they are converted, see convert_value_group.
+    cidr_expression : ClassVar[Optional[str]] = 'net.ip_in_range_cidr({field}, "{value}")'  # CIDR expression query as format string with placeholders {field} and {value} (the whole CIDR value)
+    cidr_list_expression : ClassVar[str] = "{field} in cidr %{list_name}"   # Expression for CIDR values replaced by a reference list of the CIDR syntax as format string with placeholders {field} and {list_name}
 
     # Numeric comparison operators
     compare_op_expression : ClassVar[str] = "{field}{operator}{value}"  # Compare operation query as format string with placeholders {field}, {operator} and {value}
@@ -123,6 +139,7 @@ class chronicleBackendUdm(TextQueryBackend):
     # Field value in list, e.g. "field in (value list)" or "field containsall (value list)"
     convert_or_as_in : ClassVar[bool] = True                     # Convert OR as in-expression
     convert_and_as_in : ClassVar[bool] = True                    # Convert AND as in-expression
+    in_expressions_allow_wildcards : ClassVar[bool] = True       # Values with wildcards are classified and grouped in convert_condition_as_in_expression
     list_separator : ClassVar[str] = ", "               # List element separator
 
     # Value not bound to a field
@@ -137,93 +154,28 @@ class chronicleBackendUdm(TextQueryBackend):
     # TODO: implement custom methods for query elements not covered by the default backend base.
     # Documentation: https://sigmahq-pysigma.readthedocs.io/en/latest/Backends.html
 
-    def get_quote_type(self, string_val):
-        """Returns the shortest correct quote type (single, double, or trip) based on quote characters contained within an input string"""
-        if '"' and "'" in string_val:
-            quote = self.str_triple_quote
-        elif '"' in string_val:
-            quote = self.str_single_quote
-        else:
-            quote = self.str_double_quote
-
-        return quote
-
-    def convert_condition_field_eq_val_str(self, cond : ConditionFieldEqualsValueExpression, state : ConversionState) -> Union[str, DeferredQueryExpression]:
-        """Conversion of field = string value expressions"""
-        field = cond.field
-        val = cond.value.to_plain()
-        val_no_wc = val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi)
-        quote = self.get_quote_type(val)
-        # contains
-        if val.startswith(self.wildcard_single) and val.endswith(self.wildcard_single):
-            result = self.contains_expression.format(field=field, value=val_no_wc.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)"))
-        # startswith
-        elif val.endswith(self.wildcard_single) and not val.startswith(self.wildcard_single):
-            result = self.startswith_expression.format(field=field, value=val_no_wc.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)"))
-        # endswith
-        elif val.startswith(self.wildcard_single) and not val.endswith(self.wildcard_single):
-            result = self.endswith_expression.format(field=field, value=val_no_wc.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)"))
-        # plain equals
-        else:
-            no_case_str = self.no_case_str_expression.format(value=quote + self.convert_value_str(cond.value, state) + quote)
-            result = field + self.eq_token + no_case_str
-
-        return result
-
-
-    def convert_condition_as_in_expression(self, cond : Union[ConditionOR, ConditionAND], state : ConversionState) -> Union[str, DeferredQueryExpression]:
-        """Conversion of field in value list conditions."""
-        vals = [str(arg.value.to_plain() or "") for arg in cond.args]
-        field = cond.args[0].field
-
-        # or-in condition
-        if isinstance(cond, ConditionOR):
-            # contains
-            if all(val.startswith(self.wildcard_single) and val.endswith(self.wildcard_single) for val in vals):
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' OR '.join([self.contains_expression.format(field=field, value=val.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)")) for val in vals_no_wc])
-            # starts with
-            elif all(val.endswith(self.wildcard_single) and not val.startswith(self.wildcard_single) for val in vals):
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' OR '.join([self.startswith_expression.format(field=field, value=val.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)")) for val in vals_no_wc])
-            # ends with
-            elif all(val.startswith(self.wildcard_single) and not val.endswith(self.wildcard_single) for val in vals):
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' OR '.join([self.endswith_expression.format(field=field, value=val.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)")) for val in vals_no_wc])
-            else:
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' OR '.join([f'{field} = "{val.lstrip(self.wildcard_single).rstrip(self.wildcard_single)}"' for val in vals])
-        
-        elif isinstance(cond, ConditionAND):
-            if all(val.startswith(self.wildcard_single) and val.endswith(self.wildcard_single) for val in vals):
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' AND '.join([self.contains_expression.format(field=field, value=val.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)")) for val in vals_no_wc])
-            # starts with
-            elif all(val.endswith(self.wildcard_single) and not val.startswith(self.wildcard_single) for val in vals):
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' AND '.join([self.startswith_expression.format(field=field, value=val.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)")) for val in vals_no_wc])
-            # ends with
-            elif all(val.startswith(self.wildcard_single) and not val.endswith(self.wildcard_single) for val in vals):
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' AND '.join([self.endswith_expression.format(field=field, value=val.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)")) for val in vals_no_wc])
-            else:
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' AND '.join([f'{field} = "{val.lstrip(self.wildcard_single).rstrip(self.wildcard_single)}"' for val in vals])
-            
-        else:
-            # ... other conditions ...
-            print("An Error Occurred")
-            pass
-
-        return result
-    
-    def convert_condition_field_eq_val_num(
-        self, cond: ConditionFieldEqualsValueExpression, state: ConversionState
-    ) -> Any:
-        """Conversion of field = number value expressions"""
-        result = cond.field + self.eq_token + str(f'"{cond.value}"')
-        return result
-    
+    @timed("finalize")
     def finalize_query_default(self, rule: SigmaRule, query: str, index: int, state: ConversionState) -> str:
+        if any(state.processing_state.get("aggregations", ())):
+            raise SigmaFeatureNotSupportedByBackendError("Rules with aggregate function conditions like count are only supported by the Chronicle YARA-L backend!")
+        cost = score_query(self, rule, query, state)
+        fingerprint = record_fingerprint(self, rule, index, state)
+        # Statistics are only recorded for rules that were converted.
+        self.record_statistics(rule, state)
+        return self.udm_query(rule, query, cost, fingerprint, state.processing_state.get("query_shard"))
+
+    def udm_query(self, rule : SigmaRule, query : str, cost : Optional[QueryCost] = None, fingerprint : Optional[RuleFingerprint] = None, shard : Optional[Tuple[int, int]] = None) -> str:
+        """Query followed by comments generated from the Sigma rule, the estimated cost, the fingerprint and the number of a shard are added if given."""
         # we replace the field in quarry with an $selection.field
-        return f"""({query})\n// Author: {rule.author}\n// Description: {rule.description}\n// False positives: {rule.falsepositives}\n// Level: {rule.level}\n// ID: {rule.id}\n"""
\ No newline at end of file
+        text = f"""({query})\n// Author: {rule.author}\n// Description: {rule.description}\n// False positives: {rule.falsepositives}\n// Level: {rule.level}\n// ID: {rule.id}\n"""
+        if cost is not None:
+            text += f"// Cost: {cost.score}\n"
+        if fingerprint is not None:
+            text += f"// Fingerprint: {fingerprint.fingerprint}\n"
+        if shard is not None:
+            text += f"// Shard: {shard[0]}\n"
+        return text
+
+    def finalized_size(self, rule : SigmaRule, query : str, index : int, state : ConversionState, shard : Optional[Tuple[int, int]] = None) -> int:
+        """UTF-8 size of the finalized text of a query with the given shard number, without recording its cost or fingerprint."""
+        return query_size(self.udm_query(rule, query, *finalization_estimates(self, rule, query, state), shard))
@@ -1,14 +1,28 @@
 from sigma.conversion.state import ConversionState
-from sigma.rule import SigmaRule
+from sigma.rule import SigmaRule, SigmaRuleBase
+from sigma.correlations import SigmaCorrelationRule, SigmaCorrelationTimespan, SigmaRuleReference
+from sigma.exceptions import SigmaFeatureNotSupportedByBackendError
 from sigma.conversion.base import TextQueryBackend
 from sigma.types import SigmaCompareExpression, SigmaRegularExpressionFlag
 from sigma.conversion.deferred import DeferredQueryExpression
 from sigma.types import re
-from sigma.pipelines.chronicle.chronicle import chronicle_pipeline
+from sigma.pipelines.chronicle.lazy import LazyPipeline
+from sigma.backends.chronicle.aggregation import match_variable, multi_event_sections, rename_event_variable, yaral_operators
+from sigma.backends.chronicle.concurrency import ThreadLocalPipeline
+from sigma.backends.chronicle.conversion import ChronicleBackendMixin
+from sigma.backends.chronicle.cost import QueryCost, score_query
+from sigma.backends.chronicle.fingerprint import RuleFingerprint, record_fingerprint
+from sigma.backends.chronicle.metrics import timed
+from sigma.backends.chronicle.output import batch_entry, batches, rule_record
+from sigma.backends.chronicle.options import backend_option
+from sigma.backends.chronicle.sharding import finalization_estimates, query_size
+from sigma.backends.chronicle.values import escape_meta
+from sigma.processing.pipeline import ProcessingPipeline
+import json
 import re
 from typing import ClassVar, Dict, Tuple, Pattern, List, Any, Optional
 from sigma.conditions import ConditionFieldEqualsValueExpression, ConditionOR, ConditionAND
-from typing import Union, ClassVar, Optional, Tuple, List, Dict, Any
+from typing import Union, ClassVar, Optional, Tuple, List, Dict, Any, Iterable, TextIO, TYPE_CHECKING
 from sigma.conditions import (
     ConditionItem,
     ConditionOR,
@@ -18,18 +32,35 @@ from sigma.conditions import (
 )
 from sigma.processing.postprocessing import ReplaceQueryTransformation
 
-class chronicleBackendYaral(TextQueryBackend):
+if TYPE_CHECKING:
+    from sigma.pipelines.chronicle.aggregation import Aggregation
+    from sigma.backends.chronicle.streaming import RuleSource
+    from sigma.backends.chronicle.cache import ConversionCache
+
+class chronicleBackendYaral(ChronicleBackendMixin, TextQueryBackend):
     """chronicle YARA-L backend."""
     name : ClassVar[str] = "chronicle YARA-L backend"
     formats : Dict[str, str] = {
         "default": "YARAL Rules",
+        "ndjson": "One JSON object per line with rule text, Sigma id, title, level, reference lists and content hash",
+        "rules_api": "Chronicle Rules API batch payloads, one per line, with at most rules_api_batch_bytes bytes each",
     }
     # register the output formats
 
 
     requires_pipeline : bool = True
 
-    backend_processing_pipeline : ClassVar[chronicle_pipeline] = chronicle_pipeline()
+    backend_processing_pipeline : ClassVar[ProcessingPipeline] = LazyPipeline("sigma.pipelines.chronicle.chronicle", "chronicle_pipeline")   # built on first use
+    last_processing_pipeline = ThreadLocalPipeline()     # pipeline of the rule converted by each thread, see sigma.backends.chronicle.concurrency
+
+    # Aggregations and correlation rules are converted into multi-event rules with match, outcome and condition sections
+    correlation_methods : ClassVar[Dict[str, str]] = {
+        "default": "Multi-event YARA-L rules counting events per match window",
+    }
+    rules_api_batch_bytes : ClassVar[int] = 1048576   # Maximum size of a batch payload of the rules_api format in bytes, can be set with the backend option of the same name.
+    aggregation_timeframe : ClassVar[str] = "1h"      # Match window of aggregations without timeframe, can be set with the backend option of the same name.
+    aggregation_group_by : ClassVar[str] = "principal.hostname"   # Group-by field of aggregations without one, as multi-event rules need a match variable. An empty value rejects them, can be set with the backend option of the same name.
+    field_prefix : ClassVar[str] = "$selection."      # Field references are bound to the event variable of the rule
 
     precedence : ClassVar[Tuple[ConditionItem, ConditionItem, ConditionItem]] = (ConditionNOT, ConditionAND, ConditionOR)
     group_expression : ClassVar[str] = "({expr})"   # Expression for precedence override grouping as format string with {expr} placeholder
@@ -53,16 +84,14 @@ class chronicleBackendYaral(TextQueryBackend):
     field_escape_quote : ClassVar[bool] = True        # Escape quote string defined in field_quote
     field_escape_pattern : ClassVar[Pattern] = re.compile("\\s")   # All matches of this pattern are prepended with the string contained in field_escape.
 
-    str_double_quote : ClassVar[str] = '"'
-    str_single_quote : ClassVar[str] = "'"
-    str_triple_quote : ClassVar[str] = '"""'
+    str_double_quote : ClassVar[str] = '"'   # Quote of string values, quotes and backslashes inside them are escaped
     ## Values
     str_quote       : ClassVar[str] = ''     # string quoting character (added as escaping character)
     str_quote_pattern: ClassVar[Pattern] = re.compile(r"^$")
     escape_char     : ClassVar[str] = "\\"    # Escaping character for special characrers inside string
     wildcard_multi  : ClassVar[str] = "*"     # Character used as multi-character wildcard
     wildcard_single : ClassVar[str] = "*"     # Character used as single-character wildcard
-    add_escaped     : ClassVar[str] = "\\"    # Characters quoted in addition to wildcards and string quote
+    add_escaped     : ClassVar[str] = '\\"'    # Characters quoted in addition to wildcards and string quote
     filter_chars    : ClassVar[str] = ""      # Characters filtered
     bool_values     : ClassVar[Dict[bool, str]] = {   # Values to which boolean values are mapped.
         True: "true",
@@ -72,6 +101,14 @@ class chronicleBackendYaral(TextQueryBackend):
     startswith_expression : ClassVar[str] = "{field} = /^{value}.*/ nocase"
     endswith_expression   : ClassVar[str] = "{field} = /.*{value}$/ nocase"
     contains_expression   : ClassVar[str] = "{field} = /.*{value}.*/ nocase"
+    pattern_expression    : ClassVar[str] = "{field} = /^{value}$/ nocase"   # Values with inner wildcards and merged exact values as anchored regular expression
+    regex_match_expression : ClassVar[str] = "{field} = /{regex}/ nocase"   # Regular expression match of the minimal and functions string match modes as format string with placeholders {field} and {regex}
+    string_function_expressions : ClassVar[Dict[str, str]] = {   # Literal matches of the functions string match mode as format strings with placeholders {field} and {value}, the lowercase value escaped for a string literal
+        "contains": 'strings.contains(strings.to_lower({field}), "{value}")',
+        "startswith": 'strings.starts_with(strings.to_lower({field}), "{value}")',
+        "endswith": 'strings.ends_with(strings.to_lower({field}), "{value}")',
+    }
+    reference_list_expression : ClassVar[str] = "{field} in %{list_name} nocase"   # Expression for values replaced by a reference list as format string with placeholders {field} and {list_name}
 
     # String matching operators. if none is appropriate eq_token is used.
     # Regular expressions
@@ -99,9 +136,10 @@ class chronicleBackendYaral(TextQueryBackend):
     # Case sensitive string matching operators similar to standard string matching. If not provided,
     # case_sensitive_match_expression is used.
 
-    # CIDR expressions: define CIDR matching if backend has native support. Else pySigma expands
-    # CIDR values into string wildcard matches.
-    cidr_expression : ClassVar[Optional[str]] = None  # CIDR expression query as format string with placeholders {field}, {value} (the whole CIDR value), {network} (network part only), {prefixlen} (length of network mask prefix) and {netmask} (CIDR network mask only).
+    # CIDR expressions: native CIDR matching with the net.ip_in_range_cidr function. The networks of CIDR value lists
+    # of a field are collapsed before they are converted, see convert_value_group.
+    cidr_expression : ClassVar[Optional[str]] = 'net.ip_in_range_cidr({field}, "{value}")'  # CIDR expression query as format string with placeholders {field} and {value} (the whole CIDR value)
+    cidr_list_expression : ClassVar[str] = "{field} in cidr %{list_name}"   # Expression for CIDR values replaced by a reference list of the CIDR syntax as format string with placeholders {field} and {list_name}
 
     # Numeric comparison operators
     compare_op_expression : ClassVar[str] = "{field}{operator}{value}"  # Compare operation query as format string with placeholders {field}, {operator} and {value}
@@ -128,6 +166,7 @@ class chronicleBackendYaral(TextQueryBackend):
     # Field value in list, e.g. "field in (value list)" or "field containsall (value list)"
     convert_or_as_in : ClassVar[bool] = True                     # Convert OR as in-expression
     convert_and_as_in : ClassVar[bool] = True                    # Convert AND as in-expression
+    in_expressions_allow_wildcards : ClassVar[bool] = True       # Values with wildcards are classified and grouped in convert_condition_as_in_expression
     #or_in_operator : ClassVar[str] = "in"               # Operator used to convert OR into in-expressions. Must be set if convert_or_as_in is set
     #and_in_operator : ClassVar[str] = "contains-all"    # Operator used to convert AND into in-expressions. Must be set if convert_and_as_in is set
     list_separator : ClassVar[str] = ", "               # List element separator
@@ -142,95 +181,153 @@ class chronicleBackendYaral(TextQueryBackend):
     deferred_separator : ClassVar[str] = "\n| "           # String used to join multiple deferred query parts
     deferred_only_query : ClassVar[str] = "*"            # String used as query if final query only contains deferred expression
 
-    def get_quote_type(self, string_val):
-        """Returns the shortest correct quote type (single, double, or trip) based on quote characters contained within an input string"""
-        if '"' and "'" in string_val:
-            quote = self.str_triple_quote
-        elif '"' in string_val:
-            quote = self.str_single_quote
-        else:
-            quote = self.str_double_quote
-
-        return quote
-
-    def convert_condition_field_eq_val_str(self, cond : ConditionFieldEqualsValueExpression, state : ConversionState) -> Union[str, DeferredQueryExpression]:
-        """Conversion of field = string value expressions"""
-        #field = cond.field
-        field = '$selection.'+cond.field
-        val = cond.value.to_plain()
-        val_no_wc = val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi)
-        quote = self.get_quote_type(val)
-        # contains
-        if val.startswith(self.wildcard_single) and val.endswith(self.wildcard_single):
-            result = self.contains_expression.format(field=field, value=val_no_wc.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)"))
-        # startswith
-        elif val.endswith(self.wildcard_single) and not val.startswith(self.wildcard_single):
-            result = self.startswith_expression.format(field=field, value=val_no_wc.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)"))
-        # endswith
-        elif val.startswith(self.wildcard_single) and not val.endswith(self.wildcard_single):
-            result = self.endswith_expression.format(field=field, value=val_no_wc.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)"))
-        # plain equals
-        else:
-            no_case_str = self.no_case_str_expression.format(value=quote + self.convert_value_str(cond.value, state) + quote)
-            result = field + self.eq_token + no_case_str
-
-        return result
-
-
-    def convert_condition_as_in_expression(self, cond : Union[ConditionOR, ConditionAND], state : ConversionState) -> Union[str, DeferredQueryExpression]:
-        """Conversion of field in value list conditions."""
-        vals = [str(arg.value.to_plain() or "") for arg in cond.args]
-        field = '$selection.'+cond.args[0].field
-        #field = cond.args[0].field
-
-        # or-in condition
-        if isinstance(cond, ConditionOR):
-            # contains
-            if all(val.startswith(self.wildcard_single) and val.endswith(self.wildcard_single) for val in vals):
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' OR '.join([self.contains_expression.format(field=field, value=val.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)")) for val in vals_no_wc])
-            # starts with
-            elif all(val.endswith(self.wildcard_single) and not val.startswith(self.wildcard_single) for val in vals):
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' OR '.join([self.startswith_expression.format(field=field, value=val.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)")) for val in vals_no_wc])
-            # ends with
-            elif all(val.startswith(self.wildcard_single) and not val.endswith(self.wildcard_single) for val in vals):
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' OR '.join([self.endswith_expression.format(field=field, value=val.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)")) for val in vals_no_wc])
-            else:
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' OR '.join([f'{field} = "{val.lstrip(self.wildcard_single).rstrip(self.wildcard_single)}"' for val in vals])
-        
-        elif isinstance(cond, ConditionAND):
-            if all(val.startswith(self.wildcard_single) and val.endswith(self.wildcard_single) for val in vals):
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' AND '.join([self.contains_expression.format(field=field, value=val.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)")) for val in vals_no_wc])
-            # starts with
-            elif all(val.endswith(self.wildcard_single) and not val.startswith(self.wildcard_single) for val in vals):
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' AND '.join([self.startswith_expression.format(field=field, value=val.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)")) for val in vals_no_wc])
-            # ends with
-            elif all(val.startswith(self.wildcard_single) and not val.endswith(self.wildcard_single) for val in vals):
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' AND '.join([self.endswith_expression.format(field=field, value=val.replace("\\", "\\\\").replace("$", "\\$").replace(".", "\\.").replace("/", "\\/").replace("(", "\\(").replace(")", "\\)")) for val in vals_no_wc])
-            else:
-                vals_no_wc = [val.rstrip(self.wildcard_multi).lstrip(self.wildcard_multi) for val in vals]
-                result = ' AND '.join([f'{field} = "{val.lstrip(self.wildcard_single).rstrip(self.wildcard_single)}"' for val in vals])
-            
-        else:
-            # ... other conditions ...
-            print("An Error Occurred")
-            pass
-
-        return result
-    
-    def convert_condition_field_eq_val_num(
-        self, cond: ConditionFieldEqualsValueExpression, state: ConversionState
-    ) -> Any:
-        """Conversion of field = number value expressions"""
-        result = cond.field + self.eq_token + str(f'"{cond.value}"')
-        return result
-    
-    def finalize_query_default(self, rule: SigmaRule, query: str, index: int, state: ConversionState) -> str:
+    @timed("finalize")
+    def finalize_query_default(self, rule: SigmaRuleBase, query: str, index: int, state: ConversionState) -> str:
+        if isinstance(rule, SigmaCorrelationRule):
+            return self.yaral_rule(rule, query, score_query(self, rule, query, state))
+        sections = self.query_sections(query, index, state)
+        text = self.yaral_rule(rule, sections, score_query(self, rule, sections, state), record_fingerprint(self, rule, index, state), state.processing_state.get("query_shard"))
+        # Statistics are only recorded for rules that were converted.
+        self.record_statistics(rule, state)
+        return text
+
+    def query_sections(self, query : str, index : int, state : ConversionState) -> str:
+        """Sections of the rule generated from a query, with the aggregation of the condition if it has one."""
+        aggregations = state.processing_state.get("aggregations")
+        if aggregations and aggregations[index] is not None:
+            return self.convert_aggregation(query, aggregations[index])
         # we replace the field in quarry with an $selection.field
-        return f"""rule SIGMA_{(rule.title).replace(" ","_")}\n{{\n    meta:\n        author = "{rule.author}"\n        description = "{rule.description}"\n        id = "{rule.id}"\n        status = "{rule.level}"\n        false_positives = "{rule.falsepositives}"\n        references = "{rule.references}"\n    events:\n        ({query})\n    condition:\n        $selection\n}}"""
\ No newline at end of file
+        return f"""    events:\n        ({query})\n    condition:\n        $selection\n"""
+
+    def finalized_size(self, rule : SigmaRuleBase, query : str, index : int, state : ConversionState, shard : Optional[Tuple[int, int]] = None) -> int:
+        """UTF-8 size of the rule generated from a query with the given shard number, without recording its cost or fingerprint."""
+        sections = self.query_sections(query, index, state)
+        return query_size(self.yaral_rule(rule, sections, *finalization_estimates(self, rule, sections, state), shard))
+
+    def finalize_query_ndjson(self, rule : SigmaRuleBase, query : str, index : int, state : ConversionState) -> str:
+        text = self.finalize_query_default(rule, query, index, state)
+        return json.dumps(rule_record(rule, text, state.processing_state.get("reference_lists", ()), state.processing_state.get("query_cost"), state.processing_state.get("query_fingerprint"), state.processing_state.get("query_shard")))
+
+    def finalize_output_ndjson(self, queries : List[str]) -> str:
+        return "".join(query + "\n" for query in queries)
+
+    def finalize_query_rules_api(self, rule : SigmaRuleBase, query : str, index : int, state : ConversionState) -> str:
+        return batch_entry(self.finalize_query_default(rule, query, index, state))
+
+    def finalize_output_rules_api(self, queries : List[str]) -> List[str]:
+        return list(batches(queries, backend_option(self, "rules_api_batch_bytes")))
+
+    def yaral_rule(self, rule : SigmaRuleBase, sections : str, cost : Optional[QueryCost] = None, fingerprint : Optional[RuleFingerprint] = None, shard : Optional[Tuple[int, int]] = None) -> str:
+        """
+        YARA-L rule with a meta section generated from the Sigma rule followed by the given sections. The estimated cost,
+        the fingerprint and the number of a shard of a query split into shards are added to the meta section if given,
+        shards are named after the rule with the shard number as suffix. The shard count isn't part of the rule text, so
+        the other shards don't change if shards are added or removed. Characters of the title that aren't allowed in
+        rule names are replaced by underscores, meta values are escaped.
+        """
+        extra_meta = f"""        cost = "{cost.score}"\n""" if cost is not None else ""
+        if fingerprint is not None:
+            extra_meta += f"""        fingerprint = "{fingerprint.fingerprint}"\n"""
+        suffix = ""
+        if shard is not None:
+            extra_meta += f"""        shard = "{shard[0]}"\n"""
+            suffix = f"_shard_{shard[0]}"
+        meta = {
+            "author": rule.author,
+            "description": rule.description,
+            "id": rule.id,
+            "status": rule.level,
+            "false_positives": rule.falsepositives,
+            "references": rule.references,
+        }
+        meta_lines = "".join(f"""        {key} = "{escape_meta(str(value))}"\n""" for key, value in meta.items())
+        return f"""rule SIGMA_{re.sub(r"[^A-Za-z0-9_]", "_", rule.title)}{suffix}\n{{\n    meta:\n{meta_lines}{extra_meta}{sections}}}"""
+
+    def convert_aggregation(self, query : str, aggregation : "Aggregation") -> str:
+        """
+        Sections of a rule with an aggregation like `| count(field) by group > 10`, counting events or distinct values
+        per group. Aggregations without group-by fields are grouped by the aggregation_group_by option.
+        """
+        seconds = aggregation.timeframe or SigmaCorrelationTimespan(backend_option(self, "aggregation_timeframe")).seconds
+        fields = list(aggregation.group_by)
+        if not fields and backend_option(self, "aggregation_group_by"):
+            fields = [backend_option(self, "aggregation_group_by")]
+        group_by = {match_variable(field): {"$selection": field} for field in fields}
+        operator = yaral_operators[aggregation.operator]
+        if aggregation.field is None:
+            return multi_event_sections({"$selection": query}, group_by, seconds, f"#selection {operator} {aggregation.threshold}")
+        return multi_event_sections(
+            {"$selection": query}, group_by, seconds,
+            f"$selection and $value_count {operator} {aggregation.threshold}",
+            outcome=f"$value_count = count_distinct($selection.{aggregation.field})",
+        )
+
+    def referenced_events(self, reference : SigmaRuleReference) -> str:
+        """Events expression of a rule referenced by a correlation rule. Multiple conditions of the rule are ORed."""
+        if not isinstance(reference.rule, SigmaRule):
+            raise SigmaFeatureNotSupportedByBackendError("Correlation rules referencing correlation rules are not supported by the YARA-L backend.")
+        if any(any(state.processing_state.get("aggregations", ())) for state in reference.rule.get_conversion_states()):
+            raise SigmaFeatureNotSupportedByBackendError("Correlation rules referencing rules with aggregations are not supported by the YARA-L backend.")
+        expressions = reference.rule.get_conversion_result()        # queries of referenced rules aren't finalized
+        if len(expressions) == 1:
+            return expressions[0]
+        return " or ".join(f"({expression})" for expression in expressions)
+
+    def correlation_group_by(self, rule : SigmaCorrelationRule, variables : Dict[str, List[SigmaRuleReference]]) -> Dict[str, Dict[str, str]]:
+        """
+        Match variables of the group-by fields of a correlation rule with the field bound to it for each event
+        variable, resolving field aliases. All rules matched by one event variable must use the same field.
+        """
+        group_by = {}
+        for name in rule.group_by or ():
+            alias = rule.aliases.aliases.get(name)
+            fields = {}
+            for variable, references in variables.items():
+                names = {alias.mapping[reference] if alias is not None else name for reference in references}
+                if len(names) > 1:
+                    raise SigmaFeatureNotSupportedByBackendError(f"The field alias '{name}' maps to different fields in rules counted together, which is not supported by the YARA-L backend.")
+                fields[variable] = names.pop()
+            group_by[match_variable(name)] = fields
+        return group_by
+
+    def convert_correlation_event_count_rule(self, rule : SigmaCorrelationRule, output_format : Optional[str] = None, method : Optional[str] = None) -> List[str]:
+        events = " or ".join(f"({self.referenced_events(reference)})" for reference in rule.rules) if len(rule.rules) > 1 else self.referenced_events(rule.rules[0])
+        return [multi_event_sections(
+            {"$selection": events},
+            self.correlation_group_by(rule, {"$selection": rule.rules}),
+            rule.timespan.seconds,
+            f"#selection {yaral_operators[rule.condition.op.name]} {rule.condition.count}",
+        )]
+
+    def convert_correlation_value_count_rule(self, rule : SigmaCorrelationRule, output_format : Optional[str] = None, method : Optional[str] = None) -> List[str]:
+        events = " or ".join(f"({self.referenced_events(reference)})" for reference in rule.rules) if len(rule.rules) > 1 else self.referenced_events(rule.rules[0])
+        return [multi_event_sections(
+            {"$selection": events},
+            self.correlation_group_by(rule, {"$selection": rule.rules}),
+            rule.timespan.seconds,
+            f"$selection and $value_count {yaral_operators[rule.condition.op.name]} {rule.condition.count}",
+            outcome=f"$value_count = count_distinct($selection.{rule.condition.fieldref})",
+        )]
+
+    def convert_correlation_temporal_rule(self, rule : SigmaCorrelationRule, output_format : Optional[str] = None, method : Optional[str] = None, ordered : bool = False) -> List[str]:
+        """Temporal correlations bind each referenced rule to its own event variable, all of them must occur in the match window."""
+        variables = {f"$e{index}": reference for index, reference in enumerate(rule.rules, start=1)}
+        constraints = [
+            f"{first}.metadata.event_timestamp.seconds < {second}.metadata.event_timestamp.seconds"
+            for first, second in zip(list(variables), list(variables)[1:])
+        ] if ordered else []
+        return [multi_event_sections(
+            {variable: rename_event_variable(self.referenced_events(reference), variable) for variable, reference in variables.items()},
+            self.correlation_group_by(rule, {variable: [reference] for variable, reference in variables.items()}),
+            rule.timespan.seconds,
+            " and ".join(variables),
+            constraints=constraints,
+        )]
+
+    def convert_correlation_temporal_ordered_rule(self, rule : SigmaCorrelationRule, output_format : Optional[str] = None, method : Optional[str] = None) -> List[str]:
+        return self.convert_correlation_temporal_rule(rule, output_format, method, ordered=True)
+
+    def write_stream(self, sources : Iterable["RuleSource"], f : TextIO, output_format : Optional[str] = None, correlation_method : Optional[str] = None, cache : Optional["ConversionCache"] = None, collect_statistics : bool = True) -> int:
+        """Convert rule sources like convert_stream and write each result to f as soon as it is converted: one line per ndjson record or rules_api batch, default rules separated by an empty line. Returns the number of written results."""
+        from sigma.backends.chronicle.output import write_stream
+        return write_stream(self, sources, f, output_format, correlation_method, cache, collect_statistics=collect_statistics)
@@ -0,0 +1,64 @@
+"""
+Thread safety of backend instances shared by several threads.
+
+pySigma stores the processing pipeline of the rule being converted in backend.last_processing_pipeline and processing
+items keep per-rule state in their transformations while a pipeline is applied, e.g. the pipeline they are applied by
+or the mapping table selected for the log source of the rule. The backends declare last_processing_pipeline as
+ThreadLocalPipeline, which keeps the pipeline per thread and gives each thread its own shallow copies of the processing
+items and their transformations. Read-only data like mapping tables and compiled patterns stays shared.
+
+Rules are changed by the processing pipeline while they are converted, so one rule object must not be converted by
+several threads at the same time.
+"""
+import copy
+from threading import local
+from typing import Any, Dict, Optional, Tuple
+
+from sigma.processing.pipeline import ProcessingPipeline
+
+class ThreadLocalPipeline:
+    """Data descriptor keeping a processing pipeline per backend instance and thread."""
+    def __set_name__(self, owner : Any, name : str):
+        self.name = name
+        self.attribute = f"_{name}_local"
+
+    def local(self, instance : Any) -> local:
+        return instance.__dict__.setdefault(self.attribute, local())
+
+    def __get__(self, instance : Any, owner : Any = None) -> Any:
+        if instance is None:
+            return self
+        try:
+            return self.local(instance).pipeline
+        except AttributeError:
+            raise AttributeError(f"'{type(instance).__name__}' object has no attribute '{self.name}' in this thread") from None
+
+    def __set__(self, instance : Any, pipeline : Optional[ProcessingPipeline]) -> None:
+        thread_state = self.local(instance)
+        if pipeline is not None:
+            if not hasattr(thread_state, "copies"):
+                thread_state.copies = {}
+            copies = thread_state.copies
+            pipeline.items = [thread_copy(copies, item) for item in pipeline.items]
+            pipeline.postprocessing_items = [thread_copy(copies, item) for item in pipeline.postprocessing_items]
+            pipeline.finalizers = [thread_copy(copies, item) for item in pipeline.finalizers]
+        thread_state.pipeline = pipeline
+
+    def __delete__(self, instance : Any) -> None:
+        self.local(instance).__dict__.pop("pipeline", None)
+
+def thread_copy(copies : Dict[int, Tuple[Any, Any]], item : Any) -> Any:
+    """
+    Copy of a processing item, postprocessing item or finalizer for the current thread, created on first use. Copies
+    are cached by the identity of the original, which is kept alive by the cache.
+    """
+    cached = copies.get(id(item))
+    if cached is not None and cached[0] is item:
+        return cached[1]
+    copied = copy.copy(item)
+    transformation = getattr(item, "transformation", None)
+    if transformation is not None:
+        copied.transformation = copy.copy(transformation)
+        copied.transformation.set_processing_item(copied)
+    copies[id(item)] = (item, copied)
+    return copied
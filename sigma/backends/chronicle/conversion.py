@@ -0,0 +1,296 @@
+"""
+Conversion shared by the Chronicle UDM and YARA-L backends.
+
+ChronicleBackendMixin holds the backend options, the statistics collected per rule and the conversion of values, value
+lists, reference lists and regular expressions that are the same in both query languages. The backends inherit from it
+before TextQueryBackend and only define their expressions, the prefix of field references and the finalization of
+queries.
+"""
+import warnings
+from threading import Lock
+from typing import TYPE_CHECKING, Any, ClassVar, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from sigma.collection import SigmaCollection
+from sigma.conditions import ConditionAND, ConditionFieldEqualsValueExpression, ConditionItem, ConditionOR, ConditionValueExpression
+from sigma.conversion.deferred import DeferredQueryExpression
+from sigma.conversion.state import ConversionState
+from sigma.correlations import SigmaCorrelationRule
+from sigma.exceptions import SigmaConfigurationError, SigmaFeatureNotSupportedByBackendError
+from sigma.processing.pipeline import ProcessingPipeline
+from sigma.rule import SigmaRule, SigmaRuleBase
+from sigma.types import Placeholder, SigmaCasedString, SigmaCIDRExpression, SigmaString, SigmaType
+from sigma.pipelines.chronicle.aggregation import restore_rule
+from sigma.backends.chronicle.cost import CostReport
+from sigma.backends.chronicle.fingerprint import FingerprintReport, canonical_condition
+from sigma.backends.chronicle.metrics import ConversionMetrics, timed
+from sigma.backends.chronicle.optimizer import OptimizerStats, optimize_condition
+from sigma.backends.chronicle.options import backend_option
+from sigma.backends.chronicle.re2 import RegexFinding, convert_regex, regex_policies, rule_findings
+from sigma.backends.chronicle.reference_lists import ReferenceLists
+from sigma.backends.chronicle.sharding import QueryShards, flatten_shards, shard_states, split_query
+from sigma.backends.chronicle.streaming import rule_identifier
+from sigma.backends.chronicle.values import alternation_regexes, alternations, collapse_networks, escape_regex, escape_string, group_by_kind, keyword_policies, KeywordWarning, kind_regexes, literal, minimal_regex, pattern_regex, string_match_modes, wildcard_kind
+
+if TYPE_CHECKING:
+    from sigma.backends.chronicle.cache import ConversionCache
+    from sigma.backends.chronicle.streaming import RuleSource
+
+class ChronicleBackendMixin:
+    """Options, statistics and value conversion of the Chronicle backends, see the module documentation."""
+    field_prefix : ClassVar[str] = ""                 # Prefix of field references, e.g. the event variable of YARA-L rules
+    string_match_mode : ClassVar[str] = "regex"       # Rendering of wildcard matches: "regex" as anchored regexes like /.*value.*/, "minimal" as equivalent regexes without redundant wildcards like /value/ or "functions" like "minimal", but with string functions for single literal values, can be set with the backend option of the same name.
+    collect_metrics : ClassVar[bool] = False          # Record wall time per stage and rule, output size, predicate and regex counts in self.metrics (see sigma.backends.chronicle.metrics), can be enabled with the backend option of the same name.
+    optimize_conditions : ClassVar[bool] = True       # Simplify condition trees before conversion (see sigma.backends.chronicle.optimizer), can be disabled with the backend option of the same name.
+    reference_list_threshold : ClassVar[int] = 0      # Replace value lists of a field with more than this many exact values by a reference list. 0 disables reference lists, can be set with the backend option of the same name.
+    placeholder_reference_lists : ClassVar[bool] = False   # Convert Sigma placeholders into reference lists named after the placeholder, can be set with the backend option of the same name.
+    regex_alternation_max_size : ClassVar[int] = 0    # Merge value lists of a field into alternation regexes like /.*(a|b|c).*/, one per kind of value, with at most this many values. 0 disables merging, can be set with the backend option of the same name.
+    estimate_cost : ClassVar[bool] = False            # Score each query with the static cost model (see sigma.backends.chronicle.cost), attach the score to the output and collect the scores in self.costs, can be enabled with the backend option of the same name.
+    max_cost : ClassVar[float] = 0.0                  # Fail rules with a query cost above this score with a SigmaConversionError, implies estimate_cost. 0 disables the limit, can be set with the backend option of the same name.
+    fingerprint_rules : ClassVar[bool] = False        # Fingerprint the canonical condition of each query, attach the fingerprint to the output and collect duplicate and subsumed rules in self.fingerprints (see sigma.backends.chronicle.fingerprint), can be enabled with the backend option of the same name.
+    max_query_bytes : ClassVar[int] = 0               # Split queries whose finalized text exceeds this many bytes into several queries at their largest disjunctions, tagged with the Sigma id and a shard number (see sigma.backends.chronicle.sharding). 0 disables splitting, can be set with the backend option of the same name.
+    keyword_policy : ClassVar[str] = "warn"           # Handling of keywords that the pipeline couldn't rewrite into matches of the keyword fields of the log source of the rule: "allow" searches them in all fields, "warn" also emits a KeywordWarning, "error" fails the rule, can be set with the backend option of the same name.
+    regex_policy : ClassVar[str] = "warn"             # Handling of regular expressions with constructs RE2 doesn't support or with a risk of super-linear matching time (see sigma.backends.chronicle.re2): "allow" only collects them in self.regex_findings, "warn" also emits a RegexWarning, "error" fails the rule, can be set with the backend option of the same name.
+
+    def __init__(self, processing_pipeline : Optional[ProcessingPipeline] = None, collect_errors : bool = False, **backend_options : Dict):
+        super().__init__(processing_pipeline, collect_errors, **backend_options)
+        self.reference_lists = ReferenceLists()     # reference lists used by the converted rules, see ReferenceLists.write
+        self.lock = Lock()      # guards statistics updated by concurrent conversions
+        self.optimizer_stats : Dict[str, OptimizerStats] = {}     # condition optimizer statistics per rule identifier
+        self.regex_findings : Dict[str, List[RegexFinding]] = {}  # findings of the regular expression analysis per rule identifier
+        self.metrics : Optional[ConversionMetrics] = ConversionMetrics() if backend_option(self, "collect_metrics") else None
+        self.costs : Optional[CostReport] = CostReport() if backend_option(self, "estimate_cost") or backend_option(self, "max_cost") > 0 else None
+        self.fingerprints : Optional[FingerprintReport] = FingerprintReport() if backend_option(self, "fingerprint_rules") else None
+        if backend_option(self, "string_match_mode") not in string_match_modes:
+            raise SigmaConfigurationError(f"Invalid string match mode '{backend_option(self, 'string_match_mode')}', expected one of {', '.join(string_match_modes)}")
+        if backend_option(self, "keyword_policy") not in keyword_policies:
+            raise SigmaConfigurationError(f"Invalid keyword policy '{backend_option(self, 'keyword_policy')}', expected one of {', '.join(keyword_policies)}")
+        if backend_option(self, "regex_policy") not in regex_policies:
+            raise SigmaConfigurationError(f"Invalid regex policy '{backend_option(self, 'regex_policy')}', expected one of {', '.join(regex_policies)}")
+
+    def convert_rule(self, rule : SigmaRule, output_format : Optional[str] = None) -> List[Any]:
+        """Convert a rule and put back the aggregations the pipeline removed from it, so it can be converted again."""
+        try:
+            if self.metrics is None:
+                return flatten_shards(super().convert_rule(rule, output_format))
+            return flatten_shards(self.metrics.measure_rule(rule_identifier(rule), super().convert_rule, rule, output_format))
+        finally:
+            restore_rule(rule, getattr(self.last_processing_pipeline, "state", {}))
+
+    def convert_correlation_rule(self, rule : SigmaCorrelationRule, output_format : Optional[str] = None, method : Optional[str] = None) -> List[Any]:
+        if self.metrics is None:
+            return super().convert_correlation_rule(rule, output_format, method)
+        return self.metrics.measure_rule(rule_identifier(rule), super().convert_correlation_rule, rule, output_format, method)
+
+    def convert_condition(self, cond : ConditionItem, state : ConversionState) -> Any:
+        """
+        Optimize the condition tree once at its root, the statistics are assigned to the rule when the query is finalized.
+        The root is the condition without boolean operators in its parent chain, its parent can be the identifier of the
+        detection it was generated from. The conversion of the root is measured if metrics are collected, the
+        canonical form of the optimized tree is recorded if rules are fingerprinted and the optimized tree is kept to split
+        queries exceeding the max_query_bytes budget into shards when they are finalized.
+        """
+        if cond.parent_chain_condition_classes():
+            return super().convert_condition(cond, state)
+        if backend_option(self, "optimize_conditions"):
+            cond, stats = optimize_condition(cond) if self.metrics is None else self.metrics.measure("optimize", optimize_condition, cond)
+            state.processing_state["optimizer_stats"] = stats
+        if self.fingerprints is not None:
+            state.processing_state["canonical_condition"] = canonical_condition(cond)
+        if self.metrics is not None:
+            query = self.metrics.measure_condition(super().convert_condition, cond, state)
+        else:
+            query = super().convert_condition(cond, state)
+        if backend_option(self, "max_query_bytes") > 0:
+            state.processing_state["query_condition"] = cond
+        return query
+
+    def finalize_query(self, rule : SigmaRuleBase, query : Any, index : int, state : ConversionState, output_format : str) -> Any:
+        """
+        Split a query whose finalized text exceeds the max_query_bytes budget into shards (see
+        sigma.backends.chronicle.sharding) and finalize each shard like a query of its own, the shards are flattened
+        into the rule output by convert_rule.
+        """
+        cond = state.processing_state.pop("query_condition", None)
+        if cond is not None:
+            split_query(self, cond, query, state, super().convert_condition, lambda text, shard: self.finalized_size(rule, text, index, state, shard))
+        if "query_shards" not in state.processing_state:
+            return super().finalize_query(rule, query, index, state, output_format)
+        finalize = super().finalize_query
+        return QueryShards(finalize(rule, shard, index, shard_state, output_format) for shard, shard_state in shard_states(state))
+
+    @timed("values")
+    def convert_condition_field_eq_val_str(self, cond : ConditionFieldEqualsValueExpression, state : ConversionState) -> Union[str, DeferredQueryExpression]:
+        """Conversion of field = string value expressions"""
+        field = self.field_prefix + cond.field
+        if backend_option(self, "placeholder_reference_lists") and isinstance(cond.value, SigmaString) and len(cond.value.s) == 1 and isinstance(cond.value.s[0], Placeholder):
+            return self.convert_reference_list(field, self.reference_lists.add_placeholder(cond.value.s[0].name), state)
+        kind = wildcard_kind(cond.value) or "exact"
+        return self.convert_value_group(field, kind, [cond.value], state, merge=False)[0]
+
+    def convert_condition_val(self, cond : ConditionValueExpression, state : ConversionState) -> Union[str, DeferredQueryExpression]:
+        """Conversion of keywords the pipeline didn't rewrite into field matches according to the keyword_policy option."""
+        policy = backend_option(self, "keyword_policy")
+        if policy != "allow":
+            message = f"Keyword '{cond.value}' has no keyword fields for the log source of the rule and is searched in all fields of all events"
+            if policy == "error":
+                raise SigmaFeatureNotSupportedByBackendError(message)
+            warnings.warn(message, KeywordWarning)
+        return super().convert_condition_val(cond, state)
+
+    @timed("values")
+    def convert_condition_field_eq_val_re(self, cond : ConditionFieldEqualsValueExpression, state : ConversionState) -> Union[str, DeferredQueryExpression]:
+        """Conversion of field matches regular expression value expressions translated into RE2 syntax (see sigma.backends.chronicle.re2)"""
+        return self.re_expression.format(
+            field=self.escape_and_quote_field(cond.field),
+            regex=convert_regex(self, cond.field, cond.value, state),
+            **self.get_flag_template(cond.value),
+        )
+
+    @timed("values")
+    def convert_condition_field_eq_val_cidr(self, cond : ConditionFieldEqualsValueExpression, state : ConversionState) -> Union[str, DeferredQueryExpression]:
+        """Conversion of field matches CIDR value expressions with the native CIDR function"""
+        field = self.field_prefix + cond.field
+        return self.convert_value_group(field, "cidr", [cond.value], state, merge=False)[0]
+
+    def convert_value_group(self, field : str, kind : str, values : List[SigmaType], state : ConversionState, merge : bool) -> List[str]:
+        """
+        Conversion of values of the same kind (see sigma.backends.chronicle.values.wildcard_kind) matched against a
+        field into one expression per value. If merge is set and alternation regexes are enabled, values are merged
+        into one expression per alternation chunk. Overlapping and adjacent networks of CIDR values are collapsed into
+        one expression per remaining network, or into one reference list lookup if reference lists are enabled.
+        """
+        max_size = backend_option(self, "regex_alternation_max_size") if merge else 0
+        if kind == "exact":
+            threshold = backend_option(self, "reference_list_threshold") if merge else 0
+            if threshold > 0 and len(values) > threshold:
+                list_values = [literal(value) if isinstance(value, SigmaString) else str(value) for value in values]
+                return [self.convert_reference_list(field, self.reference_lists.add_values(list_values), state)]
+            if max_size > 1 and len(values) > 1 and all(isinstance(value, SigmaString) for value in values):
+                return [self.convert_regex_match(field, "pattern", regex) for regex in alternation_regexes([literal(value) for value in values], max_size)]
+            return [self.convert_exact_value(field, value, state) for value in values]
+        elif kind == "pattern":
+            regexes = [pattern_regex(value) for value in values]
+            if max_size > 1:
+                regexes = alternations(list(dict.fromkeys(regexes)), max_size)
+            return [self.convert_regex_match(field, kind, regex) for regex in regexes]
+        elif kind == "cidr":
+            networks = collapse_networks(values)
+            # One list lookup replaces the function call per network, so CIDR lists of more than one network are
+            # always replaced if reference lists are enabled. Without them, there's no list to deploy the networks in.
+            threshold = backend_option(self, "reference_list_threshold") if merge else 0
+            if threshold > 0 and len(networks) > 1:
+                return [self.convert_reference_list(field, self.reference_lists.add_values(networks, "cidr"), state, self.cidr_list_expression)]
+            return [self.cidr_expression.format(field=field, value=network) for network in networks]
+        else:
+            if backend_option(self, "string_match_mode") == "functions" and (max_size <= 1 or len(values) == 1):
+                return [self.string_function_expressions[kind].format(field=field, value=escape_string(literal(value).lower())) for value in values]
+            if max_size > 1:
+                regexes = alternation_regexes([literal(value) for value in values], max_size)
+            else:
+                regexes = [escape_regex(literal(value)) for value in values]
+            return [self.convert_regex_match(field, kind, regex) for regex in regexes]
+
+    def convert_regex_match(self, field : str, kind : str, regex : str) -> str:
+        """
+        Match of a field against the regular expression of a value kind (see sigma.backends.chronicle.values.kind_regexes)
+        with the escaped value regex. Redundant wildcards are removed unless the regex string match mode is used.
+        """
+        if backend_option(self, "string_match_mode") == "regex":
+            expression = {
+                "contains": self.contains_expression,
+                "startswith": self.startswith_expression,
+                "endswith": self.endswith_expression,
+                "pattern": self.pattern_expression,
+            }[kind]
+            return expression.format(field=field, value=regex)
+        return self.regex_match_expression.format(field=field, regex=minimal_regex(kind_regexes[kind].format(value=regex)))
+
+    def convert_reference_list(self, field : str, list_name : str, state : ConversionState, expression : Optional[str] = None) -> str:
+        """
+        Conversion of a match against a reference list with the given expression, reference_list_expression by default.
+        The list is recorded in the state and assigned to the rule when the query is finalized.
+        """
+        state.processing_state.setdefault("reference_lists", []).append(list_name)
+        return (expression or self.reference_list_expression).format(field=field, list_name=list_name)
+
+    def convert_exact_value(self, field : str, value : SigmaType, state : ConversionState) -> str:
+        """Conversion of a value without wildcards into a case-insensitive equality expression."""
+        if not isinstance(value, SigmaString):
+            return field + self.eq_token + f'"{value}"'
+        quote = self.str_double_quote
+        no_case_str = self.no_case_str_expression.format(value=quote + self.convert_value_str(value, state) + quote)
+        return field + self.eq_token + no_case_str
+
+    def decide_convert_condition_as_in_expression(self, cond : Union[ConditionOR, ConditionAND], state : ConversionState) -> bool:
+        """
+        Value lists containing placeholders or case-sensitive values are not converted as in-expression. OR-lists of
+        CIDR values of one field are, so their networks can be collapsed.
+        """
+        if isinstance(cond, ConditionOR) and all(isinstance(arg, ConditionFieldEqualsValueExpression) and isinstance(arg.value, SigmaCIDRExpression) for arg in cond.args):
+            return len({arg.field for arg in cond.args}) == 1
+        return super().decide_convert_condition_as_in_expression(cond, state) and not any(
+            isinstance(arg.value, SigmaCasedString) or isinstance(arg.value, SigmaString) and arg.value.contains_placeholder()
+            for arg in cond.args
+        )
+
+    @timed("values")
+    def convert_condition_as_in_expression(self, cond : Union[ConditionOR, ConditionAND], state : ConversionState) -> Union[str, DeferredQueryExpression]:
+        """
+        Conversion of field in value list conditions. Each value is classified on its own and values are grouped by
+        their kind. For OR-lists, each group is converted into optimized expressions, values of AND-lists are
+        converted one by one, as they can't be merged.
+        """
+        field = self.field_prefix + cond.args[0].field
+        merge = isinstance(cond, ConditionOR)
+        token = self.or_token if merge else self.and_token
+        expressions = [
+            expression
+            for kind, values in group_by_kind([arg.value for arg in cond.args]).items()
+            for expression in self.convert_value_group(field, kind, values, state, merge)
+        ]
+        return (self.token_separator + token + self.token_separator).join(expressions)
+
+    def convert_condition_field_eq_val_num(
+        self, cond: ConditionFieldEqualsValueExpression, state: ConversionState
+    ) -> Any:
+        """Conversion of field = number value expressions"""
+        result = self.field_prefix + cond.field + self.eq_token + str(f'"{cond.value}"')
+        return result
+
+    def record_statistics(self, rule : SigmaRuleBase, state : ConversionState) -> None:
+        """Assign the reference lists, optimizer statistics and regex findings of a finalized query to its rule."""
+        for list_name in state.processing_state.get("reference_lists", ()):
+            self.reference_lists.add_rule(list_name, rule_identifier(rule))
+        if "optimizer_stats" in state.processing_state:
+            rule_id = rule_identifier(rule)
+            with self.lock:
+                self.optimizer_stats[rule_id] = self.optimizer_stats.get(rule_id, OptimizerStats()) + state.processing_state["optimizer_stats"]
+        findings = rule_findings(state)
+        if findings:
+            with self.lock:
+                self.regex_findings[rule_identifier(rule)] = findings
+
+    def clear_statistics(self) -> None:
+        """
+        Clear the statistics collected per converted rule: optimizer statistics, regex findings, the rules using each
+        reference list, metrics, costs and fingerprints. The reference lists themselves and the errors are kept.
+        """
+        self.optimizer_stats.clear()
+        self.regex_findings.clear()
+        self.reference_lists.clear_rules()
+        if self.metrics is not None:
+            self.metrics.clear()
+        if self.costs is not None:
+            self.costs.costs.clear()
+        if self.fingerprints is not None:
+            self.fingerprints.fingerprints.clear()
+
+    def convert_parallel(self, rule_collection : SigmaCollection, output_format : Optional[str] = None, correlation_method : Optional[str] = None, workers : Optional[int] = None) -> Any:
+        """Convert a Sigma rule collection in a pool of worker processes. Results are returned in input order, errors are collected in self.errors."""
+        from sigma.backends.chronicle.parallel import convert_parallel
+        return convert_parallel(self, rule_collection, output_format, correlation_method, workers)
+
+    def convert_stream(self, sources : Iterable["RuleSource"], output_format : Optional[str] = None, correlation_method : Optional[str] = None, cache : Optional["ConversionCache"] = None, collect_statistics : bool = True) -> Iterator[Tuple[str, Any]]:
+        """Lazily convert rule files, directories, YAML documents or rule dicts and yield (rule id, output) pairs. Unchanged rule sources are served from the cache if one is given, the per-rule statistics are cleared after each source unless collect_statistics is set."""
+        from sigma.backends.chronicle.streaming import convert_stream
+        return convert_stream(self, sources, output_format, correlation_method, cache, collect_statistics)
@@ -0,0 +1,275 @@
+"""
+Static cost model of the queries generated by the Chronicle backends.
+
+A query is parsed (see sigma.backends.chronicle.query) and each predicate gets an evaluation cost relative to a plain
+string comparison and a selectivity, the estimated fraction of events it matches. Regular expressions cost more than
+comparisons, unanchored ones starting with a wildcard more than anchored ones, and each alternative of an alternation
+adds to the cost. Unbound keywords are matched against every field of an event and are by far the most expensive
+predicates. The cost of AND and OR expressions is the expected cost of evaluating their operands with short-circuiting
+in the cheapest order, so selective predicates on fields like hashes or host names make the remaining predicates of
+a conjunction cheap, while OR fan-out adds up. The score of a query is its expected evaluation cost per event.
+
+Usage: python -m sigma.backends.chronicle.cost rules.ndjson [--threshold 100] [--top 20] [--json]
+"""
+import argparse
+import json
+import re
+import statistics
+import sys
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+from sigma.conversion.state import ConversionState
+from sigma.exceptions import SigmaConversionError
+from sigma.rule import SigmaRuleBase
+
+from sigma.backends.chronicle.options import backend_option
+from sigma.backends.chronicle.query import And, Call, Comparison, Field, Keyword, Node, Not, Or, Regex, ReferenceList, Variable, parse_output, walk
+from sigma.backends.chronicle.streaming import rule_identifier
+
+if TYPE_CHECKING:
+    from sigma.conversion.base import Backend
+
+# Evaluation cost of predicates relative to a case-insensitive string comparison.
+predicate_costs = {
+    "compare": 1.0,             # comparison with a string, number or variable
+    "reference_list": 2.0,
+    "regex": 4.0,
+    "unanchored": 4.0,          # added for regexes starting with a wildcard, which are tried at every offset of a value
+    "alternative": 0.5,         # added per alternative of a regex beyond the first one
+    "function": 2.0,            # string functions like strings.contains search for a literal without regex engine
+    "cidr": 1.0,                # CIDR functions compare the parsed address with the network
+    "keyword": 50.0,            # unbound keywords are matched against every field of an event
+}
+
+# Fields with long values, like command lines, multiply the cost of regular expressions matched against them.
+long_value_fields = re.compile(r"(command_line|full_path|url|value_data|description|summary|file\.names?)$")
+long_value_factor = 2.0
+
+# Estimated fraction of events matched by an equality predicate on a field, by the end of the UDM field path. Fields
+# with many distinct values are selective, type and vendor fields are not.
+field_selectivity : List[Tuple[re.Pattern, float]] = [
+    (re.compile(r"(md5|sha1|sha256|imphash|hash)$"), 0.0001),
+    (re.compile(r"(hostname|ip|port|userid|user_display_name|email_addresses|command_line|full_path|url)$"), 0.01),
+    (re.compile(r"metadata\.product_event_type$"), 0.05),
+    (re.compile(r"metadata\.(event_type|log_type)$"), 0.3),
+    (re.compile(r"(vendor_name|product_name|platform|status|action)$"), 0.5),
+]
+default_selectivity = 0.05
+regex_selectivity = 0.01
+keyword_selectivity = 0.05
+comparison_selectivity = 0.5        # <, <=, > and >=
+
+# Functions matching literal strings, with the selectivity of regular expressions.
+string_functions = frozenset(("strings.contains", "strings.starts_with", "strings.ends_with"))
+
+# Functions matching IP addresses against networks.
+cidr_functions = frozenset(("net.ip_in_range_cidr",))
+
+# Regular expression prefixes that match at every offset of a value.
+unanchored_prefix = re.compile(r"^(\(\?\w+\))?\.[*+]")
+
+@dataclass
+class QueryCost:
+    """Cost estimate of one query with the shape metrics it's derived from."""
+    rule_id : Optional[str]
+    score : float                   # expected evaluation cost per event, relative to one string comparison
+    selectivity : float             # estimated fraction of matched events
+    predicates : int = 0
+    regexes : int = 0
+    unanchored : int = 0            # regexes with a leading wildcard
+    alternation_width : int = 0     # alternatives of the widest regex alternation
+    or_fanout : int = 0             # operands of the widest OR expression
+    keyword_scans : int = 0         # unbound keywords
+
+def alternatives(pattern : str) -> int:
+    """Number of alternatives of the widest alternation of a regular expression."""
+    widths = [1]                # alternatives per open group, the outermost level first
+    widest = 1
+    escaped = in_class = False
+    for char in pattern:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+        elif char == "(":
+            widths.append(1)
+        elif char == ")" and len(widths) > 1:
+            widest = max(widest, widths.pop())
+        elif char == "|":
+            widths[-1] += 1
+    return max(widest, *widths)
+
+def field_factor(operand : Any) -> float:
+    while isinstance(operand, Call) and operand.args:      # field wrapped in functions like strings.to_lower
+        operand = operand.args[0]
+    return long_value_factor if isinstance(operand, Field) and long_value_fields.search(operand.name) else 1.0
+
+def equality_selectivity(operand : Any) -> float:
+    if isinstance(operand, Field):
+        for pattern, selectivity in field_selectivity:
+            if pattern.search(operand.name):
+                return selectivity
+    return default_selectivity
+
+def regex_cost(pattern : str, operand : Any) -> float:
+    cost = predicate_costs["regex"] + predicate_costs["alternative"] * (alternatives(pattern) - 1)
+    if unanchored_prefix.match(pattern):
+        cost += predicate_costs["unanchored"]
+    return cost * field_factor(operand)
+
+def predicate_estimate(node : Node) -> Tuple[float, float]:
+    """Cost and selectivity of a predicate."""
+    if isinstance(node, Keyword):
+        return predicate_costs["keyword"], keyword_selectivity
+    if isinstance(node, Call):
+        regexes = [arg for arg in node.args if isinstance(arg, Regex)]
+        if node.name == "re.regex" and regexes:
+            return regex_cost(regexes[0].pattern, node.args[0]), regex_selectivity
+        if node.name in cidr_functions:
+            return predicate_costs["cidr"], default_selectivity
+        if node.name in string_functions:
+            return predicate_costs["function"] * field_factor(node.args[0] if node.args else None), regex_selectivity
+        return predicate_costs["function"], comparison_selectivity
+    left, right = node.left, node.right
+    if isinstance(right, Regex):
+        cost, selectivity = regex_cost(right.pattern, left), regex_selectivity
+    elif isinstance(right, ReferenceList):
+        cost, selectivity = predicate_costs["reference_list"], min(1.0, equality_selectivity(left) * 10)
+    elif isinstance(right, (Field, Variable)) or isinstance(left, Variable):
+        cost, selectivity = predicate_costs["compare"], 1.0      # joins of event and match variables don't filter events
+    elif node.operator in ("=", "!="):
+        cost, selectivity = predicate_costs["compare"], equality_selectivity(left)
+    else:
+        cost, selectivity = predicate_costs["compare"], comparison_selectivity
+    if node.operator == "!=":
+        selectivity = 1.0 - selectivity
+    return cost, selectivity
+
+def estimate(node : Node) -> Tuple[float, float]:
+    """
+    Expected cost and selectivity of an expression. Operands of AND are evaluated until one doesn't match, in the
+    order of increasing cost per filtered event, operands of OR until one matches, in the order of increasing cost
+    per matched event. Predicates are assumed to be independent.
+    """
+    if isinstance(node, Not):
+        cost, selectivity = estimate(node.arg)
+        return cost, 1.0 - selectivity
+    if isinstance(node, (And, Or)):
+        estimates = [estimate(arg) for arg in node.args]
+        conjunction = isinstance(node, And)
+        if conjunction:
+            estimates.sort(key=lambda e: e[0] / max(1.0 - e[1], 1e-9))
+        else:
+            estimates.sort(key=lambda e: e[0] / max(e[1], 1e-9))
+        cost = 0.0
+        reached = 1.0           # probability that an operand is evaluated
+        for operand_cost, selectivity in estimates:
+            cost += reached * operand_cost
+            reached *= selectivity if conjunction else 1.0 - selectivity
+        return cost, reached if conjunction else 1.0 - reached
+    return predicate_estimate(node)
+
+def estimate_cost(query : str, rule_id : Optional[str] = None) -> QueryCost:
+    """Cost estimate of a UDM query or of the events section of a YARA-L rule."""
+    tree = parse_output(query)
+    score, selectivity = estimate(tree)
+    cost = QueryCost(rule_id, round(score, 2), float(f"{selectivity:.3g}"))
+    for node in walk(tree):
+        if isinstance(node, Or):
+            cost.or_fanout = max(cost.or_fanout, len(node.args))
+        elif isinstance(node, (Comparison, Call, Keyword)):
+            cost.predicates += 1
+            if isinstance(node, Keyword):
+                cost.keyword_scans += 1
+            operands = node.args if isinstance(node, Call) else [node.right] if isinstance(node, Comparison) else []
+            for operand in operands:
+                if isinstance(operand, Regex):
+                    cost.regexes += 1
+                    cost.unanchored += 1 if unanchored_prefix.match(operand.pattern) else 0
+                    cost.alternation_width = max(cost.alternation_width, alternatives(operand.pattern))
+    return cost
+
+class CostReport:
+    """Cost estimates of the queries of a rule collection."""
+    def __init__(self, costs : Iterable[QueryCost] = ()):
+        self.costs : List[QueryCost] = list(costs)
+
+    def add(self, cost : QueryCost) -> None:
+        self.costs.append(cost)
+
+    def expensive(self, threshold : float) -> List[QueryCost]:
+        """Queries with a score above the threshold, the most expensive first."""
+        return sorted((cost for cost in self.costs if cost.score > threshold), key=lambda cost: -cost.score)
+
+    def to_dict(self, threshold : Optional[float] = None) -> Dict[str, Any]:
+        scores = [cost.score for cost in self.costs]
+        result = {
+            "rules": len(scores),
+            "total": round(sum(scores), 2),
+            "mean": round(statistics.mean(scores), 2) if scores else 0.0,
+            "p90": round(statistics.quantiles(scores, n=10, method="inclusive")[-1], 2) if len(scores) > 1 else sum(scores),
+            "max": max(scores, default=0.0),
+            "keyword_scans": sum(cost.keyword_scans for cost in self.costs),
+            "per_rule": [asdict(cost) for cost in self.costs],
+        }
+        if threshold is not None:
+            result["threshold"] = threshold
+            result["expensive"] = [cost.rule_id for cost in self.expensive(threshold)]
+        return result
+
+    def to_json(self, threshold : Optional[float] = None, **kwargs : Any) -> str:
+        return json.dumps(self.to_dict(threshold), **kwargs)
+
+    def to_text(self, threshold : Optional[float] = None, top : int = 20) -> str:
+        """Summary and table of the most expensive queries, or of all queries above the threshold."""
+        summary = self.to_dict()
+        lines = [f"{summary['rules']} queries, total cost {summary['total']}, mean {summary['mean']}, p90 {summary['p90']}, max {summary['max']}"]
+        ranked = self.expensive(threshold) if threshold is not None else self.expensive(float("-inf"))[:top]
+        if threshold is not None:
+            lines.append(f"{len(ranked)} queries above the threshold of {threshold}")
+        if ranked:
+            lines.append(f"{'score':>9}  {'regex':>5}  {'unanch':>6}  {'alt':>4}  {'or':>4}  {'kw':>3}  rule")
+            lines.extend(
+                f"{cost.score:9.1f}  {cost.regexes:5}  {cost.unanchored:6}  {cost.alternation_width:4}  {cost.or_fanout:4}  {cost.keyword_scans:3}  {cost.rule_id}"
+                for cost in ranked
+            )
+        return "\n".join(lines) + "\n"
+
+def score_query(backend : "Backend", rule : SigmaRuleBase, query : str, state : ConversionState) -> Optional[QueryCost]:
+    """
+    Estimate the cost of a query while it's finalized if the backend collects costs and record it in backend.costs and
+    the conversion state. Raises a SigmaConversionError if the score exceeds the max_cost option of the backend.
+    """
+    if backend.costs is None:
+        return None
+    cost = estimate_cost(query, rule_identifier(rule))
+    backend.costs.add(cost)
+    state.processing_state["query_cost"] = cost
+    max_cost = backend_option(backend, "max_cost")
+    if max_cost > 0 and cost.score > max_cost:
+        raise SigmaConversionError(f"Estimated query cost {cost.score} exceeds the maximum of {max_cost}", source=rule.source)
+    return cost
+
+def main():
+    from sigma.backends.chronicle.deploy import read_records, record_key
+
+    parser = argparse.ArgumentParser(description="Cost report of converted rules in the ndjson format of the YARA-L backend.")
+    parser.add_argument("input", help="NDJSON file, - for standard input")
+    parser.add_argument("--threshold", type=float, help="List all rules above this score and exit with status 1 if there are any")
+    parser.add_argument("--top", type=int, default=20, help="Number of listed rules without threshold")
+    parser.add_argument("--json", action="store_true", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    with (sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")) as f:
+        report = CostReport(estimate_cost(record["rule"], record_key(record)[0]) for record in read_records(f))
+    print(report.to_json(args.threshold, indent=2) if args.json else report.to_text(args.threshold, args.top), end="" if not args.json else "\n")
+    if args.threshold is not None and report.expensive(args.threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
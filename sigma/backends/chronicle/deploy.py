@@ -0,0 +1,371 @@
+"""
+Concurrent deployment of converted YARA-L rules to the Chronicle Rules API.
+
+Rules are deployed from the records of the ndjson output format of the YARA-L backend. A bounded number of workers
+share a pool of persistent HTTP/1.1 connections, failed requests are retried with exponential backoff and rate limit
+responses pause all workers. Rule creations are only sent again if the rule wasn't found among the existing rules. The content hash and resource name of each deployed rule are kept in a DeployState, so
+rules that didn't change since the last deployment are skipped.
+"""
+import asyncio
+import json
+import random
+import ssl
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, TextIO, Tuple, Union
+from urllib.parse import quote, urlsplit
+
+from sigma.backends.chronicle.output import content_hash
+
+retry_statuses = frozenset((429, 500, 502, 503, 504))
+# Statuses guaranteeing that the request wasn't processed, so a rule creation can be sent again without creating a
+# duplicate. After other failures the rule is looked up before it is created again.
+unprocessed_statuses = frozenset((429, 503))
+
+class HTTPError(Exception):
+    """Request that failed with an HTTP error status or a connection error."""
+    def __init__(self, message : str, status : Optional[int] = None, retry_after : Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+@dataclass
+class Response:
+    status : int
+    headers : Dict[str, str]
+    body : bytes
+
+    def json(self) -> Any:
+        return json.loads(self.body) if self.body else None
+
+def retry_after_seconds(value : Optional[str]) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header given as seconds or as HTTP-date, None if missing or invalid."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+def status_error(method : str, path : str, response : Response) -> HTTPError:
+    return HTTPError(
+        f"{method} {path}: HTTP {response.status} {response.body[:200].decode('utf-8', 'replace')}",
+        response.status,
+        retry_after_seconds(response.headers.get("retry-after")),
+    )
+
+def response_name(response : Response) -> Optional[str]:
+    """Resource name of the rule in a successful Rules API response, None if the body isn't a JSON object with a name."""
+    try:
+        content = response.json()
+    except ValueError:      # includes UnicodeDecodeError
+        return None
+    return content.get("name") if isinstance(content, dict) else None
+
+class Connection:
+    """Persistent HTTP/1.1 connection."""
+    def __init__(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.reusable = True
+
+    async def request(self, method : str, target : str, headers : Dict[str, str], body : bytes) -> Response:
+        head = f"{method} {target} HTTP/1.1\r\n" + "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        self.writer.write(head.encode("latin-1") + f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        status = int(status_line.split(None, 2)[1])
+        response_headers = {}
+        while True:
+            line = (await self.reader.readline()).decode("latin-1").rstrip("\r\n")
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                chunks.append(chunk[:-2])
+            response_body = b"".join(chunks)
+        else:
+            response_body = await self.reader.readexactly(int(response_headers.get("content-length", 0)))
+        if response_headers.get("connection", "").lower() == "close":
+            self.reusable = False
+        return Response(status, response_headers, response_body)
+
+    def close(self) -> None:
+        self.reusable = False
+        self.writer.close()
+
+class ConnectionPool:
+    """Pool of at most size persistent connections to the host of base_url. Idle connections are reused."""
+    def __init__(self, base_url : str, size : int, ssl_context : Optional[ssl.SSLContext] = None, timeout : float = 30.0):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.host_header = url.netloc
+        self.path_prefix = url.path.rstrip("/")
+        self.ssl = (ssl_context or ssl.create_default_context()) if url.scheme == "https" else None
+        self.timeout = timeout
+        self.slots = asyncio.Semaphore(size)
+        self.idle : List[Connection] = []
+        self.opened = 0         # connections opened over the lifetime of the pool
+
+    async def request(self, method : str, path : str, headers : Dict[str, str], body : bytes = b"") -> Response:
+        async with self.slots:
+            connection = self.idle.pop() if self.idle else None
+            try:
+                if connection is None:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout)
+                    connection = Connection(reader, writer)
+                    self.opened += 1
+                headers = {"Host": self.host_header, **headers}
+                response = await asyncio.wait_for(connection.request(method, self.path_prefix + path, headers, body), self.timeout)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError, IndexError) as e:
+                if connection is not None:
+                    connection.close()
+                raise HTTPError(f"{method} {path}: {type(e).__name__}: {e}") from e
+            if connection.reusable:
+                self.idle.append(connection)
+            else:
+                connection.close()
+            return response
+
+    def close(self) -> None:
+        for connection in self.idle:
+            connection.close()
+        self.idle.clear()
+
+class RateLimiter:
+    """
+    Spaces requests to at most rate requests per second (unlimited if rate is None). pause delays all following
+    requests, e.g. for the Retry-After period of a rate limit response.
+    """
+    def __init__(self, rate : Optional[float] = None):
+        self.interval = 1 / rate if rate else 0.0
+        self.next_slot = 0.0
+
+    async def acquire(self) -> None:
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds : float) -> None:
+        self.next_slot = max(self.next_slot, time.monotonic() + seconds)
+
+class DeployState:
+    """Content hash and Rules API resource name of each deployed rule by rule identifier, stored as JSON file."""
+    def __init__(self, rules : Optional[Dict[str, Dict[str, str]]] = None):
+        self.rules : Dict[str, Dict[str, str]] = rules or {}
+
+    @classmethod
+    def load(cls, path : Union[str, Path]) -> "DeployState":
+        path = Path(path)
+        if not path.exists():
+            return cls()
+        return cls(json.loads(path.read_text(encoding="utf-8")))
+
+    def save(self, path : Union[str, Path]) -> None:
+        path = Path(path)
+        temporary = path.with_name(path.name + ".tmp")
+        temporary.write_text(json.dumps(self.rules, indent=2, sort_keys=True), encoding="utf-8")
+        temporary.replace(path)
+
+    def unchanged(self, rule_id : str, digest : str) -> bool:
+        return self.rules.get(rule_id, {}).get("content_hash") == digest
+
+    def name(self, rule_id : str) -> Optional[str]:
+        return self.rules.get(rule_id, {}).get("name")
+
+    def update(self, rule_id : str, digest : str, name : str) -> None:
+        self.rules[rule_id] = {"content_hash": digest, "name": name}
+
+@dataclass
+class DeployResult:
+    rule_id : str
+    action : str                    # created, updated, unchanged or failed
+    name : Optional[str] = None     # Rules API resource name of the rule
+    attempts : int = 0
+    error : Optional[str] = None
+
+@dataclass
+class DeployStats:
+    created : int = 0
+    updated : int = 0
+    unchanged : int = 0
+    failed : int = 0
+    retries : int = 0
+    seconds : float = 0.0
+    results : List[DeployResult] = field(default_factory=list, repr=False)
+
+def read_records(f : TextIO) -> Iterable[Dict[str, Any]]:
+    """Records of an NDJSON file written with the ndjson output format, read lazily."""
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+def record_key(record : Dict[str, Any]) -> Tuple[str, str, str]:
+    """Rule identifier, content hash and text of an ndjson record. Shards of a rule are identified by the rule identifier and their shard number."""
+    text = record["rule"]
+    rule_id = record.get("id") or record["title"]
+    if "shard" in record:
+        rule_id += f"#{record['shard']}"
+    return rule_id, record.get("content_hash") or content_hash(text), text
+
+class RulesDeployer:
+    """
+    Deploys YARA-L rules to the Rules API below base_url + parent, e.g. https://europe-chronicle.googleapis.com/v1alpha
+    and projects/p/locations/l/instances/i. New rules are created with POST {parent}/rules, changed rules of the state
+    are updated with PATCH {name}?update_mask=text or created again if they were deleted. At most concurrency requests are in flight, each one is retried up
+    to max_retries times on connection errors and retryable statuses with exponential backoff and jitter. 429
+    responses pause all workers for their Retry-After period. A creation that failed without a 429 or 503 response,
+    e.g. on a timeout, may have been processed by the server, so the rules are listed with GET {parent}/rules and an
+    existing rule with the same text is taken instead of creating it again. token can be a string or a function
+    returning the current bearer token.
+    """
+    def __init__(
+            self,
+            base_url : str,
+            parent : str,
+            token : Union[None, str, Callable[[], str]] = None,
+            state : Optional[DeployState] = None,
+            concurrency : int = 8,
+            max_retries : int = 5,
+            backoff : float = 0.5,
+            max_backoff : float = 30.0,
+            requests_per_second : Optional[float] = None,
+            timeout : float = 30.0,
+            ssl_context : Optional[ssl.SSLContext] = None,
+        ):
+        self.base_url = base_url
+        self.parent = parent.strip("/")
+        self.token = token
+        self.state = state if state is not None else DeployState()
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.requests_per_second = requests_per_second
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+
+    def headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        token = self.token() if callable(self.token) else self.token
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        return headers
+
+    async def deploy(self, records : Iterable[Dict[str, Any]]) -> DeployStats:
+        """Deploy the rules of the records. Records are consumed lazily by the workers."""
+        stats = DeployStats()
+        start = time.monotonic()
+        pool = ConnectionPool(self.base_url, self.concurrency, self.ssl_context, self.timeout)
+        limiter = RateLimiter(self.requests_per_second)
+        records = iter(records)
+
+        async def worker():
+            for record in records:
+                try:
+                    result = await self.deploy_record(pool, limiter, record, stats)
+                except Exception as e:      # a single broken record or response must not abort the deployment
+                    rule_id = str(record.get("id") or record.get("title")) if isinstance(record, dict) else None
+                    result = DeployResult(rule_id, "failed", error=f"{type(e).__name__}: {e}")
+                setattr(stats, result.action, getattr(stats, result.action) + 1)
+                stats.results.append(result)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        finally:
+            pool.close()
+        stats.seconds = time.monotonic() - start
+        return stats
+
+    async def deploy_record(self, pool : ConnectionPool, limiter : RateLimiter, record : Dict[str, Any], stats : DeployStats) -> DeployResult:
+        rule_id, digest, text = record_key(record)
+        if self.state.unchanged(rule_id, digest):
+            return DeployResult(rule_id, "unchanged", self.state.name(rule_id))
+        name = self.state.name(rule_id)
+        if name is None:
+            action, method, path = "created", "POST", f"/{self.parent}/rules"
+        else:
+            action, method, path = "updated", "PATCH", f"/{name}?update_mask=text"
+        body = json.dumps({"text": text}).encode("utf-8")
+        attempt = 0
+        lookup = False      # a creation may have been processed without its response reaching us
+        while True:
+            attempt += 1
+            await limiter.acquire()
+            try:
+                if lookup:
+                    existing = await self.find_rule(pool, limiter, text)
+                    lookup = False
+                    if existing is not None:
+                        self.state.update(rule_id, digest, existing)
+                        return DeployResult(rule_id, action, existing, attempt)
+                    await limiter.acquire()
+                response = await pool.request(method, path, self.headers(), body)
+                if response.status in retry_statuses:
+                    raise status_error(method, path, response)
+                if response.status == 404 and method == "PATCH":      # deleted in Chronicle since the last deployment
+                    action, method, path, name = "created", "POST", f"/{self.parent}/rules", None
+                    attempt -= 1
+                    continue
+                if response.status >= 400:
+                    return DeployResult(rule_id, "failed", name, attempt, f"HTTP {response.status} {response.body[:200].decode('utf-8', 'replace')}")
+                name = response_name(response) or name
+                self.state.update(rule_id, digest, name)
+                return DeployResult(rule_id, action, name, attempt)
+            except HTTPError as e:
+                if method == "POST" and e.status not in unprocessed_statuses:
+                    lookup = True
+                if attempt > self.max_retries:
+                    return DeployResult(rule_id, "failed", name, attempt, str(e))
+                stats.retries += 1
+                delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                if e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                if e.status == 429:
+                    limiter.pause(delay)
+                await asyncio.sleep(delay)
+
+    async def find_rule(self, pool : ConnectionPool, limiter : RateLimiter, text : str) -> Optional[str]:
+        """Resource name of an existing rule with the given text, listing the rules page by page."""
+        page_token = None
+        while True:
+            path = f"/{self.parent}/rules?view=FULL&pageSize=1000"
+            if page_token:
+                path += f"&pageToken={quote(page_token)}"
+                await limiter.acquire()
+            response = await pool.request("GET", path, self.headers())
+            if response.status >= 400:
+                raise status_error("GET", path, response)
+            page = response.json() or {}
+            for rule in page.get("rules", ()):
+                if rule.get("text") == text:
+                    return rule.get("name")
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return None
+
+def deploy(records : Iterable[Dict[str, Any]], base_url : str, parent : str, **kwargs : Any) -> DeployStats:
+    """Deploy the rules of ndjson records with a RulesDeployer, see RulesDeployer for the keyword arguments."""
+    return asyncio.run(RulesDeployer(base_url, parent, **kwargs).deploy(records))
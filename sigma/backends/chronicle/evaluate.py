@@ -0,0 +1,607 @@
+"""
+Offline evaluation of generated queries against UDM events in the JSON lines format.
+
+Queries of both backends are parsed (see sigma.backends.chronicle.query) and compiled into predicates over
+column-oriented batches of events: the values of each referenced field are extracted once per batch for all queries,
+each predicate scans one column and returns the matched events of the batch as bit mask. Operands of AND and OR are
+evaluated in the order of the cost model (see sigma.backends.chronicle.cost) and only for the events that can still
+change the result. Regular expressions are compiled once per evaluator and predicates occurring in several queries are
+evaluated once per batch. Event files are memory-mapped, split into chunks at line boundaries and evaluated in a pool
+of worker processes.
+
+Field values are matched like in Chronicle: repeated fields match if any of their values matches, missing fields are
+empty strings and unbound keywords match if any value of an event contains them. Multi-event YARA-L rules, variables
+and functions other than re.regex, net.ip_in_range_cidr and the strings functions generated by the backends are not
+supported.
+
+Usage: python -m sigma.backends.chronicle.evaluate --rules rules.ndjson|sigma-rules... --events events.jsonl... [--workers 8] [--json]
+"""
+import argparse
+import ipaddress
+import json
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field as dataclass_field, replace
+from functools import reduce
+from operator import methodcaller, or_
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Mapping, Optional, Pattern, Tuple
+
+from sigma.backends.chronicle.cost import estimate
+from sigma.backends.chronicle.query import (
+    And, Call, Comparison, Field, Keyword, Node, Not, Number, Or, QuerySyntaxError, Regex, ReferenceList, String,
+    parse_output, section_header, yaral_sections,
+)
+from sigma.backends.chronicle.re2 import python_regex
+
+class EvaluationError(ValueError):
+    """Query construct that can't be evaluated offline."""
+
+Values = Tuple[str, ...]        # values of a field in one event, more than one for repeated fields
+
+def value_string(value : Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value if isinstance(value, str) else str(value)
+
+def field_values(event : dict, path : str) -> Values:
+    """Values of a UDM field path like principal.ip in a nested event, an empty string if the field is missing."""
+    if path in event:           # events with flattened field paths
+        value = event[path]
+        return tuple(value_string(item) for item in value) if isinstance(value, list) else (value_string(value),)
+    values = [event]
+    for name in path.split("."):
+        children = []
+        for value in values:
+            if isinstance(value, dict) and name in value:
+                child = value[name]
+                if isinstance(child, list):
+                    children.extend(child)
+                else:
+                    children.append(child)
+        values = children
+        if not values:
+            return ("",)
+    return tuple(value_string(value) for value in values if not isinstance(value, (dict, list))) or ("",)
+
+def event_values(value : Any) -> Iterator[str]:
+    """All scalar values of an event, matched by unbound keywords."""
+    if isinstance(value, dict):
+        for child in value.values():
+            yield from event_values(child)
+    elif isinstance(value, list):
+        for child in value:
+            yield from event_values(child)
+    elif value is not None:
+        yield value_string(value)
+
+def mask_rows(mask : int) -> List[int]:
+    """Indices of the set bits of a mask."""
+    return [row for row, bit in enumerate(bin(mask)[:1:-1]) if bit == "1"]
+
+def rows_mask(rows : Iterable[int], size : int) -> int:
+    bits = bytearray(b"0" * size)
+    for row in rows:
+        bits[size - 1 - row] = 0x31
+    return int(bits, 2) if size else 0
+
+class Column:
+    """Values of an operand for each event of a batch and the events containing each distinct value as bit mask."""
+    def __init__(self, rows : List[Values]):
+        self.rows = rows
+        self.index : Dict[str, int] = {}
+        for row, values in enumerate(rows):
+            bit = 1 << row
+            for value in values:
+                self.index[value] = self.index.get(value, 0) | bit
+
+class EventBatch:
+    """Events evaluated together with their columns and predicate results, which are shared by all queries."""
+    def __init__(self, events : List[dict]):
+        self.events = events
+        self.size = len(events)
+        self.all = (1 << self.size) - 1
+        self.columns : Dict[Hashable, Column] = {}
+        self.results : Dict[Hashable, Tuple[int, int]] = {}     # evaluated and matched events per predicate key
+
+class Operand:
+    """Values of a field or of a function of a field, extracted as column of a batch."""
+    def __init__(self, key : Hashable, extract : Callable[[EventBatch], List[Values]]):
+        self.key = key
+        self.extract = extract
+
+    def column(self, batch : EventBatch) -> Column:
+        column = batch.columns.get(self.key)
+        if column is None:
+            column = batch.columns[self.key] = Column(self.extract(batch))
+        return column
+
+class Predicate:
+    """
+    Leaf of a compiled query: a test of the values of an operand that matches an event if any of its values passes.
+    The test is applied to the values of the candidate events or, if there are fewer, to the distinct values of the
+    batch. Predicates testing the membership in a set of literals look the literals up in the column index instead.
+    """
+    def __init__(self, key : Hashable, operand : Operand, test : Callable[[str], bool], node : Node, literals : Optional[frozenset] = None):
+        self.key = key
+        self.operand = operand
+        self.test = test
+        self.literals = literals
+        self.estimate = estimate(node)
+
+    def evaluate(self, batch : EventBatch, candidates : int) -> int:
+        evaluated, matched = batch.results.get(self.key, (0, 0))
+        missing = candidates & ~evaluated
+        if missing:
+            column = self.operand.column(batch)
+            count = bin(missing).count("1")
+            if self.literals is not None and len(self.literals) <= count:
+                index = column.index
+                matched |= missing & reduce(or_, (index.get(literal, 0) for literal in self.literals), 0)
+            elif len(column.index) <= count:
+                test = self.test
+                matched = reduce(or_, (mask for value, mask in column.index.items() if test(value)), 0)
+                missing = batch.all & ~evaluated
+            else:
+                test = self.test
+                values = column.rows
+                matched |= rows_mask((row for row in mask_rows(missing) if any(test(value) for value in values[row])), batch.size)
+            batch.results[self.key] = (evaluated | missing, matched)
+        return matched & candidates
+
+class Conjunction:
+    def __init__(self, args : list):
+        self.args = sorted(args, key=lambda arg: arg.estimate[0] / max(1.0 - arg.estimate[1], 1e-9))
+        cost, reached = 0.0, 1.0
+        for arg in self.args:
+            cost += reached * arg.estimate[0]
+            reached *= arg.estimate[1]
+        self.estimate = (cost, reached)
+
+    def evaluate(self, batch : EventBatch, candidates : int) -> int:
+        for arg in self.args:
+            candidates = arg.evaluate(batch, candidates)
+            if not candidates:
+                break
+        return candidates
+
+class Disjunction:
+    def __init__(self, args : list):
+        self.args = sorted(args, key=lambda arg: arg.estimate[0] / max(arg.estimate[1], 1e-9))
+        cost, reached = 0.0, 1.0
+        for arg in self.args:
+            cost += reached * arg.estimate[0]
+            reached *= 1.0 - arg.estimate[1]
+        self.estimate = (cost, 1.0 - reached)
+
+    def evaluate(self, batch : EventBatch, candidates : int) -> int:
+        matched = 0
+        for arg in self.args:
+            result = arg.evaluate(batch, candidates)
+            matched |= result
+            candidates &= ~result
+            if not candidates:
+                break
+        return matched
+
+class Negation:
+    def __init__(self, arg):
+        self.arg = arg
+        self.estimate = (arg.estimate[0], 1.0 - arg.estimate[1])
+
+    def evaluate(self, batch : EventBatch, candidates : int) -> int:
+        return candidates & ~self.arg.evaluate(batch, candidates)
+
+def to_number(value : str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+numeric_operators : Dict[str, Callable[[float, float], bool]] = {
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+}
+
+# String functions used as predicates by the string method testing their first argument with the literal second argument.
+string_predicates : Dict[str, str] = {
+    "strings.contains": "__contains__",
+    "strings.starts_with": "startswith",
+    "strings.ends_with": "endswith",
+}
+
+# String functions used as operands, applied to each value of their argument.
+string_transformations : Dict[str, Callable[[str], str]] = {
+    "strings.to_lower": str.lower,
+    "strings.to_upper": str.upper,
+}
+
+def in_networks(networks : List[Any]) -> Callable[[str], bool]:
+    """Test of values against IP networks, values that aren't IP addresses don't match."""
+    def test(value : str) -> bool:
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            return False
+        return any(address in network for network in networks)
+    return test
+
+def ip_networks(values : Iterable[str]) -> List[Any]:
+    try:
+        return [ipaddress.ip_network(value, strict=False) for value in values]
+    except ValueError as e:
+        raise EvaluationError(f"Invalid CIDR network: {e}") from None
+
+regex_literal_part = re.compile(r"(?:[^\\.^$*+?{}\[\]|()]|\\[^A-Za-z0-9])*")
+
+def regex_literal(pattern : str) -> Optional[Tuple[str, str]]:
+    """
+    Kind (contains, starts_with, ends_with or equals) and literal of a regular expression that only matches a literal,
+    optionally anchored or surrounded by .*, like the regular expressions generated for wildcard values.
+    """
+    start = 1 if pattern.startswith("^") else 2 if pattern.startswith(".*") else 0
+    end = len(pattern)
+    anchored_end = False
+    if pattern.endswith("$") and not pattern.endswith("\\$"):
+        end, anchored_end = end - 1, True
+    elif pattern.endswith(".*") and not pattern.endswith("\\.*"):
+        end -= 2
+    literal = pattern[start:end]
+    if regex_literal_part.fullmatch(literal) is None:
+        return None
+    literal = re.sub(r"\\(.)", r"\1", literal)
+    anchored_start = pattern.startswith("^")
+    return ("equals" if anchored_end else "starts_with") if anchored_start else ("ends_with" if anchored_end else "contains"), literal
+
+def rule_query(text : str) -> Node:
+    """Syntax tree of a UDM query or of the events section of a single-event YARA-L rule."""
+    if section_header.search(text) is not None and "match" in yaral_sections(text):
+        raise EvaluationError("Multi-event rules with a match section can't be evaluated offline")
+    return parse_output(text)
+
+class QueryEvaluator:
+    """
+    Compiled queries by rule identifier. Queries that can't be parsed or compiled are recorded in errors. Reference
+    lists are given by name with their values, regular expressions and predicates are shared by all queries.
+    """
+    def __init__(self, queries : Mapping[str, str], reference_lists : Optional[Mapping[str, Iterable[str]]] = None):
+        self.reference_lists = {name: list(values) for name, values in (reference_lists or {}).items()}
+        self.regexes : Dict[Tuple[str, int], Pattern] = {}
+        self.operands : Dict[Hashable, Operand] = {}
+        self.predicates : Dict[Hashable, Predicate] = {}
+        self.queries : Dict[str, Any] = {}
+        self.errors : Dict[str, Exception] = {}
+        for rule_id, text in queries.items():
+            try:
+                self.queries[rule_id] = self.compile(rule_query(text))
+            except (QuerySyntaxError, EvaluationError) as e:
+                self.errors[rule_id] = e
+
+    def regex(self, pattern : str, nocase : bool) -> Pattern:
+        key = (pattern, re.IGNORECASE if nocase else 0)
+        if key not in self.regexes:
+            try:
+                self.regexes[key] = re.compile(python_regex(pattern), key[1])
+            except re.error as e:
+                raise EvaluationError(f"Invalid regular expression /{pattern}/: {e}") from None
+        return self.regexes[key]
+
+    def operand(self, node : Any) -> Operand:
+        if isinstance(node, Field):
+            key : Hashable = ("field", node.name)
+            path = node.name
+            extract = lambda batch: [field_values(event, path) for event in batch.events]
+        elif isinstance(node, Call) and node.name in string_transformations and len(node.args) == 1:
+            inner = self.operand(node.args[0])
+            key = (node.name, inner.key)
+            transform = string_transformations[node.name]
+            extract = lambda batch: [tuple(transform(value) for value in values) for values in inner.column(batch).rows]
+        elif node is Keyword:
+            key = ("keyword",)
+            extract = lambda batch: [tuple(value.lower() for value in event_values(event)) for event in batch.events]
+        else:
+            raise EvaluationError(f"Unsupported operand {type(node).__name__}" + (f" {node.name}" if isinstance(node, Call) else ""))
+        if key not in self.operands:
+            self.operands[key] = Operand(key, extract)
+        return self.operands[key]
+
+    def lowercase(self, operand : Operand) -> Operand:
+        """Lowercased values of an operand, shared by all case-insensitive comparisons of the operand."""
+        key = ("strings.to_lower", operand.key)
+        if key not in self.operands:
+            self.operands[key] = Operand(key, lambda batch: [tuple(value.lower() for value in values) for values in operand.column(batch).rows])
+        return self.operands[key]
+
+    def predicate(self, key : Hashable, operand : Operand, test : Callable[[str], bool], node : Node, literals : Optional[frozenset] = None) -> Predicate:
+        key = (key, operand.key)
+        if key not in self.predicates:
+            self.predicates[key] = Predicate(key, operand, test, node, literals)
+        return self.predicates[key]
+
+    def regex_predicate(self, operand : Operand, pattern : str, nocase : bool, node : Node) -> Predicate:
+        """Regular expression match, evaluated as string comparison if the regular expression only matches a literal."""
+        literal = regex_literal(pattern)
+        if literal is None:
+            regex = self.regex(pattern, nocase)
+            return self.predicate(("regex", regex.pattern, regex.flags), operand, lambda value: regex.search(value) is not None, node)
+        kind, value = literal
+        if nocase:
+            operand = self.lowercase(operand)
+            value = value.lower()
+        if kind == "equals":
+            literals = frozenset((value,))
+            return self.predicate(("in", literals), operand, literals.__contains__, node, literals)
+        return self.predicate(("strings." + kind, value), operand, methodcaller(string_predicates["strings." + kind], value), node)
+
+    def comparison(self, node : Comparison) -> Any:
+        if node.operator == "!=":
+            return Negation(self.comparison(replace(node, operator="=")))
+        operand = self.operand(node.left)
+        right = node.right
+        if node.operator == "in":
+            if not isinstance(right, ReferenceList):
+                raise EvaluationError("Expected reference list after in")
+            if right.name not in self.reference_lists:
+                raise EvaluationError(f"Unknown reference list %{right.name}")
+            values = self.reference_lists[right.name]
+            if right.cidr:
+                networks = ip_networks(values)
+                return self.predicate(("in cidr", right.name), operand, in_networks(networks), node)
+            if right.regex:
+                regexes = [self.regex(value, node.nocase) for value in values]
+                return self.predicate(("in regex", right.name, node.nocase), operand, lambda value: any(regex.search(value) for regex in regexes), node)
+            if node.nocase:
+                operand = self.lowercase(operand)
+                values = [value.lower() for value in values]
+            literals = frozenset(values)
+            return self.predicate(("in", right.name, node.nocase), operand, literals.__contains__, node, literals)
+        if isinstance(right, Regex) and node.operator == "=":
+            return self.regex_predicate(operand, right.pattern, node.nocase, node)
+        if isinstance(right, String) and node.operator == "=":
+            if node.nocase:
+                operand = self.lowercase(operand)
+            literals = frozenset((right.value.lower() if node.nocase else right.value,))
+            return self.predicate(("in", literals), operand, literals.__contains__, node, literals)
+        if isinstance(right, (Number, String)) and node.operator in numeric_operators:
+            number = float(right.value) if isinstance(right, Number) else to_number(right.value)
+            if number is None:
+                raise EvaluationError(f"Expected number after {node.operator}, found {right.value!r}")
+            compare = numeric_operators[node.operator]
+            return self.predicate((node.operator, number), operand, lambda value: (item := to_number(value)) is not None and compare(item, number), node)
+        raise EvaluationError(f"Unsupported comparison with {type(right).__name__}")
+
+    def call(self, node : Call) -> Predicate:
+        if len(node.args) != 2 or not isinstance(node.args[1], (Regex, String)):
+            raise EvaluationError(f"Unsupported function {node.name}")
+        operand = self.operand(node.args[0])
+        if node.name == "net.ip_in_range_cidr" and isinstance(node.args[1], String):
+            networks = ip_networks([node.args[1].value])
+            return self.predicate(("cidr", str(networks[0])), operand, in_networks(networks), node)
+        if node.name == "re.regex":
+            return self.regex_predicate(operand, node.args[1].pattern if isinstance(node.args[1], Regex) else node.args[1].value, node.nocase, node)
+        if node.name in string_predicates and isinstance(node.args[1], String):
+            literal = node.args[1].value
+            return self.predicate((node.name, literal), operand, methodcaller(string_predicates[node.name], literal), node)
+        raise EvaluationError(f"Unsupported function {node.name}")
+
+    def compile(self, node : Node) -> Any:
+        """Compile a syntax tree into a tree of predicates, conjunctions, disjunctions and negations."""
+        if isinstance(node, And):
+            return Conjunction([self.compile(arg) for arg in node.args])
+        if isinstance(node, Or):
+            return Disjunction([self.compile(arg) for arg in node.args])
+        if isinstance(node, Not):
+            return Negation(self.compile(node.arg))
+        if isinstance(node, Comparison):
+            return self.comparison(node)
+        if isinstance(node, Call):
+            return self.call(node)
+        if isinstance(node, Keyword):
+            literal = node.value.lower()
+            return self.predicate(("strings.contains", literal), self.operand(Keyword), methodcaller("__contains__", literal), node)
+        raise EvaluationError(f"Unsupported expression {type(node).__name__}")
+
+    def evaluate(self, events : List[dict]) -> Dict[str, int]:
+        """Bit mask of the matched events per rule, bit i is set if the i-th event matches."""
+        batch = EventBatch(events)
+        return {rule_id: query.evaluate(batch, batch.all) for rule_id, query in self.queries.items()}
+
+    def matches(self, events : List[dict]) -> Dict[str, List[int]]:
+        """Indices of the matched events per rule."""
+        return {rule_id: mask_rows(mask) for rule_id, mask in self.evaluate(events).items()}
+
+@dataclass
+class RuleMatches:
+    matches : int = 0
+    samples : List[Tuple[str, int]] = dataclass_field(default_factory=list)      # (file, byte offset) of the first matched events
+
+@dataclass
+class EvaluationReport:
+    """Matches per rule of an evaluation of event files."""
+    events : int = 0
+    invalid : int = 0                   # lines that aren't JSON objects
+    seconds : float = 0.0
+    rules : Dict[str, RuleMatches] = dataclass_field(default_factory=dict)
+    errors : Dict[str, str] = dataclass_field(default_factory=dict)         # rules that can't be evaluated
+
+    def merge(self, other : "EvaluationReport", max_samples : int) -> None:
+        self.events += other.events
+        self.invalid += other.invalid
+        for rule_id, matches in other.rules.items():
+            total = self.rules.setdefault(rule_id, RuleMatches())
+            total.matches += matches.matches
+            total.samples.extend(matches.samples[:max_samples - len(total.samples)])
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = asdict(self)
+        result["events_per_second"] = round(self.events / self.seconds) if self.seconds else None
+        return result
+
+    def to_text(self) -> str:
+        lines = [f"{self.events} events, {self.invalid} invalid lines, {len(self.rules)} rules, {len(self.errors)} not evaluated, {self.seconds:.2f}s"]
+        lines.extend(f"{matches.matches:9}  {rule_id}" for rule_id, matches in sorted(self.rules.items(), key=lambda item: (-item[1].matches, item[0])) if matches.matches)
+        lines.extend(f"error: {rule_id}: {error}" for rule_id, error in self.errors.items())
+        return "\n".join(lines) + "\n"
+
+def file_chunks(path : str, chunk_bytes : int) -> List[Tuple[str, int, int]]:
+    """Split a file into (path, start, end) byte ranges of about chunk_bytes, ending after a line break or at the end of the file."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    chunks = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = 0
+        while start < size:
+            end = data.find(b"\n", min(start + chunk_bytes, size) - 1)
+            end = size if end == -1 else end + 1
+            chunks.append((path, start, end))
+            start = end
+    return chunks
+
+def read_lines(path : str, start : int, end : int) -> Iterator[Tuple[int, bytes]]:
+    """(offset, line) pairs of a memory-mapped byte range of a file."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        position = start
+        while position < end:
+            line_end = data.find(b"\n", position, end)
+            if line_end == -1:
+                line_end = end
+            yield position, data[position:line_end]
+            position = line_end + 1
+
+def evaluate_chunk(evaluator : QueryEvaluator, chunk : Tuple[str, int, int], batch_size : int, max_samples : int) -> EvaluationReport:
+    """Evaluate the events of a byte range of a file in batches of batch_size events."""
+    path = chunk[0]
+    report = EvaluationReport(rules={rule_id: RuleMatches() for rule_id in evaluator.queries})
+    events : List[dict] = []
+    offsets : List[int] = []
+
+    def flush():
+        for rule_id, mask in evaluator.evaluate(events).items():
+            if mask:
+                matches = report.rules[rule_id]
+                matches.matches += bin(mask).count("1")
+                if len(matches.samples) < max_samples:
+                    matches.samples.extend((path, offsets[row]) for row in mask_rows(mask)[:max_samples - len(matches.samples)])
+        report.events += len(events)
+        events.clear()
+        offsets.clear()
+
+    for offset, line in read_lines(*chunk):
+        if not line.strip():
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError:
+            event = None
+        if not isinstance(event, dict):
+            report.invalid += 1
+            continue
+        events.append(event)
+        offsets.append(offset)
+        if len(events) >= batch_size:
+            flush()
+    if events:
+        flush()
+    return report
+
+# Evaluator and options of the current worker process, created once by the pool initializer.
+_worker_evaluator : Optional[QueryEvaluator] = None
+_worker_options : Tuple[int, int] = (0, 0)
+
+def _init_worker(queries : Dict[str, str], reference_lists : Dict[str, List[str]], batch_size : int, max_samples : int) -> None:
+    global _worker_evaluator, _worker_options
+    _worker_evaluator = QueryEvaluator(queries, reference_lists)
+    _worker_options = (batch_size, max_samples)
+
+def _evaluate_in_worker(chunk : Tuple[str, int, int]) -> EvaluationReport:
+    return evaluate_chunk(_worker_evaluator, chunk, *_worker_options)
+
+def evaluate_files(
+        queries : Mapping[str, str],
+        paths : Iterable[str],
+        reference_lists : Optional[Mapping[str, Iterable[str]]] = None,
+        workers : Optional[int] = None,
+        batch_size : int = 2048,
+        chunk_bytes : int = 16 * 1024 * 1024,
+        max_samples : int = 10,
+    ) -> EvaluationReport:
+    """
+    Evaluate queries by rule identifier against JSON lines event files. The files are split into chunks of about
+    chunk_bytes which are evaluated in a pool of worker processes, each compiling the queries once. Returns the number
+    of matched events and the locations of the first max_samples matched events per rule.
+    """
+    start = perf_counter()
+    queries = dict(queries)
+    reference_lists = {name: list(values) for name, values in (reference_lists or {}).items()}
+    evaluator = QueryEvaluator(queries, reference_lists)
+    report = EvaluationReport(
+        rules={rule_id: RuleMatches() for rule_id in evaluator.queries},
+        errors={rule_id: str(error) for rule_id, error in evaluator.errors.items()},
+    )
+    chunks = [chunk for path in paths for chunk in file_chunks(str(path), chunk_bytes)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers <= 1:
+        for chunk in chunks:
+            report.merge(evaluate_chunk(evaluator, chunk, batch_size, max_samples), max_samples)
+    else:
+        compiled = {rule_id: queries[rule_id] for rule_id in evaluator.queries}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(compiled, reference_lists, batch_size, max_samples)) as pool:
+            for result in pool.map(_evaluate_in_worker, chunks):
+                report.merge(result, max_samples)
+    report.seconds = perf_counter() - start
+    return report
+
+def read_reference_lists(directory : str) -> Dict[str, List[str]]:
+    """Reference lists written by ReferenceLists.write, one file per list named after the list."""
+    return {path.stem: path.read_text(encoding="utf-8").splitlines() for path in sorted(Path(directory).glob("*.txt"))}
+
+def load_queries(sources : List[str]) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+    """
+    Queries and reference lists from ndjson files written by the YARA-L backend or from Sigma rule files and directories,
+    which are converted with the UDM backend.
+    """
+    from sigma.backends.chronicle import chronicleBackendUdm
+    from sigma.backends.chronicle.deploy import read_records, record_key
+
+    queries : Dict[str, str] = {}
+    sigma_sources = []
+    for source in sources:
+        if source.endswith((".ndjson", ".jsonl")):
+            with open(source, encoding="utf-8") as f:
+                queries.update((rule_id, text) for rule_id, _, text in map(record_key, read_records(f)))
+        else:
+            sigma_sources.append(source)
+    reference_lists : Dict[str, List[str]] = {}
+    if sigma_sources:
+        backend = chronicleBackendUdm(collect_errors=True)
+        queries.update(backend.convert_stream(sigma_sources))
+        reference_lists = {name: reference_list.values for name, reference_list in backend.reference_lists.lists.items() if not reference_list.placeholder}
+    return queries, reference_lists
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate converted rules against UDM events in the JSON lines format.")
+    parser.add_argument("--rules", nargs="+", required=True, help="ndjson output of the YARA-L backend or Sigma rule files and directories")
+    parser.add_argument("--events", nargs="+", required=True, help="JSON lines files with one UDM event per line")
+    parser.add_argument("--reference-lists", help="Directory with reference lists, one file per list with one value per line")
+    parser.add_argument("--workers", type=int, help="Number of worker processes, default: number of CPUs")
+    parser.add_argument("--batch-size", type=int, default=2048, help="Events evaluated together")
+    parser.add_argument("--samples", type=int, default=10, help="Locations of matched events reported per rule")
+    parser.add_argument("--json", action="store_true", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    queries, reference_lists = load_queries(args.rules)
+    if args.reference_lists:
+        reference_lists.update(read_reference_lists(args.reference_lists))
+    report = evaluate_files(queries, args.events, reference_lists, args.workers, args.batch_size, max_samples=args.samples)
+    print(json.dumps(report.to_dict(), indent=2) if args.json else report.to_text(), end="\n" if args.json else "")
+
+if __name__ == "__main__":
+    main()
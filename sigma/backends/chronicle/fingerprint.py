@@ -0,0 +1,289 @@
+"""
+Canonical form and fingerprints of Sigma condition trees to find rules that result in the same detection.
+
+The canonical form is built from the condition tree after the field mapping of the processing pipeline, so rules
+using different Sigma field names for the same UDM field are recognized. Operands of AND and OR are flattened, sorted
+and deduplicated, double negations removed and string values lowercased like they are matched by the generated
+nocase expressions. Two rules with the same fingerprint match the same events, a rule whose canonical condition
+implies the condition of another rule is subsumed by it.
+"""
+from collections import Counter
+from dataclasses import dataclass, field as dataclass_field
+from typing import TYPE_CHECKING, Any, Callable, Dict, FrozenSet, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sigma.conditions import (
+    ConditionAND,
+    ConditionFieldEqualsValueExpression,
+    ConditionNOT,
+    ConditionOR,
+    ConditionType,
+)
+from sigma.conversion.state import ConversionState
+from sigma.rule import SigmaRuleBase
+from sigma.types import SigmaCasedString, SigmaNumber, SigmaRegularExpression, SigmaString
+
+from sigma.backends.chronicle.optimizer import implies_match
+from sigma.backends.chronicle.output import content_hash
+from sigma.backends.chronicle.streaming import rule_identifier
+from sigma.backends.chronicle.values import literal, pattern_regex, wildcard_kind
+
+if TYPE_CHECKING:
+    from sigma.conversion.base import Backend
+
+# Canonical conditions are nested tuples: ("and", args), ("or", args) and ("not", arg) for boolean operators,
+# ("match", field, kind, value) for case-insensitive string and number predicates with the kinds of
+# sigma.backends.chronicle.values.wildcard_kind and (value type, field, value) for all other predicates. Keywords
+# have the field None.
+Canonical = Tuple[Any, ...]
+
+def canonical_predicate(cond : ConditionType) -> Canonical:
+    field = cond.field if isinstance(cond, ConditionFieldEqualsValueExpression) else None
+    value = cond.value
+    if isinstance(value, SigmaString) and not isinstance(value, SigmaCasedString):
+        kind = wildcard_kind(value)
+        if kind == "pattern":
+            return ("match", field, kind, pattern_regex(value).lower())
+        elif kind is not None:
+            return ("match", field, kind, literal(value).lower())
+    elif isinstance(value, SigmaNumber):
+        return ("match", field, "exact", str(value))     # numbers are matched like their string representation
+    elif isinstance(value, SigmaRegularExpression):
+        return ("regex", field, value.regexp, tuple(sorted(flag.name for flag in value.flags)))
+    return (type(value).__name__, field, str(value))
+
+def canonical_condition(cond : ConditionType) -> Canonical:
+    """Canonical form of a condition tree, equal for condition trees that only differ in order, nesting or case of values."""
+    if isinstance(cond, ConditionNOT):
+        arg = canonical_condition(cond.args[0])
+        return arg[1] if arg[0] == "not" else ("not", arg)
+    if isinstance(cond, (ConditionAND, ConditionOR)):
+        operator = "and" if isinstance(cond, ConditionAND) else "or"
+        args = set()
+        for arg in cond.args:
+            arg = canonical_condition(arg)
+            if arg[0] == operator:
+                args.update(arg[1])
+            else:
+                args.add(arg)
+        args = sorted(args, key=repr)
+        return args[0] if len(args) == 1 else (operator, tuple(args))
+    return canonical_predicate(cond)
+
+def implies(a : Canonical, b : Canonical, fields : Optional[Callable[[Canonical], FrozenSet[Optional[str]]]] = None) -> bool:
+    """
+    Check if every event matched by canonical condition a is also matched by b. The check is sound but not complete:
+    string predicates are compared like in the condition optimizer, all other predicates only by equality. If given,
+    fields returns the required fields of a condition (see required_fields) and is used to skip comparisons early.
+    """
+    if a == b:
+        return True
+    if fields is not None and not fields(b) <= fields(a):
+        return False
+    if a[0] == "or":
+        return all(implies(arg, b, fields) for arg in a[1])
+    if b[0] == "and":
+        return all(implies(a, arg, fields) for arg in b[1])
+    if a[0] == "and" and any(implies(arg, b, fields) for arg in a[1]):
+        return True
+    if b[0] == "or" and any(implies(a, arg, fields) for arg in b[1]):
+        return True
+    if a[0] == b[0] == "not":
+        return implies(b[1], a[1], fields)
+    if a[0] == b[0] == "match" and "pattern" not in (a[2], b[2]):
+        return implies_match(a[1:], b[1:])
+    return False
+
+def required_fields(canonical : Canonical) -> FrozenSet[Optional[str]]:
+    """
+    Fields constrained by every way to match a canonical condition, None for keywords. If implies(a, b), the required
+    fields of b are a subset of the required fields of a, as implications are only found between predicates of the
+    same field.
+    """
+    if canonical[0] == "and":
+        return frozenset().union(*(required_fields(arg) for arg in canonical[1]))
+    if canonical[0] == "or":
+        return frozenset.intersection(*(required_fields(arg) for arg in canonical[1]))
+    if canonical[0] == "not":
+        return frozenset()
+    return frozenset((canonical[1],))
+
+def required_clauses(canonical : Canonical) -> List[FrozenSet[Canonical]]:
+    """
+    Clauses of predicates of a canonical condition. Every condition implying it implies at least one predicate of
+    each clause, e.g. one of the values of an OR of values.
+    """
+    if canonical[0] == "and":
+        return [clause for arg in canonical[1] for clause in required_clauses(arg)]
+    if canonical[0] == "or":
+        clauses = [required_clauses(arg) for arg in canonical[1]]
+        if not all(clauses):
+            return []
+        return [frozenset().union(*(min(arg_clauses, key=len) for arg_clauses in clauses))]
+    if canonical[0] == "not":
+        return []
+    return [frozenset((canonical,))]
+
+def predicates(canonical : Canonical) -> Iterator[Canonical]:
+    """Predicates of a canonical condition outside of negations."""
+    if canonical[0] in ("and", "or"):
+        for arg in canonical[1]:
+            yield from predicates(arg)
+    elif canonical[0] != "not":
+        yield canonical
+
+def substring_match(predicate : Canonical) -> bool:
+    """Check if the predicate is only implied by string predicates of the same field whose value contains its value."""
+    return predicate[0] == "match" and predicate[2] != "pattern"
+
+def trigrams(value : str) -> Set[str]:
+    return {value[start:start + 3] for start in range(len(value) - 2)}
+
+@dataclass
+class RuleFingerprint:
+    """Fingerprint of the query generated from a condition of a rule. Aggregations are part of the fingerprint."""
+    rule_id : str
+    fingerprint : str
+    canonical : Hashable = dataclass_field(repr=False, compare=False)
+    aggregated : bool = False
+
+def aggregation_key(aggregation : Any) -> Optional[Tuple[Any, ...]]:
+    if aggregation is None:
+        return None
+    return (aggregation.function, aggregation.field, tuple(sorted(aggregation.group_by)), aggregation.operator, aggregation.threshold, aggregation.timeframe)
+
+def rule_fingerprint(rule_id : str, canonical : Canonical, aggregation : Any = None) -> RuleFingerprint:
+    key = aggregation_key(aggregation)
+    return RuleFingerprint(rule_id, content_hash(repr((canonical, key))), canonical, key is not None)
+
+class FingerprintReport:
+    """Fingerprints of the queries of a rule collection with the duplicate and subsumed rules among them."""
+    def __init__(self, fingerprints : Iterable[RuleFingerprint] = ()):
+        self.fingerprints : List[RuleFingerprint] = list(fingerprints)
+
+    def add(self, fingerprint : RuleFingerprint) -> None:
+        self.fingerprints.append(fingerprint)
+
+    def by_rule(self) -> Dict[str, List[str]]:
+        """Fingerprints per rule identifier, one per condition of the rule."""
+        result : Dict[str, List[str]] = {}
+        for fingerprint in self.fingerprints:
+            result.setdefault(fingerprint.rule_id, []).append(fingerprint.fingerprint)
+        return result
+
+    def unique(self) -> List[RuleFingerprint]:
+        """First query of each fingerprint in the order of conversion."""
+        unique : Dict[str, RuleFingerprint] = {}
+        for fingerprint in self.fingerprints:
+            unique.setdefault(fingerprint.fingerprint, fingerprint)
+        return list(unique.values())
+
+    def duplicates(self) -> List[List[str]]:
+        """Groups of rules with equal queries, each group in the order of conversion."""
+        groups : Dict[str, List[str]] = {}
+        for fingerprint in self.fingerprints:
+            rules = groups.setdefault(fingerprint.fingerprint, [])
+            if fingerprint.rule_id not in rules:
+                rules.append(fingerprint.rule_id)
+        return [rules for rules in groups.values() if len(rules) > 1]
+
+    def subsumed(self) -> List[Tuple[str, str]]:
+        """
+        (rule, broader rule) pairs of unique queries where every event matched by the first rule is also matched by
+        the broader one. Queries with aggregations are not compared.
+
+        To avoid comparing all pairs of queries, each query is indexed by the predicates of one of its required clauses
+        (see required_clauses), string predicates by the field and the least frequent trigram of their value. A query
+        is only compared with the queries with an indexed predicate that can be implied by one of its own predicates:
+        a string predicate of the same field whose value contains the indexed value or an equal predicate. Queries
+        without required clauses are compared if their required fields are a subset of the required fields of the
+        query. Nested comparisons are skipped by the same criterion.
+        """
+        candidates = [fingerprint for fingerprint in self.unique() if not fingerprint.aggregated]
+        node_fields : Dict[int, FrozenSet[Optional[str]]] = {}      # required fields per node, nodes are kept alive by the candidates
+
+        def cached_required_fields(node : Canonical) -> FrozenSet[Optional[str]]:
+            if id(node) not in node_fields:
+                node_fields[id(node)] = required_fields(node)
+            return node_fields[id(node)]
+
+        indexed : List[Tuple[int, FrozenSet[Canonical]]] = []
+        unindexed = []
+        for j, fingerprint in enumerate(candidates):
+            clauses = required_clauses(fingerprint.canonical)
+            if clauses:
+                # prefer clauses of string predicates indexed by trigrams, then smaller clauses
+                indexed.append((j, min(clauses, key=lambda clause: (not all(substring_match(predicate) and len(predicate[3]) >= 3 for predicate in clause), len(clause)))))
+            else:
+                unindexed.append(j)
+        value_trigrams = {
+            predicate[3]: trigrams(predicate[3])
+            for fingerprint in candidates
+            for predicate in predicates(fingerprint.canonical) if substring_match(predicate)
+        }
+        frequency = Counter(
+            (predicate[1], trigram)
+            for _, clause in indexed
+            for predicate in clause if substring_match(predicate)
+            for trigram in value_trigrams[predicate[3]]
+        )
+        by_trigram : Dict[Tuple[Optional[str], str], List[int]] = {}      # (field, least frequent trigram of the value)
+        short_values : Dict[Optional[str], List[int]] = {}                # string predicates with values shorter than three characters
+        by_predicate : Dict[Canonical, List[int]] = {}                    # other predicates
+        for j, clause in indexed:
+            for predicate in clause:
+                if not substring_match(predicate):
+                    by_predicate.setdefault(predicate, []).append(j)
+                elif len(predicate[3]) >= 3:
+                    _, trigram = min((frequency[predicate[1], trigram], trigram) for trigram in value_trigrams[predicate[3]])
+                    by_trigram.setdefault((predicate[1], trigram), []).append(j)
+                else:
+                    short_values.setdefault(predicate[1], []).append(j)
+
+        result = []
+        for i, fingerprint in enumerate(candidates):
+            others = {j for j in unindexed if cached_required_fields(candidates[j].canonical) <= cached_required_fields(fingerprint.canonical)}
+            for predicate in set(predicates(fingerprint.canonical)):
+                others.update(by_predicate.get(predicate, ()))
+                if substring_match(predicate):
+                    field, value = predicate[1], predicate[3]
+                    others.update(short_values.get(field, ()))
+                    for trigram in value_trigrams[value]:
+                        others.update(by_trigram.get((field, trigram), ()))
+            others.discard(i)
+            result.extend(
+                (fingerprint.rule_id, candidates[j].rule_id)
+                for j in sorted(others)
+                if implies(fingerprint.canonical, candidates[j].canonical, cached_required_fields)
+            )
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "queries": len(self.fingerprints),
+            "unique": len(self.unique()),
+            "duplicates": self.duplicates(),
+            "subsumed": [{"rule": rule_id, "by": broader} for rule_id, broader in self.subsumed()],
+            "fingerprints": self.by_rule(),
+        }
+
+    def to_text(self) -> str:
+        duplicates = self.duplicates()
+        subsumed = self.subsumed()
+        lines = [f"{len(self.fingerprints)} queries, {len(self.unique())} unique, {len(duplicates)} duplicate groups, {len(subsumed)} subsumed"]
+        lines.extend("duplicates: " + ", ".join(rules) for rules in duplicates)
+        lines.extend(f"subsumed: {rule_id} by {broader}" for rule_id, broader in subsumed)
+        return "\n".join(lines) + "\n"
+
+def record_fingerprint(backend : "Backend", rule : SigmaRuleBase, index : int, state : ConversionState) -> Optional[RuleFingerprint]:
+    """
+    Fingerprint the canonical condition recorded in the conversion state of a query while it's finalized if the
+    backend collects fingerprints and record it in backend.fingerprints and the conversion state.
+    """
+    if backend.fingerprints is None or "canonical_condition" not in state.processing_state:
+        return None
+    aggregations = state.processing_state.get("aggregations")
+    aggregation = aggregations[index] if aggregations else None
+    fingerprint = rule_fingerprint(rule_identifier(rule), state.processing_state["canonical_condition"], aggregation)
+    backend.fingerprints.add(fingerprint)
+    state.processing_state["query_fingerprint"] = fingerprint
+    return fingerprint
@@ -0,0 +1,184 @@
+"""Per-stage and per-rule metrics of conversion runs."""
+import functools
+import json
+import re
+from dataclasses import asdict, dataclass, field
+from threading import Lock, local
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sigma.conditions import ConditionItem
+from sigma.conversion.state import ConversionState
+
+from sigma.backends.chronicle.optimizer import count_predicates
+
+# Conversion stages. Rules and correlation rules are measured as a whole ("total"), parsing is only measured by
+# convert_stream, which parses the rule files itself. The pipeline stage is the time of a rule not spent in condition
+# optimization, conversion and finalization: the processing pipeline and the bookkeeping of pySigma. Values are the
+# leaf value expressions rendered while converting a condition, their time is contained in the condition stage.
+stages = ("parse", "pipeline", "optimize", "condition", "values", "finalize", "total")
+
+# Upper bounds of the buckets of the per-rule conversion time histogram in seconds.
+histogram_buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+# Tokens of a query: string literals, line comments, UDM regexes (/.../) and YARA-L regexes (`...`). Regexes are
+# counted outside of strings and comments only.
+query_tokens = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|//[^\n]*|(?P<regex>/(?:\\.|[^/\\\n])*/|`[^`]*`)')
+
+def count_regexes(query : str) -> int:
+    return sum(1 for match in query_tokens.finditer(query) if match.group("regex"))
+
+@dataclass
+class RuleMetrics:
+    """Metrics of the conversion of one rule: wall time per stage in seconds and size and shape of the output."""
+    rule_id : str
+    stages : Dict[str, float] = field(default_factory=dict)
+    output_bytes : int = 0
+    predicates : int = 0        # predicates of the converted conditions, after optimization
+    regexes : int = 0           # regular expressions in the output
+
+    def add_time(self, stage : str, seconds : float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+class ConversionMetrics:
+    """
+    Metrics collector of a backend. Assign an instance to backend.metrics or enable the backend option collect_metrics
+    to record wall time per stage and rule, output size, predicate and regex counts. The callback is called with the
+    RuleMetrics of each rule after its conversion. Without collector, each instrumented method of the backend only
+    checks if backend.metrics is None. The rule currently converted is tracked per thread, so a collector can be used
+    by a backend converting in several threads.
+    """
+    def __init__(self, callback : Optional[Callable[[RuleMetrics], None]] = None):
+        self.callback = callback
+        self.rules : List[RuleMetrics] = []
+        self.stages : Dict[str, float] = {}      # total time per stage of all rules and of parsing
+        self.lock = Lock()
+        self.local = local()
+
+    @property
+    def current(self) -> Optional[RuleMetrics]:
+        """Metrics of the rule converted by the current thread."""
+        return getattr(self.local, "current", None)
+
+    @current.setter
+    def current(self, rule : Optional[RuleMetrics]) -> None:
+        self.local.current = rule
+
+    def add_time(self, stage : str, seconds : float) -> None:
+        with self.lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        if self.current is not None:
+            self.current.add_time(stage, seconds)
+
+    def measure_rule(self, rule_id : str, convert : Callable[..., List[Any]], *args : Any) -> List[Any]:
+        """Call the conversion method of a rule or correlation rule and record its metrics."""
+        outer, self.current = self.current, RuleMetrics(rule_id)
+        start = perf_counter()
+        queries = []
+        try:
+            queries = convert(*args)
+            return queries
+        finally:
+            rule, self.current = self.current, outer
+            total = perf_counter() - start
+            pipeline = total - sum(rule.stages.get(stage, 0.0) for stage in ("optimize", "condition", "finalize"))
+            for stage, seconds in (("pipeline", pipeline), ("total", total)):
+                rule.add_time(stage, seconds)
+            for query in queries:
+                if isinstance(query, str):
+                    rule.output_bytes += len(query.encode("utf-8"))
+                    rule.regexes += count_regexes(query)
+            with self.lock:
+                self.stages["pipeline"] = self.stages.get("pipeline", 0.0) + pipeline
+                self.stages["total"] = self.stages.get("total", 0.0) + total
+                self.rules.append(rule)
+            if self.callback is not None:
+                self.callback(rule)
+
+    def measure(self, stage : str, function : Callable[..., Any], *args : Any) -> Any:
+        """Call a function and record its time in the given stage."""
+        start = perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.add_time(stage, perf_counter() - start)
+
+    def measure_condition(self, convert : Callable[[ConditionItem, ConversionState], Any], cond : ConditionItem, state : ConversionState) -> Any:
+        """Call the conversion of the root of a condition tree and record its time and predicate count."""
+        if self.current is not None:
+            self.current.predicates += count_predicates(cond)
+        start = perf_counter()
+        try:
+            return convert(cond, state)
+        finally:
+            self.add_time("condition", perf_counter() - start)
+
+    def merge(self, rules : Iterable[RuleMetrics]) -> None:
+        """Add the metrics of rules converted by another collector, e.g. in a worker process."""
+        with self.lock:
+            for rule in rules:
+                for stage, seconds in rule.stages.items():
+                    self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+                self.rules.append(rule)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.rules.clear()
+            self.stages.clear()
+        self.current = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rules": len(self.rules),
+            "stages": dict(self.stages),
+            "output_bytes": sum(rule.output_bytes for rule in self.rules),
+            "predicates": sum(rule.predicates for rule in self.rules),
+            "regexes": sum(rule.regexes for rule in self.rules),
+            "per_rule": [asdict(rule) for rule in self.rules],
+        }
+
+    def to_json(self, **kwargs : Any) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_prometheus(self, prefix : str = "sigma_chronicle") -> str:
+        """Metrics in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {prefix}_stage_seconds_total Wall time spent in each conversion stage.",
+            f"# TYPE {prefix}_stage_seconds_total counter",
+        ]
+        lines.extend(f'{prefix}_stage_seconds_total{{stage="{stage}"}} {self.stages[stage]!r}' for stage in stages if stage in self.stages)
+        for name, help_text, value in (
+            ("rules_total", "Converted rules.", len(self.rules)),
+            ("output_bytes_total", "Size of the generated queries in bytes.", sum(rule.output_bytes for rule in self.rules)),
+            ("predicates_total", "Predicates of the converted conditions.", sum(rule.predicates for rule in self.rules)),
+            ("regexes_total", "Regular expressions in the generated queries.", sum(rule.regexes for rule in self.rules)),
+        ):
+            lines.extend([f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} counter", f"{prefix}_{name} {value}"])
+        durations = [rule.stages.get("total", 0.0) for rule in self.rules]
+        lines.extend([
+            f"# HELP {prefix}_rule_seconds Conversion time per rule.",
+            f"# TYPE {prefix}_rule_seconds histogram",
+        ])
+        for bucket in histogram_buckets:
+            lines.append(f'{prefix}_rule_seconds_bucket{{le="{bucket}"}} {sum(1 for duration in durations if duration <= bucket)}')
+        lines.extend([
+            f'{prefix}_rule_seconds_bucket{{le="+Inf"}} {len(durations)}',
+            f"{prefix}_rule_seconds_sum {sum(durations)!r}",
+            f"{prefix}_rule_seconds_count {len(durations)}",
+        ])
+        return "\n".join(lines) + "\n"
+
+def timed(stage : str) -> Callable:
+    """Decorator of backend methods recording their time in the given stage if the backend collects metrics."""
+    def decorator(method : Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args : Any, **kwargs : Any) -> Any:
+            if self.metrics is None:
+                return method(self, *args, **kwargs)
+            start = perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.metrics.add_time(stage, perf_counter() - start)
+        return wrapper
+    return decorator
@@ -0,0 +1,167 @@
+"""
+Local stand-in of the Chronicle Rules API for testing and benchmarking deployments offline.
+
+The server implements creation (POST {parent}/rules), listing (GET {parent}/rules) and text updates (PATCH {name}) of
+rules over HTTP/1.1 with persistent connections. Response latency, rate limiting with 429 responses and random 503 failures can be simulated.
+
+Usage: python -m sigma.backends.chronicle.mock_server [--port 8080] [--latency 0.05] [--rate-limit 100] [--fail-rate 0.01]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+class MockRulesServer:
+    """
+    Rules API stand-in listening on host:port (port 0 selects a free port). Created rules are kept in rules by
+    resource name. At most rate_limit requests per second are accepted, requests above are answered with 429 and a
+    Retry-After header of retry_after seconds. fail_rate is the fraction of requests answered with 503. Rule lists
+    are returned in pages of at most page_size rules.
+    """
+    def __init__(
+            self,
+            host : str = "127.0.0.1",
+            port : int = 0,
+            latency : float = 0.0,
+            rate_limit : Optional[float] = None,
+            retry_after : float = 0.1,
+            fail_rate : float = 0.0,
+            seed : Optional[int] = None,
+            page_size : int = 1000,
+        ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.fail_rate = fail_rate
+        self.random = random.Random(seed)
+        self.page_size = page_size
+        self.rules : Dict[str, str] = {}
+        self.requests = 0           # all received requests
+        self.rejected = 0           # requests answered with 429 or 503
+        self.connections = 0
+        self.window = (0.0, 0)      # start and request count of the current rate limit window of one second
+        self.server : Optional[asyncio.AbstractServer] = None
+        self.handlers : Dict[asyncio.Task, asyncio.StreamWriter] = {}     # open client connections
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            for writer in self.handlers.values():
+                writer.close()
+            await asyncio.gather(*self.handlers, return_exceptions=True)
+            await self.server.wait_closed()
+            self.server = None
+
+    async def __aenter__(self) -> "MockRulesServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.stop()
+
+    async def handle_connection(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter) -> None:
+        self.connections += 1
+        handler = asyncio.current_task()
+        self.handlers[handler] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").rstrip("\r\n")
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, response_headers, response = await self.handle_request(method, target, body)
+                payload = response if isinstance(response, bytes) else json.dumps(response).encode("utf-8")
+                head = f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                head += "".join(f"{name}: {value}\r\n" for name, value in response_headers.items())
+                writer.write(head.encode("latin-1") + b"\r\n" + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            del self.handlers[handler]
+            writer.close()
+
+    def rate_limited(self) -> bool:
+        if self.rate_limit is None:
+            return False
+        now = time.monotonic()
+        start, count = self.window
+        if now - start >= 1.0:
+            start, count = now, 0
+        self.window = (start, count + 1)
+        return count + 1 > self.rate_limit
+
+    async def handle_request(self, method : str, target : str, body : bytes) -> Tuple[int, Dict[str, str], Union[dict, bytes]]:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rate_limited():
+            self.rejected += 1
+            return 429, {"Retry-After": str(self.retry_after)}, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}
+        if self.fail_rate and self.random.random() < self.fail_rate:
+            self.rejected += 1
+            return 503, {}, {"error": {"code": 503, "status": "UNAVAILABLE"}}
+        url = urlsplit(target)
+        name = url.path.strip("/")
+        if method == "GET" and name.endswith("/rules"):
+            return 200, {}, self.list_rules(name, parse_qs(url.query))
+        try:
+            text = json.loads(body)["text"]
+        except (ValueError, KeyError, TypeError):
+            return 400, {}, {"error": {"code": 400, "status": "INVALID_ARGUMENT"}}
+        if method == "POST" and name.endswith("/rules"):
+            name = f"{name}/ru_{len(self.rules) + 1:08d}"
+        elif method != "PATCH" or name not in self.rules:
+            return 404, {}, {"error": {"code": 404, "status": "NOT_FOUND"}}
+        self.rules[name] = text
+        return 200, {}, {"name": name, "text": text}
+
+    def list_rules(self, parent : str, query : Dict[str, List[str]]) -> dict:
+        """Page of the rules below parent, the page token is the index of the first rule of the page."""
+        start = int(query.get("pageToken", ["0"])[0])
+        size = min(int(query.get("pageSize", [str(self.page_size)])[0]), self.page_size)
+        names = sorted(name for name in self.rules if name.startswith(parent + "/"))
+        page = {"rules": [{"name": name, "text": self.rules[name]} for name in names[start:start + size]]}
+        if start + size < len(names):
+            page["nextPageToken"] = str(start + size)
+        return page
+
+async def serve(server : MockRulesServer) -> None:
+    await server.start()
+    print(f"Serving Rules API stand-in on {server.base_url}")
+    await server.server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Response latency in seconds")
+    parser.add_argument("--rate-limit", type=float, help="Accepted requests per second")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests failing with 503")
+    args = parser.parse_args()
+    asyncio.run(serve(MockRulesServer(args.host, args.port, args.latency, args.rate_limit, fail_rate=args.fail_rate)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Simplification of Sigma condition trees before they are rendered into queries."""
+from dataclasses import dataclass, fields
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from sigma.conditions import (
+    ConditionAND,
+    ConditionFieldEqualsValueExpression,
+    ConditionItem,
+    ConditionNOT,
+    ConditionOR,
+    ConditionType,
+    ConditionValueExpression,
+)
+from sigma.types import SigmaRegularExpression, SigmaString
+
+from sigma.backends.chronicle.values import literal, wildcard_kind
+
+@dataclass
+class OptimizerStats:
+    """Counts of the predicates (field and value expressions) of a condition before and after optimization and why predicates were removed."""
+    predicates_before : int = 0
+    predicates_after : int = 0
+    duplicates : int = 0        # predicates removed because they occurred more than once in the same group
+    absorbed : int = 0          # predicates removed by absorption, e.g. A OR (A AND B) = A
+    subsumed : int = 0          # predicates removed because another predicate of the group implies or is implied by them
+    flattened : int = 0         # nested groups merged into their parent group
+
+    @property
+    def removed(self) -> int:
+        return self.predicates_before - self.predicates_after
+
+    def __add__(self, other : "OptimizerStats") -> "OptimizerStats":
+        return OptimizerStats(*(getattr(self, f.name) + getattr(other, f.name) for f in fields(self)))
+
+    def to_dict(self) -> Dict[str, int]:
+        result = {f.name: getattr(self, f.name) for f in fields(self)}
+        result["removed"] = self.removed
+        return result
+
+def count_predicates(cond : ConditionType) -> int:
+    if isinstance(cond, ConditionItem):
+        return sum(count_predicates(arg) for arg in cond.args)
+    return 1
+
+def condition_key(cond : ConditionType) -> Hashable:
+    """Structural key of a condition. Conditions with equal keys are equivalent, the order of AND/OR arguments is irrelevant."""
+    if isinstance(cond, ConditionItem):
+        args = [condition_key(arg) for arg in cond.args]
+        if not isinstance(cond, ConditionNOT):
+            args = sorted(args, key=repr)
+        return (type(cond).__name__, tuple(args))
+    value = cond.value
+    if isinstance(value, SigmaRegularExpression):
+        value_key = (value.regexp, tuple(sorted(flag.name for flag in value.flags)))
+    else:
+        value_key = repr(value)
+    field = cond.field if isinstance(cond, ConditionFieldEqualsValueExpression) else None
+    return (type(cond).__name__, field, type(value).__name__, value_key)
+
+def _match_kind(cond : ConditionType) -> Optional[Tuple[str, str, str]]:
+    """(field, kind, lowercased literal) of case-insensitive string predicates that can be compared by implies."""
+    if not isinstance(cond, ConditionFieldEqualsValueExpression) or type(cond.value) is not SigmaString:
+        return None
+    kind = wildcard_kind(cond.value)
+    if kind is None or kind == "pattern":
+        return None
+    return cond.field, kind, literal(cond.value).lower()
+
+def implies(a : ConditionType, b : ConditionType) -> bool:
+    """
+    Check if every value matched by predicate a is also matched by predicate b, e.g. contains "abc" implies contains
+    "b". Only plain string predicates on the same field are compared, case-insensitively like they are rendered.
+    """
+    return implies_match(_match_kind(a), _match_kind(b))
+
+def implies_match(match_a : Optional[Tuple[str, str, str]], match_b : Optional[Tuple[str, str, str]]) -> bool:
+    if match_a is None or match_b is None or match_a[0] != match_b[0]:
+        return False
+    _, kind_a, value_a = match_a
+    _, kind_b, value_b = match_b
+    if kind_b == "contains":
+        return value_b in value_a
+    elif kind_b == "startswith":
+        return kind_a in ("exact", "startswith") and value_a.startswith(value_b)
+    elif kind_b == "endswith":
+        return kind_a in ("exact", "endswith") and value_a.endswith(value_b)
+    else:
+        return kind_a == "exact" and value_a == value_b
+
+def _link(cond : ConditionType, parent : Optional[ConditionItem]) -> ConditionType:
+    cond.parent = parent
+    return cond
+
+def _group(cond_class, args : List[ConditionType], source) -> ConditionType:
+    """Build an AND/OR node from the arguments or return the argument if only one is left."""
+    if len(args) == 1:
+        return args[0]
+    group = cond_class(args, source)
+    for arg in args:
+        _link(arg, group)
+    return group
+
+def _regroup_fields(cond_class, args : List[ConditionType], source) -> List[ConditionType]:
+    """
+    Group predicates on the same field into a nested group again after flattening, so value lists of a field are
+    still converted as one in-expression (see convert_condition_as_in_expression of the backends).
+    """
+    by_field : Dict[str, List[ConditionFieldEqualsValueExpression]] = {}
+    for arg in args:
+        if isinstance(arg, ConditionFieldEqualsValueExpression):
+            by_field.setdefault(arg.field, []).append(arg)
+    if len(by_field) <= 1 and len(args) == sum(len(group) for group in by_field.values()):
+        return args
+    result = []
+    emitted = set()
+    for arg in args:
+        if isinstance(arg, ConditionFieldEqualsValueExpression) and len(by_field[arg.field]) > 1:
+            if arg.field not in emitted:
+                emitted.add(arg.field)
+                result.append(_group(cond_class, by_field[arg.field], source))
+        else:
+            result.append(arg)
+    return result
+
+def _optimize(cond : ConditionType, stats : OptimizerStats) -> ConditionType:
+    if isinstance(cond, ConditionNOT):
+        arg = _optimize(cond.args[0], stats)
+        if isinstance(arg, ConditionNOT):       # NOT NOT A = A
+            return arg.args[0]
+        negation = ConditionNOT([arg], cond.source)
+        _link(arg, negation)
+        return negation
+    if not isinstance(cond, (ConditionAND, ConditionOR)):
+        return cond
+
+    cond_class = type(cond)
+    dual_class = ConditionOR if cond_class is ConditionAND else ConditionAND
+
+    # Flatten nested groups of the same operator: (A OR (B OR C)) = (A OR B OR C)
+    args = []
+    for arg in cond.args:
+        arg = _optimize(arg, stats)
+        if isinstance(arg, cond_class):
+            args.extend(arg.args)
+            stats.flattened += 1
+        else:
+            args.append(arg)
+
+    # Remove duplicates: (A OR A) = A
+    keys = {}
+    for arg in args:
+        key = condition_key(arg)
+        if key in keys:
+            stats.duplicates += count_predicates(arg)
+        else:
+            keys[key] = arg
+    args = list(keys.values())
+
+    # Absorption: A OR (A AND B) = A and A AND (A OR B) = A
+    absorbed = []
+    for arg in args:
+        if isinstance(arg, dual_class) and any(condition_key(inner) in keys for inner in arg.args):
+            stats.absorbed += count_predicates(arg)
+        else:
+            absorbed.append(arg)
+    args = absorbed
+
+    # Subsumption: in OR groups, predicates implying another predicate are redundant (contains "abc" OR contains "b"
+    # = contains "b"), in AND groups predicates implied by another one (contains "abc" AND contains "b" = contains "abc").
+    # Predicates are classified once and only compared with predicates of the same field. Exact values only imply
+    # equal exact values, they are counted by value instead of being compared pairwise, so large lists of exact values
+    # (e.g. hashes) are linear. Pairs are only compared if one side is a contains, startswith or endswith predicate.
+    by_field : Dict[str, List[Tuple[int, Tuple[str, str, str]]]] = {}
+    for i, arg in enumerate(args):
+        match = _match_kind(arg)
+        if match is not None:
+            by_field.setdefault(match[0], []).append((i, match))
+    removed = set()
+    for matches in by_field.values():
+        exact : Dict[str, int] = {}     # number of remaining exact predicates by value
+        wildcards = []
+        for i, match in matches:
+            if match[1] == "exact":
+                exact[match[2]] = exact.get(match[2], 0) + 1
+            else:
+                wildcards.append((i, match))
+        for i, match in matches:
+            is_exact = match[1] == "exact"
+            if is_exact and exact[match[2]] > 1:
+                subsumed = True
+            elif cond_class is ConditionOR:
+                subsumed = any(j != i and j not in removed and implies_match(match, other) for j, other in wildcards)
+            else:
+                subsumed = not is_exact and any(j != i and j not in removed and implies_match(other, match) for j, other in matches)
+            if subsumed:
+                removed.add(i)
+                stats.subsumed += 1
+                if is_exact:
+                    exact[match[2]] -= 1
+    args = [arg for i, arg in enumerate(args) if i not in removed]
+
+    return _group(cond_class, _regroup_fields(cond_class, args, cond.source), cond.source)
+
+def optimize_condition(cond : ConditionType) -> Tuple[ConditionType, OptimizerStats]:
+    """
+    Simplify a condition tree: flatten nested groups of the same operator, remove duplicate predicates and groups,
+    apply absorption and subsumption of string predicates and remove double negations. Returns the optimized tree
+    and statistics about the removed predicates. Leaf predicates are reused and relinked into the new tree.
+    """
+    stats = OptimizerStats(predicates_before=count_predicates(cond))
+    optimized = _link(_optimize(cond, stats), None)
+    stats.predicates_after = count_predicates(optimized)
+    return optimized, stats
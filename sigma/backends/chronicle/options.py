@@ -0,0 +1,27 @@
+"""Access to backend options that override class variable defaults of the Chronicle backends."""
+from typing import Any
+
+from sigma.conversion.base import Backend
+from sigma.exceptions import SigmaConfigurationError
+
+def backend_option(backend : Backend, name : str) -> Any:
+    """
+    Return the value of an optimization or output option of a backend. The default is the class variable of the same
+    name, it can be overridden per backend instance with backend options, e.g. chronicleBackendUdm(name=value) or
+    `sigma convert -O name=value`. Options passed on the command line are strings and are converted into the type of
+    the default.
+    """
+    default = getattr(type(backend), name)
+    value = backend.backend_options.get(name, default)
+    if not isinstance(value, str) or isinstance(default, str) or default is None:
+        return value
+    try:
+        if isinstance(default, bool):
+            if value.lower() in ("true", "yes", "1"):
+                return True
+            if value.lower() in ("false", "no", "0"):
+                return False
+            raise ValueError(value)
+        return type(default)(value)
+    except ValueError:
+        raise SigmaConfigurationError(f"Invalid value '{value}' for backend option '{name}', expected {type(default).__name__}")
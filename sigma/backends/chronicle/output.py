@@ -0,0 +1,105 @@
+"""NDJSON and Rules API batch output of converted YARA-L rules, written incrementally to file handles."""
+import hashlib
+import json
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from sigma.backends.chronicle.options import backend_option
+from sigma.rule import SigmaRuleBase
+
+if TYPE_CHECKING:
+    from sigma.backends.chronicle.cache import ConversionCache
+    from sigma.backends.chronicle.cost import QueryCost
+    from sigma.backends.chronicle.fingerprint import RuleFingerprint
+    from sigma.backends.chronicle.streaming import RuleSource
+    from sigma.conversion.base import Backend
+
+# Output formats with exactly one line per result, results of other formats are separated by an empty line.
+line_formats = {"ndjson", "rules_api"}
+
+# Envelope of a Rules API batch payload. Entries are inserted between prefix and suffix, separated by the separator,
+# so the size of a batch is known without serializing it again.
+batch_prefix = '{"requests": ['
+batch_separator = ", "
+batch_suffix = "]}"
+
+def content_hash(text : str) -> str:
+    return "sha256:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def rule_record(rule : SigmaRuleBase, text : str, reference_lists : Iterable[str] = (), cost : Optional["QueryCost"] = None, fingerprint : Optional["RuleFingerprint"] = None, shard : Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """
+    NDJSON record of a converted rule. The cost score and the fingerprint are included if the backend estimates query
+    costs or fingerprints rules, the shard number and count if the query of the rule was split into shards.
+    """
+    record = {
+        "id": str(rule.id) if rule.id is not None else None,
+        "title": rule.title,
+        "level": str(rule.level) if rule.level is not None else None,
+        "reference_lists": sorted(set(reference_lists)),
+        "content_hash": content_hash(text),
+        "rule": text,
+    }
+    if cost is not None:
+        record["cost"] = cost.score
+    if fingerprint is not None:
+        record["fingerprint"] = fingerprint.fingerprint
+    if shard is not None:
+        record["shard"], record["shards"] = shard
+    return record
+
+def batch_entry(text : str) -> str:
+    """Serialized request of a Rules API batch creating one rule."""
+    return json.dumps({"rule": {"text": text}})
+
+def batches(entries : Iterable[str], max_bytes : int) -> Iterator[str]:
+    """
+    Group serialized batch entries into Rules API batch payloads of at most max_bytes UTF-8 bytes. Entries are
+    consumed lazily, so only the current batch is held in memory. An entry exceeding the limit on its own is emitted
+    as a batch of one entry.
+    """
+    envelope_size = len(batch_prefix) + len(batch_suffix)
+    batch : List[str] = []
+    size = envelope_size
+    for entry in entries:
+        entry_size = len(entry.encode("utf-8")) + (len(batch_separator) if batch else 0)
+        if batch and size + entry_size > max_bytes:
+            yield batch_prefix + batch_separator.join(batch) + batch_suffix
+            batch = []
+            size = envelope_size
+            entry_size -= len(batch_separator)
+        batch.append(entry)
+        size += entry_size
+    if batch:
+        yield batch_prefix + batch_separator.join(batch) + batch_suffix
+
+def write_stream(
+        backend : "Backend",
+        sources : Iterable["RuleSource"],
+        f : TextIO,
+        output_format : Optional[str] = None,
+        correlation_method : Optional[str] = None,
+        cache : Optional["ConversionCache"] = None,
+        max_bytes : Optional[int] = None,
+        collect_statistics : bool = True,
+    ) -> int:
+    """
+    Convert rule sources with convert_stream and write each result to f as soon as it is converted. Results of the
+    line formats are written one per line: one NDJSON record per rule or, for the rules_api format, one batch payload
+    of at most max_bytes, by default the rules_api_batch_bytes option of the backend. Results of other formats can
+    span several lines, e.g. YARA-L rules, they are separated by an empty line. Returns the number of written results.
+    The per-rule statistics of the backend are cleared after each source unless collect_statistics is set, see
+    convert_stream.
+    """
+    output_format = output_format or backend.default_format
+    outputs = (output for _, output in backend.convert_stream(sources, output_format, correlation_method, cache, collect_statistics))
+    if output_format == "rules_api":
+        outputs = batches(outputs, max_bytes if max_bytes is not None else backend_option(backend, "rules_api_batch_bytes"))
+    separator = "\n" if output_format in line_formats else "\n\n"
+    count = 0
+    for output in outputs:
+        if count:
+            f.write(separator)
+        f.write(output)
+        count += 1
+    if count:
+        f.write("\n")
+    return count
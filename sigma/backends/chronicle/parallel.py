@@ -0,0 +1,154 @@
+"""Conversion of Sigma rule collections in a pool of worker processes."""
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from sigma.backends.chronicle.cost import QueryCost
+from sigma.backends.chronicle.fingerprint import RuleFingerprint
+from sigma.backends.chronicle.metrics import RuleMetrics
+from sigma.backends.chronicle.optimizer import OptimizerStats
+from sigma.backends.chronicle.re2 import RegexFinding
+from sigma.backends.chronicle.reference_lists import ReferenceList
+from sigma.collection import SigmaCollection
+from sigma.correlations import SigmaCorrelationRule
+from sigma.conversion.base import Backend
+from sigma.exceptions import SigmaError
+from sigma.processing.pipeline import ProcessingPipeline
+from sigma.rule import SigmaRule
+
+# Backend instance of the current worker process. It is created once by the pool initializer, so the
+# backend processing pipeline is built once per worker and not once per rule.
+_worker_backend : Optional[Backend] = None
+
+def _init_worker(backend_class : Type[Backend], processing_pipeline : Optional[ProcessingPipeline], backend_options : Dict[str, Any]) -> None:
+    global _worker_backend
+    _worker_backend = backend_class(processing_pipeline=processing_pipeline, **backend_options)
+
+def _picklable_error(error : Exception) -> Exception:
+    """Errors are sent back to the parent process. Replace the ones that can't be pickled by a plain SigmaError."""
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return SigmaError(f"{type(error).__name__}: {error}")
+
+def _worker_metrics() -> List[RuleMetrics]:
+    return list(_worker_backend.metrics.rules) if _worker_backend.metrics is not None else []
+
+def _worker_costs() -> List[QueryCost]:
+    return list(_worker_backend.costs.costs) if _worker_backend.costs is not None else []
+
+def _worker_fingerprints() -> List[RuleFingerprint]:
+    return list(_worker_backend.fingerprints.fingerprints) if _worker_backend.fingerprints is not None else []
+
+def _convert_in_worker(task : Tuple[SigmaRule, str]) -> Tuple[List[Any], Optional[Exception], Dict[str, ReferenceList], Dict[str, OptimizerStats], Dict[str, List[RegexFinding]], List[RuleMetrics], List[QueryCost], List[RuleFingerprint]]:
+    """Convert a rule and return the queries, the error and the reference lists, optimizer statistics, regex findings, metrics, query costs and fingerprints recorded while converting it."""
+    rule, output_format = task
+    _worker_backend.reference_lists.clear()
+    _worker_backend.optimizer_stats.clear()
+    _worker_backend.regex_findings.clear()
+    if _worker_backend.metrics is not None:
+        _worker_backend.metrics.clear()
+    if _worker_backend.costs is not None:
+        _worker_backend.costs.costs.clear()
+    if _worker_backend.fingerprints is not None:
+        _worker_backend.fingerprints.fingerprints.clear()
+    try:
+        queries = _worker_backend.convert_rule(rule, output_format)
+        return queries, None, dict(_worker_backend.reference_lists.lists), dict(_worker_backend.optimizer_stats), dict(_worker_backend.regex_findings), _worker_metrics(), _worker_costs(), _worker_fingerprints()
+    except Exception as e:
+        return [], _picklable_error(e), {}, {}, {}, _worker_metrics(), _worker_costs(), _worker_fingerprints()
+
+def convert_parallel(
+        backend : Backend,
+        rule_collection : SigmaCollection,
+        output_format : Optional[str] = None,
+        correlation_method : Optional[str] = None,
+        workers : Optional[int] = None,
+        chunksize : Optional[int] = None,
+    ) -> Any:
+    """
+    Convert a Sigma rule collection with the given backend, fanning the rules out to a pool of worker processes.
+
+    Each worker builds its own instance of the backend class with the processing pipeline and backend options of
+    the given backend. Results are returned in the order of the rules in the collection, exactly like
+    Backend.convert. Errors are collected per rule in backend.errors as (rule, error) tuples instead of aborting
+    the whole batch. Rules referenced by correlation rules and the correlation rules themselves are converted in
+    the calling process after the pool has finished, because they depend on each other's conversion results.
+    Reference lists, optimizer statistics, regex findings, metrics, query costs and fingerprints recorded in the workers are merged into the backend.
+    """
+    output_format = output_format or backend.default_format
+    workers = workers or os.cpu_count() or 1
+    rule_collection.resolve_rule_references()
+    rules = rule_collection.rules
+    results : List[List[Any]] = [[] for _ in rules]
+
+    referenced = {
+        id(reference.rule)
+        for rule in rules
+        if isinstance(rule, SigmaCorrelationRule)
+        for reference in rule.rules
+    }
+    pooled = [
+        index
+        for index, rule in enumerate(rules)
+        if isinstance(rule, SigmaRule) and id(rule) not in referenced
+    ]
+    if workers <= 1 or len(pooled) <= 1:
+        pooled = []
+
+    if pooled:
+        worker_options = backend.backend_options
+        if backend.metrics is not None:        # collectors assigned to backend.metrics aren't part of the options
+            worker_options = dict(worker_options, collect_metrics=True)
+        if backend.costs is not None:
+            worker_options = dict(worker_options, estimate_cost=True)
+        if backend.fingerprints is not None:
+            worker_options = dict(worker_options, fingerprint_rules=True)
+        workers = min(workers, len(pooled))
+        chunksize = chunksize or max(1, len(pooled) // (workers * 8))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(type(backend), backend.processing_pipeline, worker_options),
+        ) as pool:
+            tasks = ((rules[index], output_format) for index in pooled)
+            for index, (queries, error, reference_lists, optimizer_stats, regex_findings, metrics, costs, fingerprints) in zip(pooled, pool.map(_convert_in_worker, tasks, chunksize=chunksize)):
+                results[index] = queries
+                backend.reference_lists.merge(reference_lists)
+                with backend.lock:      # rules without id that share a title are recorded under the same identifier
+                    for rule_id, stats in optimizer_stats.items():
+                        backend.optimizer_stats[rule_id] = backend.optimizer_stats.get(rule_id, OptimizerStats()) + stats
+                backend.regex_findings.update(regex_findings)
+                if backend.metrics is not None:
+                    backend.metrics.merge(metrics)
+                if backend.costs is not None:
+                    backend.costs.costs.extend(costs)
+                if backend.fingerprints is not None:
+                    backend.fingerprints.fingerprints.extend(fingerprints)
+                if error is not None:
+                    backend.errors.append((rules[index], error))
+
+    pooled_indices = set(pooled)
+    for index, rule in enumerate(rules):
+        if index in pooled_indices:
+            continue
+        try:
+            if isinstance(rule, SigmaRule):
+                results[index] = backend.convert_rule(rule, output_format)
+            else:
+                results[index] = backend.convert_correlation_rule(rule, output_format, correlation_method)
+        except Exception as e:
+            backend.errors.append((rule, e))
+
+    # The finalization step of the backend relies on the pipeline of the last converted rule, which only exists
+    # in the worker processes if all rules were converted in the pool.
+    if not hasattr(backend, "last_processing_pipeline"):
+        backend.last_processing_pipeline = (
+            backend.backend_processing_pipeline
+            + backend.processing_pipeline
+            + backend.output_format_processing_pipeline[output_format]
+        )
+    queries = [query for rule_queries in results for query in rule_queries]
+    return backend.finalize(queries, output_format)
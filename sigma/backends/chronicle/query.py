@@ -0,0 +1,309 @@
+"""
+Parser of the query expressions generated by the Chronicle backends.
+
+Both backends emit the same expression grammar: predicates like `field = "value" nocase`, `field = /regex/ nocase`,
+`field in %list nocase`, `field in cidr %list`, function calls like `re.regex($selection.field, `regex`) nocase` and unbound keywords like
+`"value"`, combined with AND, OR, NOT and parentheses. YARA-L event expressions reference fields through event
+variables like $selection and the events section of a rule is a sequence of such expressions that must all match.
+The parser builds a small syntax tree that is used to analyze generated queries offline.
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+class QuerySyntaxError(ValueError):
+    """Syntax error in a query with the offset, line and column (both starting at 1) of the offending token."""
+    def __init__(self, message : str, text : str, position : int):
+        self.message = message
+        self.text = text
+        self.position = position
+        self.line = text.count("\n", 0, position) + 1
+        self.column = position - (text.rfind("\n", 0, position) + 1) + 1
+        super().__init__(f"{message} at line {self.line}, column {self.column}")
+
+class Token(NamedTuple):
+    kind : str
+    text : str
+    position : int
+
+# Tokens in order of precedence: comments and whitespace are skipped, triple-quoted strings are matched before strings
+# and UDM regular expressions can't start with a slash, so // is always a comment.
+token_kinds = re.compile(r"""
+    (?P<comment>//[^\n]*)
+  | (?P<space>\s+)
+  | (?P<string>\"\"\"(?:\\.|(?!\"\"\").)*\"\"\"|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  | (?P<regex>/(?:\\.|[^/\\\n])+/)
+  | (?P<backtick>`(?:\\.|[^`\\])*`)
+  | (?P<reference_list>%\w+)
+  | (?P<number>-?\d+(?:\.\d+)?(?![\w.]))
+  | (?P<operator>!=|<=|>=|=|<|>)
+  | (?P<punctuation>[(),])
+  | (?P<name>[$#]?[A-Za-z_][\w.]*(?:\[[^\]\n]*\][\w.]*)*)
+""", re.VERBOSE | re.DOTALL)
+
+keywords = frozenset(("and", "or", "not", "nocase", "in", "regex"))
+
+def tokenize(text : str) -> Iterator[Token]:
+    position = 0
+    while position < len(text):
+        match = token_kinds.match(text, position)
+        if match is None:
+            raise QuerySyntaxError(f"Unexpected character {text[position]!r}", text, position)
+        kind = match.lastgroup
+        if kind not in ("comment", "space"):
+            value = match.group()
+            if kind == "name" and value.lower() in keywords:
+                kind = value.lower()
+            elif kind == "punctuation":
+                kind = value
+            yield Token(kind, value, position)
+        position = match.end()
+
+string_escape = re.compile(r"\\(.)", re.DOTALL)
+
+def unquote(text : str) -> str:
+    """Value of a string literal."""
+    quote = 3 if text.startswith('"""') else 1
+    return string_escape.sub(r"\1", text[quote:-quote])
+
+@dataclass
+class Field:
+    path : str                          # field path including the event variable, e.g. $selection.principal.hostname
+    position : int = 0
+
+    @property
+    def name(self) -> str:
+        """UDM field path without event variable."""
+        return self.path.split(".", 1)[1] if self.path.startswith("$") and "." in self.path else self.path
+
+@dataclass
+class Variable:
+    name : str                          # placeholder or match variable like $hostname
+    position : int = 0
+
+@dataclass
+class String:
+    value : str
+    position : int = 0
+
+@dataclass
+class Regex:
+    pattern : str
+    position : int = 0
+
+@dataclass
+class Number:
+    value : Union[int, float]
+    position : int = 0
+
+@dataclass
+class ReferenceList:
+    name : str
+    regex : bool = False                # in regex %list
+    position : int = 0
+    cidr : bool = False                 # in cidr %list
+
+Operand = Union[Field, Variable, String, Regex, Number, ReferenceList, "Call"]
+
+@dataclass
+class Comparison:
+    left : Operand
+    operator : str                      # =, !=, <, <=, >, >= or in
+    right : Operand
+    nocase : bool = False
+    position : int = 0
+
+@dataclass
+class Call:
+    """Function call, used as predicate or as operand of comparisons and other function calls."""
+    name : str                          # function name like re.regex or strings.to_lower
+    args : List[Operand]
+    nocase : bool = False
+    position : int = 0
+
+@dataclass
+class Keyword:
+    """Value not bound to a field, matched against all fields of an event."""
+    value : str
+    position : int = 0
+
+@dataclass
+class Not:
+    arg : "Node"
+    position : int = 0
+
+@dataclass
+class And:
+    args : List["Node"]
+    position : int = 0
+
+@dataclass
+class Or:
+    args : List["Node"]
+    position : int = 0
+
+Node = Union[Comparison, Call, Keyword, Not, And, Or]
+
+class Parser:
+    """Recursive descent parser of a token sequence. NOT binds stronger than AND, AND stronger than OR."""
+    def __init__(self, text : str):
+        self.text = text
+        self.tokens = list(tokenize(text))
+        self.index = 0
+
+    def peek(self) -> Optional[Token]:
+        return self.tokens[self.index] if self.index < len(self.tokens) else None
+
+    def error(self, message : str) -> QuerySyntaxError:
+        token = self.peek()
+        if token is None:
+            return QuerySyntaxError(f"{message}, found end of query", self.text, len(self.text.rstrip()))
+        return QuerySyntaxError(f"{message}, found {token.text!r}", self.text, token.position)
+
+    def accept(self, *kinds : str) -> Optional[Token]:
+        token = self.peek()
+        if token is not None and token.kind in kinds:
+            self.index += 1
+            return token
+        return None
+
+    def expect(self, kind : str, description : str) -> Token:
+        token = self.accept(kind)
+        if token is None:
+            raise self.error(f"Expected {description}")
+        return token
+
+    def statements(self) -> Node:
+        """Sequence of expressions, e.g. the lines of an events section, that must all match."""
+        statements = []
+        while self.peek() is not None:
+            if self.peek().kind == ")":
+                raise self.error("Unbalanced parentheses")
+            statements.append(self.expression())
+        if not statements:
+            raise self.error("Expected expression")
+        return statements[0] if len(statements) == 1 else And(statements, statements[0].position)
+
+    def expression(self) -> Node:
+        first = self.conjunction()
+        args = [first]
+        while self.accept("or"):
+            args.append(self.conjunction())
+        return first if len(args) == 1 else Or(args, first.position)
+
+    def conjunction(self) -> Node:
+        first = self.negation()
+        args = [first]
+        while self.accept("and"):
+            args.append(self.negation())
+        return first if len(args) == 1 else And(args, first.position)
+
+    def negation(self) -> Node:
+        token = self.accept("not")
+        if token is not None:
+            return Not(self.negation(), token.position)
+        return self.primary()
+
+    def primary(self) -> Node:
+        token = self.peek()
+        if token is None:
+            raise self.error("Expected expression")
+        if self.accept("("):
+            expression = self.expression()
+            self.expect(")", "')'")
+            return expression
+        if token.kind == "string" and not self.operator_follows():
+            self.index += 1
+            return Keyword(unquote(token.text), token.position)
+        left = self.operand()
+        if isinstance(left, Call) and (self.peek() is None or self.peek().kind not in ("operator", "in")):
+            left.nocase = self.accept("nocase") is not None
+            return left
+        if self.accept("in"):
+            regex = self.accept("regex") is not None
+            cidr = not regex and self.peek() is not None and self.peek().kind == "name" and self.peek().text.lower() == "cidr"
+            if cidr:
+                self.index += 1
+            name = self.expect("reference_list", "reference list")
+            right = ReferenceList(name.text[1:], regex, name.position, cidr)
+            operator = "in"
+        else:
+            operator = self.expect("operator", "comparison operator").text
+            right = self.operand()
+        return Comparison(left, operator, right, self.accept("nocase") is not None, token.position)
+
+    def operator_follows(self) -> bool:
+        return self.index + 1 < len(self.tokens) and self.tokens[self.index + 1].kind in ("operator", "in")
+
+    def call(self) -> Call:
+        name = self.expect("name", "function name")
+        self.expect("(", "'('")
+        args = []
+        if not self.accept(")"):
+            args.append(self.operand())
+            while self.accept(","):
+                args.append(self.operand())
+            self.expect(")", "')'")
+        return Call(name.text, args, position=name.position)
+
+    def operand(self) -> Operand:
+        token = self.peek()
+        if token is None:
+            raise self.error("Expected operand")
+        # Variables aren't functions, a parenthesis after a variable starts the next statement of an events section.
+        if token.kind == "name" and token.text[0] not in "$#" and self.index + 1 < len(self.tokens) and self.tokens[self.index + 1].kind == "(":
+            return self.call()
+        self.index += 1
+        if token.kind == "name" and token.text.startswith("$") and "." not in token.text:
+            return Variable(token.text, token.position)
+        if token.kind == "name":
+            return Field(token.text, token.position)
+        if token.kind == "string":
+            return String(unquote(token.text), token.position)
+        if token.kind == "regex":
+            return Regex(token.text[1:-1].replace("\\/", "/"), token.position)
+        if token.kind == "backtick":
+            return Regex(token.text[1:-1].replace("\\`", "`"), token.position)
+        if token.kind == "number":
+            return Number(float(token.text) if "." in token.text else int(token.text), token.position)
+        if token.kind == "reference_list":
+            return ReferenceList(token.text[1:], position=token.position)
+        self.index -= 1
+        raise self.error("Expected operand")
+
+def parse_query(text : str) -> Node:
+    """Syntax tree of a UDM query or of the expressions of a YARA-L events section."""
+    return Parser(text).statements()
+
+# Section headers of a YARA-L rule body.
+section_header = re.compile(r"^[ \t]*(meta|events|match|outcome|condition|options):[ \t]*$", re.MULTILINE)
+
+def yaral_sections(text : str) -> Dict[str, Tuple[int, str]]:
+    """Offset and content of the sections of a YARA-L rule or of the sections part of a rule by name."""
+    headers = list(section_header.finditer(text))
+    end = len(text.rstrip()) - 1 if text.rstrip().endswith("}") else len(text)     # closing brace of the rule
+    return {
+        header.group(1): (header.end(), text[header.end():headers[index + 1].start() if index + 1 < len(headers) else end])
+        for index, header in enumerate(headers)
+    }
+
+def parse_events(text : str) -> Node:
+    """Syntax tree of the events section of a YARA-L rule. Errors are located relative to the whole rule text."""
+    offset, events = yaral_sections(text)["events"]
+    try:
+        return parse_query(events)
+    except QuerySyntaxError as e:
+        raise QuerySyntaxError(e.message, text, offset + e.position) from None
+
+def parse_output(text : str) -> Node:
+    """Syntax tree of a UDM query or of the events section of a YARA-L rule."""
+    return parse_events(text) if section_header.search(text) else parse_query(text)
+
+def walk(node : Node) -> Iterator[Node]:
+    """All nodes of a syntax tree, parents before children."""
+    yield node
+    if isinstance(node, (And, Or)):
+        for arg in node.args:
+            yield from walk(arg)
+    elif isinstance(node, Not):
+        yield from walk(node.arg)
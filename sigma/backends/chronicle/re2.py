@@ -0,0 +1,375 @@
+"""
+Translation of Sigma regular expressions into the RE2 syntax evaluated by Chronicle and analysis of their
+compatibility and matching cost.
+
+Sigma regular expressions are written for the Python re module, Chronicle evaluates them with RE2. A pattern is parsed
+once, translated and analyzed:
+
+* Python syntax with an RE2 equivalent is translated: \\Z to \\z, \\uXXXX, \\UXXXXXXXX and \\N{name} to \\x{...}, {,n} to
+  {0,n}, comments (?#...) and the a and u flags are dropped and the delimiter of the regex literal is escaped.
+* Constructs RE2 doesn't support are reported as unsupported: lookarounds, backreferences, atomic groups, possessive
+  quantifiers, conditional groups, the x and L flags and repetitions of more than 1000 copies.
+* Patterns that can match the same text in many ways are reported as slow: nested unbounded quantifiers like (a+)+ and
+  unbounded repetitions of overlapping alternatives like (\\w|\\d)+. RE2 itself matches in linear time, but such patterns
+  blow up the automaton and take super-linear time in backtracking engines the rules are also run with.
+"""
+import re
+import unicodedata
+import warnings
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, FrozenSet, List, Optional, Tuple
+
+from sigma.conversion.state import ConversionState
+from sigma.exceptions import SigmaFeatureNotSupportedByBackendError
+from sigma.types import SigmaRegularExpression, SigmaRegularExpressionFlag
+
+from sigma.backends.chronicle.options import backend_option
+
+if TYPE_CHECKING:
+    from sigma.conversion.base import TextQueryBackend
+
+# Handling of regular expressions with findings, see the regex_policy option of the backends.
+regex_policies = ("allow", "warn", "error")
+
+# RE2 rejects repetition counts above this limit, also as product of nested repetitions.
+max_repeat = 1000
+
+# Characters tested against single-character atoms to decide whether alternatives or repetitions overlap.
+sample_chars = "".join(chr(code) for code in range(32, 127)) + "\t\n\r\x00\x7f\u00e9\u0394\u2028\u4e00"
+
+class RegexWarning(UserWarning):
+    """Regular expression RE2 doesn't support or with a risk of super-linear matching time."""
+
+@dataclass(frozen=True)
+class RegexFinding:
+    """Problem of a regular expression, severity is unsupported or slow and position the offset in the Sigma pattern."""
+    severity : str
+    message : str
+    pattern : str
+    position : int
+    field : Optional[str] = None
+
+    def __str__(self) -> str:
+        subject = f"Regular expression '{self.pattern}'" + (f" of field {self.field}" if self.field is not None else "")
+        return f"{subject} at position {self.position}: {self.message}"
+
+@dataclass
+class RegexNode:
+    """
+    Node of a parsed pattern: a single-character atom with its Python source in text, a group with its alternatives, a
+    repetition of its child between low and high (None for unbounded) times or an assertion matching no characters.
+    """
+    position : int
+    text : Optional[str] = None
+    alternatives : Optional[List[List["RegexNode"]]] = None
+    child : Optional["RegexNode"] = None
+    low : int = 1
+    high : Optional[int] = 1
+
+@lru_cache(maxsize=4096)
+def atom_chars(text : str) -> FrozenSet[str]:
+    """Sample characters matched by a single-character atom, compared case-insensitively like Chronicle does."""
+    try:
+        regex = re.compile(text, re.IGNORECASE)
+    except re.error:
+        return frozenset(sample_chars)
+    return frozenset(char for char in sample_chars if regex.fullmatch(char))
+
+def first_chars(nodes : List[RegexNode]) -> FrozenSet[str]:
+    """Sample characters a sequence of nodes can start with."""
+    chars : FrozenSet[str] = frozenset()
+    for node in nodes:
+        chars |= node_chars(node)
+        if not nullable(node):
+            break
+    return chars
+
+def node_chars(node : RegexNode) -> FrozenSet[str]:
+    if node.child is not None:
+        return node_chars(node.child)
+    if node.alternatives is not None:
+        return frozenset().union(*(first_chars(alternative) for alternative in node.alternatives))
+    return atom_chars(node.text) if node.text is not None else frozenset()
+
+def nullable(node : RegexNode) -> bool:
+    """True if the node can match the empty string."""
+    if node.child is not None:
+        return node.low == 0 or nullable(node.child)
+    if node.alternatives is not None:
+        return any(all(nullable(item) for item in alternative) for alternative in node.alternatives)
+    return node.text is None
+
+class RegexTranslator:
+    """Parser of a Sigma regular expression emitting the translated pattern and collecting findings."""
+    quantifier = re.compile(r"\{(\d*)(?:(,)(\d*))?\}")
+    flags = re.compile(r"([aiLmsux]*)(?:-([imsx]*))?([:)])")
+    octal = re.compile(r"\\[0-7]{3}|\\0[0-7]{0,2}")
+    class_octal = re.compile(r"\\[0-7]{1,3}")      # character classes have no backreferences
+    backreference = re.compile(r"\\[1-9][0-9]?")
+    hex_escapes = {"x": 2, "u": 4, "U": 8}
+
+    def __init__(self, pattern : str, delimiters : str):
+        self.pattern = pattern
+        self.delimiters = delimiters
+        self.index = 0
+        self.output : List[str] = []
+        self.findings : List[RegexFinding] = []
+
+    def translate(self) -> str:
+        alternatives = self.alternation()
+        if self.index < len(self.pattern):      # unbalanced ) that Python rejects
+            raise SigmaFeatureNotSupportedByBackendError(f"Invalid regular expression '{self.pattern}'")
+        self.analyze(RegexNode(0, alternatives=alternatives), None, 1)
+        return "".join(self.output)
+
+    def report(self, severity : str, message : str, position : int) -> None:
+        self.findings.append(RegexFinding(severity, message, self.pattern, position))
+
+    def alternation(self) -> List[List[RegexNode]]:
+        alternatives = [self.sequence()]
+        while self.pattern.startswith("|", self.index):
+            self.output.append("|")
+            self.index += 1
+            alternatives.append(self.sequence())
+        return alternatives
+
+    def sequence(self) -> List[RegexNode]:
+        nodes = []
+        while self.index < len(self.pattern) and self.pattern[self.index] not in "|)":
+            node = self.atom()
+            if node is not None:
+                nodes.append(self.repetition(node))
+        return nodes
+
+    def atom(self) -> Optional[RegexNode]:
+        position = self.index
+        char = self.pattern[position]
+        if char == "(":
+            return self.group()
+        if char == "[":
+            return self.char_class()
+        if char == "\\":
+            return self.escape()
+        self.index += 1
+        if char in "^$":
+            self.output.append(char)
+            return RegexNode(position)
+        self.output.append("\\" + char if char in self.delimiters else char)
+        return RegexNode(position, text=char if char == "." else re.escape(char))
+
+    def repetition(self, node : RegexNode) -> RegexNode:
+        position = self.index
+        char = self.pattern[position] if position < len(self.pattern) else ""
+        if char in ("*", "+", "?"):
+            low, high = {"*": (0, None), "+": (1, None), "?": (0, 1)}[char]
+            self.output.append(char)
+            self.index += 1
+        elif char == "{":
+            match = self.quantifier.match(self.pattern, position)
+            if match is None or not (match.group(1) or match.group(2)):
+                return node         # literal brace
+            low = int(match.group(1) or 0)
+            high = (int(match.group(3)) if match.group(3) else None) if match.group(2) else low
+            self.output.append(f"{{{low}}}" if high == low else f"{{{low},{'' if high is None else high}}}")
+            self.index = match.end()
+            if max(low, high or 0) > max_repeat:
+                self.report("unsupported", f"RE2 doesn't support repetition counts above {max_repeat}", position)
+        else:
+            return node
+        if self.pattern.startswith("?", self.index):
+            self.output.append("?")
+            self.index += 1
+        elif self.pattern.startswith("+", self.index):
+            self.report("unsupported", "RE2 doesn't support possessive quantifiers", self.index)
+            self.output.append("+")
+            self.index += 1
+        return RegexNode(node.position, child=node, low=low, high=high)
+
+    def group(self) -> Optional[RegexNode]:
+        position = self.index
+        rest = self.pattern[position + 2:] if self.pattern.startswith("(?", position) else None
+        node = RegexNode(position)
+        if rest is None:
+            self.output.append("(")
+            self.index += 1
+        elif rest.startswith("#"):
+            self.index = self.pattern.index(")", position) + 1
+            return None
+        elif rest.startswith(("=", "!", "<=", "<!")):
+            self.report("unsupported", "RE2 doesn't support lookahead and lookbehind assertions", position)
+            self.copy(3 if rest[0] != "<" else 4)
+            self.alternation()      # assertions match no characters, their content isn't analyzed
+            self.close()
+            return node
+        elif rest.startswith("P="):
+            self.report("unsupported", "RE2 doesn't support backreferences", position)
+            self.copy(self.pattern.index(")", position) + 1 - position)
+            return node
+        elif rest.startswith(">"):
+            self.report("unsupported", "RE2 doesn't support atomic groups", position)
+            self.copy(3)
+        elif rest.startswith("("):
+            self.report("unsupported", "RE2 doesn't support conditional groups", position)
+            self.copy(self.pattern.index(")", position) + 1 - position)
+        elif rest.startswith("P<"):
+            self.copy(self.pattern.index(">", position) + 1 - position)
+        elif rest.startswith(":"):
+            self.copy(3)
+        else:
+            match = self.flags.match(self.pattern, position + 2)
+            enabled, disabled = match.group(1), match.group(2) or ""
+            for flag in sorted(set(enabled + disabled) & set("xL")):
+                self.report("unsupported", f"RE2 doesn't support the {flag} flag", position)
+            enabled = "".join(flag for flag in enabled if flag not in "au")
+            flags = enabled + ("-" + disabled if disabled else "")
+            self.index = match.end()
+            if match.group(3) == ")":
+                if flags:
+                    self.output.append(f"(?{flags})")
+                return None
+            self.output.append(f"(?{flags}:")
+        node.alternatives = self.alternation()
+        self.close()
+        return node
+
+    def copy(self, length : int) -> None:
+        self.output.append(self.pattern[self.index:self.index + length])
+        self.index += length
+
+    def close(self) -> None:
+        if not self.pattern.startswith(")", self.index):
+            raise SigmaFeatureNotSupportedByBackendError(f"Invalid regular expression '{self.pattern}': missing ) at position {self.index}")
+        self.output.append(")")
+        self.index += 1
+
+    def escape(self) -> RegexNode:
+        position = self.index
+        match = self.octal.match(self.pattern, position)
+        if match is None and self.backreference.match(self.pattern, position):
+            match = self.backreference.match(self.pattern, position)
+            self.report("unsupported", "RE2 doesn't support backreferences", position)
+            self.copy(match.end() - position)
+            return RegexNode(position)
+        if match is None and self.pattern[position + 1] in "AbBZ":
+            self.output.append("\\z" if self.pattern[position + 1] == "Z" else self.pattern[position:position + 2])
+            self.index += 2
+            return RegexNode(position)
+        source, translated = self.escape_sequence(position)
+        self.output.append(translated)
+        return RegexNode(position, text=source)
+
+    def escape_sequence(self, position : int, in_class : bool = False) -> Tuple[str, str]:
+        """Python source and RE2 translation of the escape sequence at position, the index is advanced past it."""
+        char = self.pattern[position + 1]
+        match = (self.class_octal if in_class else self.octal).match(self.pattern, position)
+        if match is not None:
+            end = match.end()
+            translated = f"\\x{{{int(self.pattern[position + 1:end], 8):x}}}"
+        elif char in self.hex_escapes:
+            end = position + 2 + self.hex_escapes[char]
+            translated = self.pattern[position:end] if char == "x" else f"\\x{{{int(self.pattern[position + 2:end], 16):x}}}"
+        elif char == "N":
+            end = self.pattern.index("}", position) + 1
+            translated = f"\\x{{{ord(unicodedata.lookup(self.pattern[position + 3:end - 1])):x}}}"
+        else:
+            end = position + 2
+            translated = self.pattern[position:end]
+        self.index = end
+        return self.pattern[position:end], translated
+
+    def char_class(self) -> RegexNode:
+        position = self.index
+        self.output.append("[")
+        self.index += 1
+        for prefix in ("^", "]"):
+            if self.pattern.startswith(prefix, self.index):
+                self.output.append("\\]" if prefix == "]" else prefix)
+                self.index += 1
+        while self.pattern[self.index] != "]":
+            char = self.pattern[self.index]
+            if char == "\\":
+                self.output.append(self.escape_sequence(self.index, in_class=True)[1])
+                continue
+            self.output.append("\\" + char if char in self.delimiters or char == "[" else char)
+            self.index += 1
+        self.output.append("]")
+        self.index += 1
+        return RegexNode(position, text=self.pattern[position:self.index])
+
+    def analyze(self, node : RegexNode, loop : Optional[RegexNode], copies : int) -> None:
+        """
+        Report the slow and oversized repetitions below node, loop is the innermost enclosing unbounded repetition and
+        copies the number of copies the enclosing counted repetitions expand into.
+        """
+        if node.child is not None:
+            copies *= max(node.low if node.high is None else node.high, 1)
+            if copies > max_repeat and max(node.low, node.high or 0) <= max_repeat:
+                self.report("unsupported", f"Nested repetitions expand into {copies} copies, RE2 supports at most {max_repeat}", node.position)
+                copies = 1
+            if node.high is None:
+                self.check_loop(node)
+                loop = node
+            self.analyze(node.child, loop, copies)
+        elif node.alternatives is not None:
+            for alternative in node.alternatives:
+                for item in alternative:
+                    self.analyze(item, loop, copies)
+
+    def check_loop(self, loop : RegexNode) -> None:
+        """Report an unbounded repetition whose iterations can split a text in many ways."""
+        body = loop.child
+        if body.alternatives is None:
+            return
+        starts = node_chars(body)
+        for alternative in body.alternatives:
+            for index, item in enumerate(alternative):
+                if item.child is None or item.high is not None:
+                    continue
+                rest = alternative[index + 1:]
+                follow = first_chars(rest) | (starts if all(nullable(node) for node in rest) else frozenset())
+                if node_chars(item.child) & follow:
+                    self.report("slow", "Nested unbounded quantifiers can match the same text in many ways", loop.position)
+                    return
+        firsts = [first_chars(alternative) for alternative in body.alternatives]
+        ambiguous = any(len(alternative) == 1 for alternative in body.alternatives)
+        if ambiguous and any(firsts[i] & firsts[j] for i in range(len(firsts)) for j in range(i + 1, len(firsts))):
+            self.report("slow", "Alternatives of an unbounded repetition can match the same text", loop.position)
+
+@lru_cache(maxsize=4096)
+def translate_regex(pattern : str, delimiters : str = "/") -> Tuple[str, Tuple[RegexFinding, ...]]:
+    """RE2 translation of a Python regular expression with the delimiters escaped and the findings of its analysis."""
+    translator = RegexTranslator(pattern, delimiters)
+    return translator.translate(), tuple(translator.findings)
+
+def convert_regex(backend : "TextQueryBackend", field_name : str, regex : SigmaRegularExpression, state : ConversionState) -> str:
+    """
+    Regular expression of a field match rendered for the regex literal of the backend. The m and s flags of the Sigma
+    regex become inline RE2 flags, the i flag is implied by the nocase of the match. Findings are recorded in the
+    conversion state for the per-rule report and handled according to the regex_policy option.
+    """
+    pattern, findings = translate_regex(regex.regexp, "".join(backend.re_escape))
+    flags = "".join(sorted(backend.re_flags[flag] for flag in regex.flags if flag is not SigmaRegularExpressionFlag.IGNORECASE))
+    findings = tuple(RegexFinding(finding.severity, finding.message, finding.pattern, finding.position, field_name) for finding in findings)
+    state.processing_state.setdefault("regex_findings", {})[(field_name, regex.regexp)] = findings
+    policy = backend_option(backend, "regex_policy")
+    if findings and policy == "error":
+        raise SigmaFeatureNotSupportedByBackendError("; ".join(str(finding) for finding in findings))
+    if policy == "warn":
+        for finding in findings:
+            warnings.warn(str(finding), RegexWarning)
+    return f"(?{flags}){pattern}" if flags else pattern
+
+def rule_findings(state : ConversionState) -> List[RegexFinding]:
+    """Findings of the regular expressions converted for a rule in the order they were converted."""
+    return [finding for findings in state.processing_state.get("regex_findings", {}).values() for finding in findings]
+
+re2_escape = re.compile(r"\\(?:x\{([0-9A-Fa-f]+)\}|z|.)", re.DOTALL)
+
+def python_regex(pattern : str) -> str:
+    """Python equivalent of a pattern in the RE2 syntax generated by translate_regex, used to evaluate queries offline."""
+    def replace(match : re.Match) -> str:
+        if match.group(1) is not None:
+            return f"\\U{int(match.group(1), 16):08x}"
+        return "\\Z" if match.group() == "\\z" else match.group()
+    return re2_escape.sub(replace, pattern)
@@ -0,0 +1,151 @@
+"""Chronicle reference lists generated from large value lists and Sigma placeholders."""
+import hashlib
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+@dataclass
+class ReferenceList:
+    """
+    Reference list used by converted rules. Lists generated from value lists contain their values, lists generated
+    from Sigma placeholders have no values, their content must be provided in Chronicle before the rules are deployed.
+    The syntax is the Chronicle syntax type of the list entries, "string" or "cidr" for lists of CIDR networks.
+    """
+    name : str
+    values : Optional[List[str]] = None
+    rules : Set[str] = field(default_factory=set)
+    syntax : str = "string"
+
+    @property
+    def placeholder(self) -> bool:
+        return self.values is None
+
+    def content_hash(self) -> Optional[str]:
+        return values_hash(self.values) if self.values is not None else None
+
+def values_hash(values : Iterable[str]) -> str:
+    """Hash of the content of a value list, independent from the order and duplicates of the values."""
+    return hashlib.sha256("\n".join(sorted(set(values))).encode("utf-8")).hexdigest()
+
+def list_name(values : Iterable[str], syntax : str = "string") -> str:
+    """Name of the reference list containing the given values. Lists with equal content and syntax get the same name."""
+    return ("sigma_" if syntax == "string" else f"sigma_{syntax}_") + values_hash(values)[:16]
+
+def placeholder_list_name(placeholder : str) -> str:
+    """Name of the reference list for a placeholder: the placeholder name restricted to characters allowed in list names."""
+    return re.sub(r"\W", "_", placeholder)
+
+class ReferenceLists:
+    """
+    Registry of the reference lists used by the rules converted by a backend instance. Lists are deduplicated by
+    their content, so every list only has to be uploaded once, even if it is used by many rules.
+    """
+    manifest_name = "reference_lists.json"
+
+    def __init__(self):
+        self.lists : Dict[str, ReferenceList] = {}
+        self.lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self.lists)
+
+    def __contains__(self, name : str) -> bool:
+        return name in self.lists
+
+    def __getitem__(self, name : str) -> ReferenceList:
+        return self.lists[name]
+
+    def add_values(self, values : Iterable[str], syntax : str = "string") -> str:
+        """Register a list with the given values and syntax and return its name."""
+        values = sorted(set(values))
+        name = list_name(values, syntax)
+        with self.lock:
+            self.lists.setdefault(name, ReferenceList(name, values, syntax=syntax))
+        return name
+
+    def add_placeholder(self, placeholder : str) -> str:
+        """Register the list for a Sigma placeholder and return its name."""
+        name = placeholder_list_name(placeholder)
+        with self.lock:
+            self.lists.setdefault(name, ReferenceList(name))
+        return name
+
+    def add_rule(self, name : str, rule_id : str) -> None:
+        """Record that a list is used by the given rule."""
+        with self.lock:
+            self.lists[name].rules.add(rule_id)
+
+    def merge(self, lists : Union["ReferenceLists", Dict[str, ReferenceList]]) -> None:
+        """Merge lists registered elsewhere, e.g. in a worker process, into this registry."""
+        if isinstance(lists, ReferenceLists):
+            lists = lists.lists
+        with self.lock:
+            for name, reference_list in lists.items():
+                known = self.lists.setdefault(name, ReferenceList(name, reference_list.values, syntax=reference_list.syntax))
+                known.rules.update(reference_list.rules)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.lists.clear()
+
+    def clear_rules(self) -> None:
+        """Forget the rules using the lists but keep the lists and their values, which are still needed to deploy them."""
+        with self.lock:
+            for reference_list in self.lists.values():
+                reference_list.rules.clear()
+
+    def for_rules(self, rule_ids : Iterable[str]) -> Dict[str, ReferenceList]:
+        """Lists used by the given rules, only recording these rules as users of the lists."""
+        rule_ids = set(rule_ids)
+        with self.lock:
+            return {
+                name: ReferenceList(name, reference_list.values, reference_list.rules & rule_ids, reference_list.syntax)
+                for name, reference_list in self.lists.items()
+                if reference_list.rules & rule_ids
+            }
+
+    @staticmethod
+    def serialize(lists : Dict[str, ReferenceList]) -> Dict[str, dict]:
+        """JSON-serializable representation of lists."""
+        return {
+            name: {"values": reference_list.values, "rules": sorted(reference_list.rules), "syntax": reference_list.syntax}
+            for name, reference_list in lists.items()
+        }
+
+    @staticmethod
+    def deserialize(data : Dict[str, dict]) -> Dict[str, ReferenceList]:
+        """Lists from their serialized representation, see serialize."""
+        return {
+            name: ReferenceList(name, item["values"], set(item["rules"]), item.get("syntax", "string"))
+            for name, item in data.items()
+        }
+
+    def write(self, directory : Union[str, Path]) -> List[Path]:
+        """
+        Write one file per list with one value per line and a manifest describing all lists into the given directory.
+        Placeholder lists have no file, they are only described in the manifest. Returns the written paths.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        written = []
+        manifest = {}
+        for name, reference_list in sorted(self.lists.items()):
+            manifest[name] = {
+                "file": None,
+                "placeholder": reference_list.placeholder,
+                "syntax": reference_list.syntax,
+                "content_hash": reference_list.content_hash(),
+                "rules": sorted(reference_list.rules),
+            }
+            if not reference_list.placeholder:
+                path = directory / (name + ".txt")
+                path.write_text("".join(value + "\n" for value in reference_list.values), encoding="utf-8")
+                manifest[name]["file"] = path.name
+                written.append(path)
+        manifest_path = directory / self.manifest_name
+        manifest_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        written.append(manifest_path)
+        return written
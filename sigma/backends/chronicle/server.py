@@ -0,0 +1,360 @@
+"""
+Resident conversion server keeping the Chronicle backends warm for interactive conversions of single rules.
+
+Converting a rule takes milliseconds once Python, pySigma and the processing pipeline are loaded, so the server loads
+them once per worker process and converts requests from an asyncio event loop. Requests arriving while all workers
+are busy are batched, each batch is converted by one worker with a single round trip to the pool.
+
+HTTP API (HTTP/1.1 with persistent connections, over TCP or a Unix socket):
+
+    POST /convert?backend=yaral&format=default      Sigma rule YAML as body, or a JSON object with the keys rule,
+                                                    backend and format
+    GET /health                                     Status and request counters
+
+Responses are JSON objects with the output of the backend, the reference lists used by the rules, the conversion
+errors per rule and the conversion time, or an error message with status 400.
+
+Usage: python -m sigma.backends.chronicle.server [--port 8000 | --unix /run/sigma.sock] [--workers 4] [--option name=value]
+"""
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from sigma.collection import SigmaCollection
+
+from sigma.backends.chronicle.reference_lists import ReferenceLists
+from sigma.backends.chronicle.streaming import rule_identifier
+
+# Rule converted by each backend when a worker starts, so the processing pipeline and all lazily imported modules are
+# loaded before the first request.
+warmup_rule = """
+title: Warmup
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        CommandLine|contains: warmup
+    condition: sel
+"""
+
+class ConversionWorker:
+    """Warm instances of both backends converting requests one at a time, one per worker process or thread."""
+    def __init__(self, backend_options : Optional[Dict[str, Any]] = None):
+        from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+
+        backend_options = dict(backend_options or {})
+        self.backends = {
+            "udm": chronicleBackendUdm(collect_errors=True, **backend_options),
+            "yaral": chronicleBackendYaral(collect_errors=True, **backend_options),
+        }
+        for backend in self.backends.values():
+            backend.convert(SigmaCollection.from_yaml(warmup_rule))
+            self.reset(backend)
+
+    @staticmethod
+    def reset(backend : Any) -> None:
+        """Clear the state a backend collects across conversions, so it doesn't grow with the number of requests."""
+        backend.clear_statistics()
+        backend.errors.clear()
+        backend.reference_lists.clear()
+
+    def convert(self, request : Dict[str, Any]) -> Dict[str, Any]:
+        """Convert the rules of a request, see ConversionService.convert for the request and response format."""
+        start = perf_counter()
+        backend = None
+        try:
+            name = request.get("backend") or "yaral"
+            if not isinstance(name, str) or name not in self.backends:
+                return {"error": f"Unknown backend '{name}', expected one of {', '.join(self.backends)}"}
+            backend = self.backends[name]
+            output_format = request.get("format") or "default"
+            if not isinstance(output_format, str) or output_format not in backend.formats:
+                return {"error": f"Unknown output format '{output_format}', expected one of {', '.join(backend.formats)}"}
+            rules = SigmaCollection.from_yaml(request.get("rule") or "")
+            output = backend.convert(rules, output_format)
+            return {
+                "output": output,
+                "reference_lists": ReferenceLists.serialize(backend.reference_lists.lists),
+                "errors": [
+                    {"rule": rule_identifier(rule) if rule is not None else None, "error": str(error)}
+                    for rule, error in backend.errors
+                ],
+                "seconds": perf_counter() - start,
+            }
+        except Exception as e:      # errors of one request must not fail the other requests of its batch
+            return {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            if backend is not None:
+                self.reset(backend)
+
+    def convert_batch(self, requests : List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [self.convert(request) for request in requests]
+
+# Worker of the current pool process, created once by the pool initializer.
+_worker : Optional[ConversionWorker] = None
+
+def _init_worker(backend_options : Dict[str, Any]) -> None:
+    global _worker
+    _worker = ConversionWorker(backend_options)
+
+def _convert_in_worker(requests : List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return _worker.convert_batch(requests)
+
+def _ping() -> None:
+    pass
+
+class ConversionService:
+    """
+    Asynchronous conversion API. Requests are queued and converted by a pool of workers processes, each holding warm
+    backend instances. With workers=0, a worker thread of the current process is used instead. Whenever a worker
+    becomes free, up to batch_size queued requests are sent to it as one batch; after the first request of a batch,
+    the service waits up to batch_delay seconds for further requests. Backend options apply to all conversions.
+    """
+    def __init__(
+            self,
+            workers : Optional[int] = None,
+            backend_options : Optional[Dict[str, Any]] = None,
+            batch_size : int = 32,
+            batch_delay : float = 0.0,
+        ):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.backend_options = dict(backend_options or {})
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.requests = 0           # converted requests
+        self.batches = 0            # batches sent to the workers
+        self.executor : Optional[Executor] = None
+        self.convert_batch : Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None
+        self.queue : Optional["asyncio.Queue[Tuple[Dict[str, Any], asyncio.Future]]"] = None
+        self.dispatcher : Optional[asyncio.Task] = None
+        self.pending : set = set()      # batches being converted
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.workers > 0:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.backend_options,))
+            self.convert_batch = _convert_in_worker
+            await asyncio.gather(*(loop.run_in_executor(self.executor, _ping) for _ in range(self.workers)))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sigma-conversion")
+            worker = await loop.run_in_executor(self.executor, ConversionWorker, self.backend_options)
+            self.convert_batch = worker.convert_batch
+        self.queue = asyncio.Queue()
+        self.dispatcher = asyncio.create_task(self.dispatch(max(self.workers, 1)))
+
+    async def stop(self) -> None:
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            await asyncio.gather(self.dispatcher, *self.pending, return_exceptions=True)
+            self.dispatcher = None
+        while self.queue is not None and not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            future.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    async def __aenter__(self) -> "ConversionService":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.stop()
+
+    async def convert(self, rule : str, backend : str = "yaral", output_format : str = "default") -> Dict[str, Any]:
+        """
+        Convert the rules of a Sigma YAML document with the udm or yaral backend. Returns a dict with the output of
+        the backend, the serialized reference lists used by the rules (see ReferenceLists.serialize), the errors of
+        rules that couldn't be converted as list of dicts with rule and error, and the conversion time in seconds. If
+        the request is invalid, the dict only contains an error message.
+        """
+        if self.queue is None:
+            raise RuntimeError("Conversion service isn't started")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(({"rule": rule, "backend": backend, "format": output_format}, future))
+        return await future
+
+    async def dispatch(self, slots : int) -> None:
+        """Send batches of queued requests to the workers, with at most one batch per worker in flight."""
+        loop = asyncio.get_running_loop()
+        free = asyncio.Semaphore(slots)
+        while True:
+            await free.acquire()
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self.run_batch(batch))
+            self.pending.add(task)
+            task.add_done_callback(lambda task: (self.pending.discard(task), free.release()))
+
+    async def run_batch(self, batch : List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        self.batches += 1
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, self.convert_batch, [request for request, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.requests += len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+class ConversionServer:
+    """
+    HTTP front end of a conversion service, listening on host:port (port 0 selects a free port) or on a Unix socket
+    if path is given. Request bodies are limited to max_body bytes.
+    """
+    def __init__(self, service : ConversionService, host : str = "127.0.0.1", port : int = 0, path : Optional[str] = None, max_body : int = 1024 * 1024):
+        self.service = service
+        self.host = host
+        self.port = port
+        self.path = path
+        self.max_body = max_body
+        self.server : Optional[asyncio.AbstractServer] = None
+        self.handlers : Dict[asyncio.Task, asyncio.StreamWriter] = {}     # open client connections
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        if self.path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_connection, self.path)
+            return self.path
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            for writer in self.handlers.values():
+                writer.close()
+            await asyncio.gather(*self.handlers, return_exceptions=True)
+            await self.server.wait_closed()
+            self.server = None
+
+    async def __aenter__(self) -> "ConversionServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.stop()
+
+    async def handle_connection(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter) -> None:
+        handler = asyncio.current_task()
+        self.handlers[handler] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").rstrip("\r\n")
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > self.max_body:
+                    status, response = 413, {"error": f"Request body exceeds {self.max_body} bytes"}
+                    headers["connection"] = "close"
+                else:
+                    body = await reader.readexactly(length)
+                    try:
+                        status, response = await self.handle_request(method, target, headers, body)
+                    except Exception as e:      # the client gets a response instead of a closed connection
+                        status, response = 500, {"error": f"{type(e).__name__}: {e}"}
+                payload = json.dumps(response).encode("utf-8")
+                head = f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+                writer.write(head.encode("latin-1") + payload)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            del self.handlers[handler]
+            writer.close()
+
+    async def handle_request(self, method : str, target : str, headers : Dict[str, str], body : bytes) -> Tuple[int, Dict[str, Any]]:
+        url = urlsplit(target)
+        if url.path == "/health" and method == "GET":
+            return 200, {"status": "ok", "workers": self.service.workers, "requests": self.service.requests, "batches": self.service.batches}
+        if url.path != "/convert":
+            return 404, {"error": f"Unknown path {url.path}"}
+        if method != "POST":
+            return 405, {"error": "Conversions must be requested with POST"}
+        request = dict(parse_qsl(url.query))
+        try:
+            if headers.get("content-type", "").startswith("application/json"):
+                content = json.loads(body)
+                if not isinstance(content, dict):
+                    raise ValueError("JSON body isn't an object")
+                request.update(content)
+            else:
+                request["rule"] = body.decode("utf-8")
+        except (ValueError, TypeError):
+            return 400, {"error": "Request body must be a JSON object or UTF-8 encoded YAML"}
+        if not isinstance(request.get("rule"), str):
+            return 400, {"error": "Missing rule"}
+        for key in ("backend", "format"):
+            if request.get(key) is not None and not isinstance(request[key], str):
+                return 400, {"error": f"The {key} of a request must be a string"}
+        result = await self.service.convert(request["rule"], request.get("backend") or "yaral", request.get("format") or "default")
+        return 400 if "error" in result else 200, result
+
+def option_value(text : str) -> Tuple[str, Any]:
+    """Backend option given as name=value, with the value parsed as JSON if possible."""
+    name, separator, value = text.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"Expected name=value, found '{text}'")
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+async def serve(service : ConversionService, server : ConversionServer) -> None:
+    async with service, server:
+        print(f"Serving conversions on {server.path or server.base_url} with {service.workers} workers")
+        await server.server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--unix", help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, help="Worker processes, default: number of CPUs, 0 converts in a thread of the server process")
+    parser.add_argument("--batch-size", type=int, default=32, help="Maximum requests converted as one batch")
+    parser.add_argument("--batch-delay", type=float, default=0.0, help="Seconds to wait for further requests of a batch")
+    parser.add_argument("--option", type=option_value, action="append", default=[], help="Backend option as name=value, can be repeated")
+    args = parser.parse_args()
+    service = ConversionService(args.workers, dict(args.option), args.batch_size, args.batch_delay)
+    try:
+        asyncio.run(serve(service, ConversionServer(service, args.host, args.port, args.unix)))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
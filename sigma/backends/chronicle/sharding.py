@@ -0,0 +1,154 @@
+"""
+Splitting of queries whose finalized text exceeds the max_query_bytes size budget of the Chronicle backends into shards.
+
+A query containing a disjunction that isn't negated matches an event if and only if one of the queries in which the
+disjunction is replaced by a part of its terms matches it. Oversized queries are split at their largest such
+disjunction into shards that fit into the budget, repeated on other disjunctions while a shard is still too large. Terms
+are assigned to shards in the order of their rendered text, so the shards of a rule don't depend on the order of its
+values and adding a value only changes the shards following it.
+"""
+from typing import TYPE_CHECKING, Any, Callable, Iterable, List, Optional, Tuple
+
+from sigma.conditions import ConditionItem, ConditionNOT, ConditionOR
+from sigma.conversion.state import ConversionState
+from sigma.exceptions import SigmaConversionError
+from sigma.rule import SigmaRuleBase
+from sigma.backends.chronicle.cost import QueryCost, estimate_cost
+from sigma.backends.chronicle.fingerprint import RuleFingerprint, canonical_condition
+from sigma.backends.chronicle.options import backend_option
+from sigma.backends.chronicle.output import content_hash
+from sigma.backends.chronicle.streaming import rule_identifier
+
+if TYPE_CHECKING:
+    from sigma.conversion.base import Backend
+
+class QueryShards(list):
+    """Finalized queries of the shards of one query, flattened into the output of the rule by flatten_shards."""
+
+def query_size(query : str) -> int:
+    return len(query.encode("utf-8"))
+
+def flatten_shards(queries : Iterable[Any]) -> List[Any]:
+    """Output of a rule with the shards of its queries in place of the queries."""
+    return [shard for query in queries for shard in (query if isinstance(query, QueryShards) else (query,))]
+
+def disjunctions(cond : ConditionItem, negated : bool = False) -> Iterable[ConditionOR]:
+    """Disjunctions with more than one term in a condition tree that aren't negated by a NOT above them."""
+    if isinstance(cond, ConditionOR) and not negated and len(cond.args) > 1:
+        yield cond
+    for arg in getattr(cond, "args", ()):
+        if isinstance(arg, ConditionItem):
+            yield from disjunctions(arg, negated != isinstance(cond, ConditionNOT))
+
+def pack_terms(sizes : List[int], capacity : int, separator : int) -> List[List[int]]:
+    """Consecutive groups of term indices whose sizes including separators fit into capacity, at least two groups."""
+    groups : List[List[int]] = []
+    size = 0
+    for index, term_size in enumerate(sizes):
+        if groups and size + separator + term_size <= capacity:
+            groups[-1].append(index)
+            size += separator + term_size
+        else:
+            groups.append([index])
+            size = term_size
+    if len(groups) == 1:
+        middle = len(sizes) // 2
+        groups = [groups[0][:middle], groups[0][middle:]]
+    return groups
+
+def finalization_estimates(backend : "Backend", rule : SigmaRuleBase, query : str, state : ConversionState) -> Tuple[Optional[QueryCost], Optional[RuleFingerprint]]:
+    """
+    Cost and fingerprint a query is finalized with if the backend collects them, without recording them. The
+    fingerprint is a placeholder, fingerprints of all shards are hashes of the same size.
+    """
+    cost = estimate_cost(query, rule_identifier(rule)) if backend.costs is not None else None
+    fingerprint = None
+    if backend.fingerprints is not None and "canonical_condition" in state.processing_state:
+        fingerprint = RuleFingerprint(rule_identifier(rule), content_hash(""), None)
+    return cost, fingerprint
+
+def split_query(
+        backend : "Backend",
+        cond : ConditionItem,
+        query : Any,
+        state : ConversionState,
+        convert : Callable[[ConditionItem, ConversionState], Any],
+        size : Callable[[str, Optional[Tuple[int, int]]], int],
+    ) -> None:
+    """
+    Split the query converted from the root of a condition tree into shards if its finalized text exceeds the
+    max_query_bytes option of the backend. size returns the UTF-8 size of the finalized text of a query with the given
+    shard number. The shards are recorded in the conversion state as (query, reference lists, canonical condition)
+    tuples and finalized as separate queries. Raises a SigmaConversionError if the query can't be split, e.g. because
+    it contains no disjunction or counts events in an aggregation.
+    """
+    budget = backend_option(backend, "max_query_bytes")
+    if not isinstance(query, str) or size(query, None) <= budget:
+        return
+    if any(state.processing_state.get("aggregations", ())):
+        raise SigmaConversionError(f"Query of {size(query, None)} bytes exceeds max_query_bytes of {budget} and queries with aggregations can't be split")
+    reference_lists : List[str] = state.processing_state.setdefault("reference_lists", [])
+    rule_lists = len(reference_lists)
+
+    def render() -> Tuple[str, List[str], Any]:
+        start = len(reference_lists)
+        query = convert(cond, state)
+        shard_lists = reference_lists[start:]
+        del reference_lists[start:]
+        return query, shard_lists, canonical_condition(cond) if backend.fingerprints is not None else None
+
+    def shards(query : str, number : Tuple[int, int]) -> List[Tuple[str, List[str], Any]]:
+        # The comments or the meta section of the finalized query take the same room in all shards, apart from the
+        # cost, which is why each shard is measured again after it's rendered.
+        room = budget - (size(query, number) - query_size(query))
+        if room <= 0:
+            raise SigmaConversionError(f"Finalized query without its condition exceeds max_query_bytes of {budget}")
+        candidates = [(query_size(convert(node, state)), node) for node in disjunctions(cond)]
+        del reference_lists[rule_lists:]
+        if not candidates:
+            raise SigmaConversionError(f"Query of {size(query, number)} bytes exceeds max_query_bytes of {budget} and contains no disjunction it can be split at")
+        node_size, node = max(candidates, key=lambda candidate: candidate[0])
+        terms = sorted(((convert(arg, state), arg) for arg in node.args), key=lambda term: term[0])
+        del reference_lists[rule_lists:]
+        separator = len(backend.token_separator + backend.or_token + backend.token_separator)
+        # If the rest of the query takes more than half of the room, the disjunction is halved and the other
+        # disjunctions are split in turn, which keeps the number of shards low for several large disjunctions.
+        capacity = room - (query_size(query) - node_size)
+        if capacity < room // 2:
+            capacity = max(capacity, node_size // 2)
+        args = node.args
+        result = []
+        try:
+            for group in pack_terms([query_size(text) for text, _ in terms], capacity, separator):
+                node.args = [terms[index][1] for index in group]
+                shard = render()
+                result.extend(shards(shard[0], number) if size(shard[0], number) > budget else [shard])
+        finally:
+            node.args = args
+        return result
+
+    # Shards are measured with a shard number of as many digits as the number of shards, which is only known
+    # afterwards, so the query is split again in the rare case of more shards than expected.
+    digits = 1
+    result = shards(query, (10 ** digits - 1, 10 ** digits - 1))
+    while len(str(len(result))) > digits:
+        digits = len(str(len(result)))
+        result = shards(query, (10 ** digits - 1, 10 ** digits - 1))
+    state.processing_state["query_shards"] = result
+
+def shard_states(state : ConversionState) -> Iterable[Tuple[str, ConversionState]]:
+    """
+    Queries of the shards recorded in a conversion state with the states they are finalized with. The state of each
+    shard records its reference lists, canonical condition and number, optimizer statistics are only kept by the first
+    shard, so they are counted once per rule.
+    """
+    shards = state.processing_state["query_shards"]
+    for number, (query, reference_lists, condition) in enumerate(shards, 1):
+        processing_state = {key: value for key, value in state.processing_state.items() if key != "query_shards"}
+        processing_state["reference_lists"] = reference_lists
+        processing_state["query_shard"] = (number, len(shards))
+        if condition is not None:
+            processing_state["canonical_condition"] = condition
+        if number > 1:
+            processing_state.pop("optimizer_stats", None)
+        yield query, ConversionState(processing_state=processing_state, deferred=list(state.deferred))
@@ -0,0 +1,138 @@
+"""Streaming conversion of Sigma rule files, directories and YAML documents."""
+from itertools import chain
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Optional, Tuple, Union
+
+from sigma.collection import SigmaCollection
+from sigma.conversion.base import Backend
+from sigma.exceptions import SigmaError, SigmaRuleLocation
+from sigma.rule import SigmaRule, SigmaRuleBase
+
+if TYPE_CHECKING:
+    from sigma.backends.chronicle.cache import ConversionCache
+
+RuleSource = Union[str, Path, dict]
+
+def _is_path(source : Union[str, Path]) -> bool:
+    if isinstance(source, Path):
+        return True
+    if "\n" in source:
+        return False
+    try:
+        return Path(source).exists()
+    except OSError:     # e.g. file name too long
+        return False
+
+def iter_rule_sources(sources : Iterable[RuleSource]) -> Iterator[Tuple[Optional[Path], Union[str, dict]]]:
+    """
+    Resolve rule sources into (path, content) pairs, one per rule file. A source can be a path to a rule file or a
+    directory which is searched recursively for .yml/.yaml files, YAML text or an already parsed rule dict. Files are
+    only read when the consumer asks for the next pair.
+    """
+    for source in sources:
+        if isinstance(source, dict):
+            yield None, source
+        elif _is_path(source):
+            path = Path(source)
+            if path.is_dir():
+                for file_path in sorted(chain(path.rglob("*.yml"), path.rglob("*.yaml"))):
+                    yield file_path, file_path.read_text(encoding="utf-8")
+            else:
+                yield path, path.read_text(encoding="utf-8")
+        else:
+            yield None, source
+
+def rule_identifier(rule : SigmaRuleBase) -> str:
+    """Identifier of a converted rule in streamed output: the Sigma id or the title if the rule has no id."""
+    return str(rule.id) if rule.id is not None else rule.title
+
+def parse_rule_source(path : Optional[Path], content : Union[str, dict]) -> SigmaCollection:
+    source = SigmaRuleLocation(path) if path is not None else None
+    if isinstance(content, dict):
+        collection = SigmaCollection.from_dicts([content], source=source)
+    else:
+        collection = SigmaCollection.from_yaml(content, source=source)
+    collection.resolve_rule_references()
+    return collection
+
+def convert_stream(
+        backend : Backend,
+        sources : Iterable[RuleSource],
+        output_format : Optional[str] = None,
+        correlation_method : Optional[str] = None,
+        cache : Optional["ConversionCache"] = None,
+        collect_statistics : bool = True,
+    ) -> Iterator[Tuple[str, Any]]:
+    """
+    Lazily convert Sigma rules and yield (rule id, output) pairs as soon as each rule is finalized.
+
+    Only the rule file that is currently converted is kept in memory, the parsed rules and their output aren't. The
+    statistics the backend collects per rule grow with the number of converted rules: backend.optimizer_stats if
+    conditions are optimized (the default), backend.regex_findings for rules with findings, the rules using each
+    reference list in backend.reference_lists and the costs, fingerprints and metrics if they are enabled. If
+    collect_statistics is not set, they are cleared with backend.clear_statistics after the rules of each source were
+    yielded, so they only cover the current source and memory stays bounded by the largest rule source and the
+    reference lists. The output-level finalization of the backend is not applied, as it requires all queries at once. Rules are converted independently per file, so correlation rules must reside in the same file
+    as the rules they reference. If the backend collects errors, rule files that can't be parsed are recorded in
+    backend.errors as (None, error) and skipped.
+
+    If a cache is given, rule sources whose content and conversion context are unchanged are served from the cache
+    without parsing them. The reference lists, optimizer statistics, regex findings, query costs and fingerprints of
+    their rules are cached along with the output and recorded in the backend on a hit. Conversion metrics only
+    measure converted rules, served rules aren't part of them. Sources that caused conversion errors are not cached.
+    """
+    from sigma.backends.chronicle.cache import conversion_records, record_marks, replay_records
+
+    output_format = output_format or backend.default_format
+    context_key = cache.context_key(backend, output_format) if cache is not None else None
+    for path, content in iter_rule_sources(sources):
+        if cache is not None:
+            key = cache.key(context_key, content)
+            entry = cache.get(key)
+            if entry is None:
+                error_count = len(backend.errors)
+                marks = record_marks(backend)
+                results = list(convert_rule_source(backend, path, content, output_format, correlation_method))
+                rule_ids = [rule_id for rule_id, _ in results]
+                reference_lists = backend.reference_lists.for_rules(rule_ids)
+                if len(backend.errors) == error_count:
+                    cache.put(key, results, reference_lists, conversion_records(backend, rule_ids, marks))
+            else:
+                results, reference_lists, records = entry
+                backend.reference_lists.merge(reference_lists)
+                if collect_statistics:
+                    replay_records(backend, records)
+            yield from results
+        else:
+            yield from convert_rule_source(backend, path, content, output_format, correlation_method)
+        if not collect_statistics:
+            backend.clear_statistics()
+
+def convert_rule_source(
+        backend : Backend,
+        path : Optional[Path],
+        content : Union[str, dict],
+        output_format : str,
+        correlation_method : Optional[str] = None,
+    ) -> Iterator[Tuple[str, Any]]:
+    """Convert the rules contained in one rule source and yield (rule id, output) pairs."""
+    metrics = getattr(backend, "metrics", None)
+    start = perf_counter()
+    try:
+        collection = parse_rule_source(path, content)
+    except SigmaError as e:
+        if backend.collect_errors:
+            backend.errors.append((None, e))
+            return
+        raise
+    finally:
+        if metrics is not None:
+            metrics.add_time("parse", perf_counter() - start)
+    for rule in collection.rules:
+        if isinstance(rule, SigmaRule):
+            queries = backend.convert_rule(rule, output_format)
+        else:
+            queries = backend.convert_correlation_rule(rule, output_format, correlation_method)
+        for query in queries:
+            yield rule_identifier(rule), query
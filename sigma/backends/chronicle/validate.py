@@ -0,0 +1,286 @@
+"""
+Offline validation of the YARA-L rules generated by the Chronicle YARA-L backend.
+
+The verify endpoint of the Rules API needs one request per rule. The validator checks the rule text locally instead:
+the rule header and the order of the sections, the escaping of the strings of the meta section, the syntax of the
+events, match, outcome and condition sections, that fields are referenced through event variables and that the
+variables of the match, outcome and condition sections are bound. All problems of a rule are reported with their line
+and column. It covers the subset of YARA-L generated by the backend, rules passing it can still be rejected by
+Chronicle, e.g. for unknown UDM fields.
+
+Usage: python -m sigma.backends.chronicle.validate rules.ndjson [rules.yaral ...]
+"""
+import argparse
+import json
+import re
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sigma.backends.chronicle.query import (
+    And, Call, Comparison, Field, Keyword, Node, Number, Operand, Parser, QuerySyntaxError, Variable, section_header, walk,
+)
+
+# Sections of a YARA-L rule in the order they must appear in.
+section_order = ("meta", "events", "match", "outcome", "condition", "options")
+required_sections = ("events", "condition")
+
+rule_header = re.compile(r"\s*rule\b[ \t]*(?P<name>[^\s{]*)\s*\{")
+rule_name = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+rule_start = re.compile(r"^rule\b", re.MULTILINE)
+meta_entry = re.compile(r"(?P<key>\w+)[ \t]*=[ \t]*(?P<value>.*)")
+meta_string = re.compile(r'"(?:\\.|[^"\\\n])*"')
+meta_escape = re.compile(r"\\(.)")
+meta_escapes = frozenset('\\"nrt')
+meta_scalar = re.compile(r"-?\d+(?:\.\d+)?|true|false")
+match_variables = re.compile(r"(?P<variables>\$\w+(?:[ \t]*,[ \t]*\$\w+)*)[ \t]+over[ \t]+\d+[smhd]")
+line_pattern = re.compile(r"[^\n]+")
+
+class ConditionParser(Parser):
+    """
+    Parser of the condition section: event variables like $selection, event counts like #selection > 5 and outcome
+    variables compared to a value, combined with and, or, not and parentheses.
+    """
+    def primary(self) -> Node:
+        if self.accept("("):
+            expression = self.expression()
+            self.expect(")", "')'")
+            return expression
+        token = self.peek()
+        if token is None or token.kind != "name" or token.text[0] not in "$#" or "." in token.text:
+            raise self.error("Expected event variable")
+        self.index += 1
+        variable = Variable(token.text, token.position)
+        operator = self.accept("operator")
+        if operator is None:
+            return variable
+        return Comparison(variable, operator.text, self.operand(), position=token.position)
+
+def operand_tree(operand : Operand) -> Iterator[Operand]:
+    """An operand and the arguments of function calls in it."""
+    yield operand
+    if isinstance(operand, Call):
+        for arg in operand.args:
+            yield from operand_tree(arg)
+
+def node_operands(node : Node) -> Iterator[Operand]:
+    """Operands of the comparisons and function calls of a syntax tree."""
+    for item in walk(node):
+        if isinstance(item, Comparison):
+            yield from operand_tree(item.left)
+            yield from operand_tree(item.right)
+        elif isinstance(item, Call):
+            yield from operand_tree(item)
+
+class RuleValidator:
+    """Validation of the text of one YARA-L rule, the problems found are collected in errors."""
+    def __init__(self, text : str):
+        self.text = text
+        self.errors : List[QuerySyntaxError] = []
+        self.event_variables : Set[str] = set()       # event variables like $selection bound by the events section
+        self.placeholders : Set[str] = set()          # placeholder variables assigned in the events section
+        self.outcome_variables : Set[str] = set()
+        self.events_parsed = False
+
+    def error(self, message : str, position : int) -> None:
+        self.errors.append(QuerySyntaxError(message, self.text, position))
+
+    def unbound(self, message : str, position : int) -> None:
+        """Unbound variables are only reported if the events section could be parsed, otherwise all of them would be."""
+        if self.events_parsed:
+            self.error(message, position)
+
+    def validate(self) -> List[QuerySyntaxError]:
+        sections = self.sections()
+        for name in section_order:
+            if name in sections and name != "options":
+                getattr(self, f"validate_{name}")(*sections[name])
+        return self.errors
+
+    def sections(self) -> Dict[str, Tuple[int, str]]:
+        """Offset and content of the sections by name, checking the rule header, the section order and the closing brace."""
+        header = rule_header.match(self.text)
+        if header is None:
+            self.error("Expected rule header like 'rule name {'", len(self.text) - len(self.text.lstrip()))
+            return {}
+        if not rule_name.fullmatch(header.group("name")):
+            self.error(f"Invalid rule name {header.group('name')!r}", header.start("name"))
+        stripped = self.text.rstrip()
+        end = len(stripped) - 1
+        if not stripped.endswith("}") or end < header.end():
+            self.error("Expected '}' at end of rule", len(stripped))
+            end = len(self.text)
+        headers = list(section_header.finditer(self.text, header.end(), end))
+        body = self.text[header.end():headers[0].start() if headers else end]
+        if body.strip():
+            self.error("Expected section header like 'events:'", header.end() + len(body) - len(body.lstrip()))
+        sections : Dict[str, Tuple[int, str]] = {}
+        last = 0
+        for index, match in enumerate(headers):
+            name = match.group(1)
+            order = section_order.index(name)
+            if name in sections:
+                self.error(f"Duplicate {name} section", match.start(1))
+            elif order < last:
+                self.error(f"The {name} section must come before the {section_order[last]} section", match.start(1))
+            last = max(last, order)
+            sections.setdefault(name, (match.end(), self.text[match.end():headers[index + 1].start() if index + 1 < len(headers) else end]))
+        for name in required_sections:
+            if name not in sections:
+                self.error(f"Missing {name} section", end)
+        return sections
+
+    def parse(self, offset : int, content : str, parser : type = Parser) -> Optional[Node]:
+        try:
+            return parser(content).statements()
+        except QuerySyntaxError as e:
+            self.error(e.message, offset + e.position)
+            return None
+
+    def check_fields(self, offset : int, node : Node, bind : bool) -> None:
+        """Fields must be referenced through an event variable, which is bound by the events section if bind is set."""
+        for operand in node_operands(node):
+            if isinstance(operand, Field):
+                variable = operand.path.split(".", 1)[0]
+                if not operand.path.startswith("$") or "." not in operand.path:
+                    self.error(f"Field '{operand.path}' isn't referenced through an event variable like $selection.{operand.path}", offset + operand.position)
+                elif bind:
+                    self.event_variables.add(variable)
+                elif variable not in self.event_variables:
+                    self.unbound(f"Event variable '{variable}' isn't bound in the events section", offset + operand.position)
+            elif isinstance(operand, Variable) and bind:
+                self.placeholders.add(operand.name)
+
+    def validate_meta(self, offset : int, content : str) -> None:
+        for line in line_pattern.finditer(content):
+            text = line.group().strip()
+            if not text or text.startswith("//"):
+                continue
+            position = offset + line.start() + len(line.group()) - len(line.group().lstrip())
+            entry = meta_entry.fullmatch(text)
+            if entry is None:
+                self.error('Expected meta entry like key = "value"', position)
+                continue
+            value = entry.group("value")
+            position += entry.start("value")
+            if not value.startswith('"'):
+                if not meta_scalar.fullmatch(value):
+                    self.error("Expected string, number or boolean meta value", position)
+                continue
+            string = meta_string.match(value)
+            if string is None:
+                self.error("Unterminated meta string", position)
+            elif string.end() < len(value):
+                self.error("Unescaped '\"' in meta string", position + string.end() - 1)
+            else:
+                for escape in meta_escape.finditer(value, 1, len(value) - 1):
+                    if escape.group(1) not in meta_escapes:
+                        self.error(f"Invalid escape sequence '{escape.group()}' in meta string", position + escape.start())
+
+    def validate_events(self, offset : int, content : str) -> None:
+        tree = self.parse(offset, content)
+        if tree is None:
+            return
+        self.events_parsed = True
+        for node in walk(tree):
+            if isinstance(node, Keyword):
+                self.error(f"Keyword \"{node.value}\" isn't compared to a field, which YARA-L doesn't support", offset + node.position)
+        self.check_fields(offset, tree, bind=True)
+
+    def validate_match(self, offset : int, content : str) -> None:
+        position = offset + len(content) - len(content.lstrip())
+        match = match_variables.fullmatch(content.strip())
+        if match is None:
+            self.error("Expected match variables like '$name over 5m'", position)
+            return
+        for variable in re.finditer(r"\$\w+", match.group("variables")):
+            if variable.group() not in self.placeholders:
+                self.unbound(f"Match variable '{variable.group()}' isn't assigned in the events section", position + variable.start())
+
+    def validate_outcome(self, offset : int, content : str) -> None:
+        tree = self.parse(offset, content)
+        if tree is None:
+            return
+        for statement in tree.args if isinstance(tree, And) else [tree]:
+            if not (isinstance(statement, Comparison) and statement.operator == "=" and isinstance(statement.left, Variable)):
+                self.error("Expected outcome assignment like '$name = expression'", offset + statement.position)
+                continue
+            self.check_fields(offset, statement, bind=False)
+            self.outcome_variables.add(statement.left.name)
+
+    def validate_condition(self, offset : int, content : str) -> None:
+        tree = self.parse(offset, content, ConditionParser)
+        if tree is None:
+            return
+        for node in walk(tree):
+            if isinstance(node, Variable):
+                if node.name.startswith("#"):
+                    self.error(f"Event count '{node.name}' must be compared to a number", offset + node.position)
+                elif node.name not in self.event_variables:
+                    self.unbound(f"Event variable '{node.name}' isn't bound in the events section", offset + node.position)
+            elif isinstance(node, Comparison):
+                name = node.left.name
+                if name.startswith("#") and "$" + name[1:] not in self.event_variables:
+                    self.unbound(f"Event variable '${name[1:]}' isn't bound in the events section", offset + node.position)
+                elif name.startswith("$") and name not in self.outcome_variables:
+                    self.unbound(f"Outcome variable '{name}' isn't assigned in the outcome section", offset + node.position)
+                if not isinstance(node.right, Number):
+                    self.error(f"'{name}' must be compared to a number", offset + node.right.position)
+
+def validate_rule(text : str) -> List[QuerySyntaxError]:
+    """Problems of a YARA-L rule located in its text, an empty list if the rule is valid."""
+    return RuleValidator(text).validate()
+
+def split_rules(text : str) -> Iterator[Tuple[int, str]]:
+    """Offsets and texts of the rules of a text with one rule after another, e.g. the default output of sigma convert."""
+    starts = [match.start() for match in rule_start.finditer(text)]
+    if not starts or text[:starts[0]].strip():
+        starts.insert(0, 0)
+    for index, start in enumerate(starts):
+        yield start, text[start:starts[index + 1] if index + 1 < len(starts) else len(text)]
+
+def validate_rules(rules : Iterable[Tuple[str, str]]) -> Dict[str, List[QuerySyntaxError]]:
+    """Problems of (name, text) pairs of YARA-L rules by rule name, only rules with problems are included."""
+    return {name: errors for name, text in rules if (errors := validate_rule(text))}
+
+def validate_text(text : str) -> List[QuerySyntaxError]:
+    """Problems of the rules of a text with one rule after another, located in the whole text."""
+    return [
+        QuerySyntaxError(error.message, text, offset + error.position)
+        for offset, rule in split_rules(text)
+        for error in validate_rule(rule)
+    ]
+
+def main():
+    from sigma.backends.chronicle.deploy import read_records, record_key
+
+    parser = argparse.ArgumentParser(description="Validate YARA-L rules converted by the YARA-L backend without a connection to Chronicle.")
+    parser.add_argument("input", nargs="+", help="NDJSON files of the ndjson output format or files with YARA-L rules, - for standard input")
+    parser.add_argument("--json", action="store_true", help="Write the problems as JSON")
+    args = parser.parse_args()
+
+    problems : List[Tuple[str, QuerySyntaxError]] = []
+    rules = 0
+    for path in args.input:
+        with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as f:
+            text = f.read()
+        if text.lstrip().startswith("{"):
+            records = [record_key(record) for record in read_records(text.splitlines())]
+            rules += len(records)
+            problems.extend((name, error) for name, errors in validate_rules((key, rule) for key, _, rule in records).items() for error in errors)
+        else:
+            rules += sum(1 for _ in split_rules(text))
+            problems.extend((path, error) for error in validate_text(text))
+    if args.json:
+        print(json.dumps([
+            {"rule": name, "line": error.line, "column": error.column, "message": error.message}
+            for name, error in problems
+        ], indent=2))
+    else:
+        for name, error in problems:
+            print(f"{name}:{error.line}:{error.column}: {error.message}")
+        print(f"{rules} rules, {len(problems)} problems")
+    if problems:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Classification and regular expression rendering of Sigma string values."""
+import ipaddress
+from typing import Dict, List, Optional
+
+from sigma.types import Placeholder, SigmaCIDRExpression, SigmaString, SigmaType, SpecialChars
+
+# Characters with a special meaning in RE2 regular expressions and the regex delimiter of the Chronicle query languages,
+# escaped with a translation table in one pass over the value.
+regex_special_chars = "\\^$.|?*+()[]{}/"
+regex_escape_table = str.maketrans({char: "\\" + char for char in regex_special_chars})
+
+# Backslashes and double quotes are escaped in double-quoted string literals.
+string_escape_table = str.maketrans({"\\": "\\\\", '"': '\\"'})
+
+# Strings of the meta section of YARA-L rules can't span lines, line breaks and tabs are escaped in addition.
+meta_escape_table = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r", "\t": "\\t"})
+
+# Rendering modes of wildcard string matches, see the string_match_mode option of the backends.
+string_match_modes = ("regex", "minimal", "functions")
+
+# Handling of keywords without keyword fields for the log source of their rule, see the keyword_policy option of the
+# backends.
+keyword_policies = ("allow", "warn", "error")
+
+class KeywordWarning(UserWarning):
+    """Keyword of a rule converted into a search over all fields of all events."""
+
+# Regular expressions matching a value of a kind (see wildcard_kind) with the escaped value in place of {value}.
+kind_regexes = {
+    "contains": ".*{value}.*",
+    "startswith": "^{value}.*",
+    "endswith": ".*{value}$",
+    "pattern": "^{value}$",
+}
+
+wildcard_regex = {
+    SpecialChars.WILDCARD_MULTI: ".*",
+    SpecialChars.WILDCARD_SINGLE: ".",
+}
+
+def escape_regex(value : str) -> str:
+    """Escape a literal string for usage in a Chronicle regular expression."""
+    return value.translate(regex_escape_table)
+
+def escape_string(value : str) -> str:
+    """Escape a literal string for usage in a double-quoted string literal."""
+    return value.translate(string_escape_table)
+
+def escape_meta(value : str) -> str:
+    """Escape a value for usage in a double-quoted string of the meta section of a YARA-L rule."""
+    return value.translate(meta_escape_table)
+
+def minimal_regex(regex : str) -> str:
+    """
+    Equivalent regular expression without redundant wildcards. Chronicle matches regular expressions anywhere in a
+    value, so a leading .* or ^.* and a trailing .* or .*$ don't change the result, but prevent the regex engine from
+    searching for a literal prefix.
+    """
+    if regex.startswith("^.*"):
+        regex = regex[3:]
+    elif regex.startswith(".*"):
+        regex = regex[2:]
+    for suffix in (".*$", ".*"):
+        start = len(regex) - len(suffix)
+        if regex.endswith(suffix) and (start - len(regex[:start].rstrip("\\"))) % 2 == 0:     # the dot isn't escaped
+            regex = regex[:start]
+            break
+    return regex or ".*"        # an empty regex would start a comment
+
+def wildcard_kind(value : SigmaString) -> Optional[str]:
+    """
+    Classify a string value by the position of its wildcards: "exact" without wildcards, "startswith", "endswith" or
+    "contains" for values with only leading and/or trailing multi-character wildcards and "pattern" for values with
+    inner or single-character wildcards. Values containing placeholders return None.
+    """
+    parts = value.s
+    if any(isinstance(part, Placeholder) for part in parts):
+        return None
+    leading = len(parts) > 0 and parts[0] == SpecialChars.WILDCARD_MULTI
+    trailing = len(parts) > 1 and parts[-1] == SpecialChars.WILDCARD_MULTI
+    inner = parts[int(leading):len(parts) - int(trailing)]
+    if not all(isinstance(part, str) for part in inner):
+        return "pattern"
+    if leading and trailing:
+        return "contains"
+    elif leading:
+        return "endswith"
+    elif trailing:
+        return "startswith"
+    else:
+        return "exact"
+
+def literal(value : SigmaString) -> str:
+    """Plain string of a value without its leading and trailing wildcards."""
+    return "".join(part for part in value.s if isinstance(part, str))
+
+def pattern_regex(value : SigmaString) -> str:
+    """Regular expression matching a complete value with wildcards at arbitrary positions, without anchors."""
+    return "".join(
+        escape_regex(part) if isinstance(part, str) else wildcard_regex[part]
+        for part in value.s
+    )
+
+def group_by_kind(values : List[SigmaType]) -> Dict[str, List[SigmaType]]:
+    """
+    Group values by their kind, see wildcard_kind. CIDR values are of the kind "cidr", numbers and other non-string
+    values are exact values. Groups are ordered by the first appearance of their kind, values keep their order within
+    a group.
+    """
+    groups : Dict[str, List[SigmaType]] = {}
+    for value in values:
+        if isinstance(value, SigmaCIDRExpression):
+            kind = "cidr"
+        else:
+            kind = wildcard_kind(value) if isinstance(value, SigmaString) else "exact"
+        groups.setdefault(kind or "exact", []).append(value)
+    return groups
+
+def collapse_networks(values : List[SigmaCIDRExpression]) -> List[str]:
+    """
+    Networks of CIDR values with overlapping and adjacent ranges collapsed into the fewest networks covering the same
+    addresses, e.g. 10.0.0.0/9 and 10.128.0.0/9 into 10.0.0.0/8. IPv4 networks come before IPv6 networks, both ordered
+    by address.
+    """
+    return [
+        str(network)
+        for version in (4, 6)
+        for network in ipaddress.collapse_addresses(value.network for value in values if value.network.version == version)
+    ]
+
+def alternations(regexes : List[str], max_size : int) -> List[str]:
+    """Merge regular expressions into alternations like (a|b|c) of at most max_size regular expressions each."""
+    chunks = [regexes[i:i + max_size] for i in range(0, len(regexes), max_size)]
+    return ["(" + "|".join(chunk) + ")" if len(chunk) > 1 else chunk[0] for chunk in chunks]
+
+def alternation_regexes(values : List[str], max_size : int) -> List[str]:
+    """
+    Merge literal values into escaped regular expression alternations like (a|b|c) of at most max_size values each.
+    Duplicate values are removed, the order of the values is kept.
+    """
+    return alternations([escape_regex(value) for value in dict.fromkeys(values)], max_size)
@@ -1,6 +1,10 @@
-from .chronicle import chronicle_pipeline
-# TODO: add all pipelines that should be exposed to the user of your backend in the import statement above.
+from .lazy import LazyRegistry, lazy_module_getattr
 
-pipelines = {
-    "chronicle_pipeline": chronicle_pipeline,   # TODO: adapt identifier to something approproiate
-}
\ No newline at end of file
+# Pipelines are imported from their modules on first access to keep the import of this package cheap.
+__getattr__ = lazy_module_getattr(__name__, {
+    "chronicle_pipeline": ".chronicle",
+})
+
+pipelines = LazyRegistry(__name__, {
+    "chronicle_pipeline": "chronicle_pipeline",   # TODO: adapt identifier to something approproiate
+})
@@ -0,0 +1,119 @@
+"""Parsing of legacy Sigma aggregation conditions like `selection | count(field) by group > 10`."""
+import re
+from dataclasses import dataclass, field as dataclass_field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sigma.correlations import SigmaCorrelationTimespan
+from sigma.exceptions import SigmaConditionError, SigmaFeatureNotSupportedByBackendError, SigmaTimespanError
+from sigma.processing.transformations import Transformation
+from sigma.rule import SigmaRule
+
+aggregation_pattern = re.compile(
+    r"^(?P<function>\w+)\(\s*(?P<field>[\w.]*)\s*\)"
+    r"(?:\s+by\s+(?P<group_by>[\w.]+(?:\s*,\s*[\w.]+)*))?"
+    r"\s*(?P<operator><=|>=|==|=|<|>)\s*(?P<threshold>\d+)$",
+    re.IGNORECASE,
+)
+
+# Sigma operators to the names of SigmaCorrelationConditionOperator, so legacy aggregations and correlation rules
+# share the rendering of their conditions.
+aggregation_operators = {
+    "<": "LT",
+    "<=": "LTE",
+    ">": "GT",
+    ">=": "GTE",
+    "=": "EQ",
+    "==": "EQ",
+}
+
+@dataclass
+class Aggregation:
+    """
+    Aggregation of the events matched by a search: count() counts events, count(field) distinct values of the field.
+    The counts are grouped by the group_by fields and compared against the threshold within the timeframe in seconds.
+    """
+    function : str
+    field : Optional[str] = None
+    group_by : List[str] = dataclass_field(default_factory=list)
+    operator : str = "GT"
+    threshold : int = 0
+    timeframe : Optional[int] = None
+
+    def map_fields(self, mapping : Callable[[str], str]) -> None:
+        """Replace the field names of the aggregation, e.g. by the names of the field mapping of the pipeline."""
+        if self.field is not None:
+            self.field = mapping(self.field)
+        self.group_by = [mapping(group_field) for group_field in self.group_by]
+
+def parse_aggregation(condition : str) -> Tuple[str, Optional[Aggregation]]:
+    """
+    Split a condition into the search and the aggregation after the pipe. Returns the unchanged condition and None
+    for conditions without aggregation. Aggregation functions other than count and the near operator are rejected.
+    """
+    search, pipe, expression = condition.partition("|")
+    if not pipe:
+        return condition, None
+    expression = expression.strip()
+    if expression.lower().startswith("near"):
+        raise SigmaFeatureNotSupportedByBackendError("The near aggregation is not supported by the Chronicle backend, use a temporal correlation rule instead.")
+    match = aggregation_pattern.match(expression)
+    if match is None:
+        raise SigmaConditionError(f"Invalid aggregation expression '{expression}'")
+    function = match.group("function").lower()
+    if function != "count":
+        raise SigmaFeatureNotSupportedByBackendError(f"The {function} aggregation is not supported by the Chronicle backend, only count is.")
+    group_by = match.group("group_by")
+    return search.strip(), Aggregation(
+        function=function,
+        field=match.group("field") or None,
+        group_by=[group_field.strip() for group_field in group_by.split(",")] if group_by else [],
+        operator=aggregation_operators[match.group("operator")],
+        threshold=int(match.group("threshold")),
+    )
+
+def rule_aggregations(rule : SigmaRule) -> List[Optional[Aggregation]]:
+    """Aggregation of each condition of a rule, None for conditions without aggregation."""
+    return [parse_aggregation(condition)[1] for condition in rule.detection.condition]
+
+@dataclass
+class AggregationExtractionTransformation(Transformation):
+    """
+    Remove the aggregations from the conditions of a rule, so the remaining search can be parsed by pySigma, and store
+    them in the pipeline state as list with one entry per condition under the key "aggregations". The timeframe of the
+    rule, which pySigma parses as an unused detection, is removed from the detections and stored in the aggregations.
+    pySigma parses the conditions of the rule itself when it's converted, so the original conditions and timeframe are
+    kept in the pipeline state under the key "aggregation_source" and put back by restore_rule after the conversion.
+    """
+    def apply(self, pipeline : "sigma.processing.pipeline.ProcessingPipeline", rule : SigmaRule) -> None:
+        super().apply(pipeline, rule)
+        pipeline.state["aggregation_source"] = (list(rule.detection.condition), rule.detection.detections.get("timeframe"))
+        timeframe = rule.detection.detections.pop("timeframe", None)
+        seconds = None
+        if timeframe is not None:
+            try:
+                seconds = SigmaCorrelationTimespan(str(timeframe.detection_items[0].value[0])).seconds
+            except (SigmaTimespanError, IndexError) as e:
+                raise SigmaConditionError(f"Invalid timeframe of aggregation: {e}")
+        aggregations = []
+        for condition in rule.detection.parsed_condition:
+            condition.condition, aggregation = parse_aggregation(condition.condition)
+            if aggregation is not None:
+                aggregation.timeframe = seconds
+            aggregations.append(aggregation)
+        rule.detection.condition = [condition.condition for condition in rule.detection.parsed_condition]
+        pipeline.state["aggregations"] = aggregations
+
+def restore_rule(rule : SigmaRule, state : Dict[str, Any]) -> None:
+    """
+    Put the conditions and the timeframe removed by AggregationExtractionTransformation back into a converted rule,
+    so converting it again, e.g. with another backend, extracts the same aggregations.
+    """
+    source = state.get("aggregation_source")
+    if source is None:
+        return
+    conditions, timeframe = source
+    for condition, text in zip(rule.detection.parsed_condition, conditions):
+        condition.condition = text
+    rule.detection.condition = list(conditions)
+    if timeframe is not None:
+        rule.detection.detections["timeframe"] = timeframe
@@ -0,0 +1,53 @@
+"""Rewriting of keywords into searches over the UDM fields configured for the log source of a rule."""
+import dataclasses
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
+
+from sigma.conditions import ConditionAND, ConditionOR
+from sigma.processing.transformations import DetectionItemTransformation
+from sigma.rule import SigmaDetection, SigmaDetectionItem, SigmaRule
+from sigma.types import SigmaNumber, SigmaString, SigmaType, SpecialChars
+from sigma.pipelines.chronicle.mapping import MappingIndex
+
+def contains_value(value : SigmaType) -> SigmaType:
+    """Value matched anywhere in a field like a keyword is matched anywhere in an event."""
+    if isinstance(value, SigmaNumber):
+        value = SigmaString(str(value))
+    if not isinstance(value, SigmaString):
+        return value
+    if not value.startswith(SpecialChars.WILDCARD_MULTI):
+        value = SpecialChars.WILDCARD_MULTI + value
+    if not value.endswith(SpecialChars.WILDCARD_MULTI):
+        value = value + SpecialChars.WILDCARD_MULTI
+    return value
+
+@dataclass
+class KeywordFieldTransformation(DetectionItemTransformation):
+    """
+    Keywords are rewritten into contains matches ORed over the keyword_fields of the mapping table selected by the log
+    source of the rule, which Chronicle evaluates on a few fields instead of scanning all fields of all events. Keywords
+    of rules whose table has no keyword fields are left unbound and handled by the keyword_policy backend option.
+    """
+    index : MappingIndex = field(default_factory=MappingIndex)
+    fields : List[str] = field(init=False, compare=False, repr=False, default_factory=list)    # keyword fields of the current rule
+
+    def apply(self, pipeline : "sigma.processing.pipeline.ProcessingPipeline", rule : SigmaRule) -> None:
+        table = self.index.lookup(rule.logsource) if isinstance(rule, SigmaRule) else None
+        self.fields = table.keyword_fields if table is not None else []
+        if self.fields:
+            super().apply(pipeline, rule)
+
+    def apply_detection_item(self, detection_item : SigmaDetectionItem) -> Optional[Union[SigmaDetection, SigmaDetectionItem]]:
+        if detection_item.field is not None:
+            return None
+        values = [contains_value(value) for value in detection_item.value]
+        if detection_item.value_linking is ConditionOR or len(values) == 1:
+            return self.field_disjunction(detection_item, values)
+        # Keywords with the all modifier must each be contained in one of the fields.
+        return SigmaDetection([self.field_disjunction(detection_item, [value]) for value in values], item_linking=ConditionAND)
+
+    def field_disjunction(self, detection_item : SigmaDetectionItem, values : List[SigmaType]) -> SigmaDetection:
+        return SigmaDetection(
+            [dataclasses.replace(detection_item, field=name, value=values, auto_modifiers=False) for name in self.fields],
+            item_linking=ConditionOR,
+        )
@@ -0,0 +1,62 @@
+"""Helpers for deferring imports and pipeline construction until first use."""
+import sys
+from importlib import import_module
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Mapping, Optional
+
+if TYPE_CHECKING:
+    from sigma.processing.pipeline import ProcessingPipeline
+
+class LazyRegistry(Mapping):
+    """
+    Read-only mapping from plugin identifiers to objects that are resolved as attributes of a module on first
+    access. Resolving the attributes via the module triggers its module-level __getattr__, which imports the
+    implementing submodule and caches the object in the module namespace.
+    """
+    def __init__(self, module_name : str, names : Dict[str, str]):
+        self.module_name = module_name
+        self.names = names
+
+    def __getitem__(self, identifier : str) -> Any:
+        return getattr(sys.modules[self.module_name], self.names[identifier])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.module_name!r}, {self.names!r})"
+
+def lazy_module_getattr(module_name : str, attributes : Dict[str, str]):
+    """
+    Build a module-level __getattr__ (PEP 562) that imports attributes from the submodules given in the attributes
+    mapping (attribute name -> relative submodule name) on first access and caches them in the module namespace.
+    """
+    def __getattr__(name : str) -> Any:
+        if name not in attributes:
+            raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+        value = getattr(import_module(attributes[name], module_name), name)
+        setattr(sys.modules[module_name], name, value)
+        return value
+    return __getattr__
+
+class LazyPipeline:
+    """
+    Class attribute descriptor that builds a processing pipeline on first access and returns the cached pipeline on
+    all further accesses. The pipeline is given as module and function name, so the module is also imported on first
+    access and not while the class body is evaluated.
+    """
+    def __init__(self, module_name : str, name : str):
+        self.module_name = module_name
+        self.name = name
+        self.pipeline : Optional["ProcessingPipeline"] = None
+        self.lock = Lock()
+
+    def __get__(self, instance : Any, owner : Any = None) -> "ProcessingPipeline":
+        if self.pipeline is None:
+            with self.lock:
+                if self.pipeline is None:
+                    self.pipeline = getattr(import_module(self.module_name), self.name)()
+        return self.pipeline
@@ -0,0 +1,154 @@
+"""Logsource-indexed field mapping tables loaded from the YAML and JSON files packaged with the Chronicle pipeline."""
+import json
+from dataclasses import dataclass, field
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import yaml
+
+from sigma.correlations import SigmaCorrelationRule
+from sigma.exceptions import SigmaConfigurationError, SigmaTransformationError
+from sigma.processing.transformations import FieldMappingTransformation
+from sigma.rule import SigmaDetectionItem, SigmaLogSource, SigmaRule
+
+tables_directory = Path(__file__).parent / "tables"
+
+LogsourceKey = Tuple[Optional[str], Optional[str], Optional[str]]      # (product, category, service)
+
+# Lookup order from the most specific key to the most generic one. A table registered for (windows, process_creation,
+# None) applies to all windows process_creation rules regardless of their service.
+lookup_masks = sorted(
+    ((product, category, service) for product in (True, False) for category in (True, False) for service in (True, False)),
+    key=lambda mask: -sum(mask),
+)[:-1]
+
+@dataclass
+class MappingTable:
+    """Field mapping of a group of log sources, the fields that can't be mapped for them and the fields searched for keywords."""
+    name : str
+    logsources : List[LogsourceKey]
+    fieldmapping : Dict[str, Union[str, List[str]]]
+    unsupported_fields : Tuple[str, ...] = ()        # sorted, so the repr of the pipeline doesn't depend on the hash seed
+    unsupported_fields_message : Optional[str] = None
+    keyword_fields : List[str] = field(default_factory=list)     # UDM fields searched for keywords, see KeywordFieldTransformation
+
+    @classmethod
+    def from_dict(cls, d : dict, source : str = "<dict>") -> "MappingTable":
+        try:
+            return cls(
+                name=d["name"],
+                logsources=[
+                    (logsource.get("product"), logsource.get("category"), logsource.get("service"))
+                    for logsource in d["logsources"]
+                ],
+                fieldmapping=d.get("fieldmapping", {}),
+                unsupported_fields=tuple(sorted(set(d.get("unsupported_fields", ())))),
+                unsupported_fields_message=d.get("unsupported_fields_message"),
+                keyword_fields=list(d.get("keyword_fields", ())),
+            )
+        except (KeyError, TypeError, AttributeError) as e:
+            raise SigmaConfigurationError(f"Invalid mapping table {source}: {e}")
+
+    def unsupported_field_error(self, field : str) -> SigmaTransformationError:
+        return SigmaTransformationError(
+            self.unsupported_fields_message
+            or f"The Chronicle backend does not support the {field} field for {self.name} rules."
+        )
+
+def load_table(path : Path) -> MappingTable:
+    with path.open(encoding="utf-8") as f:
+        d = json.load(f) if path.suffix == ".json" else yaml.safe_load(f)
+    return MappingTable.from_dict(d, str(path))
+
+class MappingIndex:
+    """
+    Index from (product, category, service) log source keys to mapping tables. A rule is resolved to its table with a
+    fixed number of dictionary lookups, independent from the number of tables and log sources.
+    """
+    def __init__(self, tables : Iterable[MappingTable] = ()):
+        self.tables : List[MappingTable] = []
+        self.index : Dict[LogsourceKey, MappingTable] = {}
+        for table in tables:
+            self.add(table)
+
+    @classmethod
+    def from_directory(cls, directory : Union[str, Path] = tables_directory) -> "MappingIndex":
+        directory = Path(directory)
+        paths = sorted(chain(directory.glob("*.yml"), directory.glob("*.yaml"), directory.glob("*.json")))
+        return cls(load_table(path) for path in paths)
+
+    def add(self, table : MappingTable) -> None:
+        for key in table.logsources:
+            if not any(key):
+                raise SigmaConfigurationError(f"Mapping table '{table.name}' contains a log source without product, category and service")
+            if key in self.index:
+                raise SigmaConfigurationError(
+                    f"Log source {key} is mapped by the tables '{self.index[key].name}' and '{table.name}'"
+                )
+            self.index[key] = table
+        self.tables.append(table)
+
+    def lookup(self, logsource : SigmaLogSource) -> Optional[MappingTable]:
+        """Mapping table of the most specific registered key matching the log source or None if no table applies."""
+        key = (logsource.product, logsource.category, logsource.service)
+        for mask in lookup_masks:
+            masked = tuple(value if keep else None for value, keep in zip(key, mask))
+            if masked in self.index:
+                return self.index[masked]
+        return None
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def __eq__(self, other : object) -> bool:
+        return isinstance(other, MappingIndex) and self.tables == other.tables
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.tables!r})"
+
+@dataclass
+class LogsourceFieldMappingTransformation(FieldMappingTransformation):
+    """
+    Field mapping with the table selected by the log source of the rule from a MappingIndex. Detection items with
+    fields declared as unsupported by the table raise an error. Rules without a table are passed through untouched
+    and aren't marked as processed, so later processing items can reject them.
+
+    Correlation rules are mapped with the tables of the rules they reference. The fields of aggregations extracted
+    into the pipeline state by AggregationExtractionTransformation are mapped with the table of the rule.
+    """
+    mapping : Dict[str, Union[str, List[str]]] = field(default_factory=dict, compare=False, repr=False)     # mapping of the current rule
+    index : MappingIndex = field(default_factory=MappingIndex)
+    table : Optional[MappingTable] = field(init=False, compare=False, repr=False, default=None)
+
+    def apply(self, pipeline : "sigma.processing.pipeline.ProcessingPipeline", rule : Union[SigmaRule, SigmaCorrelationRule]) -> None:
+        if isinstance(rule, SigmaCorrelationRule):
+            tables = [
+                table
+                for reference in rule.rules
+                if isinstance(reference.rule, SigmaRule) and (table := self.index.lookup(reference.rule.logsource)) is not None
+            ]
+            if not tables:
+                return
+            self.table = tables[0]
+            self.mapping = {name: target for table in reversed(tables) for name, target in table.fieldmapping.items()}
+        else:
+            self.table = self.index.lookup(rule.logsource)
+            if self.table is None:
+                return
+            self.mapping = self.table.fieldmapping
+        super().apply(pipeline, rule)
+        for aggregation in pipeline.state.get("aggregations", ()):
+            if aggregation is not None:
+                aggregation.map_fields(self.map_single_field)
+
+    def map_single_field(self, field : str) -> str:
+        mapping = self.get_mapping(field) or field
+        if not isinstance(mapping, str):
+            raise SigmaConfigurationError(f"Field '{field}' of an aggregation is mapped to multiple fields")
+        return mapping
+
+    def apply_detection_item(self, detection_item : SigmaDetectionItem):
+        if detection_item.field in self.table.unsupported_fields:
+            raise self.table.unsupported_field_error(detection_item.field)
+        return super().apply_detection_item(detection_item)
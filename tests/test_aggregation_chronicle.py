@@ -0,0 +1,216 @@
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.exceptions import SigmaConditionError, SigmaFeatureNotSupportedByBackendError
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle.aggregation import rename_event_variable, yaral_window
+from sigma.pipelines.chronicle.aggregation import parse_aggregation
+
+def aggregation_rule(condition : str, timeframe : str = "") -> SigmaCollection:
+    return SigmaCollection.from_yaml(f"""
+title: Test
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        Image|endswith: '\\net.exe'
+{timeframe}
+    condition: {condition}
+""")
+
+referenced_rules = """
+title: Net
+name: net
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        Image|endswith: '\\net.exe'
+    condition: sel
+---
+title: Whoami
+name: whoami
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        Image|endswith: '\\whoami.exe'
+    condition: sel
+---
+"""
+
+def sections(query : str) -> str:
+    """Sections of a converted rule following the meta section."""
+    return query[query.index("    events:"):]
+
+def test_chronicle_yaral_count_by_field():
+    assert sections(chronicleBackendYaral().convert(aggregation_rule("sel | count() by User > 10", "    timeframe: 5m"))[0]) == """    events:
+        ($selection.principal.process.file.full_path = /.*\\\\net\\.exe$/ nocase)
+        $selection.src.user.user_display_name = $src_user_user_display_name
+    match:
+        $src_user_user_display_name over 5m
+    condition:
+        #selection > 10
+}"""
+
+def test_chronicle_yaral_count_distinct():
+    assert sections(chronicleBackendYaral().convert(aggregation_rule("sel | count(CommandLine) by User, ParentImage >= 3", "    timeframe: 2h"))[0]) == """    events:
+        ($selection.principal.process.file.full_path = /.*\\\\net\\.exe$/ nocase)
+        $selection.src.user.user_display_name = $src_user_user_display_name
+        $selection.src.process.file.full_path = $src_process_file_full_path
+    match:
+        $src_user_user_display_name, $src_process_file_full_path over 2h
+    outcome:
+        $value_count = count_distinct($selection.principal.process.command_line)
+    condition:
+        $selection and $value_count >= 3
+}"""
+
+def test_chronicle_aggregation_rule_unchanged():
+    rules = aggregation_rule("sel | count() by User > 10", "    timeframe: 5m")
+    expected = chronicleBackendYaral().convert(aggregation_rule("sel | count() by User > 10", "    timeframe: 5m"))
+    assert chronicleBackendYaral().convert(rules) == expected
+    assert chronicleBackendYaral().convert(rules) == expected
+    with pytest.raises(SigmaFeatureNotSupportedByBackendError, match="only supported by the Chronicle YARA-L backend"):
+        chronicleBackendUdm().convert(rules)
+    assert chronicleBackendYaral().convert(rules) == expected
+    assert rules.rules[0].detection.condition == ["sel | count() by User > 10"]
+    assert "timeframe" in rules.rules[0].detection.detections
+
+def test_chronicle_yaral_count_default_timeframe():
+    query = chronicleBackendYaral(aggregation_timeframe="30m").convert(aggregation_rule("sel | count() by User > 10"))[0]
+    assert "$src_user_user_display_name over 30m" in query
+
+def test_chronicle_yaral_count_without_group_by():
+    assert sections(chronicleBackendYaral().convert(aggregation_rule("sel | count() > 10", "    timeframe: 5m"))[0]) == """    events:
+        ($selection.principal.process.file.full_path = /.*\\\\net\\.exe$/ nocase)
+        $selection.principal.hostname = $principal_hostname
+    match:
+        $principal_hostname over 5m
+    condition:
+        #selection > 10
+}"""
+    query = chronicleBackendYaral(aggregation_group_by="target.hostname").convert(aggregation_rule("sel | count() > 10"))[0]
+    assert "$target_hostname over 1h" in query
+    backend = chronicleBackendYaral(aggregation_group_by="")
+    with pytest.raises(SigmaFeatureNotSupportedByBackendError, match="without group-by"):
+        backend.convert(aggregation_rule("sel | count() > 10"))
+    assert backend.optimizer_stats == {}
+
+@pytest.mark.parametrize("condition,message", [
+    ("sel | near other", "near aggregation"),
+    ("sel | max(Duration) by User > 10", "max aggregation"),
+])
+def test_chronicle_yaral_unsupported_aggregations(condition, message):
+    with pytest.raises(SigmaFeatureNotSupportedByBackendError, match=message):
+        chronicleBackendYaral().convert(aggregation_rule(condition))
+
+def test_chronicle_aggregation_invalid_expression():
+    with pytest.raises(SigmaConditionError, match="Invalid aggregation"):
+        parse_aggregation("sel | count() by")
+
+def test_chronicle_udm_aggregation_not_supported():
+    backend = chronicleBackendUdm()
+    with pytest.raises(SigmaFeatureNotSupportedByBackendError, match="only supported by the Chronicle YARA-L backend"):
+        backend.convert(aggregation_rule("sel | count() by User > 10"))
+    assert backend.optimizer_stats == {}
+
+def test_chronicle_yaral_event_count_correlation():
+    rules = SigmaCollection.from_yaml(referenced_rules + """
+title: Many net
+status: test
+correlation:
+    type: event_count
+    rules:
+        - net
+        - whoami
+    group-by:
+        - User
+    timespan: 1h
+    condition:
+        gte: 10
+""")
+    assert sections(chronicleBackendYaral().convert(rules)[0]) == """    events:
+        (($selection.principal.process.file.full_path = /.*\\\\net\\.exe$/ nocase) or ($selection.principal.process.file.full_path = /.*\\\\whoami\\.exe$/ nocase))
+        $selection.src.user.user_display_name = $src_user_user_display_name
+    match:
+        $src_user_user_display_name over 1h
+    condition:
+        #selection >= 10
+}"""
+
+def test_chronicle_yaral_value_count_correlation():
+    rules = SigmaCollection.from_yaml(referenced_rules + """
+title: Many command lines
+status: test
+correlation:
+    type: value_count
+    rules:
+        - net
+    group-by:
+        - User
+    timespan: 1d
+    condition:
+        field: CommandLine
+        gt: 5
+""")
+    assert sections(chronicleBackendYaral().convert(rules)[-1]) == """    events:
+        ($selection.principal.process.file.full_path = /.*\\\\net\\.exe$/ nocase)
+        $selection.src.user.user_display_name = $src_user_user_display_name
+    match:
+        $src_user_user_display_name over 1d
+    outcome:
+        $value_count = count_distinct($selection.principal.process.command_line)
+    condition:
+        $selection and $value_count > 5
+}"""
+
+@pytest.mark.parametrize("correlation_type,constraint", [
+    ("temporal", ""),
+    ("temporal_ordered", "        $e1.metadata.event_timestamp.seconds < $e2.metadata.event_timestamp.seconds\n"),
+])
+def test_chronicle_yaral_temporal_correlation(correlation_type, constraint):
+    rules = SigmaCollection.from_yaml(referenced_rules + f"""
+title: Discovery
+status: test
+correlation:
+    type: {correlation_type}
+    rules:
+        - net
+        - whoami
+    group-by:
+        - User
+    timespan: 90s
+""")
+    assert sections(chronicleBackendYaral().convert(rules)[0]) == f"""    events:
+        ($e1.principal.process.file.full_path = /.*\\\\net\\.exe$/ nocase)
+        $e1.src.user.user_display_name = $src_user_user_display_name
+        ($e2.principal.process.file.full_path = /.*\\\\whoami\\.exe$/ nocase)
+        $e2.src.user.user_display_name = $src_user_user_display_name
+{constraint}    match:
+        $src_user_user_display_name over 2m
+    condition:
+        $e1 and $e2
+}}"""
+
+@pytest.mark.parametrize("seconds,window", [
+    (30, "1m"),
+    (90, "2m"),
+    (300, "5m"),
+    (7200, "2h"),
+    (172800, "2d"),
+    (5400, "90m"),
+])
+def test_chronicle_yaral_window(seconds, window):
+    assert yaral_window(seconds) == window
+
+def test_chronicle_rename_event_variable_skips_values():
+    assert rename_event_variable(
+        '$selection.a = "$selection.b" AND $selection.c = /\\$selection.d/',
+        "$e1",
+    ) == '$e1.a = "$selection.b" AND $e1.c = /\\$selection.d/'
@@ -1,149 +1,172 @@
-import pytest
-from sigma.collection import SigmaCollection
-from sigma.backends.chronicle import chronicleBackend
-
-@pytest.fixture
-def chronicle_backend():
-    return chronicleBackend()
-
-# TODO: implement tests for some basic queries and their expected results.
-def test_chronicle_and_expression(chronicle_backend : chronicleBackend):
-    assert chronicle_backend.convert(
-        SigmaCollection.from_yaml("""
-            title: Test
-            status: test
-            logsource:
-                category: test_category
-                product: test_product
-            detection:
-                sel:
-                    fieldA: valueA
-                    fieldB: valueB
-                condition: sel
-        """)
-    ) == ['<insert expected result here>']
-
-def test_chronicle_or_expression(chronicle_backend : chronicleBackend):
-    assert chronicle_backend.convert(
-        SigmaCollection.from_yaml("""
-            title: Test
-            status: test
-            logsource:
-                category: test_category
-                product: test_product
-            detection:
-                sel1:
-                    fieldA: valueA
-                sel2:
-                    fieldB: valueB
-                condition: 1 of sel*
-        """)
-    ) == ['<insert expected result here>']
-
-def test_chronicle_and_or_expression(chronicle_backend : chronicleBackend):
-    assert chronicle_backend.convert(
-        SigmaCollection.from_yaml("""
-            title: Test
-            status: test
-            logsource:
-                category: test_category
-                product: test_product
-            detection:
-                sel:
-                    fieldA:
-                        - valueA1
-                        - valueA2
-                    fieldB:
-                        - valueB1
-                        - valueB2
-                condition: sel
-        """)
-    ) == ['<insert expected result here>']
-
-def test_chronicle_or_and_expression(chronicle_backend : chronicleBackend):
-    assert chronicle_backend.convert(
-        SigmaCollection.from_yaml("""
-            title: Test
-            status: test
-            logsource:
-                category: test_category
-                product: test_product
-            detection:
-                sel1:
-                    fieldA: valueA1
-                    fieldB: valueB1
-                sel2:
-                    fieldA: valueA2
-                    fieldB: valueB2
-                condition: 1 of sel*
-        """)
-    ) == ['<insert expected result here>']
-
-def test_chronicle_in_expression(chronicle_backend : chronicleBackend):
-    assert chronicle_backend.convert(
-        SigmaCollection.from_yaml("""
-            title: Test
-            status: test
-            logsource:
-                category: test_category
-                product: test_product
-            detection:
-                sel:
-                    fieldA:
-                        - valueA
-                        - valueB
-                        - valueC*
-                condition: sel
-        """)
-    ) == ['<insert expected result here>']
-
-def test_chronicle_regex_query(chronicle_backend : chronicleBackend):
-    assert chronicle_backend.convert(
-        SigmaCollection.from_yaml("""
-            title: Test
-            status: test
-            logsource:
-                category: test_category
-                product: test_product
-            detection:
-                sel:
-                    fieldA|re: foo.*bar
-                    fieldB: foo
-                condition: sel
-        """)
-    ) == ['<insert expected result here>']
-
-def test_chronicle_cidr_query(chronicle_backend : chronicleBackend):
-    assert chronicle_backend.convert(
-        SigmaCollection.from_yaml("""
-            title: Test
-            status: test
-            logsource:
-                category: test_category
-                product: test_product
-            detection:
-                sel:
-                    field|cidr: 192.168.0.0/16
-                condition: sel
-        """)
-    ) == ['<insert expected result here>']
-
-def test_chronicle_field_name_with_whitespace(chronicle_backend : chronicleBackend):
-    assert chronicle_backend.convert(
-        SigmaCollection.from_yaml("""
-            title: Test
-            status: test
-            logsource:
-                category: test_category
-                product: test_product
-            detection:
-                sel:
-                    field name: value
-                condition: sel
-        """)
-    ) == ['<insert expected result here>']
-
-# TODO: implement tests for all backend features that don't belong to the base class defaults, e.g. features that were
-# implemented with custom code, deferred expressions etc.
-
-
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+
+@pytest.fixture
+def chronicle_udm_backend():
+    return chronicleBackendUdm()
+
+@pytest.fixture
+def chronicle_yaral_backend():
+    return chronicleBackendYaral()
+
+def rule(detection : str) -> SigmaCollection:
+    return SigmaCollection.from_yaml(f"""
+            title: Test
+            status: test
+            logsource:
+                category: process_creation
+                product: windows
+            detection:
+{detection}
+        """)
+
+def udm_query(backend : chronicleBackendUdm, detection : str) -> str:
+    """Query of a converted rule without the metadata comments."""
+    return backend.convert(rule(detection))[0].split("\n")[0]
+
+def yaral_events(backend : chronicleBackendYaral, detection : str) -> str:
+    """Events expression of a converted rule."""
+    lines = backend.convert(rule(detection))[0].split("\n")
+    return lines[lines.index("    events:") + 1].strip()
+
+and_expression = """
+                sel:
+                    Image: valueA
+                    CommandLine: valueB
+                condition: sel"""
+
+def test_chronicle_udm_and_expression(chronicle_udm_backend : chronicleBackendUdm):
+    assert udm_query(chronicle_udm_backend, and_expression) == \
+        '(principal.process.file.full_path = "valueA" nocase AND principal.process.command_line = "valueB" nocase)'
+
+def test_chronicle_udm_or_expression(chronicle_udm_backend : chronicleBackendUdm):
+    assert udm_query(chronicle_udm_backend, """
+                sel1:
+                    Image: valueA
+                sel2:
+                    CommandLine: valueB
+                condition: 1 of sel*""") == \
+        '(principal.process.file.full_path = "valueA" nocase OR principal.process.command_line = "valueB" nocase)'
+
+def test_chronicle_udm_and_or_expression(chronicle_udm_backend : chronicleBackendUdm):
+    assert udm_query(chronicle_udm_backend, """
+                sel:
+                    Image:
+                        - valueA1
+                        - valueA2
+                    CommandLine:
+                        - valueB1
+                        - valueB2
+                condition: sel""") == \
+        '((principal.process.file.full_path = "valueA1" nocase OR principal.process.file.full_path = "valueA2" nocase) AND ' \
+        '(principal.process.command_line = "valueB1" nocase OR principal.process.command_line = "valueB2" nocase))'
+
+def test_chronicle_udm_or_and_expression(chronicle_udm_backend : chronicleBackendUdm):
+    assert udm_query(chronicle_udm_backend, """
+                sel1:
+                    Image: valueA1
+                    CommandLine: valueB1
+                sel2:
+                    Image: valueA2
+                    CommandLine: valueB2
+                condition: 1 of sel*""") == \
+        '((principal.process.file.full_path = "valueA1" nocase AND principal.process.command_line = "valueB1" nocase) OR ' \
+        '(principal.process.file.full_path = "valueA2" nocase AND principal.process.command_line = "valueB2" nocase))'
+
+def test_chronicle_udm_in_expression(chronicle_udm_backend : chronicleBackendUdm):
+    assert udm_query(chronicle_udm_backend, """
+                sel:
+                    Image:
+                        - valueA
+                        - valueB
+                        - valueC*
+                condition: sel""") == \
+        '(principal.process.file.full_path = "valueA" nocase OR principal.process.file.full_path = "valueB" nocase OR ' \
+        'principal.process.file.full_path = /^valueC.*/ nocase)'
+
+def test_chronicle_udm_regex_query(chronicle_udm_backend : chronicleBackendUdm):
+    assert udm_query(chronicle_udm_backend, """
+                sel:
+                    Image|re: foo.*bar
+                    CommandLine: foo
+                condition: sel""") == \
+        '(principal.process.file.full_path = /foo.*bar/ nocase AND principal.process.command_line = "foo" nocase)'
+
+def test_chronicle_udm_not_expression(chronicle_udm_backend : chronicleBackendUdm):
+    assert udm_query(chronicle_udm_backend, """
+                sel:
+                    Image: a
+                filter:
+                    CommandLine|contains: b
+                condition: sel and not filter""") == \
+        '(principal.process.file.full_path = "a" nocase AND (NOT principal.process.command_line = /.*b.*/ nocase))'
+
+def test_chronicle_udm_number_query(chronicle_udm_backend : chronicleBackendUdm):
+    assert udm_query(chronicle_udm_backend, """
+                sel:
+                    ProcessId: 4
+                condition: sel""") == '(principal.process.pid = "4")'
+
+def test_chronicle_udm_quotes_in_values(chronicle_udm_backend : chronicleBackendUdm):
+    assert udm_query(chronicle_udm_backend, r"""
+                sel:
+                    CommandLine: 'echo "it''s" C:\\dir'
+                    Image: 'a"b'
+                condition: sel""") == \
+        '(principal.process.command_line = "echo \\"it\'s\\" C:\\\\dir" nocase AND principal.process.file.full_path = "a\\"b" nocase)'
+
+def test_chronicle_udm_metadata(chronicle_udm_backend : chronicleBackendUdm):
+    assert chronicle_udm_backend.convert(rule(and_expression))[0].split("\n")[1:] == [
+        "// Author: None",
+        "// Description: None",
+        "// False positives: []",
+        "// Level: None",
+        "// ID: None",
+        "",
+    ]
+
+def test_chronicle_yaral_rule(chronicle_yaral_backend : chronicleBackendYaral):
+    assert chronicle_yaral_backend.convert(rule(and_expression)) == ["""rule SIGMA_Test
+{
+    meta:
+        author = "None"
+        description = "None"
+        id = "None"
+        status = "None"
+        false_positives = "[]"
+        references = "[]"
+    events:
+        ($selection.principal.process.file.full_path = "valueA" nocase AND $selection.principal.process.command_line = "valueB" nocase)
+    condition:
+        $selection
+}"""]
+
+def test_chronicle_yaral_or_and_expression(chronicle_yaral_backend : chronicleBackendYaral):
+    assert yaral_events(chronicle_yaral_backend, """
+                sel1:
+                    Image: valueA1
+                    CommandLine: valueB1
+                sel2:
+                    Image: valueA2
+                    CommandLine: valueB2
+                condition: 1 of sel*""") == \
+        '(($selection.principal.process.file.full_path = "valueA1" nocase AND $selection.principal.process.command_line = "valueB1" nocase) OR ' \
+        '($selection.principal.process.file.full_path = "valueA2" nocase AND $selection.principal.process.command_line = "valueB2" nocase))'
+
+def test_chronicle_yaral_regex_query(chronicle_yaral_backend : chronicleBackendYaral):
+    assert yaral_events(chronicle_yaral_backend, """
+                sel:
+                    Image|re: foo.*bar
+                    CommandLine: foo
+                condition: sel""") == \
+        '(re.regex($selection.principal.process.file.full_path, `foo.*bar`) nocase AND $selection.principal.process.command_line = "foo" nocase)'
+
+def test_chronicle_yaral_not_expression(chronicle_yaral_backend : chronicleBackendYaral):
+    assert yaral_events(chronicle_yaral_backend, """
+                sel:
+                    Image: a
+                filter:
+                    CommandLine|contains: b
+                condition: sel and not filter""") == \
+        '($selection.principal.process.file.full_path = "a" nocase AND (NOT $selection.principal.process.command_line = /.*b.*/ nocase))'
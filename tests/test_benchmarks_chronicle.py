@@ -0,0 +1,48 @@
+import importlib.util
+from pathlib import Path
+import pytest
+
+# The benchmarks are scripts outside of the package, their corpus generator and regression check are tested here.
+spec = importlib.util.spec_from_file_location("conversion_benchmark", Path(__file__).parent.parent / "benchmarks" / "conversion.py")
+conversion_benchmark = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(conversion_benchmark)
+
+def results(**metrics) -> dict:
+    backend = {
+        "rules_per_second": 100.0,
+        "latency_p50_ms": 2.0,
+        "latency_p99_ms": 20.0,
+        "peak_rss_mb": 80.0,
+    }
+    backend.update(metrics)
+    return {"corpus": {"rules": 1000, "seed": 0}, "backends": {"udm": backend}}
+
+def test_chronicle_benchmark_corpus_deterministic():
+    assert conversion_benchmark.generate_corpus(20, seed=1) == conversion_benchmark.generate_corpus(20, seed=1)
+    assert conversion_benchmark.generate_corpus(20, seed=1) != conversion_benchmark.generate_corpus(20, seed=2)
+
+@pytest.mark.parametrize("backend", ["udm", "yaral"])
+def test_chronicle_benchmark_corpus_converts(backend):
+    result = conversion_benchmark.measure(backend, 50, seed=0)
+    assert result["rules"] == 50
+    assert result["errors"] == 0
+    assert result["latency_p50_ms"] <= result["latency_p99_ms"] <= result["latency_max_ms"]
+    assert result["peak_rss_mb"] > 0
+
+def test_chronicle_benchmark_no_regression():
+    assert conversion_benchmark.compare(results(rules_per_second=95.0, peak_rss_mb=60.0), results(), threshold=10) == []
+
+@pytest.mark.parametrize("metric,value", [
+    ("rules_per_second", 80.0),
+    ("latency_p50_ms", 2.5),
+    ("latency_p99_ms", 30.0),
+    ("peak_rss_mb", 100.0),
+])
+def test_chronicle_benchmark_regression(metric, value):
+    regressions = conversion_benchmark.compare(results(**{metric: value}), results(), threshold=10)
+    assert len(regressions) == 1 and regressions[0].startswith(f"udm {metric}")
+
+def test_chronicle_benchmark_different_corpus():
+    baseline = results()
+    baseline["corpus"]["rules"] = 50000
+    assert "differs from baseline" in conversion_benchmark.compare(results(), baseline, threshold=10)[0]
@@ -0,0 +1,116 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle.cache import ConversionCache
+
+def process_creation_rule(index : int, value : str = "value") -> str:
+    return f"""
+title: Test {index}
+id: 00000000-0000-0000-0000-{index:012d}
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        CommandLine|contains: {value}{index}
+    condition: sel
+"""
+
+@pytest.fixture
+def cache(tmp_path):
+    return ConversionCache(tmp_path / "cache")
+
+def test_chronicle_cache_serves_unchanged_rules(cache, monkeypatch):
+    sources = [process_creation_rule(index) for index in range(3)]
+    backend = chronicleBackendUdm()
+    first = list(backend.convert_stream(sources, cache=cache))
+    assert (cache.hits, cache.misses) == (0, 3)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cached rule was converted again")
+    monkeypatch.setattr(backend, "convert_rule", fail)
+    assert list(backend.convert_stream(sources, cache=cache)) == first
+    assert (cache.hits, cache.misses) == (3, 3)
+
+def test_chronicle_cache_reconverts_changed_rules(cache):
+    backend = chronicleBackendUdm()
+    list(backend.convert_stream([process_creation_rule(0)], cache=cache))
+    (rule_id, query), = backend.convert_stream([process_creation_rule(0, "changed")], cache=cache)
+    assert "changed0" in query
+    assert cache.misses == 2
+
+def test_chronicle_cache_context_key():
+    cache_key = ConversionCache.context_key
+    udm = chronicleBackendUdm()
+    assert cache_key(None, udm, "default") == cache_key(None, chronicleBackendUdm(), "default")
+    assert cache_key(None, udm, "default") != cache_key(None, chronicleBackendYaral(), "default")
+    assert cache_key(None, udm, "default") != cache_key(None, chronicleBackendUdm(option="value"), "default")
+
+def test_chronicle_cache_context_key_hash_seed():
+    script = "from sigma.backends.chronicle import chronicleBackendUdm; from sigma.backends.chronicle.cache import ConversionCache; print(ConversionCache.context_key(None, chronicleBackendUdm(), 'default'))"
+    keys = {
+        subprocess.run(
+            [sys.executable, "-c", script], env={**os.environ, "PYTHONHASHSEED": seed}, cwd=Path(__file__).parent.parent,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        for seed in ("1", "2")
+    }
+    assert len(keys) == 1
+
+def test_chronicle_cache_skips_failed_conversions(cache):
+    backend = chronicleBackendUdm(collect_errors=True)
+    unsupported = process_creation_rule(0).replace("process_creation", "test_category")
+    assert list(backend.convert_stream([unsupported], cache=cache)) == []
+    assert cache.size() == 0
+
+def test_chronicle_cache_eviction(tmp_path):
+    cache = ConversionCache(tmp_path)
+    for index in range(5):
+        cache.put(f"{index:064x}", [("id", "x" * 100)])
+        os.utime(cache.path(f"{index:064x}"), (index, index))
+    assert cache.evict(300) == 3
+    assert cache.size() <= 300
+    assert cache.get(f"{4:064x}") == ([("id", "x" * 100)], {}, {})
+    assert cache.get(f"{0:064x}") is None
+
+def test_chronicle_cache_invalidate_and_clear(cache):
+    cache.put("a" * 64, [("id", "query")])
+    cache.put("b" * 64, [("id", "query")])
+    cache.invalidate("a" * 64)
+    assert cache.get("a" * 64) is None
+    assert cache.get("b" * 64) == ([("id", "query")], {}, {})
+    cache.clear()
+    assert cache.get("b" * 64) is None
+    assert cache.size() == 0
+
+def test_chronicle_cache_unreadable_entries(cache):
+    key = "c" * 64
+    cache.path(key).parent.mkdir()
+    for content in ([["id", "query"]], {"results": "query"}, "{"):
+        cache.path(key).write_text(content if isinstance(content, str) else json.dumps(content))
+        assert cache.get(key) is None
+    assert (cache.hits, cache.misses) == (0, 3)
+
+def test_chronicle_cache_context_key_entry_format(cache, monkeypatch):
+    key = cache.context_key(chronicleBackendUdm(), "default")
+    monkeypatch.setattr(ConversionCache, "entry_format", ConversionCache.entry_format + 1)
+    assert cache.context_key(chronicleBackendUdm(), "default") != key
+
+def test_chronicle_cache_replays_records(cache):
+    sources = [process_creation_rule(0), process_creation_rule(1).replace("CommandLine|contains: value1", "CommandLine|re: '(a+)+'")]
+    options = {"estimate_cost": True, "fingerprint_rules": True, "regex_policy": "allow"}
+    converted = chronicleBackendYaral(**options)
+    list(converted.convert_stream(sources, cache=cache))
+    served = chronicleBackendYaral(**options)
+    list(served.convert_stream(sources, cache=cache))
+    assert cache.hits == 2
+    assert served.optimizer_stats == converted.optimizer_stats
+    assert served.regex_findings == converted.regex_findings and served.regex_findings
+    assert served.costs.costs == converted.costs.costs
+    assert served.fingerprints.fingerprints == converted.fingerprints.fingerprints
+    assert [fingerprint.canonical for fingerprint in served.fingerprints.fingerprints] == [fingerprint.canonical for fingerprint in converted.fingerprints.fingerprints]
@@ -0,0 +1,84 @@
+import ipaddress
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.types import SigmaCIDRExpression
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle.evaluate import QueryEvaluator
+from sigma.backends.chronicle.query import Comparison, ReferenceList, parse_query
+from sigma.backends.chronicle.reference_lists import ReferenceLists
+from sigma.backends.chronicle.values import collapse_networks
+
+def network_rule(networks, modifier : str = "cidr") -> str:
+    values = "".join(f"\n            - '{network}'" for network in networks)
+    return f"""
+title: Network Rule
+id: 00000000-0000-0000-0000-000000000001
+status: test
+logsource:
+    category: network_connection
+    product: windows
+detection:
+    sel:
+        DestinationIp|{modifier}:{values}
+    condition: sel
+"""
+
+def udm_condition(backend, networks, modifier : str = "cidr") -> str:
+    return backend.convert(SigmaCollection.from_yaml(network_rule(networks, modifier)))[0].split("\n//")[0][1:-1]
+
+def test_chronicle_cidr_single():
+    assert udm_condition(chronicleBackendUdm(), ["10.0.0.0/8"]) == 'net.ip_in_range_cidr(target.ip, "10.0.0.0/8")'
+    yaral = chronicleBackendYaral().convert(SigmaCollection.from_yaml(network_rule(["10.0.0.0/8"])))[0]
+    assert '        (net.ip_in_range_cidr($selection.target.ip, "10.0.0.0/8"))\n' in yaral
+
+def test_chronicle_cidr_list_collapsed():
+    networks = ["192.168.1.128/25", "10.128.0.0/9", "fe80::/10", "192.168.1.0/24", "10.0.0.0/9", "10.1.2.0/24"]
+    assert udm_condition(chronicleBackendUdm(), networks) == (
+        'net.ip_in_range_cidr(target.ip, "10.0.0.0/8") OR '
+        'net.ip_in_range_cidr(target.ip, "192.168.1.0/24") OR '
+        'net.ip_in_range_cidr(target.ip, "fe80::/10")'
+    )
+
+def test_chronicle_cidr_all_not_collapsed():
+    assert udm_condition(chronicleBackendUdm(), ["10.0.0.0/9", "10.128.0.0/9"], "cidr|all") == (
+        'net.ip_in_range_cidr(target.ip, "10.0.0.0/9") AND net.ip_in_range_cidr(target.ip, "10.128.0.0/9")'
+    )
+
+@pytest.mark.parametrize("backend_class,field", [(chronicleBackendUdm, "target.ip"), (chronicleBackendYaral, "$selection.target.ip")])
+def test_chronicle_cidr_reference_list(backend_class, field):
+    backend = backend_class(reference_list_threshold=2)
+    output = backend.convert(SigmaCollection.from_yaml(network_rule(["10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16"])))[0]
+    [name] = backend.reference_lists.lists
+    assert name.startswith("sigma_cidr_")
+    assert f"{field} in cidr %{name}" in output
+    reference_list = backend.reference_lists[name]
+    assert (reference_list.values, reference_list.syntax) == (["10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16"], "cidr")
+    assert ReferenceLists.deserialize(ReferenceLists.serialize(backend.reference_lists.lists))[name].syntax == "cidr"
+
+def test_chronicle_cidr_reference_list_below_threshold():
+    backend = chronicleBackendUdm(reference_list_threshold=10)
+    assert udm_condition(backend, ["10.0.0.0/9", "10.128.0.0/9"]) == 'net.ip_in_range_cidr(target.ip, "10.0.0.0/8")'
+    assert backend.reference_lists.lists == {}
+    [name] = udm_condition(backend, ["10.0.0.0/8", "192.168.0.0/16"]).split("%")[1:]
+    assert backend.reference_lists[name].values == ["10.0.0.0/8", "192.168.0.0/16"]
+
+def test_chronicle_cidr_collapse_networks():
+    values = [SigmaCIDRExpression(network) for network in ("2001:db8::/33", "10.0.0.1/32", "2001:db8:8000::/33", "10.0.0.0/32")]
+    assert collapse_networks(values) == ["10.0.0.0/31", "2001:db8::/32"]
+
+def test_chronicle_cidr_parse_reference_list():
+    node = parse_query("target.ip in cidr %networks")
+    assert isinstance(node, Comparison) and node.right == ReferenceList("networks", position=18, cidr=True)
+
+def test_chronicle_cidr_evaluate():
+    networks = ["10.0.0.0/9", "10.128.0.0/9", "192.168.1.0/25", "2001:db8::/32"]
+    addresses = ["10.1.2.3", "10.200.0.1", "11.0.0.1", "192.168.1.1", "192.168.1.200", "2001:db8::1", "2001:db9::1", "host"]
+    events = [{"target": {"ip": address}} for address in addresses]
+    expected = [
+        index for index, address in enumerate(addresses)
+        if address != "host" and any(ipaddress.ip_address(address) in ipaddress.ip_network(network) for network in networks)
+    ]
+    backend = chronicleBackendUdm(reference_list_threshold=2)
+    queries = {"functions": udm_condition(chronicleBackendUdm(), networks), "list": udm_condition(backend, networks)}
+    reference_lists = {name: reference_list.values for name, reference_list in backend.reference_lists.lists.items()}
+    assert QueryEvaluator(queries, reference_lists).matches(events) == {"functions": expected, "list": expected}
@@ -0,0 +1,123 @@
+import json
+import sys
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.exceptions import SigmaConversionError
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle import cost as cost_module
+from sigma.backends.chronicle.cost import CostReport, QueryCost, alternatives, estimate_cost
+
+def process_creation_rule(index : int, detection : str = "        CommandLine|contains: value") -> str:
+    return f"""
+title: Test {index}
+id: 00000000-0000-0000-0000-{index:012d}
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+{detection}
+    condition: sel
+"""
+
+def score(query : str) -> float:
+    return estimate_cost(query).score
+
+def test_chronicle_cost_components():
+    cost = estimate_cost('"mimikatz" OR principal.hostname = /^(a|b|c)$/ nocase OR principal.process.command_line = /.*x.*/ nocase')
+    assert (cost.predicates, cost.regexes, cost.unanchored, cost.alternation_width, cost.or_fanout, cost.keyword_scans) == (3, 2, 1, 3, 3, 1)
+
+def test_chronicle_cost_ordering():
+    assert score('principal.hostname = "a" nocase') < score("principal.hostname = /^a$/ nocase") < score("principal.hostname = /.*a.*/ nocase")
+    assert score("principal.hostname = /.*a.*/ nocase") < score("principal.process.command_line = /.*a.*/ nocase")
+    assert score("principal.hostname = /^(a|b|c|d)$/ nocase") > score("principal.hostname = /^a$/ nocase")
+    assert score('"mimikatz"') > score("principal.process.command_line = /.*a.*/ nocase")
+
+def test_chronicle_cost_or_fanout():
+    queries = [" OR ".join(f"principal.process.command_line = /.*v{index}.*/ nocase" for index in range(count)) for count in (1, 10, 100)]
+    assert score(queries[0]) < score(queries[1]) < score(queries[2])
+
+def test_chronicle_cost_field_selectivity():
+    regex = "principal.process.command_line = /.*a.*/ nocase"
+    assert score(f'target.file.sha256 = "x" nocase AND {regex}') < score(f'metadata.event_type = "PROCESS_LAUNCH" AND {regex}') < score(regex)
+
+@pytest.mark.parametrize("pattern,count", [
+    ("abc", 1),
+    ("a|b|c", 3),
+    ("x(a|b)y|z", 2),
+    ("[|]|a", 2),
+    ("\\|a", 1),
+])
+def test_chronicle_cost_alternatives(pattern, count):
+    assert alternatives(pattern) == count
+
+def test_chronicle_cost_string_match_modes():
+    rules = SigmaCollection.from_yaml(process_creation_rule(1, "        CommandLine|contains: value\n        Image|endswith: '\\\\cmd.exe'"))
+    scores = [estimate_cost(chronicleBackendUdm(string_match_mode=mode).convert(rules)[0]).score for mode in ("regex", "minimal", "functions")]
+    assert scores[0] > scores[1] > scores[2]
+
+def test_chronicle_cost_disabled_by_default():
+    backend = chronicleBackendUdm()
+    assert backend.costs is None
+    assert "// Cost" not in backend.convert(SigmaCollection.from_yaml(process_creation_rule(1)))[0]
+
+def test_chronicle_udm_cost_output():
+    backend = chronicleBackendUdm(estimate_cost=True)
+    query = backend.convert(SigmaCollection.from_yaml(process_creation_rule(1)))[0]
+    cost = backend.costs.costs[0]
+    assert cost.rule_id == "00000000-0000-0000-0000-000000000001"
+    assert query.endswith(f"// Cost: {cost.score}\n")
+    assert cost.score == score("principal.process.command_line = /.*value.*/ nocase")
+
+def test_chronicle_yaral_cost_output():
+    backend = chronicleBackendYaral(estimate_cost="true")
+    rules = SigmaCollection.from_yaml(process_creation_rule(1))
+    text = backend.convert(rules)[0]
+    cost = backend.costs.costs[0]
+    assert f'        cost = "{cost.score}"\n    events:' in text
+    assert estimate_cost(text).score == cost.score
+    record = json.loads(chronicleBackendYaral(estimate_cost=True).convert(rules, "ndjson"))
+    assert record["cost"] == cost.score
+
+def test_chronicle_max_cost():
+    backend = chronicleBackendYaral(max_cost=10, collect_errors=True)
+    queries = backend.convert(SigmaCollection.from_yaml(
+        process_creation_rule(1, "        Image: 'C:\\\\Windows\\\\cmd.exe'") + "---" + process_creation_rule(2)
+    ))
+    assert len(queries) == 1
+    rule, error = backend.errors[0]
+    assert str(rule.id) == "00000000-0000-0000-0000-000000000002"
+    assert isinstance(error, SigmaConversionError)
+    assert "exceeds the maximum of 10" in str(error)
+    assert len(backend.costs.costs) == 2
+
+def test_chronicle_cost_parallel():
+    backend = chronicleBackendUdm(estimate_cost=True)
+    backend.convert_parallel(SigmaCollection.from_yaml("---".join(process_creation_rule(index) for index in range(4))), workers=2)
+    assert sorted(cost.rule_id for cost in backend.costs.costs) == [f"00000000-0000-0000-0000-{index:012d}" for index in range(4)]
+
+def test_chronicle_cost_report():
+    report = CostReport([QueryCost("a", 5.0, 0.1), QueryCost("b", 500.0, 0.1, keyword_scans=2), QueryCost("c", 50.0, 0.1)])
+    assert [cost.rule_id for cost in report.expensive(10)] == ["b", "c"]
+    result = report.to_dict(threshold=10)
+    assert (result["rules"], result["total"], result["max"], result["keyword_scans"]) == (3, 555.0, 500.0, 2)
+    assert result["expensive"] == ["b", "c"]
+    text = report.to_text(top=1)
+    assert text.splitlines()[0] == "3 queries, total cost 555.0, mean 185.0, p90 410.0, max 500.0"
+    assert text.splitlines()[-1].endswith("  b")
+    assert "2 queries above the threshold of 10" in report.to_text(threshold=10)
+
+def test_chronicle_cost_cli(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "rules.ndjson"
+    path.write_text(chronicleBackendYaral().convert(SigmaCollection.from_yaml(
+        process_creation_rule(1, "        Image: 'C:\\\\Windows\\\\cmd.exe'") + "---" + process_creation_rule(2)
+    ), "ndjson"))
+    monkeypatch.setattr(sys, "argv", ["cost", str(path), "--threshold", "10"])
+    with pytest.raises(SystemExit) as exit:
+        cost_module.main()
+    assert exit.value.code == 1
+    assert capsys.readouterr().out.splitlines()[-1].endswith("00000000-0000-0000-0000-000000000002")
+    monkeypatch.setattr(sys, "argv", ["cost", str(path), "--json"])
+    cost_module.main()
+    assert json.loads(capsys.readouterr().out)["rules"] == 2
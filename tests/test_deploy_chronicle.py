@@ -0,0 +1,191 @@
+import asyncio
+import io
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from sigma.collection import SigmaCollection
+from sigma.backends.chronicle import chronicleBackendYaral
+from sigma.backends.chronicle.deploy import ConnectionPool, DeployState, RulesDeployer, read_records, retry_after_seconds
+from sigma.backends.chronicle.mock_server import MockRulesServer
+from sigma.backends.chronicle.output import content_hash
+
+parent = "projects/p/locations/eu/instances/i"
+
+def records(count : int, suffix : str = "") -> list:
+    return [{"id": f"rule-{index}", "title": f"Rule {index}", "rule": f"rule rule_{index} {{{suffix}}}"} for index in range(count)]
+
+def run(server : MockRulesServer, deploy):
+    async def main():
+        async with server:
+            return await deploy(server.base_url)
+    return asyncio.run(main())
+
+def test_chronicle_deploy_create_update_unchanged():
+    server = MockRulesServer()
+    state = DeployState()
+
+    async def deploy(base_url):
+        deployer = RulesDeployer(base_url, parent, token="secret", state=state, concurrency=4)
+        first = await deployer.deploy(records(10))
+        second = await deployer.deploy(records(3, " ") + records(10)[3:])
+        return first, second
+
+    first, second = run(server, deploy)
+    assert (first.created, first.updated, first.unchanged, first.failed) == (10, 0, 0, 0)
+    assert (second.created, second.updated, second.unchanged, second.failed) == (0, 3, 7, 0)
+    assert len(server.rules) == 10
+    assert server.rules[state.name("rule-0")] == "rule rule_0 { }"
+    assert state.rules["rule-9"]["content_hash"] == content_hash("rule rule_9 {}")
+
+def test_chronicle_deploy_recreates_deleted_rule():
+    server = MockRulesServer()
+    state = DeployState({"rule-0": {"content_hash": "sha256:old", "name": f"{parent}/rules/deleted"}})
+    stats = run(server, lambda base_url: RulesDeployer(base_url, parent, state=state).deploy(records(1)))
+    assert stats.created == 1
+    assert state.name("rule-0") in server.rules
+
+def test_chronicle_deploy_state_file(tmp_path):
+    path = tmp_path / "state.json"
+    assert DeployState.load(path).rules == {}
+    state = DeployState()
+    state.update("rule-0", "sha256:0", f"{parent}/rules/ru_1")
+    state.save(path)
+    assert DeployState.load(path).rules == state.rules
+
+def test_chronicle_deploy_retries_server_errors():
+    server = MockRulesServer(fail_rate=0.3, seed=1)
+    stats = run(server, lambda base_url: RulesDeployer(base_url, parent, concurrency=4, max_retries=10, backoff=0.001).deploy(records(20)))
+    assert stats.created == 20
+    assert stats.retries == server.rejected > 0
+
+def test_chronicle_deploy_rate_limit():
+    server = MockRulesServer(rate_limit=5, retry_after=0.2)
+    stats = run(server, lambda base_url: RulesDeployer(base_url, parent, concurrency=4, backoff=0.001).deploy(records(8)))
+    assert stats.created == 8
+    assert stats.retries > 0
+    assert stats.seconds >= 0.2
+
+def test_chronicle_deploy_retry_after_seconds():
+    assert retry_after_seconds("2.5") == 2.5
+    assert retry_after_seconds(None) is None
+    assert retry_after_seconds("soon") is None
+    assert 9 < retry_after_seconds(format_datetime(datetime.now(timezone.utc) + timedelta(seconds=10), usegmt=True)) <= 10
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+class UnusualResponsesServer(MockRulesServer):
+    """Answers the first request with a 429 with an HTTP-date Retry-After and the first rule with a body that isn't JSON."""
+    async def handle_request(self, method, target, body):
+        if self.requests == 0:
+            self.requests += 1
+            return 429, {"Retry-After": format_datetime(datetime.now(timezone.utc), usegmt=True)}, {}
+        status, headers, response = await super().handle_request(method, target, body)
+        if b"rule_0" in body:
+            return status, headers, b"<html>created</html>"
+        return status, headers, response
+
+def test_chronicle_deploy_unusual_responses():
+    server = UnusualResponsesServer()
+    stats = run(server, lambda base_url: RulesDeployer(base_url, parent, concurrency=1, backoff=0.001).deploy(records(3)))
+    assert (stats.created, stats.failed, stats.retries) == (3, 0, 1)
+    assert [result.name is None for result in stats.results] == [True, False, False]
+
+def test_chronicle_deploy_records_failures_per_rule():
+    server = MockRulesServer()
+    stats = run(server, lambda base_url: RulesDeployer(base_url, parent).deploy([{"id": "broken"}] + records(2)))
+    assert (stats.created, stats.failed) == (2, 1)
+    [failed] = [result for result in stats.results if result.action == "failed"]
+    assert failed.rule_id == "broken" and failed.error == "KeyError: 'rule'"
+
+def test_chronicle_deploy_gives_up_after_max_retries():
+    server = MockRulesServer(fail_rate=1.0)
+    stats = run(server, lambda base_url: RulesDeployer(base_url, parent, max_retries=2, backoff=0.001).deploy(records(2)))
+    assert stats.failed == 2
+    assert all(result.attempts == 3 and "HTTP 503" in result.error for result in stats.results)
+
+def test_chronicle_deploy_connection_error():
+    stats = asyncio.run(RulesDeployer("http://127.0.0.1:1", parent, max_retries=1, backoff=0.001).deploy(records(1)))
+    assert stats.failed == 1
+    assert stats.results[0].error.startswith("GET ")        # the failed creation is looked up before it's sent again
+
+class LostResponseServer(MockRulesServer):
+    """Creates the rules of the first posts_lost creations, but only responds after the client timed out."""
+    def __init__(self, posts_lost : int = 1, status : int = 200, **kwargs):
+        super().__init__(**kwargs)
+        self.posts_lost = posts_lost
+        self.status = status
+        self.posts = 0
+
+    async def handle_request(self, method, target, body):
+        status, headers, response = await super().handle_request(method, target, body)
+        if method == "POST":
+            self.posts += 1
+            if self.posts <= self.posts_lost:
+                if self.status != 200:
+                    return self.status, {}, {"error": {"code": self.status}}
+                await asyncio.sleep(1.0)
+        return status, headers, response
+
+def test_chronicle_deploy_lost_creation_response():
+    server = LostResponseServer(page_size=2)
+    state = DeployState()
+
+    server.rules["projects/other/rules/ru_0"] = "rule rule_0 {}"      # rules of other parents aren't listed
+    server.rules[f"{parent}/rules/existing_1"] = "rule existing_1 {}"
+    server.rules[f"{parent}/rules/existing_2"] = "rule existing_2 {}"
+    stats = run(server, lambda base_url: RulesDeployer(base_url, parent, state=state, timeout=0.2, backoff=0.001).deploy(records(1)))
+    assert (stats.created, stats.failed, stats.retries) == (1, 0, 1)
+    assert server.posts == 1
+    assert [name for name, text in server.rules.items() if text == "rule rule_0 {}"] == ["projects/other/rules/ru_0", state.name("rule-0")]
+    assert state.name("rule-0").startswith(parent)
+
+def test_chronicle_deploy_creation_server_error():
+    server = LostResponseServer(posts_lost=2, status=500)
+    stats = run(server, lambda base_url: RulesDeployer(base_url, parent, backoff=0.001).deploy(records(1)))
+    assert (stats.created, stats.failed) == (1, 0)
+    assert server.posts == 1
+    assert len(server.rules) == 1
+
+def test_chronicle_deploy_reuses_connections():
+    server = MockRulesServer(latency=0.001)
+
+    async def deploy(base_url):
+        deployer = RulesDeployer(base_url, parent, concurrency=4)
+        return await deployer.deploy(records(50))
+
+    stats = run(server, deploy)
+    assert stats.created == 50
+    assert server.connections <= 4
+
+def test_chronicle_connection_pool_bounded():
+    async def main():
+        async with MockRulesServer(latency=0.01) as server:
+            pool = ConnectionPool(server.base_url, 2)
+            responses = await asyncio.gather(*(
+                pool.request("POST", f"/{parent}/rules", {}, b'{"text": "rule a {}"}') for _ in range(6)
+            ))
+            pool.close()
+            return pool, responses
+
+    pool, responses = asyncio.run(main())
+    assert [response.status for response in responses] == [200] * 6
+    assert pool.opened == 2
+
+def test_chronicle_deploy_ndjson_output():
+    rule = """
+title: Test
+id: 00000000-0000-0000-0000-000000000001
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        CommandLine: value
+    condition: sel
+"""
+    output = chronicleBackendYaral().convert(SigmaCollection.from_yaml(rule), "ndjson")
+    server = MockRulesServer()
+    state = DeployState()
+    stats = run(server, lambda base_url: RulesDeployer(base_url, parent, state=state).deploy(read_records(io.StringIO(output))))
+    assert stats.created == 1
+    assert list(server.rules.values())[0].startswith("rule SIGMA_Test")
+    assert "00000000-0000-0000-0000-000000000001" in state.rules
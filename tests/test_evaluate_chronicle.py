@@ -0,0 +1,178 @@
+import json
+import sys
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle.evaluate import (
+    EvaluationError, QueryEvaluator, evaluate_files, field_values, file_chunks, main, mask_rows, regex_literal, rows_mask,
+)
+
+rule = """
+title: Test
+id: 00000000-0000-0000-0000-000000000001
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        Image|endswith: '\\cmd.exe'
+        CommandLine|contains:
+            - whoami
+            - net user
+    filter:
+        User: SYSTEM
+    condition: sel and not filter
+"""
+
+def process_event(image : str, command_line : str, user : str = "bob") -> dict:
+    return {
+        "principal": {"process": {"file": {"full_path": image}, "command_line": command_line}},
+        "src": {"user": {"user_display_name": user}},
+    }
+
+events = [
+    process_event("C:\\Windows\\System32\\CMD.EXE", "WHOAMI /all"),
+    process_event("C:\\Windows\\System32\\cmd.exe", "net user admin", "system"),
+    process_event("C:\\Windows\\System32\\powershell.exe", "whoami"),
+    process_event("C:\\Windows\\System32\\cmd.exe", "dir"),
+]
+
+@pytest.mark.parametrize("backend", [chronicleBackendUdm, chronicleBackendYaral])
+def test_chronicle_evaluate_converted_rule(backend):
+    query = backend().convert(SigmaCollection.from_yaml(rule))[0]
+    evaluator = QueryEvaluator({"rule": query})
+    assert evaluator.errors == {}
+    assert evaluator.matches(events) == {"rule": [0]}
+
+def test_chronicle_evaluate_field_values():
+    event = {"a": {"b": [{"c": 1}, {"c": True}], "d": None}, "x.y": "flat"}
+    assert field_values(event, "a.b.c") == ("1", "true")
+    assert field_values(event, "a.e") == ("",)
+    assert field_values(event, "x.y") == ("flat",)
+    assert mask_rows(rows_mask([0, 2, 5], 7)) == [0, 2, 5]
+    assert rows_mask([], 0) == 0
+
+@pytest.mark.parametrize("query,matches", [
+    ('f = "abc"', [0]),
+    ('f = "ABC" nocase', [0, 1]),
+    ('f != "abc"', [1, 2, 3]),
+    ("f = /^a.c$/", [0]),
+    ("f = /B/ nocase", [0, 1]),
+    ("n > 5", [1]),
+    ("n <= 5", [0]),
+    ('"ABC"', [0, 1]),
+    ('re.regex(f, `^AB`) nocase', [0, 1]),
+    ('strings.contains(strings.to_lower(f), "bc")', [0, 1]),
+    ('strings.starts_with(f, "x")', [2]),
+    ('strings.ends_with(f, "z")', [2]),
+    ('f = "abc" OR NOT (r = "a" AND r = "b")', [0, 1, 2, 3]),
+    ('r = "b" AND NOT f = "xyz"', [0]),
+    ("r in %values", [0, 2]),
+    ("f in %values nocase", [2]),
+    ("f in regex %patterns", [1, 2]),
+    ('net.ip_in_range_cidr(ip, "10.0.0.0/8")', [0, 2]),
+    ('NOT net.ip_in_range_cidr(ip, "10.0.0.0/8")', [1, 3]),
+    ("ip in cidr %networks", [0, 1]),
+])
+def test_chronicle_evaluate_predicates(query, matches):
+    events = [
+        {"f": "abc", "n": 5, "r": ["a", "b"], "ip": "10.1.2.3"},
+        {"f": "ABC", "n": "7", "ip": ["192.168.0.1", "fe80::1"]},
+        {"f": "xyz", "r": "c", "ip": "10.255.0.1"},
+        {"n": "n/a", "ip": "not an address"},
+    ]
+    evaluator = QueryEvaluator({"rule": query}, {"values": ["a", "c", "XYZ"], "patterns": ["^AB", "y"], "networks": ["10.1.0.0/16", "fe80::/10"]})
+    assert evaluator.errors == {}
+    assert evaluator.matches(events) == {"rule": matches}
+
+@pytest.mark.parametrize("pattern,literal", [
+    (".*whoami.*", ("contains", "whoami")),
+    (".*\\\\cmd\\.exe$", ("ends_with", "\\cmd.exe")),
+    ("^C:\\\\Windows", ("starts_with", "C:\\Windows")),
+    ("^a\\.b$", ("equals", "a.b")),
+    ("abc", ("contains", "abc")),
+    ("a.c", None),
+    ("^\\d+$", None),
+    ("a\\$", ("contains", "a$")),
+])
+def test_chronicle_evaluate_regex_literal(pattern, literal):
+    assert regex_literal(pattern) == literal
+
+@pytest.mark.parametrize("query,error", [
+    ('f = "a" AND', "Expected expression"),
+    ("f = $value", "Unsupported comparison with Variable"),
+    ("f = g", "Unsupported comparison with Field"),
+    ('strings.coalesce(f, "a")', "Unsupported function strings.coalesce"),
+    ('net.ip_in_range_cidr(f, "10.0.0.0/33")', "Invalid CIDR network"),
+    ("f in %missing", "Unknown reference list %missing"),
+    ("f = /(/", "Invalid regular expression"),
+    ('rule r {\n    events:\n        $e.f = "a"\n    match:\n        $e.f over 5m\n    condition:\n        $e\n}', "match section"),
+])
+def test_chronicle_evaluate_errors(query, error):
+    evaluator = QueryEvaluator({"rule": query, "valid": 'f = "a"'})
+    assert list(evaluator.queries) == ["valid"]
+    assert error in str(evaluator.errors["rule"])
+    assert isinstance(evaluator.errors["rule"], ValueError)
+
+def test_chronicle_evaluate_errors_are_evaluation_errors():
+    assert isinstance(QueryEvaluator({"rule": "f = $value"}).errors["rule"], EvaluationError)
+
+def test_chronicle_evaluate_shared_predicates():
+    evaluator = QueryEvaluator({
+        "a": 'f = "x" nocase AND g = /y+/',
+        "b": 'g = /y+/ OR F = "x" nocase',
+        "c": 'F = "X" nocase',
+    })
+    assert len(evaluator.predicates) == 3
+    assert len(evaluator.regexes) == 1
+    assert evaluator.matches([{"f": "X", "g": "y"}, {"g": "zyz"}, {"F": "x"}]) == {"a": [0], "b": [0, 1, 2], "c": [2]}
+
+def write_events(path, count : int) -> None:
+    with open(path, "w") as f:
+        for index in range(count):
+            f.write(json.dumps(process_event("C:\\cmd.exe", "whoami" if index % 3 == 0 else "dir")) + "\n")
+        f.write("not json\n\n")
+
+def test_chronicle_evaluate_file_chunks(tmp_path):
+    path = tmp_path / "events.jsonl"
+    write_events(path, 100)
+    chunks = file_chunks(str(path), 1000)
+    assert len(chunks) > 1
+    assert chunks[0][1] == 0 and chunks[-1][2] == path.stat().st_size
+    data = path.read_bytes()
+    assert all(data[end - 1:end] == b"\n" and start < end for _, start, end in chunks)
+    assert all(chunks[index][2] == chunks[index + 1][1] for index in range(len(chunks) - 1))
+    (tmp_path / "empty.jsonl").write_text("")
+    assert file_chunks(str(tmp_path / "empty.jsonl"), 1000) == []
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_chronicle_evaluate_files(tmp_path, workers):
+    path = tmp_path / "events.jsonl"
+    write_events(path, 100)
+    query = chronicleBackendUdm().convert(SigmaCollection.from_yaml(rule))[0]
+    report = evaluate_files({"rule": query, "invalid": "f = $x"}, [path], workers=workers, batch_size=16, chunk_bytes=1000, max_samples=3)
+    assert (report.events, report.invalid) == (100, 1)
+    assert report.rules["rule"].matches == 34
+    offsets = [0]
+    for line in path.read_bytes().splitlines(keepends=True):
+        offsets.append(offsets[-1] + len(line))
+    assert report.rules["rule"].samples == [(str(path), offsets[0]), (str(path), offsets[3]), (str(path), offsets[6])]
+    assert list(report.errors) == ["invalid"]
+    result = report.to_dict()
+    assert result["rules"]["rule"]["matches"] == 34
+    assert report.to_text().splitlines()[0].startswith("100 events, 1 invalid lines, 1 rules, 1 not evaluated")
+
+def test_chronicle_evaluate_cli(tmp_path, monkeypatch, capsys):
+    events_path = tmp_path / "events.jsonl"
+    write_events(events_path, 10)
+    rule_path = tmp_path / "rule.yml"
+    rule_path.write_text(rule)
+    rules_path = tmp_path / "rules.ndjson"
+    rules_path.write_text(chronicleBackendYaral().convert(SigmaCollection.from_yaml(rule), "ndjson"))
+    for rules in (rule_path, rules_path):
+        monkeypatch.setattr(sys, "argv", ["evaluate", "--rules", str(rules), "--events", str(events_path), "--workers", "1", "--json"])
+        main()
+        result = json.loads(capsys.readouterr().out)
+        assert result["events"] == 10
+        assert result["rules"]["00000000-0000-0000-0000-000000000001"]["matches"] == 4
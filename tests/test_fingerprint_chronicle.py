@@ -0,0 +1,121 @@
+import json
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle.fingerprint import FingerprintReport, implies, required_clauses, rule_fingerprint
+
+def rule(index : int, detection : str, condition : str = "sel", category : str = "process_creation") -> str:
+    return f"""
+title: Test {index}
+id: 00000000-0000-0000-0000-{index:012d}
+status: test
+logsource:
+    category: {category}
+    product: windows
+detection:
+{detection}
+    condition: {condition}
+"""
+
+def rule_id(index : int) -> str:
+    return f"00000000-0000-0000-0000-{index:012d}"
+
+def fingerprints(*rules : str) -> FingerprintReport:
+    backend = chronicleBackendYaral(fingerprint_rules=True)
+    backend.convert(SigmaCollection.from_yaml("---".join(rules)))
+    return backend.fingerprints
+
+def match(field : str, kind : str, value : str) -> tuple:
+    return ("match", field, kind, value)
+
+def test_chronicle_fingerprint_canonical_order_and_case():
+    report = fingerprints(
+        rule(1, "    sel:\n        CommandLine|contains: ['Foo', 'bar']\n        Image|endswith: '\\\\cmd.exe'"),
+        rule(2, "    sel:\n        Image|endswith: '\\\\CMD.EXE'\n    sel2:\n        CommandLine|contains: ['bar', 'foo', 'BAR']", "sel2 and sel"),
+        rule(3, "    sel:\n        CommandLine|contains: ['Foo', 'bar']\n    filter:\n        Image|endswith: '\\\\cmd.exe'", "sel and not not filter"),
+        rule(4, "    sel:\n        CommandLine|contains: ['Foo', 'baz']\n        Image|endswith: '\\\\cmd.exe'"),
+    )
+    assert report.duplicates() == [[rule_id(1), rule_id(2), rule_id(3)]]
+    assert [fingerprint.rule_id for fingerprint in report.unique()] == [rule_id(1), rule_id(4)]
+    assert report.fingerprints[0].canonical == ("and", (
+        match("principal.process.file.full_path", "endswith", "\\cmd.exe"),
+        ("or", (match("principal.process.command_line", "contains", "bar"), match("principal.process.command_line", "contains", "foo"))),
+    ))
+
+def test_chronicle_fingerprint_after_field_mapping():
+    report = fingerprints(
+        rule(1, "    sel:\n        Image|endswith: '\\\\cmd.exe'"),
+        rule(2, "    sel:\n        Image|endswith: '\\\\cmd.exe'", category="file_event"),
+        rule(3, "    sel:\n        TargetFilename|endswith: '\\\\cmd.exe'", category="file_event"),
+    )
+    assert report.duplicates() == [[rule_id(1), rule_id(2)]]
+
+def test_chronicle_fingerprint_values_and_aggregations():
+    canonical = match("principal.hostname", "exact", "a")
+    assert rule_fingerprint("a", canonical).fingerprint == rule_fingerprint("b", canonical).fingerprint
+    assert rule_fingerprint("a", canonical).fingerprint != rule_fingerprint("a", match("principal.hostname", "exact", "b")).fingerprint
+    report = fingerprints(
+        rule(1, "    sel:\n        CommandLine: a\n        User: b", "sel | count() by User > 5"),
+        rule(2, "    sel:\n        CommandLine: a\n        User: b", "sel | count() by User > 10"),
+        rule(3, "    sel:\n        CommandLine: a\n        User: b"),
+    )
+    assert len(report.unique()) == 3
+    assert [fingerprint.aggregated for fingerprint in report.fingerprints] == [True, True, False]
+    assert report.subsumed() == []
+
+@pytest.mark.parametrize("a,b,result", [
+    (match("f", "exact", "abc"), match("f", "contains", "b"), True),
+    (match("f", "contains", "b"), match("f", "exact", "abc"), False),
+    (match("f", "exact", "abc"), match("g", "contains", "b"), False),
+    (("and", (match("f", "exact", "abc"), match("g", "exact", "x"))), match("f", "startswith", "ab"), True),
+    (match("f", "exact", "abc"), ("or", (match("f", "endswith", "bc"), match("g", "exact", "x"))), True),
+    (("or", (match("f", "exact", "abc"), match("f", "exact", "xbx"))), match("f", "contains", "b"), True),
+    (("or", (match("f", "exact", "abc"), match("f", "exact", "xyz"))), match("f", "contains", "b"), False),
+    (("not", match("f", "contains", "b")), ("not", match("f", "exact", "abc")), True),
+    (match("f", "pattern", "a.c"), match("f", "contains", "a"), False),
+    (("regex", "f", "a.*", ()), ("regex", "f", "a.*", ()), True),
+])
+def test_chronicle_fingerprint_implies(a, b, result):
+    assert implies(a, b) == result
+
+def test_chronicle_fingerprint_required_clauses():
+    a, b, c, d = (match("f", "exact", value) for value in "abcd")
+    assert required_clauses(("and", (a, ("or", (b, ("and", (c, d))))))) == [frozenset((a,)), frozenset((b, c))]
+    assert required_clauses(("or", (a, ("not", b)))) == []
+
+def test_chronicle_fingerprint_subsumed():
+    report = fingerprints(
+        rule(1, "    sel:\n        CommandLine|contains: 'mimikatz'\n        Image|endswith: '\\\\cmd.exe'"),
+        rule(2, "    sel:\n        CommandLine|contains: ['katz', 'lsass']"),
+        rule(3, "    sel:\n        CommandLine|contains: 'ka'"),
+        rule(4, "    sel:\n        Image|endswith: '.exe'\n    filter:\n        User: system", "sel and not filter"),
+        rule(5, "    sel:\n        User: system", "not sel"),
+        rule(6, "    sel:\n        Image|endswith: '\\\\cmd.exe'\n        User: admin"),
+    )
+    assert report.subsumed() == [
+        (rule_id(1), rule_id(2)),
+        (rule_id(1), rule_id(3)),
+        (rule_id(4), rule_id(5)),
+    ]
+    result = report.to_dict()
+    assert (result["queries"], result["unique"], result["duplicates"]) == (6, 6, [])
+    assert result["subsumed"][0] == {"rule": rule_id(1), "by": rule_id(2)}
+    assert report.to_text().splitlines()[0] == "6 queries, 6 unique, 0 duplicate groups, 3 subsumed"
+
+def test_chronicle_fingerprint_disabled_by_default():
+    backend = chronicleBackendYaral()
+    assert backend.fingerprints is None
+    assert "fingerprint" not in backend.convert(SigmaCollection.from_yaml(rule(1, "    sel:\n        CommandLine: a")))[0]
+
+def test_chronicle_fingerprint_output():
+    rules = SigmaCollection.from_yaml(rule(1, "    sel:\n        CommandLine: a"))
+    backend = chronicleBackendYaral(fingerprint_rules=True)
+    fingerprint = rule_fingerprint(rule_id(1), match("principal.process.command_line", "exact", "a")).fingerprint
+    assert f'        fingerprint = "{fingerprint}"\n    events:' in backend.convert(rules)[0]
+    assert json.loads(chronicleBackendYaral(fingerprint_rules=True).convert(rules, "ndjson"))["fingerprint"] == fingerprint
+    assert chronicleBackendUdm(fingerprint_rules=True).convert(rules)[0].endswith(f"// Fingerprint: {fingerprint}\n")
+
+def test_chronicle_fingerprint_parallel():
+    backend = chronicleBackendUdm(fingerprint_rules=True)
+    backend.convert_parallel(SigmaCollection.from_yaml("---".join(rule(index, "    sel:\n        CommandLine: a") for index in range(4))), workers=2)
+    assert backend.fingerprints.duplicates() == [[rule_id(index) for index in range(4)]]
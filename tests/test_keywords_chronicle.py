@@ -0,0 +1,83 @@
+import warnings
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.exceptions import SigmaConfigurationError, SigmaFeatureNotSupportedByBackendError
+from sigma.types import SigmaNumber, SigmaString
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle.evaluate import QueryEvaluator
+from sigma.backends.chronicle.values import KeywordWarning
+from sigma.pipelines.chronicle.keywords import contains_value
+from sigma.pipelines.chronicle.mapping import MappingTable
+
+def keyword_rule(keywords, logsource : str = "category: process_creation", modifier : str = "") -> str:
+    values = "".join(f"\n            - '{keyword}'" for keyword in keywords)
+    detection = f"'|{modifier}':{values}" if modifier else values
+    return f"""
+title: Keyword Rule
+id: 00000000-0000-0000-0000-000000000001
+status: test
+logsource:
+    product: windows
+    {logsource}
+detection:
+    keywords:
+        {detection}
+    condition: keywords
+"""
+
+def udm_condition(backend, yaml : str) -> str:
+    return backend.convert(SigmaCollection.from_yaml(yaml))[0].split("\n//")[0][1:-1]
+
+def test_chronicle_keywords_fields():
+    assert udm_condition(chronicleBackendUdm(), keyword_rule(["mimikatz", "*sekurlsa::*"])) == (
+        "(principal.process.command_line = /.*mimikatz.*/ nocase OR principal.process.command_line = /.*sekurlsa::.*/ nocase) OR "
+        "(principal.process.file.full_path = /.*mimikatz.*/ nocase OR principal.process.file.full_path = /.*sekurlsa::.*/ nocase) OR "
+        "(src.process.command_line = /.*mimikatz.*/ nocase OR src.process.command_line = /.*sekurlsa::.*/ nocase)"
+    )
+    yaral = chronicleBackendYaral().convert(SigmaCollection.from_yaml(keyword_rule(["mimikatz"])))[0]
+    assert "$selection.principal.process.command_line = /.*mimikatz.*/ nocase OR " in yaral
+    assert '"mimikatz"' not in yaral
+
+def test_chronicle_keywords_all():
+    query = udm_condition(chronicleBackendUdm(), keyword_rule(["a", "b"], "category: dns_query", "all"))
+    assert query == "network.dns.questions.name = /.*a.*/ nocase AND network.dns.questions.name = /.*b.*/ nocase"
+
+def test_chronicle_keywords_evaluate():
+    events = [
+        {"principal": {"process": {"command_line": "run MIMIKATZ.exe", "file": {"full_path": "C:\\a.exe"}}}},
+        {"principal": {"process": {"command_line": "whoami", "file": {"full_path": "C:\\mimikatz\\b.exe"}}}},
+        {"src": {"process": {"command_line": "cmd /c mimikatz"}}},
+        {"principal": {"process": {"command_line": "whoami"}}, "metadata": {"description": "mimikatz"}},
+    ]
+    query = udm_condition(chronicleBackendUdm(), keyword_rule(["mimikatz"]))
+    assert QueryEvaluator({"keywords": query}).matches(events) == {"keywords": [0, 1, 2]}
+
+def test_chronicle_keywords_policy_warn():
+    yaml = keyword_rule(["mimikatz"], "service: security")
+    with pytest.warns(KeywordWarning, match="Keyword 'mimikatz' has no keyword fields"):
+        assert udm_condition(chronicleBackendUdm(), yaml) == '"mimikatz"'
+
+def test_chronicle_keywords_policy_allow():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert udm_condition(chronicleBackendUdm(keyword_policy="allow"), keyword_rule(["mimikatz"], "service: security")) == '"mimikatz"'
+
+@pytest.mark.parametrize("backend_class", [chronicleBackendUdm, chronicleBackendYaral])
+def test_chronicle_keywords_policy_error(backend_class):
+    with pytest.raises(SigmaFeatureNotSupportedByBackendError, match="searched in all fields"):
+        backend_class(keyword_policy="error").convert(SigmaCollection.from_yaml(keyword_rule(["mimikatz"], "service: security")))
+    assert backend_class(keyword_policy="error").convert(SigmaCollection.from_yaml(keyword_rule(["mimikatz"])))
+
+def test_chronicle_keywords_policy_invalid():
+    with pytest.raises(SigmaConfigurationError, match="Invalid keyword policy 'ignore'"):
+        chronicleBackendYaral(keyword_policy="ignore")
+
+def test_chronicle_keywords_contains_value():
+    assert contains_value(SigmaString("a*b")) == SigmaString("*a*b*")
+    assert contains_value(SigmaString("*a*")) == SigmaString("*a*")
+    assert contains_value(SigmaNumber(5)) == SigmaString("*5*")
+
+def test_chronicle_keywords_mapping_table():
+    table = MappingTable.from_dict({"name": "test", "logsources": [{"product": "test"}], "keyword_fields": ["a.b"]})
+    assert table.keyword_fields == ["a.b"]
+    assert MappingTable.from_dict({"name": "test", "logsources": [{"product": "test"}]}).keyword_fields == []
@@ -0,0 +1,35 @@
+import subprocess
+import sys
+import sigma.backends.chronicle
+import sigma.pipelines.chronicle
+from sigma.backends.chronicle.chronicle_udm import chronicleBackendUdm
+from sigma.backends.chronicle.chronicle_yaral import chronicleBackendYaral
+from sigma.pipelines.chronicle.chronicle import chronicle_pipeline
+from sigma.processing.pipeline import ProcessingPipeline
+
+def test_chronicle_package_import_is_lazy():
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import sys, sigma.backends.chronicle, sigma.pipelines.chronicle; print(' '.join(sorted(sys.modules)))"],
+        check=True, capture_output=True, text=True,
+    ).stdout.split()
+    assert "sigma.backends.chronicle.chronicle_udm" not in loaded
+    assert "sigma.backends.chronicle.chronicle_yaral" not in loaded
+    assert "sigma.pipelines.chronicle.chronicle" not in loaded
+    assert "sigma.conversion.base" not in loaded
+
+def test_chronicle_backends_registry():
+    assert dict(sigma.backends.chronicle.backends) == {
+        "chronicle_udm": chronicleBackendUdm,
+        "chronicle_yaral": chronicleBackendYaral,
+    }
+    assert sigma.backends.chronicle.chronicleBackendUdm is chronicleBackendUdm
+
+def test_chronicle_pipelines_registry():
+    assert dict(sigma.pipelines.chronicle.pipelines) == {"chronicle_pipeline": chronicle_pipeline}
+    assert sigma.pipelines.chronicle.chronicle_pipeline is chronicle_pipeline
+
+def test_chronicle_backend_pipeline_built_once():
+    pipeline = chronicleBackendUdm.backend_processing_pipeline
+    assert isinstance(pipeline, ProcessingPipeline)
+    assert chronicleBackendUdm().backend_processing_pipeline is pipeline
+    assert chronicleBackendYaral.backend_processing_pipeline == pipeline
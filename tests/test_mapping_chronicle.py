@@ -0,0 +1,104 @@
+import json
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.exceptions import SigmaConfigurationError, SigmaTransformationError
+from sigma.rule import SigmaLogSource
+from sigma.backends.chronicle import chronicleBackendUdm
+from sigma.pipelines.chronicle.mapping import MappingIndex, MappingTable
+
+def rule(logsource : str, detection : str) -> SigmaCollection:
+    return SigmaCollection.from_yaml(f"""
+title: Test
+status: test
+logsource:
+{logsource}
+detection:
+    sel:
+{detection}
+    condition: sel
+""")
+
+def table(name : str, *logsources : dict) -> MappingTable:
+    return MappingTable.from_dict({"name": name, "logsources": list(logsources), "fieldmapping": {}})
+
+def test_chronicle_mapping_index_lookup():
+    index = MappingIndex([
+        table("generic", {"category": "dns"}),
+        table("windows", {"product": "windows", "category": "dns"}),
+        table("service", {"product": "windows", "service": "security"}),
+    ])
+    assert index.lookup(SigmaLogSource(category="dns")).name == "generic"
+    assert index.lookup(SigmaLogSource(product="linux", category="dns")).name == "generic"
+    assert index.lookup(SigmaLogSource(product="windows", category="dns")).name == "windows"
+    assert index.lookup(SigmaLogSource(product="windows", service="security")).name == "service"
+    assert index.lookup(SigmaLogSource(product="windows", category="process_creation")) is None
+    assert index.lookup(SigmaLogSource(product="windows")) is None
+
+def test_chronicle_mapping_index_duplicate_logsource():
+    with pytest.raises(SigmaConfigurationError, match="mapped by the tables 'a' and 'b'"):
+        MappingIndex([table("a", {"category": "dns"}), table("b", {"category": "dns"})])
+
+def test_chronicle_mapping_index_empty_logsource():
+    with pytest.raises(SigmaConfigurationError, match="without product, category and service"):
+        MappingIndex([table("a", {})])
+
+def test_chronicle_mapping_invalid_table():
+    with pytest.raises(SigmaConfigurationError, match="Invalid mapping table"):
+        MappingTable.from_dict({"logsources": []})
+
+def test_chronicle_mapping_index_from_directory(tmp_path):
+    (tmp_path / "a.json").write_text(json.dumps({"name": "a", "logsources": [{"category": "a"}], "fieldmapping": {"x": "y"}}))
+    (tmp_path / "b.yml").write_text("name: b\nlogsources:\n  - category: b\nfieldmapping:\n  x: z\n")
+    index = MappingIndex.from_directory(tmp_path)
+    assert [table.name for table in index.tables] == ["a", "b"]
+    assert index.lookup(SigmaLogSource(category="b")).fieldmapping == {"x": "z"}
+
+def test_chronicle_mapping_packaged_tables():
+    index = MappingIndex.from_directory()
+    for logsource in [
+        SigmaLogSource(product="windows", category="process_creation"),
+        SigmaLogSource(product="linux", category="network_connection"),
+        SigmaLogSource(product="windows", category="file_event"),
+        SigmaLogSource(product="windows", category="registry_set"),
+        SigmaLogSource(product="windows", category="dns_query"),
+        SigmaLogSource(product="windows", service="security"),
+    ]:
+        assert index.lookup(logsource) is not None
+
+@pytest.mark.parametrize("logsource,detection,query", [
+    (
+        "    product: windows\n    category: network_connection",
+        "        DestinationPort: 445\n        DestinationIp: 10.0.0.1",
+        '(target.port = "445" AND target.ip = "10.0.0.1" nocase)',
+    ),
+    (
+        "    product: windows\n    category: registry_set",
+        "        TargetObject|endswith: '\\Run'",
+        "(target.registry.registry_key = /.*\\\\Run$/ nocase)",
+    ),
+    (
+        "    product: windows\n    category: file_event",
+        "        TargetFilename|contains: 'temp'",
+        "(target.file.full_path = /.*temp.*/ nocase)",
+    ),
+    (
+        "    category: dns",
+        "        query: evil.com",
+        '(network.dns.questions.name = "evil.com" nocase)',
+    ),
+    (
+        "    product: windows\n    service: security",
+        "        EventID: 4625",
+        '(metadata.product_event_type = "4625")',
+    ),
+])
+def test_chronicle_mapping_logsources(logsource, detection, query):
+    assert chronicleBackendUdm().convert(rule(logsource, detection))[0].split("\n")[0] == query
+
+def test_chronicle_mapping_unsupported_field():
+    with pytest.raises(SigmaTransformationError, match="does not support the Initiated field for network_connection rules"):
+        chronicleBackendUdm().convert(rule("    product: windows\n    category: network_connection", "        Initiated: 'true'"))
+
+def test_chronicle_mapping_unsupported_logsource():
+    with pytest.raises(SigmaTransformationError, match="Rule type not yet supported"):
+        chronicleBackendUdm().convert(rule("    product: windows\n    category: ps_script", "        ScriptBlockText: x"))
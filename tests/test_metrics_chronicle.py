@@ -0,0 +1,99 @@
+import json
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle.metrics import ConversionMetrics, RuleMetrics, count_regexes
+
+def process_creation_rule(index : int) -> str:
+    return f"""
+title: Test {index}
+id: 00000000-0000-0000-0000-{index:012d}
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        Image|endswith: '\\\\cmd.exe'
+        CommandLine:
+            - a
+            - b
+    condition: sel
+"""
+
+def test_chronicle_metrics_disabled_by_default():
+    assert chronicleBackendUdm().metrics is None
+    assert chronicleBackendYaral().metrics is None
+
+@pytest.mark.parametrize("backend_class", [chronicleBackendUdm, chronicleBackendYaral])
+def test_chronicle_metrics_per_rule(backend_class):
+    backend = backend_class(collect_metrics="true")
+    queries = backend.convert(SigmaCollection.from_yaml(process_creation_rule(1) + "---" + process_creation_rule(2)))
+    metrics = backend.metrics
+    assert [rule.rule_id for rule in metrics.rules] == [
+        "00000000-0000-0000-0000-000000000001",
+        "00000000-0000-0000-0000-000000000002",
+    ]
+    rule = metrics.rules[0]
+    assert rule.predicates == 3
+    assert rule.regexes == 1
+    assert rule.output_bytes == len(queries[0].encode("utf-8"))
+    assert {"pipeline", "optimize", "condition", "values", "finalize", "total"} <= set(rule.stages)
+    assert rule.stages["values"] <= rule.stages["condition"] <= rule.stages["total"]
+    assert metrics.stages["total"] == pytest.approx(sum(rule.stages["total"] for rule in metrics.rules))
+
+def test_chronicle_metrics_callback():
+    seen = []
+    backend = chronicleBackendUdm()
+    backend.metrics = ConversionMetrics(callback=seen.append)
+    backend.convert(SigmaCollection.from_yaml(process_creation_rule(1)))
+    assert len(seen) == 1 and isinstance(seen[0], RuleMetrics)
+
+def test_chronicle_metrics_failed_rule():
+    backend = chronicleBackendUdm(collect_errors=True, collect_metrics=True)
+    backend.convert(SigmaCollection.from_yaml(process_creation_rule(1).replace("process_creation", "ps_script")))
+    assert len(backend.errors) == 1
+    assert backend.metrics.rules[0].output_bytes == 0
+
+def test_chronicle_metrics_stream_parse_stage():
+    backend = chronicleBackendYaral(collect_metrics=True)
+    list(backend.convert_stream([process_creation_rule(1)]))
+    assert backend.metrics.stages["parse"] > 0
+    assert "parse" not in backend.metrics.rules[0].stages
+
+def test_chronicle_metrics_parallel():
+    backend = chronicleBackendUdm()
+    backend.metrics = ConversionMetrics()
+    backend.convert_parallel(SigmaCollection.from_yaml("---".join(process_creation_rule(index) for index in range(4))), workers=2)
+    assert sorted(rule.rule_id for rule in backend.metrics.rules) == [f"00000000-0000-0000-0000-{index:012d}" for index in range(4)]
+
+def test_chronicle_metrics_json():
+    backend = chronicleBackendUdm(collect_metrics=True)
+    backend.convert(SigmaCollection.from_yaml(process_creation_rule(1)))
+    result = json.loads(backend.metrics.to_json())
+    assert result["rules"] == 1
+    assert result["predicates"] == 3
+    assert result["per_rule"][0]["rule_id"] == "00000000-0000-0000-0000-000000000001"
+
+def test_chronicle_metrics_prometheus():
+    metrics = ConversionMetrics()
+    metrics.merge([
+        RuleMetrics("a", {"total": 0.002, "condition": 0.001}, output_bytes=10, predicates=2, regexes=1),
+        RuleMetrics("b", {"total": 2.0}, output_bytes=5, predicates=1),
+    ])
+    text = metrics.to_prometheus()
+    assert 'sigma_chronicle_stage_seconds_total{stage="condition"} 0.001\n' in text
+    assert "sigma_chronicle_output_bytes_total 15\n" in text
+    assert "sigma_chronicle_regexes_total 1\n" in text
+    assert 'sigma_chronicle_rule_seconds_bucket{le="0.005"} 1\n' in text
+    assert 'sigma_chronicle_rule_seconds_bucket{le="+Inf"} 2\n' in text
+    assert "sigma_chronicle_rule_seconds_count 2\n" in text
+
+@pytest.mark.parametrize("query,count", [
+    ('field = /.*a.*/ nocase AND other = "x"', 1),
+    ('field = "/not/a/regex" nocase', 0),
+    ("re.regex($selection.field, `a|b`) nocase OR $selection.x = /c/", 2),
+    ('x = /a/\n// Description: a/b/c\n', 1),
+])
+def test_chronicle_metrics_count_regexes(query, count):
+    assert count_regexes(query) == count
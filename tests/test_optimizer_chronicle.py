@@ -0,0 +1,177 @@
+from time import perf_counter
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.conditions import ConditionAND, ConditionFieldEqualsValueExpression, ConditionNOT, ConditionOR
+from sigma.types import SigmaString
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle.optimizer import OptimizerStats, implies, optimize_condition
+
+def rule(detection : str, condition : str) -> SigmaCollection:
+    return SigmaCollection.from_yaml(f"""
+title: Test
+id: 00000000-0000-0000-0000-000000000000
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+{detection}
+    condition: {condition}
+""")
+
+def parsed(detection : str, condition : str):
+    return rule(detection, condition).rules[0].detection.parsed_condition[0].parsed
+
+def field_eq(field : str, value : str) -> ConditionFieldEqualsValueExpression:
+    return ConditionFieldEqualsValueExpression(field, SigmaString(value))
+
+@pytest.mark.parametrize("a,b,result", [
+    ("*abc*", "*b*", True),
+    ("abc", "*b*", True),
+    ("abc*", "*b*", True),
+    ("*b*", "*abc*", False),
+    ("ABC", "ab*", True),
+    ("*abc", "ab*", False),
+    ("xabc", "*bc", True),
+    ("abc", "ABC", True),
+    ("a*c", "*a*", False),
+])
+def test_chronicle_optimizer_implies(a, b, result):
+    assert implies(field_eq("CommandLine", a), field_eq("CommandLine", b)) == result
+
+def test_chronicle_optimizer_implies_other_field():
+    assert not implies(field_eq("CommandLine", "*abc*"), field_eq("Image", "*b*"))
+
+def test_chronicle_optimizer_flatten_and_regroup():
+    cond, stats = optimize_condition(parsed("""
+    sel1:
+        CommandLine: [a, b]
+        Image: c
+    sel2:
+        User: d
+""", "sel1 and sel2"))
+    assert isinstance(cond, ConditionAND)
+    assert [type(arg) for arg in cond.args] == [ConditionOR, ConditionFieldEqualsValueExpression, ConditionFieldEqualsValueExpression]
+    assert all(arg.parent is cond for arg in cond.args)
+    assert cond.parent is None
+    assert stats.flattened == 1
+    assert stats.removed == 0
+
+def test_chronicle_optimizer_duplicates():
+    cond, stats = optimize_condition(parsed("""
+    sel1:
+        CommandLine: a
+    sel2:
+        CommandLine: [a, b]
+""", "sel1 or sel2"))
+    assert cond == ConditionOR([field_eq("CommandLine", "a"), field_eq("CommandLine", "b")])
+    assert (stats.predicates_before, stats.predicates_after, stats.duplicates, stats.removed) == (3, 2, 1, 1)
+
+def test_chronicle_optimizer_absorption():
+    cond, stats = optimize_condition(parsed("""
+    sel1:
+        CommandLine: a
+    sel2:
+        Image: b
+""", "sel1 or (sel1 and sel2)"))
+    assert cond == field_eq("CommandLine", "a")
+    assert (stats.absorbed, stats.removed) == (2, 2)
+
+def test_chronicle_optimizer_subsumption_or():
+    cond, stats = optimize_condition(parsed("""
+    sel:
+        CommandLine|contains: [abc, b, xbx]
+""", "sel"))
+    assert cond == field_eq("CommandLine", "*b*")
+    assert stats.subsumed == 2
+
+def test_chronicle_optimizer_subsumption_and():
+    cond, stats = optimize_condition(parsed("""
+    sel:
+        CommandLine|contains|all: [abc, b]
+""", "sel"))
+    assert cond == field_eq("CommandLine", "*abc*")
+    assert stats.subsumed == 1
+
+def test_chronicle_optimizer_double_negation():
+    cond, stats = optimize_condition(parsed("""
+    sel:
+        CommandLine: a
+""", "not (not sel)"))
+    assert cond == field_eq("CommandLine", "a")
+
+def test_chronicle_optimizer_negation_kept():
+    cond, stats = optimize_condition(parsed("""
+    sel:
+        CommandLine: a
+    filter:
+        Image: [b, b]
+""", "sel and not filter"))
+    assert isinstance(cond.args[1], ConditionNOT)
+    assert cond.args[1].args[0] == field_eq("Image", "b")
+    assert cond.args[1].args[0].parent is cond.args[1]
+
+def test_chronicle_optimizer_stats_add():
+    stats = OptimizerStats(3, 2, duplicates=1) + OptimizerStats(4, 1, subsumed=3)
+    assert stats.to_dict() == {
+        "predicates_before": 7,
+        "predicates_after": 3,
+        "duplicates": 1,
+        "absorbed": 0,
+        "subsumed": 3,
+        "flattened": 0,
+        "removed": 4,
+    }
+
+@pytest.mark.parametrize("backend_class,prefix", [(chronicleBackendUdm, ""), (chronicleBackendYaral, "$selection.")])
+def test_chronicle_optimizer_backend(backend_class, prefix):
+    backend = backend_class()
+    query = backend.convert(rule("""
+    sel1:
+        CommandLine|contains: abc
+    sel2:
+        CommandLine|contains: [b, c]
+""", "sel1 or sel2"))[0]
+    assert f"({prefix}principal.process.command_line = /.*b.*/ nocase OR {prefix}principal.process.command_line = /.*c.*/ nocase)" in query
+    stats = backend.optimizer_stats["00000000-0000-0000-0000-000000000000"]
+    assert (stats.predicates_before, stats.predicates_after, stats.subsumed) == (3, 2, 1)
+
+def test_chronicle_optimizer_disabled():
+    backend = chronicleBackendUdm(optimize_conditions="false")
+    query = backend.convert(rule("""
+    sel1:
+        CommandLine|contains: abc
+    sel2:
+        CommandLine|contains: b
+""", "sel1 or sel2"))[0]
+    assert "abc" in query
+    assert backend.optimizer_stats == {}
+
+def test_chronicle_optimizer_parallel():
+    rules = "---".join(
+        f"""
+title: Test {index}
+id: 00000000-0000-0000-0000-{index:012d}
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        CommandLine|contains: [abc{index}, c{index}]
+    condition: sel
+""" for index in range(4))
+    serial = chronicleBackendUdm()
+    parallel = chronicleBackendUdm()
+    assert parallel.convert_parallel(SigmaCollection.from_yaml(rules), workers=2) == serial.convert(SigmaCollection.from_yaml(rules))
+    assert parallel.optimizer_stats == serial.optimizer_stats
+    assert len(parallel.optimizer_stats) == 4
+
+def test_chronicle_optimizer_large_exact_list():
+    values = [f"{index:064x}" for index in range(10000)]
+    cond = ConditionOR([field_eq("Hashes", value) for value in values] + [field_eq("Hashes", values[0].upper()), field_eq("Hashes", "*0001*")])
+    start = perf_counter()
+    optimized, stats = optimize_condition(cond)
+    assert perf_counter() - start < 2.0
+    assert stats.duplicates + stats.subsumed == 1 + sum("0001" in value for value in values)
+    assert len(optimized.args) == 10001 - sum("0001" in value for value in values)
@@ -0,0 +1,91 @@
+import hashlib
+import io
+import json
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.backends.chronicle import chronicleBackendYaral
+from sigma.backends.chronicle.output import batch_entry, batches, write_stream
+
+def process_creation_rule(index : int, values : str = "value") -> str:
+    return f"""
+title: Test {index}
+id: 00000000-0000-0000-0000-{index:012d}
+status: test
+level: high
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        CommandLine: {values}
+    condition: sel
+"""
+
+def test_chronicle_yaral_ndjson():
+    backend = chronicleBackendYaral(reference_list_threshold=2)
+    output = backend.convert(SigmaCollection.from_yaml(process_creation_rule(1) + "---" + process_creation_rule(2, "['a', 'b', 'c']")), "ndjson")
+    records = [json.loads(line) for line in output.splitlines()]
+    text = chronicleBackendYaral().convert(SigmaCollection.from_yaml(process_creation_rule(1)))[0]
+    assert records[0] == {
+        "id": "00000000-0000-0000-0000-000000000001",
+        "title": "Test 1",
+        "level": "high",
+        "reference_lists": [],
+        "content_hash": "sha256:" + hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        "rule": text,
+    }
+    assert records[1]["reference_lists"] == list(backend.reference_lists.lists)
+    assert output.endswith("\n")
+
+def test_chronicle_yaral_rules_api():
+    output = chronicleBackendYaral(rules_api_batch_bytes=1000).convert(
+        SigmaCollection.from_yaml("---".join(process_creation_rule(index) for index in range(5))), "rules_api"
+    )
+    payloads = [json.loads(batch) for batch in output]
+    assert len(payloads) > 1
+    assert all(len(batch.encode("utf-8")) <= 1000 for batch in output)
+    texts = [request["rule"]["text"] for payload in payloads for request in payload["requests"]]
+    assert [text.split("\n")[0] for text in texts] == [f"rule SIGMA_Test_{index}" for index in range(5)]
+
+@pytest.mark.parametrize("sizes,max_bytes,expected", [
+    ([10, 10, 10], 100, [3]),
+    ([10, 10, 10], 40, [2, 1]),
+    ([10, 200, 10], 100, [1, 1, 1]),
+    ([], 100, []),
+])
+def test_chronicle_batches(sizes, max_bytes, expected):
+    entries = ['"' + "x" * (size - 2) + '"' for size in sizes]
+    result = list(batches(entries, max_bytes))
+    assert [len(json.loads(batch)["requests"]) for batch in result] == expected
+    assert all(len(batch) <= max_bytes for batch, count in zip(result, expected) if count > 1)
+
+def test_chronicle_batches_lazy():
+    def entries():
+        yield batch_entry("a")
+        yield batch_entry("b")
+        raise AssertionError("entries consumed beyond the first full batch")
+    assert json.loads(next(batches(entries(), 40)))["requests"] == [{"rule": {"text": "a"}}]
+
+@pytest.mark.parametrize("output_format,lines", [
+    ("ndjson", 3),
+    ("rules_api", 1),
+])
+def test_chronicle_yaral_write_stream(output_format, lines):
+    f = io.StringIO()
+    count = chronicleBackendYaral().write_stream([process_creation_rule(index) for index in range(3)], f, output_format)
+    written = f.getvalue().splitlines()
+    assert count == len(written) == lines
+    assert all(json.loads(line) for line in written)
+
+def test_chronicle_yaral_write_stream_default_format():
+    backend = chronicleBackendYaral()
+    sources = [process_creation_rule(index) for index in range(3)]
+    f = io.StringIO()
+    assert backend.write_stream(sources, f) == 3
+    assert f.getvalue() == "\n\n".join(query for _, query in backend.convert_stream(sources)) + "\n"
+
+def test_chronicle_write_stream_default_batch_bytes():
+    backend = chronicleBackendYaral(rules_api_batch_bytes=600)
+    f = io.StringIO()
+    assert write_stream(backend, [process_creation_rule(index) for index in range(3)], f, "rules_api") == 3
+    assert all(len(line) <= 600 and len(json.loads(line)["requests"]) == 1 for line in f.getvalue().splitlines())
@@ -0,0 +1,105 @@
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+
+def process_creation_rule(index : int) -> str:
+    return f"""
+title: Test {index}
+id: 00000000-0000-0000-0000-{index:012d}
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        CommandLine|contains: value{index}
+        Image|endswith: '\\proc{index}.exe'
+    condition: sel
+"""
+
+unsupported_rule = """
+title: Unsupported
+status: test
+logsource:
+    category: test_category
+    product: test_product
+detection:
+    sel:
+        fieldA: valueA
+    condition: sel
+"""
+
+@pytest.fixture
+def rule_collection():
+    return SigmaCollection.from_yaml("---".join(
+        [process_creation_rule(index) for index in range(3)]
+        + [unsupported_rule]
+        + [process_creation_rule(index) for index in range(3, 6)]
+    ))
+
+@pytest.mark.parametrize("backend_class", [chronicleBackendUdm, chronicleBackendYaral])
+def test_chronicle_convert_parallel_matches_serial(backend_class, rule_collection):
+    serial_backend = backend_class(collect_errors=True)
+    serial = serial_backend.convert(rule_collection)
+    parallel_backend = backend_class()
+    assert parallel_backend.convert_parallel(rule_collection, workers=2) == serial
+    assert len(serial) == 6
+
+def test_chronicle_convert_parallel_collects_errors(rule_collection):
+    backend = chronicleBackendUdm()
+    queries = backend.convert_parallel(rule_collection, workers=2)
+    assert len(queries) == 6
+    assert [(rule.title, str(error)) for rule, error in backend.errors] == [
+        ("Unsupported", "Rule type not yet supported by the Chronicle Sigma backend!"),
+    ]
+
+def test_chronicle_convert_parallel_single_worker(rule_collection):
+    backend = chronicleBackendYaral()
+    assert backend.convert_parallel(rule_collection, workers=1) == chronicleBackendYaral(collect_errors=True).convert(rule_collection)
+    assert len(backend.errors) == 1
+
+def test_chronicle_convert_parallel_regex_findings():
+    rules = SigmaCollection.from_yaml("---".join(
+        process_creation_rule(index).replace("CommandLine|contains: value", "CommandLine|re: (a+)+") for index in range(3)
+    ))
+    serial_backend = chronicleBackendUdm(regex_policy="allow")
+    serial_backend.convert(rules)
+    backend = chronicleBackendUdm(regex_policy="allow")
+    backend.convert_parallel(rules, workers=2)
+    assert backend.regex_findings == serial_backend.regex_findings
+    assert len(backend.regex_findings) == 3
+
+def test_chronicle_convert_parallel_merges_optimizer_stats():
+    rules = SigmaCollection.from_yaml("---".join(
+        process_creation_rule(index).replace(f"id: 00000000-0000-0000-0000-{index:012d}\n", "").replace(f"title: Test {index}", "title: Test")
+        for index in range(4)
+    ))
+    serial_backend = chronicleBackendUdm()
+    serial_backend.convert(rules)
+    backend = chronicleBackendUdm()
+    backend.convert_parallel(rules, workers=2)
+    assert list(backend.optimizer_stats) == ["Test"]
+    assert backend.optimizer_stats == serial_backend.optimizer_stats
+    assert backend.optimizer_stats["Test"].predicates_before == 8
+
+def test_chronicle_convert_parallel_correlation_rules():
+    rules = SigmaCollection.from_yaml("---".join(
+        [process_creation_rule(index).replace(f"title: Test {index}", f"title: Test {index}\nname: test_{index}") for index in range(3)]
+        + ["""
+title: Correlation
+status: test
+correlation:
+    type: event_count
+    rules:
+        - test_0
+        - test_1
+    group-by:
+        - ComputerName
+    timespan: 5m
+    condition:
+        gte: 2
+"""]
+    ))
+    serial = chronicleBackendYaral().convert(rules)
+    assert chronicleBackendYaral().convert_parallel(rules, workers=2) == serial
+    assert len(serial) == 2
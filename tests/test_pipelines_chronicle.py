@@ -1,5 +1,51 @@
-import pytest
-from sigma.backends.chronicle import chronicleBackend
-from sigma.pipelines.chronicle import # TODO: import pipeline functions
-
-# TODO: import tests for all implemented pipelines and contained transformations
\ No newline at end of file
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.exceptions import SigmaTransformationError
+from sigma.processing.pipeline import ProcessingPipeline
+from sigma.backends.chronicle import chronicleBackendUdm
+from sigma.pipelines.chronicle import chronicle_pipeline
+
+def process_creation_rule(detection : str, product : str = "windows") -> SigmaCollection:
+    return SigmaCollection.from_yaml(f"""
+        title: Test
+        status: test
+        logsource:
+            category: process_creation
+            product: {product}
+        detection:
+            sel:
+{detection}
+            condition: sel
+    """)
+
+def test_chronicle_pipeline_items():
+    pipeline = chronicle_pipeline()
+    assert isinstance(pipeline, ProcessingPipeline)
+    assert [item.identifier for item in pipeline.items] == [
+        "chronicle_aggregation_extraction",
+        "chronicle_udm_fieldmapping",
+        "chronicle_keyword_fields",
+        "chronicle_udm_fail_rule_not_supported",
+    ]
+
+def test_chronicle_pipeline_field_mapping():
+    rule = process_creation_rule("                ParentImage: a\n                OriginalFileName: b").rules[0]
+    chronicle_pipeline().apply(rule)
+    assert [item.field for item in rule.detection.detections["sel"].detection_items] == [
+        "src.process.file.full_path",
+        "src.file.full_path",
+    ]
+
+def test_chronicle_pipeline_unmapped_field_passthrough():
+    rule = process_creation_rule("                SomeField: a").rules[0]
+    chronicle_pipeline().apply(rule)
+    assert rule.detection.detections["sel"].detection_items[0].field == "SomeField"
+
+@pytest.mark.parametrize("field", ["IntegrityLevel", "imphash", "LogonId"])
+def test_chronicle_pipeline_unsupported_process_creation_fields(field):
+    with pytest.raises(SigmaTransformationError, match="IntegrityLevel, LogonId or imphash fields"):
+        chronicleBackendUdm().convert(process_creation_rule(f"                {field}: a"))
+
+def test_chronicle_pipeline_unsupported_logsource():
+    with pytest.raises(SigmaTransformationError, match="Rule type not yet supported"):
+        chronicleBackendUdm().convert(process_creation_rule("                Image: a", product="zos"))
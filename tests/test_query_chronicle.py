@@ -0,0 +1,76 @@
+import re
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle.query import (
+    And, Call, Comparison, Field, Keyword, Not, Number, Or, QuerySyntaxError, Regex, ReferenceList, String, Variable,
+    parse_events, parse_output, parse_query,
+)
+
+rule = SigmaCollection.from_yaml("""
+title: Test
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    keywords:
+        - 'mimikatz'
+    sel:
+        Image|endswith: '\\\\cmd.exe'
+        CommandLine:
+            - 'a"b'
+            - 'c'
+    condition: keywords or sel
+""")
+
+def test_chronicle_query_parse_udm_output():
+    tree = parse_query(chronicleBackendUdm().convert(rule)[0])
+    assert isinstance(tree, Or)
+    assert [(arg.left.path, arg.right.pattern) for arg in tree.args[:3]] == [
+        (path, ".*mimikatz.*") for path in ("principal.process.command_line", "principal.process.file.full_path", "src.process.command_line")
+    ]
+    selection = tree.args[3]
+    assert isinstance(selection, And)
+    image, command_line = selection.args
+    assert image.left.path == "principal.process.file.full_path"
+    assert image.right.pattern == ".*\\\\cmd\\.exe$" and image.nocase
+    assert [arg.right.value for arg in command_line.args] == ['a"b', "c"]
+
+def test_chronicle_query_parse_yaral_events():
+    text = chronicleBackendYaral().convert(rule)[0]
+    tree = parse_output(text)
+    comparisons = [arg for arg in tree.args[3].args[1].args]
+    assert all(arg.left.path == "$selection.principal.process.command_line" for arg in comparisons)
+    assert comparisons[0].left.name == "principal.process.command_line"
+
+@pytest.mark.parametrize("query,expected", [
+    ("a = 1 AND NOT b != 'x'", And([Comparison(Field("a", 0), "=", Number(1, 4), position=0), Not(Comparison(Field("b", 14), "!=", String("x", 19), position=14), 10)], 0)),
+    ("\"mimikatz\" OR f = 1", Or([Keyword("mimikatz", 0), Comparison(Field("f", 14), "=", Number(1, 18), position=14)], 0)),
+    ("f in %list nocase", Comparison(Field("f", 0), "in", ReferenceList("list", position=5), True, 0)),
+    ("f in regex %list", Comparison(Field("f", 0), "in", ReferenceList("list", True, 11), False, 0)),
+    ("re.regex($e.f, `a\\`b`) nocase", Call("re.regex", [Field("$e.f", 9), Regex("a`b", 15)], True, 0)),
+    ("strings.contains(strings.to_lower($e.f), \"a\")", Call("strings.contains", [Call("strings.to_lower", [Field("$e.f", 34)], position=17), String("a", 41)], position=0)),
+    ("$e.f = $var", Comparison(Field("$e.f", 0), "=", Variable("$var", 7), position=0)),
+    ("f = /a\\/b/ or g = \"\"\"it's\"\"\"", Or([Comparison(Field("f", 0), "=", Regex("a/b", 4), position=0), Comparison(Field("g", 14), "=", String("it's", 18), position=14)], 0)),
+])
+def test_chronicle_query_parse(query, expected):
+    assert parse_query(query) == expected
+
+@pytest.mark.parametrize("query,message,line,column", [
+    ("a = ", "Expected operand, found end of query", 1, 4),
+    ("(a = 1", "Expected ')', found end of query", 1, 7),
+    ("a = 1)", "Unbalanced parentheses, found ')'", 1, 6),
+    ("a = 1 AND\nb 1", "Expected comparison operator, found '1'", 2, 3),
+    ("a = 1 ; b = 2", "Unexpected character ';'", 1, 7),
+])
+def test_chronicle_query_syntax_error(query, message, line, column):
+    with pytest.raises(QuerySyntaxError, match=re.escape(message)) as error:
+        parse_query(query)
+    assert (error.value.line, error.value.column) == (line, column)
+
+def test_chronicle_query_events_error_location():
+    text = "rule r {\n    meta:\n        a = \"b\"\n    events:\n        $e.f = \n    condition:\n        $e\n}"
+    with pytest.raises(QuerySyntaxError) as error:
+        parse_events(text)
+    assert (error.value.line, error.value.column) == (5, 15)     # end of the incomplete expression
@@ -0,0 +1,116 @@
+import re
+import warnings
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.exceptions import SigmaConfigurationError, SigmaFeatureNotSupportedByBackendError
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle.evaluate import QueryEvaluator
+from sigma.backends.chronicle.re2 import RegexWarning, python_regex, translate_regex
+
+def regex_rule(pattern : str, modifiers : str = "re") -> str:
+    return f"""
+title: Regex Rule
+id: 00000000-0000-0000-0000-000000000001
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        CommandLine|{modifiers}: '{pattern}'
+    condition: sel
+"""
+
+def udm_condition(backend, pattern : str, modifiers : str = "re") -> str:
+    return backend.convert(SigmaCollection.from_yaml(regex_rule(pattern, modifiers)))[0].split("\n//")[0][1:-1]
+
+@pytest.mark.parametrize("pattern,expected", [
+    ("a.*b", "a.*b"),
+    ("a/b\\/c", "a\\/b\\/c"),
+    ("end\\Z", "end\\z"),
+    ("\\u00e9\\U0001F600\\N{LATIN SMALL LETTER A}", "\\x{e9}\\x{1f600}\\x{61}"),
+    ("a{,5}", "a{0,5}"),
+    ("(?#comment)a(?u:b)", "a(?:b)"),
+    ("[]/[]", "[\\]\\/\\[]"),
+    ("\\101[\\1]", "\\x{41}[\\x{1}]"),
+])
+def test_chronicle_re2_translate(pattern, expected):
+    assert translate_regex(pattern) == (expected, ())
+
+@pytest.mark.parametrize("pattern,message,position", [
+    ("a(?=b)", "lookahead and lookbehind assertions", 1),
+    ("(?<!a)b", "lookahead and lookbehind assertions", 0),
+    ("(a)\\1", "backreferences", 3),
+    ("(?P<x>a)(?P=x)", "backreferences", 8),
+    ("(?>a+)b", "atomic groups", 0),
+    ("a++b", "possessive quantifiers", 2),
+    ("(a)?(?(1)b|c)", "conditional groups", 4),
+    ("(?x)a b", "the x flag", 0),
+    ("a{1001}", "repetition counts above 1000", 1),
+    ("(a{1,50}){1,50}", "Nested repetitions expand into 2500 copies", 1),
+])
+def test_chronicle_re2_unsupported(pattern, message, position):
+    [finding] = translate_regex(pattern)[1]
+    assert (finding.severity, finding.position) == ("unsupported", position)
+    assert message in finding.message
+
+@pytest.mark.parametrize("pattern,slow", [
+    ("(a+)+", True),
+    ("(.*a)*", True),
+    ("(\\w+\\s?)+$", True),
+    ("(\\w|\\d)+", True),
+    ("(a|ab)*c", True),
+    ("(a+b)+", False),
+    ("(\\d+,)*", False),
+    ("(a|b)*", False),
+    ("(\\.exe|\\.dll)+", False),
+])
+def test_chronicle_re2_slow(pattern, slow):
+    assert [finding.severity for finding in translate_regex(pattern)[1]] == (["slow"] if slow else [])
+
+@pytest.mark.parametrize("backend_class,expected", [
+    (chronicleBackendUdm, "principal.process.command_line = /(?ms)^a.b$/ nocase"),
+    (chronicleBackendYaral, "re.regex($selection.principal.process.command_line, `(?ms)^a.b$`) nocase"),
+])
+def test_chronicle_re2_flags(backend_class, expected):
+    output = backend_class().convert(SigmaCollection.from_yaml(regex_rule("^a.b$", "re|i|m|s")))[0]
+    assert expected in output
+
+def test_chronicle_re2_yaral_delimiter():
+    output = chronicleBackendYaral().convert(SigmaCollection.from_yaml(regex_rule("a`b/c")))[0]
+    assert "re.regex($selection.principal.process.command_line, `a\\`b/c`) nocase" in output
+
+def test_chronicle_re2_policy_warn():
+    backend = chronicleBackendUdm()
+    with pytest.warns(RegexWarning, match="Regular expression 'a\\(\\?=b\\)' of field principal.process.command_line at position 1"):
+        assert udm_condition(backend, "a(?=b)") == "principal.process.command_line = /a(?=b)/ nocase"
+    [finding] = backend.regex_findings["00000000-0000-0000-0000-000000000001"]
+    assert (finding.severity, finding.field) == ("unsupported", "principal.process.command_line")
+
+def test_chronicle_re2_policy_allow():
+    backend = chronicleBackendYaral(regex_policy="allow")
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        backend.convert(SigmaCollection.from_yaml(regex_rule("(a+)+")))
+    assert [finding.severity for finding in backend.regex_findings["00000000-0000-0000-0000-000000000001"]] == ["slow"]
+    backend.convert(SigmaCollection.from_yaml(regex_rule("a.*b").replace("000000000001", "000000000002")))
+    assert "00000000-0000-0000-0000-000000000002" not in backend.regex_findings
+
+@pytest.mark.parametrize("backend_class", [chronicleBackendUdm, chronicleBackendYaral])
+def test_chronicle_re2_policy_error(backend_class):
+    with pytest.raises(SigmaFeatureNotSupportedByBackendError, match="RE2 doesn't support backreferences"):
+        backend_class(regex_policy="error").convert(SigmaCollection.from_yaml(regex_rule("(a)\\1")))
+    assert backend_class(regex_policy="error").convert(SigmaCollection.from_yaml(regex_rule("a.*b")))
+
+def test_chronicle_re2_policy_invalid():
+    with pytest.raises(SigmaConfigurationError, match="Invalid regex policy 'ignore'"):
+        chronicleBackendUdm(regex_policy="ignore")
+
+def test_chronicle_re2_evaluate():
+    pattern = "^\\u00e9t\\U00000065/x\\Z"
+    events = [{"principal": {"process": {"command_line": value}}} for value in ("ÉTE/X", "éte/x\n", "ete/x")]
+    query = udm_condition(chronicleBackendUdm(), pattern)
+    assert query == "principal.process.command_line = /^\\x{e9}t\\x{65}\\/x\\z/ nocase"
+    assert QueryEvaluator({"regex": query}).matches(events) == {"regex": [0]}
+    assert python_regex("\\x{1f600}\\\\x{41}\\z") == "\\U0001f600\\\\x{41}\\Z"
+    assert re.fullmatch(python_regex("\\x{1f600}"), "\U0001F600")
@@ -0,0 +1,100 @@
+import json
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle.cache import ConversionCache
+from sigma.backends.chronicle.reference_lists import ReferenceLists, list_name
+
+def process_creation_rule(index : int, values : str = "['a', 'b', 'c']") -> str:
+    return f"""
+title: Test {index}
+id: 00000000-0000-0000-0000-{index:012d}
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        CommandLine: {values}
+    condition: sel
+"""
+
+placeholder_rule = """
+title: Placeholder
+id: 00000000-0000-0000-0000-000000000099
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        User|expand: '%admins%'
+    condition: sel
+"""
+
+def test_chronicle_reference_list_threshold():
+    backend = chronicleBackendUdm(reference_list_threshold=2)
+    query = backend.convert(SigmaCollection.from_yaml(process_creation_rule(0)))[0]
+    name = list_name(["a", "b", "c"])
+    assert query.startswith(f"(principal.process.command_line in %{name} nocase)\n")
+    assert backend.reference_lists[name].values == ["a", "b", "c"]
+    assert backend.reference_lists[name].rules == {"00000000-0000-0000-0000-000000000000"}
+
+def test_chronicle_reference_list_below_threshold():
+    backend = chronicleBackendUdm(reference_list_threshold=3)
+    query = backend.convert(SigmaCollection.from_yaml(process_creation_rule(0)))[0]
+    assert "%" not in query
+    assert len(backend.reference_lists) == 0
+
+def test_chronicle_reference_list_yaral():
+    backend = chronicleBackendYaral(reference_list_threshold="2")
+    query = backend.convert(SigmaCollection.from_yaml(process_creation_rule(0)))[0]
+    assert f"($selection.principal.process.command_line in %{list_name(['a', 'b', 'c'])} nocase)" in query
+
+def test_chronicle_reference_list_dedup_across_rules():
+    backend = chronicleBackendUdm(reference_list_threshold=2)
+    backend.convert(SigmaCollection.from_yaml(process_creation_rule(0) + "---" + process_creation_rule(1, "['c', 'b', 'a', 'a']")))
+    assert len(backend.reference_lists) == 1
+    reference_list = backend.reference_lists[list_name(["a", "b", "c"])]
+    assert reference_list.rules == {"00000000-0000-0000-0000-000000000000", "00000000-0000-0000-0000-000000000001"}
+
+def test_chronicle_reference_list_placeholder():
+    backend = chronicleBackendUdm(placeholder_reference_lists=True)
+    query = backend.convert(SigmaCollection.from_yaml(placeholder_rule))[0]
+    assert query.startswith("(src.user.user_display_name in %admins nocase)\n")
+    assert backend.reference_lists["admins"].placeholder
+
+def test_chronicle_reference_list_write(tmp_path):
+    backend = chronicleBackendUdm(reference_list_threshold=2, placeholder_reference_lists=True)
+    backend.convert(SigmaCollection.from_yaml(process_creation_rule(0) + "---" + placeholder_rule))
+    name = list_name(["a", "b", "c"])
+    written = backend.reference_lists.write(tmp_path)
+    assert sorted(path.name for path in written) == sorted([name + ".txt", ReferenceLists.manifest_name])
+    assert (tmp_path / (name + ".txt")).read_text() == "a\nb\nc\n"
+    manifest = json.loads((tmp_path / ReferenceLists.manifest_name).read_text())
+    assert manifest[name]["file"] == name + ".txt"
+    assert manifest[name]["rules"] == ["00000000-0000-0000-0000-000000000000"]
+    assert manifest["admins"] == {
+        "file": None,
+        "placeholder": True,
+        "syntax": "string",
+        "content_hash": None,
+        "rules": ["00000000-0000-0000-0000-000000000099"],
+    }
+
+def test_chronicle_reference_list_parallel():
+    rules = "---".join(process_creation_rule(index, f"['a', 'b', 'c{index % 2}']") for index in range(6))
+    serial = chronicleBackendUdm(reference_list_threshold=2)
+    parallel = chronicleBackendUdm(reference_list_threshold=2)
+    assert parallel.convert_parallel(SigmaCollection.from_yaml(rules), workers=2) == serial.convert(SigmaCollection.from_yaml(rules))
+    assert ReferenceLists.serialize(parallel.reference_lists.lists) == ReferenceLists.serialize(serial.reference_lists.lists)
+
+def test_chronicle_reference_list_cache(tmp_path):
+    cache = ConversionCache(tmp_path)
+    sources = [process_creation_rule(0), process_creation_rule(1)]
+    first = chronicleBackendUdm(reference_list_threshold=2)
+    list(first.convert_stream(sources, cache=cache))
+    second = chronicleBackendUdm(reference_list_threshold=2)
+    list(second.convert_stream(sources, cache=cache))
+    assert cache.hits == 2
+    assert ReferenceLists.serialize(second.reference_lists.lists) == ReferenceLists.serialize(first.reference_lists.lists)
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle.deploy import ConnectionPool
+from sigma.backends.chronicle.re2 import RegexWarning
+from sigma.backends.chronicle.server import ConversionServer, ConversionService, ConversionWorker, option_value
+
+def rule(index : int = 1, condition : str = "sel") -> str:
+    return f"""
+title: Test {index}
+id: 00000000-0000-0000-0000-{index:012d}
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        CommandLine|contains:
+            - value{index}
+            - other
+        User: admin
+    condition: {condition}
+"""
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_chronicle_server_worker():
+    worker = ConversionWorker({"reference_list_threshold": 1})
+    result = worker.convert({"rule": rule(), "backend": "udm"})
+    assert result["output"] == chronicleBackendUdm(reference_list_threshold=1).convert(SigmaCollection.from_yaml(rule()))
+    assert result["errors"] == []
+    assert result["seconds"] > 0
+    result = worker.convert({"rule": rule(2, "sel | count() > 5"), "backend": "udm"})
+    assert result["output"] == []
+    assert result["errors"][0]["rule"] == "00000000-0000-0000-0000-000000000002"
+    assert "only supported by the Chronicle YARA-L backend" in result["errors"][0]["error"]
+    assert worker.backends["udm"].errors == []
+    with pytest.warns(RegexWarning, match="Nested unbounded quantifiers"):
+        worker.convert({"rule": rule(4).replace("CommandLine|contains:", "CommandLine|re:").replace("value4", "(a+)+"), "backend": "udm"})
+    assert (worker.backends["udm"].optimizer_stats, worker.backends["udm"].regex_findings) == ({}, {})
+
+def test_chronicle_server_worker_reference_lists():
+    worker = ConversionWorker({"reference_list_threshold": 1})
+    yaml = rule().replace("User: admin", "User:\n            - admin\n            - root")
+    result = worker.convert({"rule": yaml})
+    assert [item["rules"] for item in result["reference_lists"].values()] == [["00000000-0000-0000-0000-000000000001"]]
+    assert worker.convert({"rule": rule(3)})["reference_lists"] == {}
+
+@pytest.mark.parametrize("request_,error", [
+    ({"rule": rule(), "backend": "splunk"}, "Unknown backend 'splunk'"),
+    ({"rule": rule(), "format": "xml"}, "Unknown output format 'xml'"),
+    ({"rule": "title: [", "backend": "udm"}, "ParserError"),
+    ({"rule": "title: Test", "backend": "udm"}, "SigmaLogsourceError"),
+    ({"rule": rule(), "backend": ["udm"]}, "Unknown backend '['udm']'"),
+    ({"rule": rule(), "format": {"name": "default"}}, "Unknown output format"),
+])
+def test_chronicle_server_worker_errors(request_, error):
+    assert error in ConversionWorker().convert(request_)["error"]
+
+def test_chronicle_server_service_batches():
+    async def main():
+        async with ConversionService(workers=0) as service:
+            results = await asyncio.gather(*(service.convert(rule(index)) for index in range(20)))
+            return service, results
+    service, results = run(main())
+    expected = chronicleBackendYaral().convert(SigmaCollection.from_yaml("---".join(rule(index) for index in range(20))))
+    assert [result["output"][0] for result in results] == expected
+    assert service.requests == 20
+    assert service.batches < 20
+
+def test_chronicle_server_service_invalid_request_in_batch():
+    async def main():
+        async with ConversionService(workers=0, batch_delay=0.01) as service:
+            return await asyncio.gather(service.convert(rule(1)), service.convert(rule(2), ["udm"]), service.convert(rule(3)))
+    first, invalid, last = run(main())
+    assert "Unknown backend" in invalid["error"]
+    assert first["output"][0].startswith("rule SIGMA_Test_1") and last["output"][0].startswith("rule SIGMA_Test_3")
+
+def test_chronicle_server_service_not_started():
+    with pytest.raises(RuntimeError, match="isn't started"):
+        run(ConversionService(workers=0).convert(rule()))
+
+def test_chronicle_server_service_processes():
+    async def main():
+        async with ConversionService(workers=1, backend_options={"fingerprint_rules": True}, batch_delay=0.01) as service:
+            results = await asyncio.gather(*(service.convert(rule(index), "udm") for index in range(5)))
+            return service, results
+    service, results = run(main())
+    assert all("// Fingerprint: sha256:" in result["output"][0] for result in results)
+    assert (service.requests, service.batches) == (5, 1)
+
+def test_chronicle_server_http():
+    async def main():
+        async with ConversionService(workers=0) as service, ConversionServer(service) as server:
+            pool = ConnectionPool(server.base_url, 2)
+            try:
+                yaml = await pool.request("POST", "/convert?backend=udm", {"Content-Type": "application/yaml"}, rule().encode())
+                ndjson = await pool.request("POST", "/convert", {"Content-Type": "application/json"}, json.dumps({"rule": rule(), "format": "ndjson"}).encode())
+                invalid = await pool.request("POST", "/convert?backend=splunk", {}, rule().encode())
+                wrong_type = await pool.request("POST", "/convert", {"Content-Type": "application/json"}, json.dumps({"rule": rule(), "backend": ["udm"]}).encode())
+                not_object = await pool.request("POST", "/convert", {"Content-Type": "application/json"}, b"[1]")
+                missing = await pool.request("GET", "/rules", {})
+                health = await pool.request("GET", "/health", {})
+                return yaml, ndjson, invalid, wrong_type, not_object, missing, health
+            finally:
+                pool.close()
+    yaml, ndjson, invalid, wrong_type, not_object, missing, health = run(main())
+    assert yaml.status == 200
+    assert yaml.json()["output"] == chronicleBackendUdm().convert(SigmaCollection.from_yaml(rule()))
+    assert json.loads(ndjson.json()["output"])["id"] == "00000000-0000-0000-0000-000000000001"
+    assert invalid.status == 400 and "Unknown backend" in invalid.json()["error"]
+    assert wrong_type.status == 400 and wrong_type.json() == {"error": "The backend of a request must be a string"}
+    assert not_object.status == 400
+    assert missing.status == 404
+    assert health.json() == {"status": "ok", "workers": 0, "requests": 3, "batches": 3}
+
+def test_chronicle_server_unix_socket(tmp_path):
+    path = str(tmp_path / "sigma.sock")
+    async def main():
+        async with ConversionService(workers=0) as service, ConversionServer(service, path=path, max_body=10000):
+            reader, writer = await asyncio.open_unix_connection(path)
+            try:
+                responses = []
+                for body in (rule().encode(), b"x" * 10001):
+                    writer.write(b"POST /convert HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+                    status = (await reader.readline()).split()[1]
+                    headers = {}
+                    while (line := (await reader.readline()).strip()):
+                        name, _, value = line.decode().partition(":")
+                        headers[name.lower()] = value.strip()
+                    responses.append((int(status), json.loads(await reader.readexactly(int(headers["content-length"])))))
+                return responses, await reader.read()
+            finally:
+                writer.close()
+    (ok, too_large), rest = run(main())
+    assert ok[0] == 200 and ok[1]["output"][0].startswith("rule SIGMA_Test_1")
+    assert too_large[0] == 413
+    assert rest == b""
+
+def test_chronicle_server_option_value():
+    assert option_value("reference_list_threshold=5") == ("reference_list_threshold", 5)
+    assert option_value("string_match_mode=minimal") == ("string_match_mode", "minimal")
+    assert option_value("fingerprint_rules=true") == ("fingerprint_rules", True)
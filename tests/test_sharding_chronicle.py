@@ -0,0 +1,139 @@
+import json
+import random
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.exceptions import SigmaConversionError
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle.deploy import record_key
+from sigma.backends.chronicle.evaluate import QueryEvaluator, load_queries
+from sigma.backends.chronicle.sharding import pack_terms
+
+def rule(images, commands = ("whoami",), filters = ("admin",), condition : str = "sel and not filter") -> str:
+    def values(items):
+        return "".join(f"\n            - '{item}'" for item in items)
+    return f"""
+title: Large Rule
+id: 00000000-0000-0000-0000-000000000001
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        Image|endswith:{values(images)}
+        CommandLine|contains:{values(commands)}
+    filter:
+        User:{values(filters)}
+    timeframe: 5m
+    condition: {condition}
+"""
+
+images = [f"\\tool{index:03d}.exe" for index in range(100)]
+
+def udm_condition(output : str) -> str:
+    return output.split("\n//")[0][1:-1]
+
+def process_event(image : str, command_line : str, user : str = "bob") -> dict:
+    return {
+        "principal": {"process": {"file": {"full_path": image}, "command_line": command_line}},
+        "src": {"user": {"user_display_name": user}},
+    }
+
+def test_chronicle_sharding_below_budget():
+    yaml = rule(images[:5])
+    for backend in (chronicleBackendUdm, chronicleBackendYaral):
+        assert backend(max_query_bytes=100000).convert(SigmaCollection.from_yaml(yaml)) == backend().convert(SigmaCollection.from_yaml(yaml))
+
+def test_chronicle_sharding_udm():
+    yaml = rule(images, ["whoami", "net user"])
+    [full] = chronicleBackendUdm().convert(SigmaCollection.from_yaml(yaml))
+    shards = chronicleBackendUdm(max_query_bytes=1000).convert(SigmaCollection.from_yaml(yaml))
+    assert len(shards) > 1
+    assert all(len(udm_condition(shard).encode()) <= 1000 for shard in shards)
+    assert [shard.rsplit("// Shard: ", 1)[1] for shard in shards] == [f"{number}\n" for number in range(1, len(shards) + 1)]
+    assert all("// ID: 00000000-0000-0000-0000-000000000001" in shard for shard in shards)
+
+    events = [
+        process_event(f"C:\\{image}", command, user)
+        for image in images[::7] + ["\\other.exe"]
+        for command in ("whoami /all", "net user x", "dir")
+        for user in ("admin", "bob")
+    ]
+    evaluator = QueryEvaluator({"full": udm_condition(full), **{str(index): udm_condition(shard) for index, shard in enumerate(shards)}})
+    matches = evaluator.matches(events)
+    assert matches["full"]
+    assert sorted(set(row for index in range(len(shards)) for row in matches[str(index)])) == matches["full"]
+
+def test_chronicle_sharding_several_disjunctions():
+    commands = [f"command{index:03d}" for index in range(40)]
+    shards = chronicleBackendUdm(max_query_bytes=1000).convert(SigmaCollection.from_yaml(rule(images, commands)))
+    assert all(len(udm_condition(shard).encode()) <= 1000 for shard in shards)
+    assert len(shards) < 200
+
+def test_chronicle_sharding_deterministic():
+    shuffled = list(images)
+    random.Random(1).shuffle(shuffled)
+    backend = chronicleBackendYaral(max_query_bytes=2000)
+    shards = backend.convert(SigmaCollection.from_yaml(rule(images)))
+    assert backend.convert(SigmaCollection.from_yaml(rule(shuffled))) == shards
+    added = backend.convert(SigmaCollection.from_yaml(rule(images + ["\\tool999.exe"])))
+    assert added[:len(shards) - 1] == shards[:-1]
+
+def test_chronicle_sharding_yaral():
+    backend = chronicleBackendYaral(max_query_bytes=2000, fingerprint_rules=True, estimate_cost=True)
+    shards = backend.convert(SigmaCollection.from_yaml(rule(images)))
+    assert [shard.splitlines()[0] for shard in shards] == [f"rule SIGMA_Large_Rule_shard_{number}" for number in range(1, len(shards) + 1)]
+    assert all(f'        shard = "{number}"\n' in shard for number, shard in enumerate(shards, 1))
+    assert len(backend.costs.costs) == len(backend.fingerprints.fingerprints) == len(shards)
+    assert len(set(fingerprint.fingerprint for fingerprint in backend.fingerprints.fingerprints)) == len(shards)
+    assert list(backend.optimizer_stats) == ["00000000-0000-0000-0000-000000000001"]
+
+def test_chronicle_sharding_ndjson():
+    output = chronicleBackendYaral(max_query_bytes=2000).convert(SigmaCollection.from_yaml(rule(images)), "ndjson")
+    records = [json.loads(line) for line in output.splitlines()]
+    assert len(records) > 1
+    assert [(record["id"], record["shard"], record["shards"]) for record in records] == [
+        ("00000000-0000-0000-0000-000000000001", number, len(records)) for number in range(1, len(records) + 1)
+    ]
+    assert [record_key(record)[0] for record in records] == [f"00000000-0000-0000-0000-000000000001#{number}" for number in range(1, len(records) + 1)]
+
+def test_chronicle_sharding_reference_lists():
+    backend = chronicleBackendYaral(max_query_bytes=1000, reference_list_threshold=3)
+    filters = [f"user{index}" for index in range(5)]
+    output = backend.convert(SigmaCollection.from_yaml(rule(images, filters=filters)), "ndjson")
+    records = [json.loads(line) for line in output.splitlines()]
+    assert len(records) > 1
+    assert all(len(record["reference_lists"]) == 1 and f"%{record['reference_lists'][0]}" in record["rule"] for record in records)
+
+@pytest.mark.parametrize("backend_class", [chronicleBackendUdm, chronicleBackendYaral])
+def test_chronicle_sharding_finalized_size(backend_class):
+    commands = [f"command{index:03d}" for index in range(40)]
+    for options in ({}, {"estimate_cost": True, "fingerprint_rules": True}):
+        shards = backend_class(max_query_bytes=3000, **options).convert(SigmaCollection.from_yaml(rule(images, commands)))
+        assert len(shards) > 1
+        assert all(len(shard.encode()) <= 3000 for shard in shards)
+        assert max(len(shard.encode()) for shard in shards) > 2500
+
+def test_chronicle_sharding_budget_too_small():
+    with pytest.raises(SigmaConversionError, match="Finalized query without its condition exceeds max_query_bytes of 300"):
+        chronicleBackendYaral(max_query_bytes=300).convert(SigmaCollection.from_yaml(rule(images)))
+
+@pytest.mark.parametrize("yaml,error", [
+    (rule(["\\a.exe"], filters=images), "contains no disjunction"),
+    (rule(images, condition="sel | count() by User > 5"), "queries with aggregations can't be split"),
+])
+def test_chronicle_sharding_errors(yaml, error):
+    with pytest.raises(SigmaConversionError, match=error):
+        chronicleBackendYaral(max_query_bytes=1000).convert(SigmaCollection.from_yaml(yaml))
+
+def test_chronicle_sharding_pack_terms():
+    assert pack_terms([3, 3, 3, 3], 10, 1) == [[0, 1], [2, 3]]
+    assert pack_terms([3, 3, 3], 100, 1) == [[0], [1, 2]]
+    assert pack_terms([20, 3, 3], 10, 1) == [[0], [1, 2]]
+
+def test_chronicle_sharding_load_queries(tmp_path):
+    path = tmp_path / "rules.ndjson"
+    path.write_text(chronicleBackendYaral(max_query_bytes=2000).convert(SigmaCollection.from_yaml(rule(images)), "ndjson"))
+    queries, _ = load_queries([str(path)])
+    assert len(queries) > 1
+    assert all(rule_id.startswith("00000000-0000-0000-0000-000000000001#") for rule_id in queries)
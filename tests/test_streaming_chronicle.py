@@ -0,0 +1,107 @@
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.exceptions import SigmaError
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle.streaming import iter_rule_sources
+
+def process_creation_rule(index : int) -> str:
+    return f"""
+title: Test {index}
+id: 00000000-0000-0000-0000-{index:012d}
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        CommandLine|contains: value{index}
+    condition: sel
+"""
+
+@pytest.fixture
+def rule_directory(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "b.yml").write_text(process_creation_rule(1))
+    (tmp_path / "sub" / "c.yaml").write_text(process_creation_rule(2))
+    (tmp_path / "a.yml").write_text(process_creation_rule(0))
+    (tmp_path / "ignored.txt").write_text("not a rule")
+    return tmp_path
+
+@pytest.mark.parametrize("backend_class", [chronicleBackendUdm, chronicleBackendYaral])
+def test_chronicle_convert_stream_directory(backend_class, rule_directory):
+    backend = backend_class()
+    expected = backend.convert(SigmaCollection.from_yaml("---".join(process_creation_rule(index) for index in range(3))))
+    assert list(backend.convert_stream([rule_directory])) == [
+        (f"00000000-0000-0000-0000-{index:012d}", query)
+        for index, query in enumerate(expected)
+    ]
+
+def test_chronicle_convert_stream_is_lazy():
+    consumed = []
+    def sources():
+        for index in range(3):
+            consumed.append(index)
+            yield process_creation_rule(index)
+
+    stream = chronicleBackendUdm().convert_stream(sources())
+    assert consumed == []
+    rule_id, query = next(stream)
+    assert rule_id == "00000000-0000-0000-0000-000000000000"
+    assert query.startswith("(principal.process.command_line = /.*value0.*/ nocase)")
+    assert consumed == [0]
+
+def test_chronicle_convert_stream_multi_document_and_dict():
+    sources = [
+        process_creation_rule(0) + "---" + process_creation_rule(1),
+        SigmaCollection.from_yaml(process_creation_rule(2)).rules[0].to_dict(),
+    ]
+    assert [rule_id for rule_id, _ in chronicleBackendUdm().convert_stream(sources)] == [
+        "00000000-0000-0000-0000-000000000000",
+        "00000000-0000-0000-0000-000000000001",
+        "00000000-0000-0000-0000-000000000002",
+    ]
+
+def test_chronicle_convert_stream_collect_errors():
+    backend = chronicleBackendUdm(collect_errors=True)
+    sources = ["title: Broken\nlogsource: {}\n", process_creation_rule(0)]
+    assert [rule_id for rule_id, _ in backend.convert_stream(sources)] == ["00000000-0000-0000-0000-000000000000"]
+    assert len(backend.errors) == 1
+    assert backend.errors[0][0] is None
+
+def test_chronicle_convert_stream_raises_parse_errors():
+    with pytest.raises(SigmaError):
+        list(chronicleBackendUdm().convert_stream(["title: Broken\nlogsource: {}\n"]))
+
+def statistics_size(backend) -> int:
+    return (
+        len(backend.optimizer_stats)
+        + len(backend.regex_findings)
+        + sum(len(reference_list.rules) for reference_list in backend.reference_lists.lists.values())
+        + len(backend.metrics.rules)
+        + len(backend.costs.costs)
+        + len(backend.fingerprints.fingerprints)
+    )
+
+def bounded_rule(index : int) -> str:
+    return process_creation_rule(index).replace(
+        f"CommandLine|contains: value{index}",
+        f"CommandLine: [a, b, c]\n        Image|re: '(a+)+x{index}'",
+    )
+
+def test_chronicle_convert_stream_without_statistics():
+    options = {"collect_metrics": True, "estimate_cost": True, "fingerprint_rules": True, "regex_policy": "allow", "reference_list_threshold": 2}
+    collecting = chronicleBackendYaral(**options)
+    list(collecting.convert_stream(bounded_rule(index) for index in range(20)))
+    assert statistics_size(collecting) == 20 * 6
+
+    backend = chronicleBackendYaral(**options)
+    sizes = [statistics_size(backend) for _ in backend.convert_stream((bounded_rule(index) for index in range(20)), collect_statistics=False)]
+    assert len(sizes) == 20
+    assert max(sizes) == 6
+    assert statistics_size(backend) == 0
+    assert len(backend.reference_lists) == 1
+
+def test_chronicle_iter_rule_sources_file(rule_directory):
+    assert list(iter_rule_sources([str(rule_directory / "a.yml")])) == [
+        (rule_directory / "a.yml", process_creation_rule(0)),
+    ]
@@ -0,0 +1,74 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+
+# Log sources whose mapping tables map User to different UDM fields, with a field only mapped by the table.
+logsources = [
+    ("process_creation", "Image|endswith"),
+    ("file_event", "TargetFilename|contains"),
+    ("network_connection", "DestinationHostname"),
+    ("registry_event", "TargetObject|startswith"),
+    ("dns_query", "QueryName|endswith"),
+]
+
+threads = 8
+
+def rules_yaml(count : int) -> str:
+    rules = []
+    for index in range(count):
+        category, field = logsources[index % len(logsources)]
+        condition = "sel | count() by User > 3" if index % 7 == 0 else "sel and not filter"
+        rules.append(f"""
+title: Rule {index}
+id: 00000000-0000-0000-0000-{index:012d}
+status: test
+logsource:
+    category: {category}
+    product: windows
+detection:
+    sel:
+        {field}:
+            - value{index}a
+            - value{index}b
+            - value{index}c
+        User: user{index}
+    filter:
+        User: admin{index}
+    timeframe: 5m
+    condition: {condition}
+""")
+    return "---".join(rules)
+
+@pytest.fixture
+def fast_thread_switching():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+@pytest.mark.parametrize("backend_class,options", [
+    (chronicleBackendUdm, {"collect_metrics": True, "fingerprint_rules": True}),
+    (chronicleBackendYaral, {"estimate_cost": True, "reference_list_threshold": 2}),
+])
+def test_chronicle_shared_backend_threads(backend_class, options, fast_thread_switching):
+    text = rules_yaml(40)
+    serial_backend = backend_class(collect_errors=True, **options)
+    serial = [serial_backend.convert_rule(rule) for rule in SigmaCollection.from_yaml(text).rules]
+    assert sum(1 for queries in serial if queries) > 30
+
+    backend = backend_class(collect_errors=True, **options)
+    def convert(_):
+        return [backend.convert_rule(rule) for rule in SigmaCollection.from_yaml(text).rules]
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(convert, range(threads)))
+    assert all(result == serial for result in results)
+    assert len(backend.errors) == threads * len(serial_backend.errors)
+    assert {name: reference_list.rules for name, reference_list in backend.reference_lists.lists.items()} == {name: reference_list.rules for name, reference_list in serial_backend.reference_lists.lists.items()}
+    assert backend.optimizer_stats.keys() == serial_backend.optimizer_stats.keys()
+    if backend.metrics is not None:
+        assert len(backend.metrics.rules) == threads * len(serial_backend.metrics.rules)
+        assert sorted(rule.rule_id for rule in backend.metrics.rules) == sorted([rule.rule_id for rule in serial_backend.metrics.rules] * threads)
+    if backend.fingerprints is not None:
+        assert len(backend.fingerprints.fingerprints) == threads * len(serial_backend.fingerprints.fingerprints)
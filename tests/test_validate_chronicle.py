@@ -0,0 +1,162 @@
+import importlib.util
+import json
+import sys
+from pathlib import Path
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.backends.chronicle import chronicleBackendYaral
+from sigma.backends.chronicle.validate import main, validate_rule, validate_rules, validate_text
+
+spec = importlib.util.spec_from_file_location("conversion_benchmark", Path(__file__).parent.parent / "benchmarks" / "conversion.py")
+conversion_benchmark = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(conversion_benchmark)
+
+valid_rule = """rule SIGMA_Test
+{
+    meta:
+        author = "a"
+        description = "b"
+    events:
+        ($selection.principal.hostname = "x" nocase)
+        $selection.principal.user.userid = $user
+    match:
+        $user over 5m
+    outcome:
+        $count = count_distinct($selection.target.ip)
+    condition:
+        #selection > 2 and $count > 1
+}"""
+
+sigma_rules = """
+title: Test - Quotes "and" Lines
+id: 00000000-0000-0000-0000-000000000001
+status: test
+description: |
+    Says "hi"
+    on two lines\\
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        ProcessId: 4
+        CommandLine|contains: whoami
+    keywords:
+        - mimikatz
+    condition: sel or keywords
+---
+title: Net
+id: 00000000-0000-0000-0000-000000000002
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        Image|endswith: '\\\\net.exe'
+    timeframe: 10m
+    condition: sel
+---
+title: Aggregation
+id: 00000000-0000-0000-0000-000000000003
+status: test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    sel:
+        Image|endswith: '\\\\net.exe'
+    timeframe: 10m
+    condition: sel | count(CommandLine) by User > 5
+---
+title: Correlation
+id: 00000000-0000-0000-0000-000000000004
+status: test
+correlation:
+    type: event_count
+    rules:
+        - 00000000-0000-0000-0000-000000000002
+    group-by:
+        - User
+    timespan: 1h
+    condition:
+        gte: 10
+"""
+
+def test_chronicle_validate_valid_rule():
+    assert validate_rule(valid_rule) == []
+
+def test_chronicle_validate_backend_output():
+    output = chronicleBackendYaral().convert(SigmaCollection.from_yaml(sigma_rules))
+    assert len(output) == 3
+    assert [error.message for rule in output for error in validate_rule(rule)] == []
+    assert output[0].startswith("rule SIGMA_Test___Quotes__and__Lines\n")
+    assert '        description = "Says \\"hi\\"\\non two lines\\\\\\n"\n' in output[0]
+    assert '$selection.principal.process.pid = "4"' in output[0]
+
+def test_chronicle_validate_temporal_correlation():
+    rules = sigma_rules.replace("type: event_count", "type: temporal").replace(
+        "        - 00000000-0000-0000-0000-000000000002\n", "        - 00000000-0000-0000-0000-000000000001\n        - 00000000-0000-0000-0000-000000000002\n"
+    )
+    [aggregation, correlation] = chronicleBackendYaral().convert(SigmaCollection.from_yaml(rules))
+    assert "        $e1.src.user.user_display_name = $src_user_user_display_name\n        ($e2." in correlation
+    assert validate_rule(correlation) == []
+
+def test_chronicle_validate_benchmark_corpus():
+    backend = chronicleBackendYaral()
+    output = [rule for item in conversion_benchmark.generate_corpus(100, seed=0) for rule in backend.convert(SigmaCollection.from_dicts([item]))]
+    assert validate_rules(enumerate(output)) == {}
+
+@pytest.mark.parametrize("old,new,message,line,column", [
+    ('description = "b"', 'description = "say "hi""', "Unescaped '\"' in meta string", 5, 28),
+    ('description = "b"', 'description = "a\\qb"', "Invalid escape sequence '\\q' in meta string", 5, 25),
+    ('description = "b"', "description = b", "Expected string, number or boolean meta value", 5, 23),
+    ("($selection.principal.hostname", "(principal.hostname", "Field 'principal.hostname' isn't referenced through an event variable", 7, 10),
+    ('$selection.principal.hostname = "x" nocase', '"x"', 'Keyword "x" isn\'t compared to a field', 7, 10),
+    ('= "x" nocase)', "= nocase)", "Expected operand, found 'nocase'", 7, 42),
+    ("$user over 5m", "$host over 5m", "Match variable '$host' isn't assigned", 10, 9),
+    ("$user over 5m", "$user", "Expected match variables", 10, 9),
+    ("($selection.target.ip)", "($other.target.ip)", "Event variable '$other' isn't bound", 12, 33),
+    ("#selection > 2", "#other > 2", "Event variable '$other' isn't bound", 14, 9),
+    ("#selection > 2 and", "#selection and", "Event count '#selection' must be compared to a number", 14, 9),
+    ("and $count > 1", "and $total > 1", "Outcome variable '$total' isn't assigned", 14, 28),
+    ("rule SIGMA_Test", "rule SIGMA_Test-1", "Invalid rule name 'SIGMA_Test-1'", 1, 6),
+    ("    condition:\n        #selection > 2 and $count > 1\n", "", "Missing condition section", 13, 1),
+    ("\n}", "", "Expected '}' at end of rule", 14, 38),
+])
+def test_chronicle_validate_errors(old, new, message, line, column):
+    assert old in valid_rule
+    [error] = validate_rule(valid_rule.replace(old, new))
+    assert error.message.startswith(message)
+    assert (error.line, error.column) == (line, column)
+
+def test_chronicle_validate_section_order():
+    text = valid_rule.replace("    match:\n        $user over 5m\n", "").replace("\n}", "\n    match:\n        $user over 5m\n}")
+    assert [(error.message, error.line, error.column) for error in validate_rule(text)] == [
+        ("The match section must come before the condition section", 13, 5),
+    ]
+
+def test_chronicle_validate_several_errors():
+    text = valid_rule.replace('description = "b"', 'description = "b""').replace("#selection > 2", "#other > 2")
+    assert [(error.line, error.column) for error in validate_rule(text)] == [(5, 25), (14, 9)]
+
+def test_chronicle_validate_text():
+    text = valid_rule + "\n\n" + valid_rule.replace("$user over 5m", "$host over 5m")
+    [error] = validate_text(text)
+    assert (error.line, error.column) == (26, 9)
+
+def test_chronicle_validate_main(tmp_path, monkeypatch, capsys):
+    ndjson = tmp_path / "rules.ndjson"
+    ndjson.write_text(chronicleBackendYaral().convert(SigmaCollection.from_yaml(sigma_rules), "ndjson"))
+    text = tmp_path / "rules.yaral"
+    text.write_text(valid_rule + "\n" + valid_rule.replace("#selection > 2", "#other > 2"))
+    monkeypatch.setattr(sys, "argv", ["validate", str(ndjson)])
+    main()
+    assert capsys.readouterr().out == "3 rules, 0 problems\n"
+    monkeypatch.setattr(sys, "argv", ["validate", str(ndjson), str(text), "--json"])
+    with pytest.raises(SystemExit) as exit:
+        main()
+    assert exit.value.code == 1
+    assert json.loads(capsys.readouterr().out) == [
+        {"rule": str(text), "line": 29, "column": 9, "message": "Event variable '$other' isn't bound in the events section"},
+    ]
@@ -0,0 +1,165 @@
+import pytest
+from sigma.collection import SigmaCollection
+from sigma.exceptions import SigmaConfigurationError
+from sigma.types import SigmaString
+from sigma.backends.chronicle import chronicleBackendUdm, chronicleBackendYaral
+from sigma.backends.chronicle.options import backend_option
+from sigma.backends.chronicle.values import alternation_regexes, escape_regex, escape_string, group_by_kind, literal, minimal_regex, pattern_regex, wildcard_kind
+
+def rule_with_values(modifier : str, values : str) -> SigmaCollection:
+    return SigmaCollection.from_yaml(f"""
+        title: Test
+        status: test
+        logsource:
+            category: process_creation
+            product: windows
+        detection:
+            sel:
+                CommandLine{modifier}: {values}
+            condition: sel
+    """)
+
+@pytest.mark.parametrize("value,kind", [
+    ("abc", "exact"),
+    ("abc*", "startswith"),
+    ("*abc", "endswith"),
+    ("*abc*", "contains"),
+    ("a*c", "pattern"),
+    ("*a?c*", "pattern"),
+])
+def test_chronicle_wildcard_kind(value, kind):
+    assert wildcard_kind(SigmaString(value)) == kind
+
+def test_chronicle_wildcard_kind_placeholder():
+    assert wildcard_kind(SigmaString("%list%").insert_placeholders()) is None
+
+def test_chronicle_pattern_regex():
+    assert pattern_regex(SigmaString("*a.b?c*")) == ".*a\\.b.c.*"
+
+def test_chronicle_group_by_kind():
+    values = [SigmaString(value) for value in ["a", "*b*", "c*", "d", "*e*", "f*g"]]
+    assert group_by_kind(values) == {
+        "exact": [values[0], values[3]],
+        "contains": [values[1], values[4]],
+        "startswith": [values[2]],
+        "pattern": [values[5]],
+    }
+
+def test_chronicle_literal():
+    assert literal(SigmaString("*a\\*b*")) == "a*b"
+
+def test_chronicle_escape_regex():
+    assert escape_regex("C:\\a.b|c(d)/e+f$") == "C:\\\\a\\.b\\|c\\(d\\)\\/e\\+f\\$"
+
+def test_chronicle_escape_string():
+    assert escape_string('C:\\a "b"') == 'C:\\\\a \\"b\\"'
+
+@pytest.mark.parametrize("regex,minimal", [
+    (".*foo.*", "foo"),
+    ("^foo.*", "^foo"),
+    (".*foo$", "foo$"),
+    ("^.*a.*b.c.*$", "a.*b.c"),
+    ("^(a|b)$", "^(a|b)$"),
+    ("a\\.*", "a\\.*"),
+    ("a\\\\.*", "a\\\\"),
+    (".*", ".*"),
+])
+def test_chronicle_minimal_regex(regex, minimal):
+    assert minimal_regex(regex) == minimal
+
+def test_chronicle_alternation_regexes():
+    assert alternation_regexes(["a", "b.c", "a", "d", "e"], 3) == ["(a|b\\.c|d)", "e"]
+
+def test_chronicle_backend_option():
+    assert backend_option(chronicleBackendUdm(), "regex_alternation_max_size") == 0
+    assert backend_option(chronicleBackendUdm(regex_alternation_max_size="5"), "regex_alternation_max_size") == 5
+    with pytest.raises(SigmaConfigurationError, match="regex_alternation_max_size"):
+        backend_option(chronicleBackendUdm(regex_alternation_max_size="many"), "regex_alternation_max_size")
+
+def test_chronicle_udm_contains_alternation():
+    assert chronicleBackendUdm(regex_alternation_max_size=2).convert(
+        rule_with_values("|contains", "['foo', 'a|b', 'c.d']")
+    )[0].splitlines()[0] == "(principal.process.command_line = /.*(foo|a\\|b).*/ nocase OR principal.process.command_line = /.*c\\.d.*/ nocase)"
+
+def test_chronicle_yaral_startswith_alternation():
+    assert "($selection.principal.process.command_line = /^(foo|bar).*/ nocase)" in chronicleBackendYaral(regex_alternation_max_size=10).convert(
+        rule_with_values("|startswith", "['foo', 'bar']")
+    )[0]
+
+def test_chronicle_udm_endswith_alternation():
+    assert chronicleBackendUdm(regex_alternation_max_size=10).convert(
+        rule_with_values("|endswith", "['\\\\cmd.exe', '\\\\ps.exe']")
+    )[0].splitlines()[0] == "(principal.process.command_line = /.*(\\\\cmd\\.exe|\\\\ps\\.exe)$/ nocase)"
+
+def test_chronicle_alternation_disabled_by_default():
+    assert chronicleBackendUdm().convert(
+        rule_with_values("|contains", "['foo', 'bar']")
+    )[0].splitlines()[0] == "(principal.process.command_line = /.*foo.*/ nocase OR principal.process.command_line = /.*bar.*/ nocase)"
+
+mixed_values = "['exact1', '*contains1*', 'prefix*', 'exact2', '*suf', 'a*b?c', '*contains2*']"
+
+def test_chronicle_udm_mixed_value_list():
+    assert chronicleBackendUdm().convert(
+        rule_with_values("", mixed_values)
+    )[0].splitlines()[0] == (
+        '(principal.process.command_line = "exact1" nocase OR principal.process.command_line = "exact2" nocase'
+        ' OR principal.process.command_line = /.*contains1.*/ nocase OR principal.process.command_line = /.*contains2.*/ nocase'
+        ' OR principal.process.command_line = /^prefix.*/ nocase OR principal.process.command_line = /.*suf$/ nocase'
+        ' OR principal.process.command_line = /^a.*b.c$/ nocase)'
+    )
+
+def test_chronicle_yaral_mixed_value_list_alternation():
+    assert (
+        "($selection.principal.process.command_line = /^(exact1|exact2)$/ nocase"
+        " OR $selection.principal.process.command_line = /.*(contains1|contains2).*/ nocase"
+        " OR $selection.principal.process.command_line = /^prefix.*/ nocase"
+        " OR $selection.principal.process.command_line = /.*suf$/ nocase"
+        " OR $selection.principal.process.command_line = /^a.*b.c$/ nocase)"
+    ) in chronicleBackendYaral(regex_alternation_max_size=10).convert(rule_with_values("", mixed_values))[0]
+
+def test_chronicle_udm_mixed_and_list():
+    assert chronicleBackendUdm(regex_alternation_max_size=10).convert(
+        rule_with_values("|contains|all", "['a', 'b*c']")
+    )[0].splitlines()[0] == "(principal.process.command_line = /.*a.*/ nocase AND principal.process.command_line = /^.*b.*c.*$/ nocase)"
+
+def test_chronicle_udm_exact_value_list():
+    assert chronicleBackendUdm().convert(
+        rule_with_values("", "['foo', 'bar']")
+    )[0].splitlines()[0] == '(principal.process.command_line = "foo" nocase OR principal.process.command_line = "bar" nocase)'
+
+def test_chronicle_udm_minimal_regexes():
+    assert chronicleBackendUdm(string_match_mode="minimal").convert(
+        rule_with_values("", mixed_values)
+    )[0].splitlines()[0] == (
+        '(principal.process.command_line = "exact1" nocase OR principal.process.command_line = "exact2" nocase'
+        ' OR principal.process.command_line = /contains1/ nocase OR principal.process.command_line = /contains2/ nocase'
+        ' OR principal.process.command_line = /^prefix/ nocase OR principal.process.command_line = /suf$/ nocase'
+        ' OR principal.process.command_line = /^a.*b.c$/ nocase)'
+    )
+
+def test_chronicle_yaral_minimal_alternation():
+    assert "($selection.principal.process.command_line = /(foo|bar)/ nocase)" in chronicleBackendYaral(string_match_mode="minimal", regex_alternation_max_size=10).convert(
+        rule_with_values("|contains", "['foo', 'bar']")
+    )[0]
+
+def test_chronicle_udm_string_functions():
+    assert chronicleBackendUdm(string_match_mode="functions").convert(
+        rule_with_values("", "['*A\"b*', 'Pre*', '*\\\\suf', 'a*b?c']")
+    )[0].splitlines()[0] == (
+        '(strings.contains(strings.to_lower(principal.process.command_line), "a\\"b")'
+        ' OR strings.starts_with(strings.to_lower(principal.process.command_line), "pre")'
+        ' OR strings.ends_with(strings.to_lower(principal.process.command_line), "\\\\suf")'
+        ' OR principal.process.command_line = /^a.*b.c$/ nocase)'
+    )
+
+def test_chronicle_yaral_string_functions_with_alternation():
+    query = chronicleBackendYaral(string_match_mode="functions", regex_alternation_max_size=10).convert(
+        rule_with_values("|contains", "['foo', 'bar']")
+    )[0]
+    assert "($selection.principal.process.command_line = /(foo|bar)/ nocase)" in query
+    query = chronicleBackendYaral(string_match_mode="functions", regex_alternation_max_size=10).convert(rule_with_values("|contains", "foo"))[0]
+    assert '(strings.contains(strings.to_lower($selection.principal.process.command_line), "foo"))' in query
+
+def test_chronicle_invalid_string_match_mode():
+    with pytest.raises(SigmaConfigurationError, match="Invalid string match mode 'fast'"):
+        chronicleBackendUdm(string_match_mode="fast")